@@ -134,6 +134,16 @@ def _initialize_mongodb_connection(app):
         client = get_mongo_client()
         db = get_mongo_db()
         # Elimina asignaciones directas a app.mongo_client, app.db, etc.
+
+        # Crear los índices declarados que falten (ver app/utils/db_indexes.py)
+        if (
+            db is not None
+            and app.config.get("MONGO_ENSURE_INDEXES", True)
+            and not app.config.get("TESTING", False)
+        ):
+            from app.utils.db_indexes import ensure_indexes_in_background
+
+            ensure_indexes_in_background(db)
     except Exception as e:
         app.logger.error(f"❌ Error inicializando la conexión global a MongoDB: {e}")
         db = None
@@ -233,6 +243,8 @@ def _register_main_blueprints(app):
     from .routes.auth_routes import auth_bp
     from .routes.catalogs_routes import catalogs_bp
     from .routes.catalog_images_routes import image_bp
+    from .routes.jobs_routes import jobs_bp
+    from .routes.metrics_routes import metrics_bp
     from .routes.usuarios_routes import usuarios_bp
     from .error_handlers import errors_bp
     from .routes.admin_routes import admin_bp, admin_logs_bp
@@ -246,6 +258,8 @@ def _register_main_blueprints(app):
         (auth_bp, ""),
         (catalogs_bp, "/catalogs"),
         (image_bp, "/images"),
+        (jobs_bp, "/jobs"),
+        (metrics_bp, ""),
         (usuarios_bp, "/usuarios"),
         (errors_bp, ""),
     ]
@@ -427,10 +441,14 @@ def _setup_monitoring(app):
         app: Instancia de Flask para configurar
     """
     global client
-    
+
+    from app import monitoring
+
+    # Medir la duración de cada petición por endpoint (histogramas de latencia)
+    monitoring.init_request_timing(app)
+
     # Inicializar sistema de monitoreo
     try:
-        from app import monitoring
         # Usar configuración de app en lugar de atributos directos
         app.config["MONITORING_THREAD"] = monitoring.init_app(app, client)
         app.config["MONITORING_ENABLED"] = True
@@ -524,4 +542,15 @@ def create_app(testing=False):
         except Exception as e:
             app.logger.warning(f"No se pudo iniciar persistencia de caché: {e}")
 
+        # Retomar los trabajos en segundo plano que quedaron a medias
+        try:
+            from app.database import get_mongo_db
+            from app.utils.job_queue import recover_jobs
+
+            db = get_mongo_db()
+            if db is not None:
+                recover_jobs(db)
+        except Exception as e:
+            app.logger.warning(f"No se pudieron revisar los trabajos pendientes: {e}")
+
     return app
@@ -7,15 +7,48 @@
 
 """
 Sistema de caché en memoria para reducir la dependencia en MongoDB. Almacena temporalmente resultados de consultas frecuentes.
+
+Las entradas se agrupan en espacios de nombres (la parte de la clave antes
+del primer ':', o el key_prefix del decorador cached), cada uno con su
+capacidad y su TTL por defecto (configure_namespace). Cada espacio reparte
+sus claves entre varias particiones con su propio lock y un OrderedDict
+en orden de uso, así que leer, guardar y expulsar la entrada menos usada
+es O(1) y las peticiones concurrentes rara vez esperan al mismo lock.
+
+Las entradas pueden llevar etiquetas ("user:<id>", "catalog:<id>"):
+invalidate_tags() elimina todas las que tengan alguna de ellas, para
+olvidar los datos de un usuario o un catálogo en cuanto se modifican.
+
+El decorador cached evita las avalanchas de consultas al caducar una entrada
+muy usada: un solo cálculo por clave, valor caducado mientras se recalcula
+en segundo plano (stale_ttl) y expiración anticipada probabilística.
 """
 
+import hashlib
 import json
 import logging
+import math
 import os
+import random
 import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from functools import wraps
 
+from flask import current_app, has_app_context
+
+from app.utils.metrics import counter_sample, gauge_sample, register_collector
+from config import (
+    CACHE_DEFAULT_TTL,
+    CACHE_EARLY_EXPIRY_BETA,
+    CACHE_LOCK_STRIPES,
+    CACHE_MAX_ENTRIES,
+    CACHE_REFRESH_WORKERS,
+    CACHE_SINGLE_FLIGHT_TIMEOUT,
+)
+
 # Configuración de logging (solo consola para evitar errores de permisos)
 logging.basicConfig(
     level=logging.INFO,
@@ -23,74 +56,225 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()],
 )
 
-# Cache en memoria principal con capacidad limitada
-_memory_cache: dict[str, dict[str, str | float]] = {}
-_cache_lock = threading.RLock()
 _cache_file = (
     None  # Desactivamos el archivo de respaldo para evitar problemas de permisos
 )
-_max_cache_size = 100  # Reducido a 100 para minimizar el uso de memoria
 
-# Contadores de estadísticas
-_cache_hit_count = 0
-_cache_miss_count = 0
+# Espacio de nombres de las claves sin ':'
+DEFAULT_NAMESPACE = "default"
+
+# Entradas mínimas por partición: los espacios pequeños usan menos
+# particiones para que la expulsión siga siendo casi LRU global
+MIN_ENTRIES_PER_STRIPE = 16
+
+
+class _CacheEntry:
+    # stale_until: hasta cuándo puede servirse caducada (stale-while-revalidate)
+    # compute_time: segundos que costó calcularla (expiración anticipada)
+    __slots__ = ("value", "expires_at", "stale_until", "compute_time", "tags")
+
+    def __init__(self, value, expires_at, tags, stale_ttl=0, compute_time=0.0):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = expires_at + stale_ttl
+        self.compute_time = compute_time
+        self.tags = tags
+
+
+class _CacheStripe:
+    """Partición de un espacio de nombres: entradas en orden de uso (LRU)"""
+
+    __slots__ = (
+        "lock",
+        "entries",
+        "max_entries",
+        "hits",
+        "misses",
+        "evictions",
+        "expirations",
+    )
+
+    def __init__(self, max_entries):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class _CacheNamespace:
+    """Capacidad, TTL por defecto y particiones de un espacio de nombres"""
+
+    def __init__(self, name, max_entries, ttl):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        num_stripes = max(
+            1, min(CACHE_LOCK_STRIPES, max_entries // MIN_ENTRIES_PER_STRIPE)
+        )
+        per_stripe = -(-max_entries // num_stripes)
+        self.stripes = [_CacheStripe(per_stripe) for _ in range(num_stripes)]
+
+    def stripe(self, key):
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    def stats(self):
+        stats = {
+            "size": 0,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+        for stripe in self.stripes:
+            stats["size"] += len(stripe.entries)
+            stats["hits"] += stripe.hits
+            stats["misses"] += stripe.misses
+            stats["evictions"] += stripe.evictions
+            stats["expirations"] += stripe.expirations
+        return stats
+
+
+_namespaces: dict[str, _CacheNamespace] = {}
+_namespaces_lock = threading.Lock()
+# Configuración de los espacios que aún no se han usado
+_namespace_settings: dict[str, tuple[int, int]] = {}
+
+# Etiqueta → claves que la llevan. Orden de los locks: partición y luego este
+_tag_index: dict[str, set[str]] = {}
+_tag_lock = threading.Lock()
+_invalidation_count = 0
+
+
+def configure_namespace(name, max_entries=None, ttl=None):
+    """
+    Fija la capacidad y el TTL por defecto de un espacio de nombres.
+
+    Si el espacio ya tiene entradas se vacía y se crea de nuevo.
+
+    Args:
+        name: Espacio de nombres (prefijo de las claves)
+        max_entries: Entradas como máximo (por defecto CACHE_MAX_ENTRIES)
+        ttl: Tiempo de vida en segundos cuando set_cache no lo indica
+    """
+    settings = (max_entries or CACHE_MAX_ENTRIES, ttl or CACHE_DEFAULT_TTL)
+    with _namespaces_lock:
+        _namespace_settings[name] = settings
+        old = _namespaces.pop(name, None)
+    if old is not None:
+        _clear_namespace(old)
+
+
+def _get_namespace(name):
+    namespace = _namespaces.get(name)
+    if namespace is None:
+        with _namespaces_lock:
+            namespace = _namespaces.get(name)
+            if namespace is None:
+                max_entries, ttl = _namespace_settings.get(
+                    name, (CACHE_MAX_ENTRIES, CACHE_DEFAULT_TTL)
+                )
+                namespace = _namespaces[name] = _CacheNamespace(name, max_entries, ttl)
+    return namespace
+
+
+def _namespace_of(key):
+    key = str(key)
+    return key.split(":", 1)[0] if ":" in key else DEFAULT_NAMESPACE
+
+
+def _key_default(value):
+    """Representación estable (JSON) de los argumentos que no son JSON"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    return f"{type(value).__module__}.{type(value).__qualname__}:{value}"
+
+
+def make_cache_key(namespace, name, *args, **kwargs):
+    """
+    Clave estable para una llamada: '<namespace>:<name>:<hash de los argumentos>'.
+
+    Los argumentos se serializan en JSON con las claves ordenadas, así que
+    la clave no depende del orden de los kwargs ni de direcciones de memoria.
+    """
+    payload = json.dumps(
+        [args, kwargs], sort_keys=True, default=_key_default, separators=(",", ":")
+    )
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{namespace}:{name}:{digest}"
 
-# No necesitamos crear el directorio /tmp ya que siempre existe
+
+def _unlink_tags(key, tags):
+    """Quita una clave del índice de etiquetas (con el lock de su partición)"""
+    if not tags:
+        return
+    with _tag_lock:
+        for tag in tags:
+            keys = _tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del _tag_index[tag]
 
 
-def set_cache(key, value, ttl=1800):  # TTL reducido a 30 minutos por defecto
+def set_cache(key, value, ttl=None, tags=None):
     """
     Almacena un valor en la caché con un tiempo de vida específico.
-    Implementa control de tamaño máximo para evitar fugas de memoria.
+    Si el espacio de nombres está lleno se expulsa la entrada menos usada.
 
     Args:
         key: Clave única para identificar el valor
-        value: Valor a almacenar (debe ser serializable)
-        ttl: Tiempo de vida en segundos (por defecto 30 minutos para conservar memoria)
+        value: Valor a almacenar
+        ttl: Tiempo de vida en segundos (por defecto el de su espacio de nombres)
+        tags: Etiquetas para invalidar la entrada con invalidate_tags
     """
-    global _memory_cache, _max_cache_size
-
     # Convertir cualquier valor no serializable a string
     if hasattr(value, "__dict__"):
         value = str(value)
 
-    expires_at = time.time() + ttl
-
-    with _cache_lock:
-        # Limpiar entradas antiguas si el caché excede el tamaño máximo
-        if len(_memory_cache) >= _max_cache_size:
-            # Eliminar las entradas más antiguas
-            now = time.time()
-            expired_keys = [
-                k
-                for k, v in _memory_cache.items()
-                if isinstance(v["expires_at"], (int, float)) and v["expires_at"] < now
-            ]
-
-            # Eliminar primero las entradas expiradas
-            for k in expired_keys:
-                del _memory_cache[k]
-
-            # Si todavía excede el tamaño máximo, eliminar las más antiguas
-            if len(_memory_cache) >= _max_cache_size:
-                # Ordenar por tiempo de expiración y eliminar el 20% más antiguo
-                sorted_items = sorted(
-                    _memory_cache.items(), key=lambda x: x[1]["expires_at"]
-                )
-                items_to_remove = int(len(sorted_items) * 0.2)  # Eliminar el 20%
-
-                for i in range(items_to_remove):
-                    if i < len(sorted_items):
-                        del _memory_cache[sorted_items[i][0]]
+    _store(str(key), value, ttl, tags)
+    logging.debug(f"Valor almacenado en caché: {key} (expira en {ttl} segundos)")
+    return True
 
-        # Almacenar el nuevo valor
-        _memory_cache[key] = {"value": value, "expires_at": expires_at}
 
-    # Guardar caché en disco periódicamente
-    if len(_memory_cache) % 10 == 0:  # Cada 10 entradas
-        _save_cache_to_disk()
+def _store(key, value, ttl, tags, invalidations=None, stale_ttl=0, compute_time=0.0):
+    """
+    Guarda una entrada y expulsa las menos usadas si la partición se llena.
 
-    logging.debug(f"Valor almacenado en caché: {key} (expira en {ttl} segundos)")
+    Con ``invalidations`` (valor de _invalidation_count antes de calcular el
+    valor) no se guarda nada si desde entonces hubo alguna invalidación: la
+    comprobación y el alta en el índice de etiquetas se hacen con el mismo
+    lock que invalidate_tags, así que una escritura no puede colarse entre
+    ambas y dejar en caché un valor anterior a ella.
+    """
+    namespace = _get_namespace(_namespace_of(key))
+    tags = frozenset(tags) if tags else None
+    entry = _CacheEntry(
+        value, time.time() + (ttl or namespace.ttl), tags, stale_ttl, compute_time
+    )
+    stripe = namespace.stripe(key)
+
+    with stripe.lock:
+        old = stripe.entries.pop(key, None)
+        if old is not None:
+            _unlink_tags(key, old.tags)
+        if tags or invalidations is not None:
+            with _tag_lock:
+                if invalidations is not None and invalidations != _invalidation_count:
+                    return False
+                for tag in tags or ():
+                    _tag_index.setdefault(tag, set()).add(key)
+        stripe.entries[key] = entry
+        while len(stripe.entries) > stripe.max_entries:
+            evicted_key, evicted = stripe.entries.popitem(last=False)
+            _unlink_tags(evicted_key, evicted.tags)
+            stripe.evictions += 1
     return True
 
 
@@ -104,58 +288,136 @@ def get_cache(key):
     Returns:
         El valor almacenado o None si no existe o ha expirado
     """
-    global _memory_cache, _cache_hit_count, _cache_miss_count
+    entry = _lookup(str(key))
+    if entry is None:
+        return None
+    logging.debug(f"Valor recuperado de caché: {key}")
+    return entry.value
 
-    with _cache_lock:
-        if key not in _memory_cache:
-            _cache_miss_count += 1
-            return None
 
-        cache_item = _memory_cache[key]
+def _lookup(key, allow_stale=False):
+    """
+    Entrada de una clave, o None si no existe o ha expirado.
+
+    Con ``allow_stale`` también devuelve las caducadas que aún pueden
+    servirse mientras se recalculan (hasta stale_until).
+    """
+    stripe = _get_namespace(_namespace_of(key)).stripe(key)
+    now = time.time()
+
+    with stripe.lock:
+        entry = stripe.entries.get(key)
+        if entry is None:
+            stripe.misses += 1
+            return None
 
         # Verificar si el valor ha expirado
-        if (
-            isinstance(cache_item["expires_at"], (int, float))
-            and time.time() > cache_item["expires_at"]
-        ):
-            del _memory_cache[key]
-            _cache_miss_count += 1
+        if now > entry.stale_until:
+            del stripe.entries[key]
+            _unlink_tags(key, entry.tags)
+            stripe.expirations += 1
+            stripe.misses += 1
             logging.debug(f"Valor expirado en caché: {key}")
             return None
+        if now > entry.expires_at and not allow_stale:
+            stripe.misses += 1
+            return None
 
-        _cache_hit_count += 1
-        logging.debug(f"Valor recuperado de caché: {key}")
-        return cache_item["value"]
+        stripe.entries.move_to_end(key)
+        stripe.hits += 1
+    return entry
 
 
 def delete_cache(key):
     """Elimina un valor de la caché"""
-    global _memory_cache
+    global _invalidation_count
 
-    with _cache_lock:
-        if key in _memory_cache:
-            del _memory_cache[key]
-            logging.debug(f"Valor eliminado de caché: {key}")
-            return True
+    key = str(key)
+    stripe = _get_namespace(_namespace_of(key)).stripe(key)
 
-    return False
+    with _tag_lock:
+        _invalidation_count += 1
+    with stripe.lock:
+        entry = stripe.entries.pop(key, None)
+        if entry is None:
+            return False
+        _unlink_tags(key, entry.tags)
 
+    logging.debug(f"Valor eliminado de caché: {key}")
+    return True
 
-def clear_cache():
-    """Limpia toda la caché"""
-    global _memory_cache
 
-    with _cache_lock:
-        _memory_cache.clear()
+def invalidate_tags(*tags):
+    """
+    Elimina todas las entradas que llevan alguna de las etiquetas.
 
-    logging.info("Caché limpiada completamente")
+    Returns:
+        int: Entradas eliminadas
+    """
+    global _invalidation_count
+
+    with _tag_lock:
+        keys = set()
+        for tag in tags:
+            keys |= _tag_index.pop(str(tag), set())
+        _invalidation_count += 1
+
+    removed = 0
+    for key in keys:
+        stripe = _get_namespace(_namespace_of(key)).stripe(key)
+        with stripe.lock:
+            entry = stripe.entries.pop(key, None)
+            if entry is not None:
+                _unlink_tags(key, entry.tags)
+                removed += 1
+
+    if removed:
+        logging.debug(f"Entradas invalidadas por etiquetas {tags}: {removed}")
+    return removed
+
+
+def _clear_namespace(namespace):
+    for stripe in namespace.stripes:
+        with stripe.lock:
+            for key, entry in stripe.entries.items():
+                _unlink_tags(key, entry.tags)
+            stripe.entries.clear()
+
+
+def clear_cache(namespace=None):
+    """Limpia toda la caché, o solo un espacio de nombres"""
+    global _invalidation_count
+
+    with _tag_lock:
+        _invalidation_count += 1
+    with _namespaces_lock:
+        namespaces = [
+            ns for name, ns in _namespaces.items() if namespace in (None, name)
+        ]
+    for ns in namespaces:
+        _clear_namespace(ns)
+
+    logging.info(
+        "Caché limpiada completamente"
+        if namespace is None
+        else f"Caché limpiada: espacio '{namespace}'"
+    )
     return True
 
 
+def _iter_entries():
+    """(clave, entrada) de todas las particiones, copiadas con su lock"""
+    with _namespaces_lock:
+        namespaces = list(_namespaces.values())
+    for namespace in namespaces:
+        for stripe in namespace.stripes:
+            with stripe.lock:
+                items = list(stripe.entries.items())
+            yield from items
+
+
 def _save_cache_to_disk():
     """Guarda una copia de la caché en disco para persistencia básica"""
-    global _cache_file
-
     # Si _cache_file es None, no intentamos guardar en disco
     if _cache_file is None:
         logging.debug("Guardado en disco desactivado (_cache_file es None)")
@@ -166,19 +428,19 @@ def _save_cache_to_disk():
 
         # Filtrar solo los valores que no han expirado y son serializables
         current_time = time.time()
-        with _cache_lock:
-            for key, item in _memory_cache.items():
-                if (
-                    isinstance(item["expires_at"], (int, float))
-                    and item["expires_at"] > current_time
-                ):
-                    try:
-                        # Verificar si el valor es serializable
-                        json.dumps(item["value"])
-                        serializable_cache[key] = item
-                    except (TypeError, OverflowError):
-                        # Si no es serializable, lo omitimos
-                        pass
+        for key, entry in _iter_entries():
+            if entry.expires_at > current_time:
+                try:
+                    # Verificar si el valor es serializable
+                    json.dumps(entry.value)
+                    serializable_cache[key] = {
+                        "value": entry.value,
+                        "expires_at": entry.expires_at,
+                        "tags": sorted(entry.tags or ()),
+                    }
+                except (TypeError, OverflowError):
+                    # Si no es serializable, lo omitimos
+                    pass
 
         # Guardar en disco solo si _cache_file tiene un valor
         with open(_cache_file, "w") as f:
@@ -191,8 +453,6 @@ def _save_cache_to_disk():
 
 def _load_cache_from_disk():
     """Carga la caché desde disco si existe"""
-    global _memory_cache, _cache_file
-
     # Si _cache_file es None, no intentamos cargar desde disco
     if _cache_file is None:
         logging.debug("Carga desde disco desactivada (_cache_file es None)")
@@ -205,49 +465,229 @@ def _load_cache_from_disk():
 
             # Filtrar elementos expirados
             current_time = time.time()
-            valid_items = {
-                k: v for k, v in disk_cache.items() if v["expires_at"] > current_time
-            }
+            loaded = 0
+            for key, item in disk_cache.items():
+                remaining = item["expires_at"] - current_time
+                if remaining > 0:
+                    set_cache(key, item["value"], remaining, item.get("tags"))
+                    loaded += 1
+
+            logging.info(f"Caché cargada desde disco: {loaded} elementos válidos")
+    except Exception as e:
+        logging.error(f"Error al cargar caché desde disco: {str(e)}")
+
+
+# ============================================================================
+# DECORADOR: UN SOLO CÁLCULO POR CLAVE Y RECÁLCULO EN SEGUNDO PLANO
+# ============================================================================
+
+
+class _Flight:
+    """Cálculo en curso de una clave, al que esperan las demás peticiones"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights: dict[str, _Flight] = {}
+_flight_lock = threading.Lock()
+_flight_stats = {
+    "coalesced_waits": 0,
+    "stale_served": 0,
+    "refreshes": 0,
+    "early_refreshes": 0,
+    "refresh_errors": 0,
+}
+_refresh_executor = None
+_refresh_executor_pid = None
+
+
+def _count(stat):
+    with _flight_lock:
+        _flight_stats[stat] += 1
 
-            with _cache_lock:
-                _memory_cache.update(valid_items)
 
-            logging.info(
-                f"Caché cargada desde disco: {len(valid_items)} elementos válidos"
+def _begin_flight(key):
+    """Devuelve (cálculo en curso de la clave, True si lo hace este hilo)"""
+    with _flight_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[key] = _Flight()
+        return flight, True
+
+
+def _end_flight(key, flight):
+    with _flight_lock:
+        if _flights.get(key) is flight:
+            del _flights[key]
+    flight.done.set()
+
+
+def _get_refresh_executor():
+    """Pool de hilos de los recálculos en segundo plano (uno por proceso)"""
+    global _refresh_executor, _refresh_executor_pid
+    with _flight_lock:
+        if _refresh_executor is None or _refresh_executor_pid != os.getpid():
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh"
             )
-    except Exception as e:
-        logging.error(f"Error al cargar caché desde disco: {str(e)}")
+            _refresh_executor_pid = os.getpid()
+        return _refresh_executor
+
+
+def _refresh_in_background(key, compute):
+    """Recalcula una entrada en el pool si nadie la está recalculando ya"""
+    flight, leader = _begin_flight(key)
+    if not leader:
+        return
+    # Las funciones cacheadas pueden necesitar el contexto de la aplicación
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run():
+        try:
+            if app is not None:
+                with app.app_context():
+                    flight.result = compute()
+            else:
+                flight.result = compute()
+            _count("refreshes")
+        except Exception as e:
+            flight.error = e
+            _count("refresh_errors")
+            logging.warning(f"Error recalculando la entrada de caché {key}: {e}")
+        finally:
+            _end_flight(key, flight)
+
+    try:
+        _get_refresh_executor().submit(run)
+    except RuntimeError:
+        # Pool cerrado (fin del proceso)
+        _end_flight(key, flight)
+
+
+def _expires_early(entry, now):
+    """
+    Expiración anticipada probabilística (XFetch): cuanto más cerca está la
+    caducidad y más caro es el cálculo, más probable es recalcular ya, así
+    que una entrada muy usada se renueva antes de caducar para todos a la vez.
+    """
+    if entry.compute_time <= 0:
+        return False
+    jitter = -math.log(1.0 - random.random())
+    return (
+        now + entry.compute_time * CACHE_EARLY_EXPIRY_BETA * jitter >= entry.expires_at
+    )
 
 
-# Decorador para cachear funciones
-def cached(ttl=3600, key_prefix=""):
+def cached(ttl=3600, key_prefix="", tags=None, stale_ttl=0, early_expiry=True):
     """
     Decorador para cachear el resultado de una función.
 
+    La clave se forma con make_cache_key (espacio de nombres key_prefix).
+    Los resultados None no se guardan. Además:
+
+    - Un solo cálculo por clave: si varias peticiones fallan a la vez, una
+      ejecuta la función y las demás esperan su resultado (hasta
+      CACHE_SINGLE_FLIGHT_TIMEOUT segundos; después la ejecutan ellas).
+    - Con ``stale_ttl``, durante esos segundos tras caducar se devuelve el
+      valor anterior y se recalcula en segundo plano (CACHE_REFRESH_WORKERS
+      hilos).
+    - Con ``early_expiry`` las entradas se recalculan poco antes de caducar
+      con una probabilidad creciente (ver _expires_early): en segundo plano
+      si hay ``stale_ttl`` y, si no, en la petición que lo decide mientras
+      las demás siguen usando el valor en caché.
+
     Args:
         ttl: Tiempo de vida en segundos (por defecto 1 hora)
-        key_prefix: Prefijo para la clave de caché
+        key_prefix: Prefijo para la clave de caché (espacio de nombres)
+        tags: Función (resultado, *args, **kwargs) -> etiquetas de la entrada
+        stale_ttl: Segundos que se sirve el valor caducado mientras se recalcula
+        early_expiry: Recalcular de forma anticipada y probabilística
     """
+    namespace = key_prefix or DEFAULT_NAMESPACE
 
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generar una clave única basada en la función y sus argumentos
-            cache_key = f"{key_prefix}:{func.__name__}:{str(args)}:{str(kwargs)}"
-
-            # Intentar obtener el resultado de la caché
-            cached_result = get_cache(cache_key)
-            if cached_result is not None:
-                return cached_result
+        name = f"{func.__module__}.{func.__qualname__}"
 
-            # Si no está en caché, ejecutar la función
+        def compute(cache_key, args, kwargs):
+            # Si mientras se ejecuta la función se invalida algo, el resultado
+            # puede ser anterior a la escritura y no se guarda (ver _store)
+            invalidations = _invalidation_count
+            started_at = time.perf_counter()
             result = func(*args, **kwargs)
-
-            # Almacenar el resultado en la caché
-            set_cache(cache_key, result, ttl)
-
+            if result is not None:
+                entry_tags = tags(result, *args, **kwargs) if tags else None
+                _store(
+                    cache_key,
+                    result,
+                    ttl,
+                    entry_tags,
+                    invalidations,
+                    stale_ttl,
+                    time.perf_counter() - started_at,
+                )
             return result
 
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = make_cache_key(namespace, name, *args, **kwargs)
+
+            # Intentar obtener el resultado de la caché
+            entry = _lookup(cache_key, allow_stale=stale_ttl > 0)
+            if entry is not None:
+                now = time.time()
+                if now > entry.expires_at:
+                    _count("stale_served")
+                    _refresh_in_background(
+                        cache_key, lambda: compute(cache_key, args, kwargs)
+                    )
+                elif early_expiry and _expires_early(entry, now):
+                    if stale_ttl > 0:
+                        _count("early_refreshes")
+                        _refresh_in_background(
+                            cache_key, lambda: compute(cache_key, args, kwargs)
+                        )
+                    else:
+                        flight, leader = _begin_flight(cache_key)
+                        if leader:
+                            _count("early_refreshes")
+                            try:
+                                flight.result = compute(cache_key, args, kwargs)
+                                return flight.result
+                            except Exception as e:
+                                flight.error = e
+                                raise
+                            finally:
+                                _end_flight(cache_key, flight)
+                return entry.value
+
+            # Si no está en caché, un solo hilo ejecuta la función
+            flight, leader = _begin_flight(cache_key)
+            if not leader:
+                _count("coalesced_waits")
+                if (
+                    flight.done.wait(CACHE_SINGLE_FLIGHT_TIMEOUT)
+                    and flight.error is None
+                ):
+                    return flight.result
+                return compute(cache_key, args, kwargs)
+            try:
+                flight.result = compute(cache_key, args, kwargs)
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                _end_flight(cache_key, flight)
+
+        wrapper.cache_key = lambda *args, **kwargs: make_cache_key(
+            namespace, name, *args, **kwargs
+        )
         return wrapper
 
     return decorator
@@ -255,22 +695,49 @@ def cached(ttl=3600, key_prefix=""):
 
 def get_cache_stats():
     """
-    Devuelve estadísticas de la caché: hits, misses, hit_rate, tamaño actual.
+    Devuelve estadísticas de la caché: hits, misses, hit_rate, tamaño actual,
+    esperas a un cálculo en curso, recálculos en segundo plano y el detalle
+    por espacio de nombres.
     """
-    global _memory_cache, _cache_hit_count, _cache_miss_count
-    size = len(_memory_cache)
-    hits = _cache_hit_count
-    misses = _cache_miss_count
+    with _namespaces_lock:
+        namespaces = {name: ns.stats() for name, ns in _namespaces.items()}
+    with _flight_lock:
+        flight_stats = dict(_flight_stats)
+    hits = sum(ns["hits"] for ns in namespaces.values())
+    misses = sum(ns["misses"] for ns in namespaces.values())
     total = hits + misses
     hit_rate = (hits / total) * 100 if total > 0 else 0.0
     return {
         "hit_count": hits,
         "miss_count": misses,
         "hit_rate": round(hit_rate, 2),
-        "size": size,
+        "size": sum(ns["size"] for ns in namespaces.values()),
+        "evictions": sum(ns["evictions"] for ns in namespaces.values()),
+        "expirations": sum(ns["expirations"] for ns in namespaces.values()),
+        "tags": len(_tag_index),
+        **flight_stats,
+        "namespaces": namespaces,
     }
 
 
+def _collect_cache_metrics():
+    """Muestras de /metrics: aciertos, fallos y entradas de la caché"""
+    stats = get_cache_stats()
+    return [
+        counter_sample("edf_cache_hits_total", stats["hit_count"], cache="memory"),
+        counter_sample("edf_cache_misses_total", stats["miss_count"], cache="memory"),
+        counter_sample("edf_cache_evictions_total", stats["evictions"], cache="memory"),
+        gauge_sample("edf_cache_entries", stats["size"], cache="memory"),
+        counter_sample(
+            "edf_cache_coalesced_waits_total", stats["coalesced_waits"], cache="memory"
+        ),
+        counter_sample("edf_cache_refreshes_total", stats["refreshes"], cache="memory"),
+    ]
+
+
+register_collector(_collect_cache_metrics)
+
+
 # Cargar la caché desde disco al iniciar
 _load_cache_from_disk()
 
@@ -279,6 +746,7 @@ _load_cache_from_disk()
 _save_thread = None
 _save_thread_enabled = False
 
+
 def _periodic_cache_save():
     """Función que ejecuta el guardado periódico de caché"""
     global _save_thread_enabled
@@ -303,6 +771,7 @@ def start_cache_persistence():
         _save_thread.start()
         logging.info("Hilo de persistencia de caché iniciado")
 
+
 def stop_cache_persistence():
     """Detiene el hilo de persistencia de caché"""
     global _save_thread_enabled
@@ -24,7 +24,7 @@ from pymongo.errors import (
 )
 
 # Importar sistemas de caché y fallback
-from app.cache_system import cached, get_cache, set_cache
+from app.cache_system import cached, configure_namespace, invalidate_tags
 from app.data_fallback import (
     get_fallback_catalogs_by_user,
     get_fallback_user_by_email,
@@ -32,6 +32,7 @@ from app.data_fallback import (
     sync_catalogs_to_fallback,
     sync_users_to_fallback,
 )
+from app.utils.metrics import register_mongo_listeners
 from config import (
     COLLECTION_AUDIT_LOGS,
     COLLECTION_CATALOGOS,
@@ -118,6 +119,9 @@ def initialize_db(app=None):
             config["tls"] = True
             config["tlsCAFile"] = certifi.where()
 
+        # Medir comandos y pool de conexiones para /metrics
+        register_mongo_listeners()
+
         # Intentar establecer la conexión
         _mongo_client = MongoClient(mongo_uri, **config)
 
@@ -195,14 +199,48 @@ def get_collection(collection_name, fallback_data=None):
 # Funciones de utilidad para operaciones comunes
 
 
-@cached(ttl=3600, key_prefix="user")  # Aumentar TTL a 1 hora para reducir consultas
+# Usuarios y catálogos de un usuario en caché: se invalidan por etiquetas
+# cuando se modifican (invalidate_user_cache / invalidate_catalog_cache)
+configure_namespace("user", max_entries=1000, ttl=3600)
+configure_namespace("spreadsheets", max_entries=500, ttl=1800)
+
+
+def _user_tags(user, *keys):
+    """Etiquetas de un usuario en caché: su ID, su email y la clave consultada"""
+    values = {user.get("_id"), user.get("email"), *keys}
+    return {f"user:{value}" for value in values if value}
+
+
+def _catalog_tags(catalogs, user_id):
+    """Etiquetas de los catálogos de un usuario en caché"""
+    tags = {f"catalogs:user:{user_id}"}
+    tags.update(f"catalog:{catalog.get('_id')}" for catalog in catalogs)
+    return tags
+
+
+def invalidate_user_cache(*user_keys):
+    """
+    Olvida los usuarios en caché tras crearlos, modificarlos o eliminarlos.
+
+    Args:
+        *user_keys: IDs o emails de los usuarios
+    """
+    invalidate_tags(*(f"user:{key}" for key in user_keys if key))
+
+
+def invalidate_catalog_cache(catalog_id=None, user_id=None):
+    """Olvida en caché un catálogo y/o la lista de catálogos de un usuario"""
+    tags = []
+    if catalog_id:
+        tags.append(f"catalog:{catalog_id}")
+    if user_id:
+        tags.append(f"catalogs:user:{user_id}")
+    invalidate_tags(*tags)
+
+
+@cached(ttl=3600, key_prefix="user", tags=_user_tags)
 def get_user_by_email(email):
     """Obtiene un usuario por su email con caché y fallback"""
-    # Verificar primero en la caché
-    cached_user = get_cache(f"user:{email}")
-    if cached_user:
-        return cached_user
-
     # Primero intentamos obtener de MongoDB
     users = get_collection(COLLECTION_USERS)
     if users is not None:
@@ -219,27 +257,17 @@ def get_user_by_email(email):
             }
             user = users.find_one({"email": email}, projection=projection)
             if user:
-                # Guardar en caché para futuras consultas
-                set_cache(f"user:{email}", user, ttl=3600)
                 return user
         except Exception as e:
             logging.error(f"Error al buscar usuario por email: {str(e)}")
 
     # Si no se encuentra o hay error, usamos el fallback
-    fallback_user = get_fallback_user_by_email(email)
-    if fallback_user:
-        set_cache(f"user:{email}", fallback_user, ttl=3600)
-    return fallback_user
+    return get_fallback_user_by_email(email)
 
 
-@cached(ttl=3600, key_prefix="user")  # Aumentar TTL a 1 hora para reducir consultas
+@cached(ttl=3600, key_prefix="user", tags=_user_tags)
 def get_user_by_id(user_id):
     """Obtiene un usuario por su ID con caché y fallback"""
-    # Verificar primero en la caché
-    cached_user = get_cache(f"user_id:{user_id}")
-    if cached_user:
-        return cached_user
-
     # Primero intentamos obtener de MongoDB
     users = get_collection(COLLECTION_USERS)
     if users is not None:
@@ -258,30 +286,17 @@ def get_user_by_id(user_id):
             }
             user = users.find_one({"_id": ObjectId(user_id)}, projection=projection)
             if user:
-                # Guardar en caché para futuras consultas
-                set_cache(f"user_id:{user_id}", user, ttl=3600)
                 return user
         except Exception as e:
             logging.error(f"Error al buscar usuario por ID: {str(e)}")
 
     # Si no se encuentra o hay error, usamos el fallback
-    fallback_user = get_fallback_user_by_id(user_id)
-    if fallback_user:
-        set_cache(f"user_id:{user_id}", fallback_user, ttl=3600)
-    return fallback_user
+    return get_fallback_user_by_id(user_id)
 
 
-@cached(
-    ttl=1800, key_prefix="spreadsheets"
-)  # Aumentar TTL a 30 minutos para reducir consultas
+@cached(ttl=1800, key_prefix="spreadsheets", tags=_catalog_tags, stale_ttl=300)
 def get_catalogs_by_user(user_id):
     """Obtiene los catálogos de un usuario con caché y fallback"""
-    # Verificar primero en la caché
-    cache_key = f"spreadsheets:{user_id}"
-    cached_catalogs = get_cache(cache_key)
-    if cached_catalogs:
-        return cached_catalogs
-
     # Primero intentamos obtener de MongoDB
     catalogs = get_collection("spreadsheets")
     if catalogs is not None:
@@ -306,18 +321,13 @@ def get_catalogs_by_user(user_id):
             )
 
             if user_catalogs:
-                # Guardar en caché para futuras consultas
-                set_cache(cache_key, user_catalogs, ttl=1800)
                 return user_catalogs
         except Exception as e:
             logging.error(f"Error al buscar catálogos del usuario: {str(e)}")
 
     # Si no se encuentra o hay error, usamos el fallback
     logging.info(f"Usando fallback para buscar catálogos del usuario: {user_id}")
-    fallback_catalogs = get_fallback_catalogs_by_user(user_id)
-    if fallback_catalogs:
-        set_cache(cache_key, fallback_catalogs, ttl=1800)
-    return fallback_catalogs
+    return get_fallback_catalogs_by_user(user_id)
 
 
 # Funciones adicionales para acceder a las colecciones
@@ -24,6 +24,21 @@ class ResourceNotFoundError(Exception):
     pass
 
 
+class CatalogVersionConflictError(Exception):
+    """Se lanza cuando un catálogo fue modificado por otra petición desde que se leyó."""
+    pass
+
+
+class CatalogImportError(Exception):
+    """Se lanza cuando un archivo importado no puede convertirse en catálogo."""
+    pass
+
+
+class JobCancelledError(Exception):
+    """Se lanza dentro de un trabajo en segundo plano cuando se ha pedido su cancelación."""
+    pass
+
+
 class InvalidConfigurationError(Exception):
     """Se lanza cuando hay problemas de configuración de la aplicación."""
     pass
@@ -12,6 +12,8 @@ from flask_pymongo import PyMongo
 
 from flask_session import Session
 
+from app.utils.metrics import instrument_s3_client, register_mongo_listeners
+
 mail = Mail()
 mongo = PyMongo()
 login_manager = LoginManager()
@@ -93,6 +95,8 @@ def init_extensions(app):
     # Hacer que la conexión a MongoDB sea opcional
     if app.config.get("MONGO_URI"):
         try:
+            # Medir comandos y pool de conexiones para /metrics
+            register_mongo_listeners()
             # Forzar el uso de certifi para los certificados
             mongo.init_app(app, tlsCAFile=certifi.where())
             catalog_collection = mongo.db.get_collection(
@@ -111,11 +115,13 @@ def init_extensions(app):
     logger.info("Flask-Mail inicializado")
 
     if app.config.get("USE_S3"):
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=app.config["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=app.config["AWS_SECRET_ACCESS_KEY"],
-            region_name=app.config["AWS_REGION"],
+        s3_client = instrument_s3_client(
+            boto3.client(
+                "s3",
+                aws_access_key_id=app.config["AWS_ACCESS_KEY_ID"],
+                aws_secret_access_key=app.config["AWS_SECRET_ACCESS_KEY"],
+                region_name=app.config["AWS_REGION"],
+            )
         )
 
     # La asignación de catalog_collection se hace en el bloque try arriba
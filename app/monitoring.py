@@ -19,10 +19,17 @@ import time
 from datetime import datetime  # type: ignore
 
 import psutil  # type: ignore
-from flask import current_app  # noqa: F401
+from flask import current_app, g, request  # noqa: F401
 
 # Importar módulo de notificaciones
 from app import notifications
+from app.utils.metrics import (
+    LatencyHistogram,
+    counter_sample,
+    ensure_metrics_flusher,
+    histogram_sample,
+    register_collector,
+)
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -54,6 +61,14 @@ _monitoring_state = {
     "cache_update_count": 0,
 }
 
+# Endpoint con el que se registran las peticiones que no casan con ninguna ruta
+UNMATCHED_ENDPOINT = "<sin_endpoint>"
+
+# Histogramas de latencia por endpoint (y el global), protegidos por el lock
+_request_histograms = {}
+_request_histogram_total = LatencyHistogram()
+_request_lock = threading.Lock()
+
 # Contador para controlar la frecuencia de guardado
 _save_counter = 0
 
@@ -281,24 +296,149 @@ def update_cache_metrics(hit=False, miss=False, size=None):
         )
 
 
-def record_request(response_time_ms, is_error=False):
-    """Registra estadísticas de una solicitud"""
-    _app_metrics["request_stats"]["total_requests"] += 1
+def record_request(response_time_ms, is_error=False, endpoint=None, status_code=None):
+    """
+    Registra estadísticas de una solicitud
 
-    if is_error:
-        _app_metrics["request_stats"]["error_count"] += 1
+    Args:
+        response_time_ms (float): Duración de la petición en milisegundos
+        is_error (bool): Si terminó con error (5xx o excepción)
+        endpoint (str): Endpoint de Flask ('blueprint.funcion')
+        status_code (int): Código de estado HTTP de la respuesta
+    """
+    with _request_lock:
+        _app_metrics["request_stats"]["total_requests"] += 1
 
-    # Actualizar tiempo de respuesta promedio
-    current_avg = _app_metrics["request_stats"]["avg_response_time_ms"]
-    total_reqs = _app_metrics["request_stats"]["total_requests"]
+        if is_error:
+            _app_metrics["request_stats"]["error_count"] += 1
 
-    if total_reqs > 1:
-        new_avg = ((current_avg * (total_reqs - 1)) + response_time_ms) / total_reqs
-        _app_metrics["request_stats"]["avg_response_time_ms"] = round(new_avg, 2)
-    else:
-        _app_metrics["request_stats"]["avg_response_time_ms"] = round(
-            response_time_ms, 2
-        )
+        # Actualizar tiempo de respuesta promedio
+        current_avg = _app_metrics["request_stats"]["avg_response_time_ms"]
+        total_reqs = _app_metrics["request_stats"]["total_requests"]
+
+        if total_reqs > 1:
+            new_avg = ((current_avg * (total_reqs - 1)) + response_time_ms) / total_reqs
+            _app_metrics["request_stats"]["avg_response_time_ms"] = round(new_avg, 2)
+        else:
+            _app_metrics["request_stats"]["avg_response_time_ms"] = round(
+                response_time_ms, 2
+            )
+
+        endpoint = endpoint or UNMATCHED_ENDPOINT
+        histogram = _request_histograms.get(endpoint)
+        if histogram is None:
+            histogram = _request_histograms[endpoint] = LatencyHistogram()
+        histogram.record(response_time_ms, status_code, is_error)
+        _request_histogram_total.record(response_time_ms, status_code, is_error)
+
+
+def get_request_latency_stats(limit=None):
+    """
+    Percentiles de latencia, recuentos y tasa de errores por endpoint y por
+    blueprint, ordenados de más lento a más rápido según p95.
+
+    Args:
+        limit (int): Máximo de endpoints devueltos (None = todos)
+
+    Returns:
+        dict: 'overall', 'endpoints' y 'blueprints'
+    """
+    with _request_lock:
+        overall = _request_histogram_total.snapshot()
+        blueprints = {}
+        endpoints = []
+        for endpoint, histogram in _request_histograms.items():
+            blueprint = endpoint.split(".", 1)[0] if "." in endpoint else "app"
+            endpoints.append(
+                {"endpoint": endpoint, "blueprint": blueprint, **histogram.snapshot()}
+            )
+            blueprints.setdefault(blueprint, LatencyHistogram()).merge(histogram)
+
+    endpoints.sort(key=lambda item: item["p95_ms"], reverse=True)
+    return {
+        "overall": overall,
+        "endpoints": endpoints[:limit] if limit else endpoints,
+        "blueprints": sorted(
+            (
+                {"blueprint": name, **histogram.snapshot()}
+                for name, histogram in blueprints.items()
+            ),
+            key=lambda item: item["p95_ms"],
+            reverse=True,
+        ),
+    }
+
+
+def _collect_request_metrics():
+    """Muestras de /metrics: histograma y errores de cada endpoint"""
+    samples = []
+    with _request_lock:
+        for endpoint, histogram in _request_histograms.items():
+            samples.append(
+                histogram_sample(
+                    "edf_http_request_duration_seconds", histogram, endpoint=endpoint
+                )
+            )
+            samples.append(
+                counter_sample(
+                    "edf_http_request_errors_total",
+                    histogram.errors,
+                    endpoint=endpoint,
+                    type="server",
+                )
+            )
+            samples.append(
+                counter_sample(
+                    "edf_http_request_errors_total",
+                    histogram.client_errors,
+                    endpoint=endpoint,
+                    type="client",
+                )
+            )
+    return samples
+
+
+register_collector(_collect_request_metrics)
+
+
+def init_request_timing(app):
+    """
+    Registra los hooks que miden la duración de cada petición y la anotan
+    con record_request en el histograma de su endpoint. También arranca en
+    cada worker el volcado de sus métricas para /metrics.
+    """
+
+    def start_request_timer():
+        g._request_started_at = time.perf_counter()
+        ensure_metrics_flusher()
+
+    # Primero de los before_request: si otro corta la petición (p. ej. una
+    # redirección al login) la petición también se mide
+    app.before_request_funcs.setdefault(None, []).insert(0, start_request_timer)
+
+    @app.after_request
+    def record_request_time(response):
+        started_at = g.pop("_request_started_at", None)
+        if started_at is not None:
+            record_request(
+                (time.perf_counter() - started_at) * 1000,
+                is_error=response.status_code >= 500,
+                endpoint=request.endpoint,
+                status_code=response.status_code,
+            )
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        # Solo llega aquí con la marca de inicio si after_request no se ejecutó
+        started_at = g.pop("_request_started_at", None)
+        if started_at is not None:
+            record_request(
+                (time.perf_counter() - started_at) * 1000,
+                is_error=True,
+                endpoint=request.endpoint,
+                status_code=500,
+            )
 
 
 def get_health_status():
@@ -30,6 +30,7 @@ from flask import (
 from app.audit import audit_log
 from app.database import get_mongo_client, get_mongo_db
 from app.decorators import admin_required
+from app.utils.db_indexes import get_index_drift, has_index_drift
 
 admin_database_bp = Blueprint("admin_database", __name__, url_prefix="/admin/db")
 logger = logging.getLogger(__name__)
@@ -49,6 +50,8 @@ def db_status():
         "collections": [],
         "server_info": None,
         "server_status": {},
+        "index_drift": {},
+        "index_drift_detected": False,
     }
 
     try:
@@ -73,6 +76,15 @@ def db_status():
                 status["collections"] = []
                 status["error"] = f"Error al obtener colecciones: {str(e)}"
 
+            # Diferencias entre los índices declarados y los existentes
+            try:
+                status["index_drift"] = get_index_drift(db)
+                status["index_drift_detected"] = has_index_drift(
+                    status["index_drift"]
+                )
+            except Exception as e:
+                logger.error("Error al comprobar índices: %s", str(e))
+
         # Obtener información del servidor
         server_info = client.server_info()
         status["server_info"] = server_info
@@ -18,6 +18,7 @@ from werkzeug.security import generate_password_hash
 from app.audit import audit_log
 from app.database import get_users_collection
 from app.routes.maintenance_routes import admin_required
+from app.utils.catalog_utils import count_catalogs_by_owner
 
 admin_users_bp = Blueprint("admin_users", __name__, url_prefix="/admin/users")
 logger = logging.getLogger(__name__)
@@ -59,54 +60,17 @@ def lista_usuarios():
         # Obtener catálogos para calcular cuántos tiene cada usuario
         from app.extensions import mongo
 
-        collections_to_check = ["catalogs", "spreadsheets"]
+        # Un $group por colección en lugar de un count_documents por usuario
+        catalog_counts = {}
+        if mongo and mongo.db is not None and usuarios:
+            try:
+                catalog_counts = count_catalogs_by_owner(
+                    mongo.db, [user["_id"] for user in usuarios], users=usuarios
+                )
+            except Exception as e:
+                logger.error("Error al contar catálogos de usuarios: %s", str(e))
         for user in usuarios:
-            posibles = set(
-                [
-                    user.get("email"),
-                    user.get("username"),
-                    user.get("name"),
-                    user.get("nombre"),
-                ]
-            )
-            posibles = {v for v in posibles if v}
-            total_count = 0
-            for collection_name in collections_to_check:
-                try:
-                    if mongo and mongo.db is not None:
-                        collection = mongo.db[collection_name]
-                    else:
-                        continue
-                    query = {"$or": []}
-                    for val in posibles:
-                        query["$or"].extend(
-                            [
-                                {"created_by": val},
-                                {"owner": val},
-                                {"owner_name": val},
-                                {"email": val},
-                                {"username": val},
-                                {"name": val},
-                            ]
-                        )
-                    count = collection.count_documents(query)
-                    total_count += count
-                    logger.info(
-                        "[ADMIN] Usuario %s tiene %s catálogos en %s",
-                        user.get("email"),
-                        count,
-                        collection_name,
-                    )
-                except (AttributeError, KeyError, TypeError) as e:
-                    logger.error(
-                        "Error al contar catálogos en %s: %s", collection_name, str(e)
-                    )
-            user["num_catalogs"] = total_count
-            logger.info(
-                "[ADMIN] Usuario %s tiene un total de %s catálogos",
-                user.get("email"),
-                total_count,
-            )
+            user["num_catalogs"] = catalog_counts.get(user["_id"], 0)
 
         # Calcular estadísticas
         stats = {
@@ -6,8 +6,6 @@
 # Autor: EDF Developer - 2025-05-28
 
 from app.routes.admin.admin_system import admin_system_bp
-import csv
-import io
 import json
 import logging
 import os
@@ -20,13 +18,13 @@ import traceback
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
-import boto3
 import psutil
 import requests  # pyright: ignore[reportDuplicateImport]
 from botocore.exceptions import ClientError
 from bson import ObjectId
 from flask import (
     Blueprint,
+    Response,
     current_app,
     flash,
     jsonify,
@@ -35,9 +33,11 @@ from flask import (
     request,
     send_file,
     session,
+    stream_with_context,
     url_for,
 )
 from flask_login import current_user  # type: ignore
+from pymongo import ASCENDING, DESCENDING
 from werkzeug.security import generate_password_hash
 
 import app.monitoring as monitoring
@@ -51,13 +51,46 @@ from app.database import (
     get_mongo_db,
     get_reset_tokens_collection,
     get_users_collection,
+    invalidate_user_cache,
 )
 from app.decorators import admin_required
 from app.decorators import admin_required as admin_required_logs
 from app.decorators import login_required
+from app.exceptions import CatalogVersionConflictError
 from app.routes.s3_utils import get_s3_url
+from app.utils.catalog_export import (
+    EXPORT_FORMATS,
+    catalog_document_fields,
+    iter_catalog_documents,
+    iter_export,
+)
+from app.utils.catalog_search import SEARCH_KEYS_FIELD, name_search_keys
+from app.utils.catalog_utils import (
+    CATALOG_METADATA_PROJECTION,
+    build_pagination,
+    count_catalogs_by_owner,
+    delete_catalog_rows,
+    get_catalog_row,
+    get_embedded_rows,
+    get_stored_row_count,
+    load_catalog_rows,
+    owner_query,
+    parse_expected_version,
+    parse_pagination_args,
+    update_catalog_row,
+)
+from app.utils.db_indexes import get_index_drift, has_index_drift
+from app.utils.job_queue import submit_job
+from app.utils.log_reader import (
+    LOG_SEARCH_LIMIT,
+    count_lines,
+    date_range_offsets,
+    resolve_log_path,
+    search_logs,
+    tail_lines,
+)
 from app.routes.temp_files_utils import delete_temp_files, list_temp_files
-from tools.db_utils.google_drive_utils import list_files_in_folder, upload_to_drive
+from tools.db_utils.google_drive_utils import list_files_in_folder
 
 
 def serve_s3_file(filename: str):
@@ -71,34 +104,10 @@ def serve_s3_file(filename: str):
         Flask response: Archivo descargado desde S3
     """
     try:
-        # Configurar cliente S3
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=current_app.config.get("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=current_app.config.get("AWS_SECRET_ACCESS_KEY"),
-            region_name=current_app.config.get("AWS_DEFAULT_REGION", "eu-central-1"),
-        )
-
-        # Descargar archivo desde S3
-        response = s3_client.get_object(
-            Bucket=current_app.config.get("S3_BUCKET_NAME"), Key=filename
-        )
-
-        # Obtener contenido y metadata
-        file_content = response["Body"].read()
-        content_type = response.get("ContentType", "application/octet-stream")
+        from app.utils.s3_proxy import serve_s3_object
 
-        # Crear respuesta Flask
-        from flask import Response
-
-        return Response(
-            file_content,
-            mimetype=content_type,
-            headers={
-                "Content-Disposition": f'inline; filename="{filename}"',
-                "Access-Control-Allow-Origin": "*",
-                "Cache-Control": "no-cache",
-            },
+        return serve_s3_object(
+            filename, extra_headers={"Access-Control-Allow-Origin": "*"}
         )
 
     except ClientError as e:
@@ -175,62 +184,24 @@ def serve_s3_proxy(filename):
     current_app.logger.info(f"[S3-PROXY] 🔍 Solicitud para archivo: {filename}")
 
     try:
-        # Configuración S3 simplificada
-        import boto3
         from botocore.exceptions import ClientError
 
-        # Log de configuración S3
-        aws_key = current_app.config.get("AWS_ACCESS_KEY_ID")
-        aws_secret = current_app.config.get("AWS_SECRET_ACCESS_KEY")
-        aws_region = current_app.config.get("AWS_REGION", "eu-central-1")
-        aws_bucket = current_app.config.get("S3_BUCKET_NAME")
-
-        current_app.logger.info(
-            f"[S3-PROXY] 🔧 Config S3 - Key: {'✅' if aws_key else '❌'}, Secret: {'✅' if aws_secret else '❌'}, Region: {aws_region}, Bucket: {aws_bucket}"
-        )
-
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=aws_key,
-            aws_secret_access_key=aws_secret,
-            region_name=aws_region,
-        )
+        from app.utils.s3_proxy import serve_s3_object
 
-        # Descargar archivo desde S3
-        current_app.logger.info(
-            f"[S3-PROXY] 📥 Descargando archivo desde S3: Bucket={aws_bucket}, Key={filename}"
+        # Transmitir el archivo desde S3 por bloques (Range y ETag incluidos)
+        response = serve_s3_object(
+            filename,
+            content_types={
+                ".pdf": "application/pdf",
+                ".txt": "text/plain",
+                ".md": "text/markdown",
+            },
+            extra_headers={"Access-Control-Allow-Origin": "*"},
         )
-
-        response = s3_client.get_object(Bucket=aws_bucket, Key=filename)
-
-        # Obtener contenido y metadata
-        file_content = response["Body"].read()
-        content_type = response.get("ContentType", "application/octet-stream")
-
-        # Corregir Content-Type para PDFs
-        if filename.lower().endswith(".pdf"):
-            content_type = "application/pdf"
-        elif filename.lower().endswith(".txt"):
-            content_type = "text/plain"
-        elif filename.lower().endswith(".md"):
-            content_type = "text/markdown"
-
         current_app.logger.info(
-            f"[S3-PROXY] ✅ Archivo descargado exitosamente - Tamaño: {len(file_content)} bytes, Tipo: {content_type}"
-        )
-
-        # Crear respuesta Flask
-        from flask import Response
-
-        return Response(
-            file_content,
-            mimetype=content_type,
-            headers={
-                "Content-Disposition": f'inline; filename="{filename}"',
-                "Access-Control-Allow-Origin": "*",
-                "Cache-Control": "no-cache",
-            },
+            f"[S3-PROXY] ✅ Respuesta {response.status_code} - Tamaño: {response.headers.get('Content-Length', '?')} bytes, Tipo: {response.content_type}"
         )
+        return response
 
     except ClientError as e:
         current_app.logger.error(f"Error descargando archivo S3 {filename}: {e}")
@@ -318,10 +289,10 @@ def dashboard_admin():
             catalogos = []
         for t in tablas:
             t["tipo"] = "spreadsheet"
-            t["data"] = t.get("data", [])
+            t["data"] = get_embedded_rows(t)
         for c in catalogos:
             c["tipo"] = "catalog"
-            c["data"] = c.get("rows", [])
+            c["data"] = get_embedded_rows(c)
         registros = tablas + catalogos
         catalogos_por_usuario = {}
         for usuario in usuarios:
@@ -585,6 +556,7 @@ def get_system_status_data(full: bool = False) -> Dict[str, Any]:
             "health": health_report,
             "uptime": uptime_str,
             "request_stats": request_stats,
+            "request_latency": monitoring.get_request_latency_stats(limit=20),
             "database": monitoring._app_metrics["database_status"],
             "refresh_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "memory": mem_breakdown,
@@ -725,6 +697,20 @@ def get_backup_files(backup_dir: str) -> List[Dict[str, Any]]:
         return []
 
 
+# Listado de usuarios: ordenaciones permitidas (parámetro 'sort') y campos que
+# usa admin/users.html
+USER_LIST_SORT_FIELDS = ("nombre", "email", "role", "updated_at")
+USER_LIST_PROJECTION = {
+    "email": 1,
+    "username": 1,
+    "nombre": 1,
+    "role": 1,
+    "updated_at": 1,
+}
+# Orden alfabético sin distinguir mayúsculas ni acentos
+USER_LIST_COLLATION = {"locale": "es", "strength": 1}
+
+
 @admin_bp.route("/usuarios")
 @admin_required
 def lista_usuarios():
@@ -735,77 +721,93 @@ def lista_usuarios():
         if users_col is None:
             flash("Error: No se pudo acceder a la colección de usuarios", "error")
             return redirect(url_for("admin.dashboard_admin"))
+        query: Dict[str, Any] = {}
         if q:
             # Búsqueda insensible a mayúsculas/minúsculas en email o nombre de usuario
-            usuarios = list(
-                users_col.find(
-                    {
-                        "$or": [
-                            {"email": {"$regex": q, "$options": "i"}},
-                            {"username": {"$regex": q, "$options": "i"}},
-                            {"nombre": {"$regex": q, "$options": "i"}},
-                        ]
-                    }
-                )
-            )
-        else:
-            usuarios = list(users_col.find())
-        # Ordenar usuarios por nombre alfabéticamente
-        usuarios.sort(key=lambda u: u.get("nombre", "").lower())
-        # Obtener catálogos para calcular cuántos tiene cada usuario
-        from app.extensions import mongo
-
-        collections_to_check = ["catalogs", "spreadsheets"]
-        for user in usuarios:
-            posibles = {
-                user.get("email"),
-                user.get("username"),
-                user.get("name"),
-                user.get("nombre"),
+            query = {
+                "$or": [
+                    {"email": {"$regex": q, "$options": "i"}},
+                    {"username": {"$regex": q, "$options": "i"}},
+                    {"nombre": {"$regex": q, "$options": "i"}},
+                ]
             }
-            posibles = {v for v in posibles if v}
-            total_count = 0
-            for collection_name in collections_to_check:
-                try:
-                    if mongo and mongo.db is not None:
-                        collection = mongo.db[collection_name]
-                    else:
-                        continue
-                    query = {"$or": []}
-                    for val in posibles:
-                        query["$or"].extend(
-                            [
-                                {"created_by": val},
-                                {"owner": val},
-                                {"owner_name": val},
-                                {"email": val},
-                                {"username": val},
-                                {"name": val},
-                            ]
-                        )
-                    count = collection.count_documents(query)
-                    total_count += count
-                    logger.info(
-                        f"[ADMIN] Usuario {user.get('email')} tiene {count} catálogos en {collection_name}"
-                    )
-                except (AttributeError, KeyError, TypeError) as e:
-                    logger.error(
-                        f"Error al contar catálogos en {collection_name}: {str(e)}"
-                    )
-            user["num_catalogs"] = total_count
-            logger.info(
-                f"[ADMIN] Usuario {user.get('email')} tiene un total de {total_count} catálogos"
+
+        # Orden y paginación en MongoDB (por defecto: nombre ascendente)
+        sort_field = request.args.get("sort", "nombre")
+        if sort_field not in USER_LIST_SORT_FIELDS:
+            sort_field = "nombre"
+        sort_order = request.args.get(
+            "order", "desc" if sort_field == "updated_at" else "asc"
+        )
+        if sort_order not in ("asc", "desc"):
+            sort_order = "asc"
+        direction = ASCENDING if sort_order == "asc" else DESCENDING
+        per_page = current_app.config.get("USER_LIST_PER_PAGE", 50)
+        requested = parse_pagination_args(request.args, default_per_page=per_page)
+        page, per_page = requested or (
+            max(1, request.args.get("page", 1, type=int) or 1),
+            per_page,
+        )
+
+        # Estadísticas por rol de todos los usuarios del filtro en una agregación
+        roles_count = {
+            group["_id"]: group["count"]
+            for group in users_col.aggregate(
+                [
+                    {"$match": query},
+                    {"$group": {"_id": "$role", "count": {"$sum": 1}}},
+                ]
             )
-        # Calcular estadísticas
+        }
+        total = sum(roles_count.values())
         stats = {
-            "total": len(usuarios),
+            "total": total,
             "roles": {
-                "admin": sum(1 for u in usuarios if u.get("role") == "admin"),
-                "normal": sum(1 for u in usuarios if u.get("role") == "user"),
-                "no_role": sum(1 for u in usuarios if not u.get("role")),
+                "admin": roles_count.get("admin", 0),
+                "normal": roles_count.get("user", 0),
+                "no_role": roles_count.get(None, 0) + roles_count.get("", 0),
             },
         }
-        return render_template("admin/users.html", usuarios=usuarios, stats=stats)
+
+        pagination = build_pagination(page, per_page, total)
+        usuarios = list(
+            users_col.find(
+                query, USER_LIST_PROJECTION, collation=USER_LIST_COLLATION
+            )
+            .sort([(sort_field, direction), ("_id", direction)])
+            .skip(pagination["offset"])
+            .limit(pagination["per_page"])
+        )
+
+        # Catálogos de los usuarios de la página: un $group por colección en
+        # lugar de un count_documents por usuario y colección
+        from app.extensions import mongo
+
+        catalog_counts = {}
+        if mongo and mongo.db is not None and usuarios:
+            try:
+                catalog_counts = count_catalogs_by_owner(
+                    mongo.db, [user["_id"] for user in usuarios], users=usuarios
+                )
+            except Exception as e:
+                logger.error(f"Error al contar catálogos de usuarios: {str(e)}")
+        for user in usuarios:
+            user["num_catalogs"] = catalog_counts.get(user["_id"], 0)
+
+        return render_template(
+            "admin/users.html",
+            usuarios=usuarios,
+            stats=stats,
+            sort=sort_field,
+            order=sort_order,
+            pagination=pagination,
+            pagination_label="usuarios",
+            pagination_args={
+                key: value
+                for key, value in (("q", q), ("sort", sort_field), ("order", sort_order))
+                if value
+            },
+        )
     except (AttributeError, KeyError, TypeError) as e:
         logger.error(f"Error en lista_usuarios: {str(e)}", exc_info=True)
         flash(f"Error al cargar la lista de usuarios: {str(e)}", "error")
@@ -825,42 +827,29 @@ def ver_catalogos_usuario(user_email: str):
         if not user:
             flash(f"Usuario con email {user_email} no encontrado", "error")
             return redirect(url_for("admin.lista_usuarios"))
-        # Unificar criterio: buscar por todos los posibles identificadores
-        posibles = {
-            user.get("email"),
-            user.get("username"),
-            user.get("name"),
-            user.get("nombre"),
-        }
-        posibles = {v for v in posibles if v}
+        # Catálogos del usuario por 'owner_id' (un único campo indexado) y
+        # los antiguos sin 'owner_id' por sus campos históricos
+        query = owner_query(
+            user.get("_id"),
+            (user.get("email"), user.get("username"), user.get("nombre")),
+        )
         from app.extensions import mongo
 
         collections_to_check = ["catalogs", "spreadsheets"]
         all_catalogs = []
         for collection_name in collections_to_check:
             try:
-                if mongo and mongo.db is not None:
+                if mongo and mongo.db is not None and query:
                     collection = mongo.db[collection_name]
                 else:
                     continue
-                query: Dict[str, Any] = {"$or": []}
-                for val in posibles:
-                    query["$or"].extend(
-                        [
-                            {"created_by": val},
-                            {"owner": val},
-                            {"owner_name": val},
-                            {"email": val},
-                            {"username": val},
-                            {"name": val},
-                        ]
-                    )
-                catalogs_cursor = collection.find(query)
-                for catalog in catalogs_cursor:
+                found = 0
+                for catalog in collection.find(query):
                     catalog["collection_source"] = collection_name
                     all_catalogs.append(catalog)
+                    found += 1
                 logger.info(
-                    f"[ADMIN] Encontrados {collection.count_documents(query)} catálogos en {collection_name} para {posibles}"
+                    f"[ADMIN] Encontrados {found} catálogos en {collection_name} para {user_email}"
                 )
             except (AttributeError, KeyError, TypeError) as e:
                 logger.error(
@@ -868,18 +857,13 @@ def ver_catalogos_usuario(user_email: str):
                 )
         catalogs = all_catalogs
         logger.info(
-            f"[ADMIN] Total de catálogos encontrados para {posibles}: {len(catalogs)}"
+            f"[ADMIN] Total de catálogos encontrados para {user_email}: {len(catalogs)}"
         )
         # Añadir _id_str a cada catálogo para facilitar su uso en las plantillas
         for catalog in catalogs:
             catalog["_id_str"] = str(catalog["_id"])
             # Calcular el número de filas del catálogo
-            if "rows" in catalog:
-                catalog["row_count"] = len(catalog["rows"])
-            elif "data" in catalog:
-                catalog["row_count"] = len(catalog["data"])
-            else:
-                catalog["row_count"] = 0
+            catalog["row_count"] = get_stored_row_count(catalog)
             # Formatear la fecha de creación
             if "created_at" in catalog and catalog["created_at"]:
                 if isinstance(catalog["created_at"], str):
@@ -929,14 +913,19 @@ def ver_catalogo_admin(catalog_id: str):
 
         # Añadir _id_str al catálogo
         catalog["_id_str"] = str(catalog["_id"])
+        load_catalog_rows(mongo.db.catalogs, catalog)
 
         # Procesar imágenes para cada fila (igual que en ver_tabla)
         if catalog.get("data"):
-            from app.utils.image_utils import get_images_for_template
+            from app.utils.image_utils import (
+                get_images_for_template,
+                resolve_row_image_urls,
+            )
 
+            url_map = resolve_row_image_urls(catalog["data"])
             for i, row in enumerate(catalog["data"]):
                 # Usar función unificada para obtener URLs de imágenes
-                image_data = get_images_for_template(row)
+                image_data = get_images_for_template(row, url_map)
                 # Añade imagen_urls, num_imagenes, tiene_imagenes
                 row.update(image_data)
 
@@ -960,6 +949,7 @@ def eliminar_usuario(user_id: str):
     users_col = get_users_collection()
     if users_col is not None:
         users_col.delete_one({"_id": ObjectId(user_id)})
+        invalidate_user_cache(user_id)
         flash("Usuario eliminado", "success")
     else:
         flash("Error: No se pudo acceder a la colección de usuarios", "error")
@@ -987,6 +977,7 @@ def editar_usuario(user_id: str):
                     {"_id": ObjectId(user_id)},
                     {"$set": {"verified": True, "updated_at": datetime.now()}},
                 )
+                invalidate_user_cache(user_id)
                 flash(
                     f"Usuario {user.get('nombre', 'desconocido')} ha sido verificado",
                     "success",
@@ -1053,6 +1044,7 @@ def editar_usuario(user_id: str):
                 users_col.update_one(
                     {"_id": ObjectId(user_id)}, {"$set": {"password": password_hash}}
                 )
+                invalidate_user_cache(user_id)
                 flash("Contraseña actualizada", "success")
 
             # Si hay conflicto de email, no actualizar nada más
@@ -1073,6 +1065,7 @@ def editar_usuario(user_id: str):
 
             # Realizar la actualización
             _ = users_col.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
+            invalidate_user_cache(user_id)
 
             flash("Usuario actualizado correctamente", "success")
             return redirect(url_for("admin.lista_usuarios"))
@@ -1125,6 +1118,7 @@ def crear_usuario():
         }
 
         _ = users_col.insert_one(user_data)
+        invalidate_user_cache(user_data["email"])
         flash("Usuario creado exitosamente", "success")
         return redirect(url_for("admin.lista_usuarios"))
 
@@ -1271,6 +1265,7 @@ def bulk_upload_usuarios():
                     }
 
                     result = users_col.insert_one(new_user)
+                    invalidate_user_cache(email)
 
                     if result.inserted_id:
                         usuarios_exitosos += 1
@@ -1369,137 +1364,70 @@ def download_csv_template():
         return redirect(url_for("admin.bulk_upload_usuarios"))
 
 
-@admin_bp.route("/backup/json")
-def backup_json():
-    catalog = get_catalogs_collection()
-    if catalog is None:
+def _submit_catalog_export(format):
+    """Encola la exportación de los catálogos y redirige a la página del trabajo"""
+    db = get_mongo_db()
+    if db is None:
         flash("Error: No se pudo acceder a la colección de catálogos", "error")
         return redirect(url_for("maintenance.maintenance_dashboard"))
-    data = list(catalog.find())
-    for d in data:
-        d["_id"] = str(d["_id"])
-    output = io.StringIO()
-    json.dump(data, output, indent=4, default=str)
-    output.seek(0)
-    # Guardar el archivo en /backups/ con nombre único
-    backups_dir = os.path.join(os.getcwd(), "backups")
-    if not os.path.exists(backups_dir):
-        os.makedirs(backups_dir, exist_ok=True)
-    filename = f"catalog_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    backup_path = os.path.join(backups_dir, filename)
-    with open(backup_path, "w", encoding="utf-8") as f:
-        f.write(output.getvalue())
-    # Subir a Google Drive
-    try:
-        enlace_drive = upload_to_drive(backup_path)
-        os.remove(backup_path)
-        flash(
-            f"Backup subido a Google Drive y eliminado localmente. <a href='{enlace_drive}' target='_blank'>Ver en Drive</a>",
-            "success",
-        )
-        audit_log(
-            "backup_json_uploaded_to_drive",
-            user_id=session.get("user_id"),
-            details={
-                "filename": filename,
-                "username": session.get("username", "desconocido"),
-                "drive_url": enlace_drive,
-            },
-        )
-    except (OSError, PermissionError, ValueError) as e:
-        flash(
-            f"Error al subir el backup a Google Drive: {str(e)}. El archivo local no se ha eliminado.",
-            "danger",
-        )
-        audit_log(
-            "backup_json_upload_failed",
-            user_id=session.get("user_id"),
-            details={
-                "filename": filename,
-                "username": session.get("username", "desconocido"),
-                "error": str(e),
-            },
-            success=False,
-        )
-    # Permitir descarga directa como antes
-    return send_file(
-        io.BytesIO(output.read().encode()),
-        download_name="backup_catalog.json",
-        as_attachment=True,
+    if format == "csv" and db.spreadsheets.estimated_document_count() == 0:
+        flash("No hay datos para exportar", "warning")
+        return redirect(url_for("maintenance.maintenance_dashboard"))
+    # La exportación y la subida a Google Drive se hacen en segundo plano
+    # (ver run_catalog_export en app/utils/job_tasks.py)
+    job_id = submit_job(
+        db,
+        "catalog_export",
+        {"format": format},
+        user_id=session.get("user_id"),
+        username=session.get("username", "desconocido"),
     )
+    return redirect(url_for("jobs.view", job_id=job_id))
 
 
-@admin_bp.route("/backup/csv")
-def backup_csv():
+@admin_bp.route("/export/catalogs/<export_format>")
+@admin_required
+def export_catalogs(export_format):
+    """Descarga directa de la colección de catálogos en CSV, JSON o NDJSON.
+
+    Los documentos se leen por lotes del cursor y la respuesta se envía por
+    fragmentos (ver app/utils/catalog_export.py).
+    """
+    if export_format not in ("csv", "json", "ndjson"):
+        flash("Formato de exportación no soportado", "warning")
+        return redirect(url_for("maintenance.maintenance_dashboard"))
     catalog = get_catalogs_collection()
     if catalog is None:
         flash("Error: No se pudo acceder a la colección de catálogos", "error")
         return redirect(url_for("maintenance.maintenance_dashboard"))
-    data = list(catalog.find())
-    if not data:
-        flash("No hay datos para exportar", "warning")
-        return redirect(url_for("maintenance.maintenance_dashboard"))
-    # Unificar todos los campos presentes en los documentos
-    all_fields = set()
-    for row in data:
-        all_fields.update(row.keys())
-    headers = list(all_fields)
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=headers)
-    writer.writeheader()
-    for row in data:
-        row["_id"] = str(row["_id"])
-        row_filled = {k: row.get(k, "") for k in headers}
-        writer.writerow(row_filled)
-    output.seek(0)
-    # Guardar el archivo en /backups/ con nombre único
-    backups_dir = os.path.join(os.getcwd(), "backups")
-    if not os.path.exists(backups_dir):
-        os.makedirs(backups_dir, exist_ok=True)
-    filename = f"catalog_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    backup_path = os.path.join(backups_dir, filename)
-    with open(backup_path, "w", encoding="utf-8") as f:
-        f.write(output.getvalue())
-    # Subir a Google Drive
-    try:
-        enlace_drive = upload_to_drive(backup_path)
-        os.remove(backup_path)
-        flash(
-            f"Backup subido a Google Drive y eliminado localmente. <a href='{enlace_drive}' target='_blank'>Ver en Drive</a>",
-            "success",
-        )
-        audit_log(
-            "backup_csv_uploaded_to_drive",
-            user_id=session.get("user_id"),
-            details={
-                "filename": filename,
-                "username": session.get("username", "desconocido"),
-                "drive_url": enlace_drive,
-            },
-        )
-    except (OSError, PermissionError, ValueError) as e:
-        flash(
-            f"Error al subir el backup a Google Drive: {str(e)}. El archivo local no se ha eliminado.",
-            "danger",
-        )
-        audit_log(
-            "backup_csv_upload_failed",
-            user_id=session.get("user_id"),
-            details={
-                "filename": filename,
-                "username": session.get("username", "desconocido"),
-                "error": str(e),
-            },
-            success=False,
-        )
-    # Permitir descarga directa como antes
-    return send_file(
-        io.BytesIO(output.read().encode()),
-        download_name="backup_catalog.csv",
-        as_attachment=True,
+    headers = catalog_document_fields(catalog) if export_format == "csv" else []
+    filename = f"catalog_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{EXPORT_FORMATS[export_format][1]}"
+    audit_log(
+        f"catalogs_exported_{export_format}",
+        user_id=session.get("user_id"),
+        details={"filename": filename, "username": session.get("username")},
+    )
+    return Response(
+        stream_with_context(
+            iter_export(export_format, headers, iter_catalog_documents(catalog))
+        ),
+        mimetype=EXPORT_FORMATS[export_format][0],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
+@admin_bp.route("/backup/json")
+@admin_required
+def backup_json():
+    return _submit_catalog_export("json")
+
+
+@admin_bp.route("/backup/csv")
+@admin_required
+def backup_csv():
+    return _submit_catalog_export("csv")
+
+
 @admin_bp.route("/backups/cleanup", methods=["POST"])
 @admin_required
 def cleanup_old_backups():
@@ -2336,9 +2264,11 @@ def bulk_user_action():
             result = users_col.update_many(
                 {"_id": {"$in": object_ids}}, {"$set": {"verified": True}}
             )
+            invalidate_user_cache(*user_ids)
             flash(f"{result.modified_count} usuarios verificados.", "success")
         elif action == "delete":
             result = users_col.delete_many({"_id": {"$in": object_ids}})
+            invalidate_user_cache(*user_ids)
             flash(f"{result.deleted_count} usuarios eliminados.", "success")
         else:
             flash("Acción no reconocida.", "danger")
@@ -2363,15 +2293,13 @@ def ver_catalogos_usuario_por_id(user_id: str):
             flash("Usuario no encontrado", "danger")
             return redirect(url_for("admin.lista_usuarios"))
 
-        # Obtener todos los posibles identificadores del usuario
-        user_email = usuario.get("email", "")
-        username = usuario.get("username", "")
-        nombre = usuario.get("name", "")
-        posibles = {user_email, username, nombre}
-        posibles = {v for v in posibles if v}
-        logger.info(
-            f"[ADMIN] Buscando catálogos para el usuario con ID: {user_id}, posibles: {posibles}"
+        # Catálogos del usuario por 'owner_id' (un único campo indexado) y
+        # los antiguos sin 'owner_id' por sus campos históricos
+        query = owner_query(
+            usuario["_id"],
+            (usuario.get("email"), usuario.get("username"), usuario.get("nombre")),
         )
+        logger.info(f"[ADMIN] Buscando catálogos para el usuario con ID: {user_id}")
 
         # Obtener los catálogos del usuario de ambas colecciones
         collections_to_check = ["catalogs", "spreadsheets"]
@@ -2380,29 +2308,17 @@ def ver_catalogos_usuario_por_id(user_id: str):
         for collection_name in collections_to_check:
             try:
                 db = get_mongo_db()
-                if db is None:
+                if db is None or not query:
                     continue
                 collection = db[collection_name]
-                # Buscar por todos los campos posibles
-                query: Dict[str, Any] = {"$or": []}
-                for val in posibles:
-                    query["$or"].extend(
-                        [
-                            {"created_by": val},
-                            {"owner": val},
-                            {"owner_name": val},
-                            {"email": val},
-                            {"username": val},
-                            {"name": val},
-                        ]
-                    )
-                catalogs_cursor = collection.find(query)
-                for catalog in catalogs_cursor:
+                found = 0
+                for catalog in collection.find(query):
                     catalog["collection_source"] = collection_name
                     catalog["_id_str"] = str(catalog["_id"])
                     all_catalogs.append(catalog)
+                    found += 1
                 logger.info(
-                    f"[ADMIN] Encontrados {collection.count_documents(query)} catálogos en {collection_name} para {posibles}"
+                    f"[ADMIN] Encontrados {found} catálogos en {collection_name} para {user_id}"
                 )
             except (AttributeError, KeyError, TypeError, ValueError) as e:
                 logger.error(
@@ -2411,17 +2327,12 @@ def ver_catalogos_usuario_por_id(user_id: str):
 
         catalogs = all_catalogs
         logger.info(
-            f"[ADMIN] Total de catálogos encontrados para {posibles}: {len(catalogs)}"
+            f"[ADMIN] Total de catálogos encontrados para {user_id}: {len(catalogs)}"
         )
 
         # Añadir información adicional a cada catálogo
         for catalog in catalogs:
-            if "rows" in catalog and catalog["rows"] is not None:
-                catalog["row_count"] = len(catalog["rows"])
-            elif "data" in catalog and catalog["data"] is not None:
-                catalog["row_count"] = len(catalog["data"])
-            else:
-                catalog["row_count"] = 0
+            catalog["row_count"] = get_stored_row_count(catalog)
             if "created_at" in catalog and catalog["created_at"]:
                 try:
                     if hasattr(catalog["created_at"], "strftime"):
@@ -2476,6 +2387,9 @@ def ver_catalogo_unificado(collection_source: str, catalog_id: str):
                 "admin/ver_catalogo.html", catalog=None, error="Catálogo no encontrado"
             )
 
+        # Catálogos con filas en catalog_rows: cargarlas para la vista completa
+        load_catalog_rows(collection, catalog)
+
         # --- Start of Refactoring ---
 
         def get_final_url(file_identifier):
@@ -2599,14 +2513,7 @@ def ver_catalogo_unificado(collection_source: str, catalog_id: str):
         else:
             catalog["created_at_formatted"] = "Fecha desconocida"
 
-        if "rows" in catalog and catalog["rows"] is not None:
-            catalog["row_count"] = len(catalog["rows"])
-            catalog["data"] = catalog["rows"]
-        elif "data" in catalog and catalog["data"] is not None:
-            catalog["row_count"] = len(catalog["data"])
-        else:
-            catalog["row_count"] = 0
-            catalog["data"] = []
+        catalog["row_count"] = len(catalog["data"])
 
         logger.info(
             f"[ADMIN] Mostrando catálogo desde {collection_source}: {catalog.get('name', 'Sin nombre')}"
@@ -2761,6 +2668,7 @@ def editar_catalogo_admin(collection_source: str, catalog_id: str):
 
             update_data: Dict[str, Any] = {
                 "name": name,
+                SEARCH_KEYS_FIELD: name_search_keys(name),
                 "description": description,
                 "updated_at": datetime.utcnow(),
             }
@@ -2827,7 +2735,9 @@ def editar_fila_admin(collection_source: str, catalog_id: str, row_index: int):
             return redirect(url_for("admin.dashboard_admin"))
 
         collection = db[collection_source]
-        catalog = collection.find_one({"_id": ObjectId(catalog_id)})
+        catalog = collection.find_one(
+            {"_id": ObjectId(catalog_id)}, CATALOG_METADATA_PROJECTION
+        )
         if not catalog:
             logger.warning(
                 f"[ADMIN] Catálogo no encontrado en {collection_source} para id={catalog_id}"
@@ -2835,12 +2745,11 @@ def editar_fila_admin(collection_source: str, catalog_id: str, row_index: int):
             flash("Catálogo no encontrado", "warning")
             return redirect(url_for("admin.dashboard_admin"))
 
-        # Asegurar que rows existe
-        if "rows" not in catalog or not catalog["rows"]:
-            catalog["rows"] = []
+        # Obtener solo la fila solicitada a través de la capa de datos del catálogo
+        row_data = get_catalog_row(collection, catalog, row_index)
 
         # Verificar que el índice de fila es válido
-        if row_index < 0 or row_index >= len(catalog["rows"]):
+        if row_data is None:
             flash("Índice de fila inválido", "error")
             return redirect(
                 url_for(
@@ -2850,7 +2759,6 @@ def editar_fila_admin(collection_source: str, catalog_id: str, row_index: int):
                 )
             )
 
-        row_data = catalog["rows"][row_index]
         logger.info(f"[ADMIN_EDIT_ROW] 🔍 row_data obtenido: {row_data}")
         logger.info(f"[ADMIN_EDIT_ROW] 📋 row_data tipo: {type(row_data)}")
         logger.info(
@@ -3450,13 +3358,27 @@ def editar_fila_admin(collection_source: str, catalog_id: str, row_index: int):
                     ]
                 else:
                     updated_row["images"] = []
-            # Actualizar la fila en el catálogo
-            catalog["rows"][row_index] = updated_row
-
-            # Actualizar en la base de datos
-            _ = collection.update_one(
-                {"_id": ObjectId(catalog_id)}, {"$set": {"rows": catalog["rows"]}}
-            )
+            # Actualizar solo la fila editada en la base de datos
+            try:
+                _ = update_catalog_row(
+                    collection,
+                    catalog,
+                    row_index,
+                    updated_row,
+                    expected_version=parse_expected_version(request.form),
+                )
+            except CatalogVersionConflictError:
+                flash(
+                    "El catálogo ha sido modificado por otro usuario. Revisa los cambios y vuelve a editar la fila.",
+                    "warning",
+                )
+                return redirect(
+                    url_for(
+                        "admin.ver_catalogo_unificado",
+                        collection_source=collection_source,
+                        catalog_id=catalog_id,
+                    )
+                )
 
             flash("Fila actualizada correctamente", "success")
             return redirect(
@@ -3510,7 +3432,8 @@ def get_catalog_images(catalog_id: str):
 
         # Extraer imágenes de las filas del catálogo
         images = []
-        data_to_search = catalog.get("data", catalog.get("rows", []))
+        load_catalog_rows(collection, catalog)
+        data_to_search = catalog["data"]
 
         for row in data_to_search:
             if isinstance(row, dict):
@@ -3587,6 +3510,8 @@ def eliminar_catalogo_admin(collection_source: str, catalog_id: str):
         result = collection.delete_one({"_id": ObjectId(catalog_id)})
 
         if result.deleted_count > 0:
+            # Eliminar también las filas guardadas en catalog_rows
+            delete_catalog_rows(collection, catalog_id)
             logger.info(
                 f"[ADMIN] Catálogo eliminado correctamente: {catalog_id} de {collection_source}"
             )
@@ -3661,6 +3586,7 @@ def eliminar_catalogos_multiple():
                 result = collection.delete_one({"_id": ObjectId(catalog_id)})
 
                 if result.deleted_count > 0:
+                    delete_catalog_rows(collection, catalog_id)
                     eliminados.append(
                         {
                             "id": catalog_id,
@@ -3876,6 +3802,8 @@ def db_status():
         "collections": [],
         "server_info": None,
         "server_status": {},
+        "index_drift": {},
+        "index_drift_detected": False,
     }
 
     try:
@@ -3899,6 +3827,15 @@ def db_status():
                 status["collections"] = []
                 status["error"] = f"Error al obtener colecciones: {str(e)}"
 
+            # Diferencias entre los índices declarados y los existentes
+            try:
+                status["index_drift"] = get_index_drift(db)
+                status["index_drift_detected"] = has_index_drift(
+                    status["index_drift"]
+                )
+            except Exception as e:
+                current_app.logger.error(f"Error al comprobar índices: {str(e)}")
+
         # Obtener información del servidor y convertir objetos no serializables
         def convert_timestamps(obj: Any) -> Any:
             from datetime import datetime
@@ -4677,9 +4614,9 @@ def logs_tail():
     log_file = request.args.get("log_file", "flask_debug.log")
 
     logs_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../logs"))
-    log_path = os.path.join(logs_dir, log_file)
+    log_path = resolve_log_path(logs_dir, log_file)
 
-    if not os.path.isfile(log_path):
+    if log_path is None:
         return (
             jsonify(
                 {
@@ -4691,14 +4628,8 @@ def logs_tail():
         )
 
     try:
-        with open(log_path, encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-
-        # Aplicar filtros combinados
-        filtered_lines = []
-        date_format = "%Y-%m-%d"
-
         # Preparar filtros de fecha
+        date_format = "%Y-%m-%d"
         date_from_obj = None
         date_to_obj = None
         if date_from:
@@ -4706,45 +4637,17 @@ def logs_tail():
         if date_to:
             date_to_obj = datetime.strptime(date_to, date_format).date()
 
-        for line in lines:
-            # Aplicar filtro de palabra clave
-            if keyword and keyword.lower() not in line.lower():
-                continue
-
-            # Aplicar filtros de fecha
-            if date_from_obj or date_to_obj:
-                # Extraer la fecha del log (asumiendo formato de fecha al inicio de la
-                # línea)
-                log_date_str = " ".join(
-                    line.split()[:2]
-                )  # Toma los dos primeros segmentos (fecha y hora)
-                try:
-                    log_datetime = datetime.strptime(
-                        log_date_str, "%Y-%m-%d %H:%M:%S,%f"
-                    )
-                    log_date = log_datetime.date()
-
-                    # Aplicar filtros de fecha
-                    if date_from_obj and log_date < date_from_obj:
-                        continue
-                    if date_to_obj and log_date > date_to_obj:
-                        continue
-
-                    filtered_lines.append(line)
-                except ValueError:
-                    # Si no se puede extraer la fecha, incluir la línea por defecto
-                    filtered_lines.append(line)
-            else:
-                # Si no hay filtro de fechas, solo aplicar filtro de palabra clave
-                filtered_lines.append(line)
-
-        # Aplicar límite de líneas si se especificó
-        result_lines = filtered_lines[-n:] if n > 0 else filtered_lines
+        # Las fechas se localizan con búsqueda binaria y las líneas se leen
+        # desde el final hacia atrás (ver app/utils/log_reader.py)
+        start, end = 0, None
+        if date_from_obj or date_to_obj:
+            start, end = date_range_offsets(log_path, date_from_obj, date_to_obj)
+        result_lines = tail_lines(log_path, n, keyword, start, end)
 
         return jsonify(
             {
                 "logs": result_lines,
-                "total_lines": len(lines),
+                "total_lines": count_lines(log_path),
                 "filtered_lines": len(result_lines),
             }
         )
@@ -4768,17 +4671,17 @@ def logs_search():
 
     kw = request.args.get("kw", "").strip()
     log_file = request.args.get("log_file", "flask_debug.log")
+    # Por defecto se busca también en las rotaciones (<log>.1, <log>.2, ...)
+    include_rotated = request.args.get("rotated", "true").lower() != "false"
+    limit = request.args.get("limit", LOG_SEARCH_LIMIT, type=int)
     logs_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../logs"))
-    log_path = os.path.join(logs_dir, log_file)
-    if not os.path.isfile(log_path):
+    if resolve_log_path(logs_dir, log_file) is None:
         from flask import abort
 
         abort(404, description=f"Archivo no encontrado: {log_file}")
     if not kw:
         return jsonify({"logs": []})  # Esto es éxito, no error, se mantiene igual.
-    with open(log_path, encoding="utf-8", errors="ignore") as f:
-        lines = [line for line in f if kw.lower() in line.lower()]
-    return jsonify({"logs": lines})
+    return jsonify(search_logs(logs_dir, log_file, kw, include_rotated, limit))
 
 
 @admin_logs_bp.route("/logs/download")
@@ -6579,6 +6482,38 @@ def api_cache_stats():
         )
 
 
+@admin_bp.route("/api/s3-cache-stats")
+@admin_required
+def api_s3_cache_stats():
+    """API endpoint con las métricas de las caches S3 (existencia y disco)"""
+    try:
+        from app.utils.s3_cache import get_s3_exists_cache
+        from app.utils.s3_disk_cache import get_s3_disk_cache
+
+        disk_cache = get_s3_disk_cache()
+        return jsonify(
+            {
+                "status": "success",
+                "data": {
+                    "exists_cache": get_s3_exists_cache().stats(),
+                    "disk_cache": disk_cache.stats() if disk_cache else None,
+                },
+            }
+        )
+
+    except (AttributeError, KeyError, TypeError, ValueError, OSError) as e:
+        logger.error(f"Error en api_s3_cache_stats: {str(e)}", exc_info=True)
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "Error al obtener estadísticas de las caches S3",
+                }
+            ),
+            500,
+        )
+
+
 @admin_bp.route("/api/test-cache")
 @admin_required
 def test_cache():
@@ -6851,6 +6786,7 @@ def reset_user_password(user_id):
                 }
             },
         )
+        invalidate_user_cache(user_id)
 
         if result.modified_count > 0:
             logger.info(
@@ -6909,6 +6845,7 @@ def clear_user_flags(user_id):
                 }
             },
         )
+        invalidate_user_cache(user_id)
 
         if result.modified_count > 0:
             logger.info(
@@ -6968,6 +6905,7 @@ def bulk_password_action():
                             }
                         },
                     )
+                    invalidate_user_cache(user_id)
                     results.append(
                         {"user_id": user_id, "success": result.modified_count > 0}
                     )
@@ -7003,6 +6941,7 @@ def bulk_password_action():
                                 }
                             },
                         )
+                        invalidate_user_cache(user_id)
                         results.append(
                             {"user_id": user_id, "success": result.modified_count > 0}
                         )
@@ -7082,6 +7021,7 @@ def assign_temp_password(user_id):
                 }
             },
         )
+        invalidate_user_cache(user_id)
 
         if result.modified_count > 0:
             logger.info(
@@ -6,7 +6,6 @@
 # Autor: EDF Developer - 2025-05-28
 
 import logging
-from datetime import datetime  # noqa: F401
 from typing import Any
 
 from bson.objectid import ObjectId
@@ -21,6 +20,8 @@ from flask import (
     url_for,
 )
 
+from app.utils.catalog_utils import CATALOG_METADATA_PROJECTION, append_catalog_row
+
 logger = logging.getLogger(__name__)
 
 
@@ -35,7 +36,7 @@ def agregar_fila_route(main_bp):
         try:
             # Obtener la tabla
             tabla = current_app.spreadsheets_collection.find_one(  # type: ignore
-                {"_id": ObjectId(tabla_id)}
+                {"_id": ObjectId(tabla_id)}, CATALOG_METADATA_PROJECTION
             )
             if not tabla:
                 flash("Tabla no encontrada", "error")
@@ -54,15 +55,9 @@ def agregar_fila_route(main_bp):
                 for header in tabla.get("headers", []):
                     nueva_fila[header] = request.form.get(header, "")
 
-                # Agregar la fila a la tabla (actualizar tanto data como rows para
-                # compatibilidad)
-                current_app.spreadsheets_collection.update_one(  # type: ignore
-                    {"_id": ObjectId(tabla_id)},
-                    {
-                        "$push": {"data": nueva_fila, "rows": nueva_fila},
-                        "$inc": {"num_rows": 1},
-                        "$set": {"updated_at": datetime.utcnow()},
-                    },
+                # Agregar la fila al array canónico 'data' de la tabla
+                append_catalog_row(
+                    current_app.spreadsheets_collection, tabla, nueva_fila  # type: ignore
                 )
 
                 flash("Fila agregada correctamente", "success")
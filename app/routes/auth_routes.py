@@ -25,6 +25,7 @@ from flask import (
 from flask_mail import Message
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from app.database import invalidate_user_cache
 from app.extensions import mail  # pyright: ignore[reportUnusedImport]
 from app.models import find_reset_token  # pyright: ignore[reportUnusedImport]
 from app.models import mark_token_as_used  # pyright: ignore[reportUnusedImport]
@@ -141,6 +142,7 @@ def register():
         # Insertar en la colección users
         try:
             result = users_collection.insert_one(nuevo_usuario)
+            invalidate_user_cache(result.inserted_id, nuevo_usuario["email"])
             logger.info(f"Usuario registrado correctamente: {email}")
 
             # Si llegamos aquí, la autenticación fue exitosa
@@ -551,6 +553,7 @@ def temp_password_reset():
                 }
             },
         )
+        invalidate_user_cache(user_id)
 
         if result.modified_count > 0:
             # Limpiar la sesión temporal
@@ -612,6 +615,7 @@ def reset_password(token):
                     }
                 },
             )
+            invalidate_user_cache(reset_info["user_id"])
 
             # Marcar token como usado
             get_resets_collection().update_one(
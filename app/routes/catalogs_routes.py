@@ -13,32 +13,76 @@ visualización y gestión de catálogos de tablas. Incluye funcionalidades para:
 
 import logging
 import os
+import re
 import uuid
 from datetime import datetime
 from functools import wraps
 
-try:
-    import pandas as pd
-
-    pandas_available = True
-except ImportError:
-    pandas_available = False
-    pd = None
 from bson.objectid import ObjectId
 from flask import (
     Blueprint,
+    Response,
     current_app,
     flash,
+    jsonify,
     redirect,
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
 )
 from werkzeug.utils import secure_filename
 
-from app.database import get_mongo_db
-from app.utils.image_utils import get_images_for_template, upload_image_to_s3
+from app.database import get_mongo_db, invalidate_catalog_cache
+from app.exceptions import CatalogVersionConflictError
+from app.utils.catalog_export import (
+    EXPORT_FORMATS,
+    export_filename,
+    iter_catalog_rows,
+    iter_export,
+)
+from app.utils.catalog_import import IMPORT_EXTENSIONS
+from app.utils.catalog_search import (
+    SEARCH_KEYS_FIELD,
+    name_prefix_query,
+    name_search_keys,
+    search_catalog_rows,
+    search_catalogs,
+)
+from app.utils.catalog_utils import (
+    CATALOG_METADATA_PROJECTION,
+    ROW_ID_FIELD,
+    ROW_INDEX_FIELD,
+    THUMBNAIL_FIELD,
+    append_catalog_row,
+    build_pagination,
+    count_catalogs,
+    delete_catalog_row,
+    delete_catalog_rows,
+    find_catalog_summaries,
+    get_catalog_row,
+    get_catalog_row_count,
+    get_catalog_rows,
+    load_catalog_rows,
+    owner_fields,
+    owner_query,
+    parse_catalog_sort,
+    parse_expected_version,
+    parse_pagination_args,
+    parse_row_query_args,
+    query_catalog_rows,
+    resolve_row_window,
+    row_query_link_args,
+    update_catalog_row,
+)
+from app.utils.image_utils import (
+    get_catalog_thumbnail_url,
+    get_images_for_template,
+    resolve_row_image_urls,
+    upload_image_to_s3,
+)
+from app.utils.job_queue import submit_job
 from app.utils.mongo_utils import is_mongo_available, is_valid_object_id
 from app.utils.s3_utils import convert_s3_url_to_proxy, get_s3_url
 from app.utils.upload_utils import get_upload_dir, handle_file_upload
@@ -62,8 +106,16 @@ def is_admin():
 # El campo created_by se compara con el username de sesión
 
 
-def check_catalog_permission(f):
-    """Decorador para validar el acceso a un catálogo."""
+def check_catalog_permission(f=None, *, load_rows=True):
+    """Decorador para validar el acceso a un catálogo.
+
+    Puede usarse sin argumentos (``@check_catalog_permission``) o con
+    ``@check_catalog_permission(load_rows=False)`` para cargar solo los
+    metadatos del catálogo; la vista obtiene después las filas que necesite
+    a través de ``app.utils.catalog_utils``.
+    """
+    if f is None:
+        return lambda func: check_catalog_permission(func, load_rows=load_rows)
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -110,7 +162,8 @@ def check_catalog_permission(f):
                 raise Exception("No se pudo conectar a la base de datos")
 
             collection = db[collection_name]
-            catalog = collection.find_one({"_id": object_id})
+            projection = None if load_rows else CATALOG_METADATA_PROJECTION
+            catalog = collection.find_one({"_id": object_id}, projection)
 
             current_app.logger.info(f"[DEBUG] catalog from DB: {catalog}")
             current_app.logger.info(f"[DEBUG] catalog type from DB: {type(catalog)}")
@@ -142,7 +195,6 @@ def check_catalog_permission(f):
                         "headers": ["Header1", "Header2"],
                         "created_by": "testuser",
                         "data": [],
-                        "rows": [],
                     }
 
             # Asegurarse de que catalog es un diccionario válido
@@ -258,13 +310,9 @@ def check_catalog_permission(f):
                 or catalog.get("email") == email
             ):
                 # Usuario autorizado, pasar el catálogo a la función decorada
-                # Asegurar que el catálogo tenga la clave 'rows' correctamente
-                # inicializada
-                if "rows" not in catalog or catalog["rows"] is None:
-                    current_app.logger.warning(
-                        f"[PERMISOS] Catálogo {catalog_id} no tenía 'rows', se inicializa como lista vacía."
-                    )
-                    catalog["rows"] = []
+                # con sus filas en el array canónico 'data'
+                if load_rows:
+                    load_catalog_rows(collection, catalog)
                 kwargs["catalog"] = catalog
                 return f(*args, **kwargs)
             else:
@@ -342,63 +390,56 @@ def list_catalogs():
         # Si hay una búsqueda, aplicar el filtro correspondiente
         if search_query:
             if search_type == "name":
-                # Búsqueda por nombre (insensible a mayúsculas/minúsculas)
-                filter_query["name"] = {"$regex": search_query, "$options": "i"}
+                # Palabras del nombre que empiezan por cada término (índice
+                # search_keys, sin distinguir mayúsculas ni acentos)
+                filter_query = name_prefix_query(search_query) or {}
                 current_app.logger.info(f"Búsqueda por nombre: {search_query}")
             elif search_type == "user":
-                # Búsqueda por usuario creador (insensible a mayúsculas/minúsculas)
-                filter_query["created_by"] = {"$regex": search_query, "$options": "i"}
+                # Usuario creador que empieza por el texto buscado
+                filter_query["created_by"] = {
+                    "$regex": f"^{re.escape(search_query)}",
+                    "$options": "i",
+                }
                 current_app.logger.info(f"Búsqueda por usuario: {search_query}")
 
-        # Obtener las colecciones de catálogos
-        collections_to_check = ["spreadsheets"]
-        all_catalogs = []
-
-        # Buscar en todas las colecciones relevantes
-        for collection_name in collections_to_check:
-            try:
-                db = get_mongo_db()
-                if db is None:
-                    continue
-                collection = db[collection_name]
-                current_app.logger.info(
-                    f"Buscando catálogos en la colección {collection_name}"
-                )
-
-                # Aplicar filtros según el rol del usuario
-                if role == "admin":
-                    # Para admins, aplicar solo el filtro de búsqueda
-                    catalogs_cursor = collection.find(filter_query)
-                else:
-                    # Para usuarios normales, combinar el filtro de búsqueda con el
-                    # filtro de usuario
-                    user_filter = {"created_by": username}
-                    # Combinar filtros
-                    if filter_query:
-                        # Usar $and para combinar ambos filtros
-                        catalogs_cursor = collection.find(
-                            {"$and": [filter_query, user_filter]}
-                        )
-                    else:
-                        # Si no hay filtro de búsqueda, usar solo el filtro de usuario
-                        catalogs_cursor = collection.find(user_filter)
-
-                # Convertir el cursor a lista y añadir a los resultados
-                for catalog in catalogs_cursor:
-                    # Añadir información sobre la colección de origen
-                    catalog["collection_source"] = collection_name
-                    all_catalogs.append(catalog)
-            except Exception as e:
-                current_app.logger.error(
-                    f"Error al buscar en colección {collection_name}: {str(e)}"
-                )
+        # Aplicar filtros según el rol del usuario
+        if role != "admin":
+            user_filter = owner_query(
+                session.get("user_id"),
+                (username, session.get("email"), session.get("nombre")),
+            ) or {"created_by": username}
+            filter_query = (
+                {"$and": [filter_query, user_filter]} if filter_query else user_filter
+            )
 
-        current_app.logger.info(
-            f"Total de catálogos encontrados en todas las colecciones: {len(all_catalogs)}"
+        # Solo los campos del listado; orden y paginación en MongoDB
+        collection = db["spreadsheets"]
+        sort_field, sort_order, sort_spec = parse_catalog_sort(request.args)
+        per_page = current_app.config.get("CATALOG_LIST_PER_PAGE", 24)
+        requested = parse_pagination_args(request.args, default_per_page=per_page)
+        page, per_page = requested or (
+            max(1, request.args.get("page", 1, type=int) or 1),
+            per_page,
         )
-
-        # Usar la lista combinada de catálogos
-        catalogs = all_catalogs
+        if search_query and search_type == "content":
+            # Texto completo en nombre, encabezados y filas, por relevancia
+            current_app.logger.info(f"Búsqueda en contenido: {search_query}")
+            results = search_catalogs(collection, search_query, filter_query)
+            pagination = build_pagination(page, per_page, len(results))
+            catalogs = results[
+                pagination["offset"] : pagination["offset"] + pagination["per_page"]
+            ]
+        else:
+            pagination = build_pagination(
+                page, per_page, count_catalogs(collection, filter_query)
+            )
+            catalogs = find_catalog_summaries(
+                collection,
+                filter_query,
+                sort=sort_spec,
+                skip=pagination["offset"],
+                limit=pagination["per_page"],
+            )
 
         # Registrar información sobre los catálogos encontrados según el rol
         if role == "admin":
@@ -410,12 +451,13 @@ def list_catalogs():
                 f"[USER] Mostrando catálogos filtrados para el usuario {username}"
             )
 
-        # Convertir el cursor a una lista para poder usarlo en la plantilla
         catalogs_list = []
         catalog_ids = []
 
         for catalog in catalogs:
             try:
+                catalog["collection_source"] = "spreadsheets"
+
                 # Guardar el ID original para depuración
                 original_id = catalog.get("_id")
                 catalog_ids.append(str(original_id))
@@ -423,14 +465,6 @@ def list_catalogs():
                 # Asegurarse de que _id_str existe y es correcto
                 catalog["_id_str"] = str(original_id)
 
-                # Calcular el número de filas del catálogo
-                if "rows" in catalog and catalog["rows"] is not None:
-                    catalog["row_count"] = len(catalog["rows"])
-                elif "data" in catalog and catalog["data"] is not None:
-                    catalog["row_count"] = len(catalog["data"])
-                else:
-                    catalog["row_count"] = 0
-
                 # Formatear la fecha de creación
                 if "created_at" in catalog and catalog["created_at"]:
                     try:
@@ -452,10 +486,6 @@ def list_catalogs():
                 # Asegurarse de que todos los campos necesarios existan
                 if "headers" not in catalog or catalog["headers"] is None:
                     catalog["headers"] = []
-                if "data" not in catalog and "rows" not in catalog:
-                    catalog["data"] = []
-                elif "rows" in catalog and "data" not in catalog:
-                    catalog["data"] = catalog["rows"]
 
                 # Asegurarse de que hay un creador/propietario
                 if "created_by" not in catalog or not catalog["created_by"]:
@@ -470,118 +500,17 @@ def list_catalogs():
                 current_app.logger.error(f"Error al procesar catálogo: {str(e)}")
                 continue
 
-        # 🖼️ AÑADIR LÓGICA DE MINIATURA (igual que dashboard_user)
+        # 🖼️ Miniatura precalculada al escribir las filas (sin recorrerlas ni
+        # consultar S3 al listar)
         for catalog in catalogs_list:
-            current_app.logger.info(
-                f"[DEBUG_CATALOGS_MINIATURA] Procesando catálogo: {catalog.get('name', 'Sin nombre')}"
-            )
-
-            # 1. Verificar si tiene miniatura personalizada configurada
-            if catalog.get("miniatura") and catalog["miniatura"].strip():
-                # Convertir URL directa de S3 a URL del proxy si es necesario
-                miniatura_original = catalog["miniatura"]
-                if isinstance(miniatura_original, str) and (
-                    "s3.amazonaws.com" in miniatura_original
-                    or "edf-catalogo-tablas.s3" in miniatura_original
-                ):
-                    from app.utils.s3_utils import convert_s3_url_to_proxy
-
-                    catalog["miniatura"] = convert_s3_url_to_proxy(miniatura_original)
-                    current_app.logger.info(
-                        f"[MINIATURA_CATALOGS] Usando miniatura personalizada (convertida): {catalog['miniatura']}"
-                    )
-                else:
-                    current_app.logger.info(
-                        f"[MINIATURA_CATALOGS] Usando miniatura personalizada: {catalog['miniatura']}"
-                    )
-                continue
-
-            # 2. Si no tiene miniatura personalizada, buscar automáticamente
-            catalog["miniatura"] = ""
-
-            # Buscar en todas las filas hasta encontrar una imagen
-            for row in catalog.get("data", []):
-                if not isinstance(row, dict):
-                    continue
-
-                imagen_encontrada = None
-
-                # 1. Verificar campo "Imagen" (URLs externas como Unsplash)
-                if (
-                    row.get("Imagen")
-                    and isinstance(row["Imagen"], str)
-                    and row["Imagen"].startswith("http")
-                ):
-                    imagen_encontrada = row["Imagen"]
-
-                # 2. Si no hay imagen externa, buscar en campos de imágenes locales
-                if not imagen_encontrada:
-                    for campo in ["imagenes", "images", "imagen_data"]:
-                        if campo in row and row[campo]:
-                            imgs = (
-                                row[campo]
-                                if hasattr(row[campo], "__iter__")
-                                and not isinstance(row[campo], str)
-                                else [row[campo]]
-                            )
-                            for img in imgs:
-                                if (
-                                    img
-                                    and img != "N/A"
-                                    and isinstance(img, str)
-                                    and not img.startswith("http")
-                                ):
-                                    use_s3 = (
-                                        os.environ.get("USE_S3", "false").lower()
-                                        == "true"
-                                    )
-                                    if use_s3:
-                                        from app.utils.s3_utils import (
-                                            convert_s3_url_to_proxy,
-                                            get_s3_url,
-                                        )
-
-                                        s3_url = get_s3_url(img)
-                                        if s3_url:
-                                            imagen_encontrada = s3_url
-                                        else:
-                                            imagen_encontrada = url_for(
-                                                "static", filename=f"uploads/{img}"
-                                            )
-                                    else:
-                                        imagen_encontrada = url_for(
-                                            "static", filename=f"uploads/{img}"
-                                        )
-                                    break
-                        if imagen_encontrada:
-                            break
-
-                # Si encontramos una imagen, salir del bucle
-                if imagen_encontrada:
-                    # Convertir URL directa de S3 a URL del proxy si es necesario
-                    if (
-                        "s3.amazonaws.com" in imagen_encontrada
-                        or "edf-catalogo-tablas.s3" in imagen_encontrada
-                    ):
-                        from app.utils.s3_utils import convert_s3_url_to_proxy
-
-                        imagen_encontrada = convert_s3_url_to_proxy(imagen_encontrada)
-
-                    catalog["miniatura"] = imagen_encontrada
-                    current_app.logger.info(
-                        f"[MINIATURA_CATALOGS] Encontrada para catálogo {catalog.get('name', 'Sin nombre')}: {imagen_encontrada}"
-                    )
-                    break
-
-            # Si no se encontró ninguna imagen, dejar vacío
-            if not catalog["miniatura"]:
-                current_app.logger.info(
-                    f"[MINIATURA_CATALOGS] No se encontró imagen para catálogo {catalog.get('name', 'Sin nombre')}"
-                )
+            catalog["miniatura"] = get_catalog_thumbnail_url(catalog)
 
         # Registrar los IDs de los catálogos para depuración
         current_app.logger.info(f"IDs de catálogos listados: {catalog_ids}")
-        current_app.logger.info(f"Total de catálogos encontrados: {len(catalogs_list)}")
+        current_app.logger.info(
+            f"Total de catálogos encontrados: {pagination['total']} "
+            f"(página {pagination['page']}/{pagination['total_pages']})"
+        )
 
         return render_template(
             "catalogs.html",
@@ -590,6 +519,20 @@ def list_catalogs():
             current_user_email=session.get("username"),
             search_query=search_query,
             search_type=search_type,
+            sort=sort_field,
+            order=sort_order,
+            pagination=pagination,
+            pagination_label="catálogos",
+            pagination_args={
+                key: value
+                for key, value in (
+                    ("search", search_query),
+                    ("search_type", search_type if search_query else ""),
+                    ("sort", sort_field),
+                    ("order", sort_order),
+                )
+                if value
+            },
         )
     except Exception as e:
         current_app.logger.error(f"Error al listar catálogos: {str(e)}", exc_info=True)
@@ -609,13 +552,19 @@ def list():
 
 
 @catalogs_bp.route("/<catalog_id>")
-@check_catalog_permission
+@check_catalog_permission(load_rows=False)
 def view(catalog_id, catalog):
     """Mostrar la vista detallada de un catálogo específico.
-    
+
+    Admite paginación en servidor con los parámetros ``page`` y ``per_page``;
+    los catálogos que superan CATALOG_VIEW_AUTO_PAGINATE_ROWS filas se
+    paginan automáticamente. Solo se cargan y procesan las filas visibles.
+    Los filtros y el orden por columna (``filter[<columna>]``, ``q``,
+    ``sort``) se ejecutan en MongoDB (ver catalog_utils.query_catalog_rows).
+
     Args:
         catalog_id (str): ID del catálogo a visualizar
-        catalog (dict): Datos del catálogo obtenidos por el decorador
+        catalog (dict): Metadatos del catálogo obtenidos por el decorador
         
     Returns:
         str: Template HTML con los detalles del catálogo
@@ -627,19 +576,57 @@ def view(catalog_id, catalog):
         )
         if "headers" not in catalog or catalog["headers"] is None:
             catalog["headers"] = []
-        # Asegurar que tenemos tanto rows como data disponibles
-        # IMPORTANTE: NO sobrescribir data con rows (rows puede estar desactualizado)
-        if "data" in catalog and catalog["data"] is not None:
-            # data es la fuente de verdad, sincronizar rows desde data
-            # NO hacer esto al revés porque data tiene las imágenes reales
-            if not catalog.get("rows"):
-                catalog["rows"] = catalog["data"]
-        elif "rows" in catalog and catalog["rows"] is not None:
-            # Solo usar rows si no hay data
-            catalog["data"] = catalog["rows"]
+
+        # Cargar solo la ventana de filas visible del array canónico 'data'
+        collection = get_mongo_db()["spreadsheets"]
+        catalog["row_count"] = get_catalog_row_count(collection, catalog)
+        per_page = current_app.config.get("CATALOG_VIEW_PER_PAGE", 50)
+        filters, row_sort, row_search = parse_row_query_args(
+            request.args, catalog["headers"]
+        )
+        row_query_args = {}
+        if filters or row_sort or row_search:
+            # Filtros y orden por columna: se resuelven en MongoDB y la vista
+            # pasa a paginarse en servidor con el total filtrado
+            page, per_page = parse_pagination_args(
+                request.args, default_per_page=per_page
+            ) or (max(1, request.args.get("page", 1, type=int) or 1), per_page)
+            filas, total = query_catalog_rows(
+                collection,
+                catalog,
+                filters,
+                row_sort,
+                row_search,
+                (page - 1) * per_page,
+                per_page,
+            )
+            pagination = build_pagination(page, per_page, total)
+            if pagination["page"] != page:
+                filas, total = query_catalog_rows(
+                    collection,
+                    catalog,
+                    filters,
+                    row_sort,
+                    row_search,
+                    pagination["offset"],
+                    per_page,
+                )
+            row_query_args = row_query_link_args(filters, row_sort, row_search)
         else:
-            catalog["data"] = []
-            catalog["rows"] = []
+            pagination = resolve_row_window(
+                request.args,
+                catalog["row_count"],
+                current_app.config.get("CATALOG_VIEW_AUTO_PAGINATE_ROWS", 1000),
+                per_page,
+            )
+            if pagination:
+                filas = get_catalog_rows(
+                    collection, catalog, pagination["offset"], pagination["per_page"]
+                )
+            else:
+                filas = get_catalog_rows(collection, catalog)
+        row_offset = pagination["offset"] if pagination else 0
+        catalog["data"] = filas
         catalog["_id_str"] = str(catalog["_id"])
         if "updated_at" in catalog and catalog["updated_at"]:
             if hasattr(catalog["updated_at"], "strftime"):
@@ -659,9 +646,9 @@ def view(catalog_id, catalog):
         # Importar utilidades de imágenes si están disponibles
         try:
             # Procesar cada fila para obtener URLs de imágenes
-            # IMPORTANTE: Usar data que contiene las imágenes reales (campo 'imagenes')
-            # rows tiene datos obsoletos sin imágenes
             filas_a_procesar = catalog.get("data", [])
+            # Resolver en un solo lote todas las imágenes de la página
+            url_map = resolve_row_image_urls(filas_a_procesar)
             for i, fila in enumerate(filas_a_procesar):
                 if isinstance(fila, dict):
                     # Debugging detallado para entender el problema
@@ -669,7 +656,7 @@ def view(catalog_id, catalog):
                         f"[DEBUG_RAW_DATA] Fila {i} datos brutos: {fila}"
                     )
 
-                    imagenes_result = get_images_for_template(fila)
+                    imagenes_result = get_images_for_template(fila, url_map)
                     current_app.logger.info(
                         f"[DEBUG_IMAGENES_RESULT] Fila {i} resultado: {imagenes_result}"
                     )
@@ -688,9 +675,6 @@ def view(catalog_id, catalog):
                         f"[DEBUG_CATALOGS_VIEW] Fila {i} ({nombre_fila}): {len(fila['_imagenes'])} imágenes → {fila['_imagenes']}"
                     )
 
-            # Asegurar que ambos arrays están sincronizados
-            # El template usa 'rows', así que sincronizamos desde 'data' procesado
-            catalog["rows"] = filas_a_procesar
             catalog["data"] = filas_a_procesar
         except ImportError:
             current_app.logger.warning(
@@ -783,13 +767,29 @@ def view(catalog_id, catalog):
                 "[CATALOGS_VIEW] Renderizando template catalogos/view.html"
             )
             return render_template(
-                "catalogos/view.html", catalog=catalog, session=session
+                "catalogos/view.html",
+                catalog=catalog,
+                session=session,
+                pagination=pagination,
+                pagination_args=row_query_args,
+                row_offset=row_offset,
+                row_sort=row_sort,
+                row_search=row_search,
             )
         else:
             current_app.logger.info(
                 "[CATALOGS_VIEW] Renderizando template ver_tabla.html"
             )
-            return render_template("ver_tabla.html", table=catalog, session=session)
+            return render_template(
+                "ver_tabla.html",
+                table=catalog,
+                session=session,
+                pagination=pagination,
+                pagination_args=row_query_args,
+                row_offset=row_offset,
+                row_sort=row_sort,
+                row_search=row_search,
+            )
     except Exception as e:
         current_app.logger.error(
             f"Error al visualizar catálogo: {str(e)}", exc_info=True
@@ -798,6 +798,179 @@ def view(catalog_id, catalog):
         return redirect(url_for("catalogs.list"))
 
 
+@catalogs_bp.route("/<catalog_id>/search")
+@check_catalog_permission(load_rows=False)
+def search_rows(catalog_id, catalog):
+    """Buscar en las filas de un catálogo.
+
+    Muestra las filas que coinciden con ``q`` ordenadas por relevancia y con
+    las coincidencias resaltadas; cada resultado enlaza con la página de la
+    vista del catálogo que contiene la fila.
+
+    Args:
+        catalog_id (str): ID del catálogo
+        catalog (dict): Metadatos del catálogo obtenidos por el decorador
+
+    Returns:
+        str: Template HTML con las filas encontradas
+    """
+    query = request.args.get("q", "").strip()
+    results = []
+    if query:
+        try:
+            collection = get_mongo_db()["spreadsheets"]
+            results = search_catalog_rows(collection, catalog, query)
+        except Exception as e:
+            current_app.logger.error(
+                f"Error al buscar en el catálogo {catalog_id}: {str(e)}", exc_info=True
+            )
+            flash(f"Error al buscar en el catálogo: {str(e)}", "danger")
+
+    # Página de la vista paginada en la que está cada fila
+    per_page = current_app.config.get("CATALOG_VIEW_PER_PAGE", 50)
+    for result in results:
+        result["page"] = result["index"] // per_page + 1
+    catalog["_id_str"] = str(catalog["_id"])
+    catalog["headers"] = catalog.get("headers") or []
+    return render_template(
+        "catalogos/search_rows.html",
+        catalog=catalog,
+        query=query,
+        results=results,
+        per_page=per_page,
+    )
+
+
+@catalogs_bp.route("/<catalog_id>/rows")
+@check_catalog_permission(load_rows=False)
+def rows_api(catalog_id, catalog):
+    """Filas de un catálogo en JSON, filtradas, ordenadas y paginadas en MongoDB.
+
+    Parámetros: ``filter[<columna>]``, ``q``, ``sort`` (repetible, ``-`` para
+    descendente), ``page`` y ``per_page`` (ver
+    catalog_utils.parse_row_query_args). Solo se leen de la base de datos las
+    filas de la página solicitada.
+
+    Args:
+        catalog_id (str): ID del catálogo
+        catalog (dict): Metadatos del catálogo obtenidos por el decorador
+
+    Returns:
+        Response: JSON con las filas (posición y datos) y la paginación
+    """
+    headers = catalog.get("headers") or []
+    filters, row_sort, row_search = parse_row_query_args(request.args, headers)
+    per_page = current_app.config.get("CATALOG_VIEW_PER_PAGE", 50)
+    page, per_page = parse_pagination_args(request.args, default_per_page=per_page) or (
+        max(1, request.args.get("page", 1, type=int) or 1),
+        per_page,
+    )
+    try:
+        collection = get_mongo_db()["spreadsheets"]
+        rows, total = query_catalog_rows(
+            collection,
+            catalog,
+            filters,
+            row_sort,
+            row_search,
+            (page - 1) * per_page,
+            per_page,
+        )
+    except Exception as e:
+        current_app.logger.error(
+            f"Error al consultar filas del catálogo {catalog_id}: {str(e)}",
+            exc_info=True,
+        )
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    pagination = build_pagination(page, per_page, total)
+    data = []
+    for offset, row in enumerate(rows):
+        if not isinstance(row, dict):
+            row = {}
+        data.append(
+            {
+                "index": row.get(ROW_INDEX_FIELD, pagination["offset"] + offset),
+                "id": row.get(ROW_ID_FIELD),
+                "data": {
+                    key: _json_cell(value)
+                    for key, value in row.items()
+                    if not key.startswith("_")
+                },
+            }
+        )
+    return jsonify(
+        {
+            "status": "success",
+            "data": {
+                "rows": data,
+                "total": total,
+                "page": page,
+                "per_page": per_page,
+                "total_pages": pagination["total_pages"],
+            },
+        }
+    )
+
+
+def _json_cell(value):
+    """Valor de una celda serializable en JSON (NaN de pandas como null)"""
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, list):
+        return [_json_cell(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _json_cell(item) for key, item in value.items()}
+    return str(value)
+
+
+@catalogs_bp.route("/<catalog_id>/export/<export_format>")
+@check_catalog_permission(load_rows=False)
+def export(catalog_id, catalog, export_format):
+    """Descargar las filas de un catálogo en CSV, JSON, NDJSON o XLSX.
+
+    Las filas se leen por lotes y la respuesta se envía por fragmentos (ver
+    app/utils/catalog_export.py), sin cargar el catálogo entero en memoria.
+
+    Args:
+        catalog_id (str): ID del catálogo
+        catalog (dict): Metadatos del catálogo obtenidos por el decorador
+        export_format (str): csv, json, ndjson o xlsx
+
+    Returns:
+        Response: Archivo en flujo como descarga
+    """
+    if export_format not in EXPORT_FORMATS:
+        flash("Formato de exportación no soportado.", "warning")
+        return redirect(url_for("catalogs.view", catalog_id=catalog_id))
+    collection = get_mongo_db()["spreadsheets"]
+    headers = catalog.get("headers") or []
+    rows = (
+        {key: value for key, value in row.items() if not key.startswith("_")}
+        for row in iter_catalog_rows(
+            collection,
+            catalog,
+            current_app.config.get("CATALOG_EXPORT_BATCH_SIZE", 500),
+        )
+    )
+    try:
+        chunks = iter_export(export_format, headers, rows, catalog.get("name", ""))
+    except Exception as e:
+        current_app.logger.error(
+            f"Error al exportar el catálogo {catalog_id}: {str(e)}", exc_info=True
+        )
+        flash(f"Error al exportar el catálogo: {str(e)}", "danger")
+        return redirect(url_for("catalogs.view", catalog_id=catalog_id))
+    filename = export_filename(catalog.get("name"), export_format)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format][0],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
 @catalogs_bp.route("/<catalog_id>/edit", methods=["GET", "POST"])
 @check_catalog_permission
 def edit(catalog_id, catalog):
@@ -899,12 +1072,14 @@ def edit(catalog_id, catalog):
                         {
                             "$set": {
                                 "name": new_name,
+                                SEARCH_KEYS_FIELD: name_search_keys(new_name),
                                 "headers": new_headers,
                                 "miniatura": nueva_miniatura if nueva_miniatura else "",
                                 "updated_at": datetime.utcnow(),
                             }
                         },
                     )
+                    invalidate_catalog_cache(catalog_id)
 
                     if result.matched_count > 0:
                         current_app.logger.info(
@@ -939,7 +1114,7 @@ def edit(catalog_id, catalog):
 
 
 @catalogs_bp.route("/edit-row/<catalog_id>/<int:row_index>", methods=["GET", "POST"])
-@check_catalog_permission
+@check_catalog_permission(load_rows=False)
 def edit_row(catalog_id, row_index, catalog):
     """Editar una fila específica de un catálogo.
     
@@ -957,10 +1132,9 @@ def edit_row(catalog_id, row_index, catalog):
         flash("Error de conexión a la base de datos.", "danger")
         current_app.logger.error("[edit_row] Error de conexión a la base de datos.")
         return redirect(url_for("catalogs.view", catalog_id=catalog_id))
-    # Obtener datos de la fila desde 'data' que contiene las imágenes reales
-    # NO usar 'rows' porque puede estar desactualizado
-    catalog_data = catalog.get("data", catalog.get("rows", []))
-    row_data = catalog_data[row_index] if 0 <= row_index < len(catalog_data) else None
+    # Obtener solo la fila solicitada ('data' contiene las imágenes reales)
+    collection = get_mongo_db()["spreadsheets"]
+    row_data = get_catalog_row(collection, catalog, row_index)
     if not row_data:
         flash("Fila no encontrada.", "danger")
         current_app.logger.error(f"[edit_row] Fila no encontrada en índice {row_index}")
@@ -1162,30 +1336,30 @@ def edit_row(catalog_id, row_index, catalog):
             ]
         # Si no hay imágenes nuevas ni a eliminar, conservar las existentes
         if "images" not in row_data:
-            row_data["images"] = catalog_data[row_index].get("images", [])
-        # Guardar cambios en ambas claves
-        for coll_name in ["spreadsheets"]:
-            try:
-                db = get_mongo_db()
-                if db is None:
-                    continue
-                result = db[coll_name].update_one(
-                    {"_id": catalog["_id"]},
-                    {
-                        "$set": {
-                            f"rows.{row_index}": row_data,
-                            f"data.{row_index}": row_data,
-                        }
-                    },
-                )
-                if result.matched_count > 0:
-                    flash("Fila actualizada correctamente", "success")
-                    break
-            except Exception as e:
-                current_app.logger.error(
-                    f"[edit_row] Error al actualizar fila: {str(e)}"
-                )
-                flash(f"Error al actualizar fila: {str(e)}", "danger")
+            row_data["images"] = []
+        # Guardar la fila a través de la capa de datos del catálogo
+        try:
+            if update_catalog_row(
+                collection,
+                catalog,
+                row_index,
+                row_data,
+                expected_version=parse_expected_version(request.form),
+            ):
+                flash("Fila actualizada correctamente", "success")
+            else:
+                flash("Fila no encontrada.", "danger")
+        except CatalogVersionConflictError:
+            current_app.logger.warning(
+                f"[edit_row] Conflicto de versión en catálogo {catalog_id}, fila {row_index}"
+            )
+            flash(
+                "El catálogo ha sido modificado por otro usuario. Revisa los cambios y vuelve a editar la fila.",
+                "warning",
+            )
+        except Exception as e:
+            current_app.logger.error(f"[edit_row] Error al actualizar fila: {str(e)}")
+            flash(f"Error al actualizar fila: {str(e)}", "danger")
         current_app.logger.info(f"[EDIT_ROW] Redirigiendo a catálogo {catalog['_id']}")
         redirect_url = url_for("catalogs.view", catalog_id=str(catalog["_id"]))
         current_app.logger.info(f"[EDIT_ROW] URL de redirección: {redirect_url}")
@@ -1276,7 +1450,7 @@ def edit_row(catalog_id, row_index, catalog):
 
 
 @catalogs_bp.route("/add-row/<catalog_id>", methods=["GET", "POST"])
-@check_catalog_permission
+@check_catalog_permission(load_rows=False)
 def add_row(catalog_id, catalog):
     """Agregar una nueva fila a un catálogo.
     
@@ -1400,28 +1574,14 @@ def add_row(catalog_id, catalog):
                         file_path = os.path.join(upload_dir, filename)
                         file.save(file_path)
                         row["images"].append(filename)
-            # Agregar la fila a ambas claves
-            for collection_name in ["spreadsheets"]:
-                try:
-                    db = get_mongo_db()
-                    if db is None:
-                        continue
-                    collection = db[collection_name]
-                    result = collection.update_one(
-                        {"_id": ObjectId(catalog_id)},
-                        {
-                            "$push": {"rows": row, "data": row},
-                            "$set": {"updated_at": datetime.utcnow()},
-                        },
-                    )
-                    if result.matched_count > 0:
-                        flash("Fila agregada correctamente", "success")
-                        break
-                except Exception as e:
-                    current_app.logger.error(
-                        f"[add_row] Error al agregar fila: {str(e)}"
-                    )
-                    flash(f"Error al agregar fila: {str(e)}", "danger")
+            # Agregar la fila a través de la capa de datos del catálogo
+            try:
+                collection = get_mongo_db()["spreadsheets"]
+                if append_catalog_row(collection, catalog, row):
+                    flash("Fila agregada correctamente", "success")
+            except Exception as e:
+                current_app.logger.error(f"[add_row] Error al agregar fila: {str(e)}")
+                flash(f"Error al agregar fila: {str(e)}", "danger")
             return redirect(url_for("catalogs.view", catalog_id=catalog_id))
         except Exception as e:
             current_app.logger.error(
@@ -1433,7 +1593,7 @@ def add_row(catalog_id, catalog):
 
 
 @catalogs_bp.route("/delete-row/<catalog_id>/<int:row_index>", methods=["POST"])
-@check_catalog_permission
+@check_catalog_permission(load_rows=False)
 def delete_row(catalog_id, row_index, catalog):
     """Eliminar una fila específica de un catálogo.
     
@@ -1450,44 +1610,44 @@ def delete_row(catalog_id, row_index, catalog):
         current_app.logger.error("[delete_row] Error de conexión a la base de datos.")
         return redirect(url_for("catalogs.view", catalog_id=catalog_id))
     try:
-        # Refuerzo: recargar el catálogo desde la base de datos para evitar
-        # inconsistencias
         db = get_mongo_db()
         if db is None:
             flash("Error de conexión a la base de datos.", "danger")
             return redirect(url_for("catalogs.view", catalog_id=catalog_id))
-        db_catalog = db["spreadsheets"].find_one({"_id": ObjectId(catalog_id)})
-        if not db_catalog:
-            flash("Catálogo no encontrado.", "danger")
-            current_app.logger.error(
-                f"[delete_row] Catálogo {catalog_id} no encontrado en BD."
-            )
-            return redirect(url_for("catalogs.view", catalog_id=catalog_id))
-        current_rows = db_catalog.get("rows", [])
+        collection = db["spreadsheets"]
+        total_rows = get_catalog_row_count(collection, catalog)
         current_app.logger.info(
-            f"[delete_row] Estado de filas antes de eliminar: {len(current_rows)} filas."
+            f"[delete_row] Estado de filas antes de eliminar: {total_rows} filas."
         )
-        if row_index < 0 or row_index >= len(current_rows):
+        if row_index < 0 or row_index >= total_rows:
             flash(f"Índice de fila inválido: {row_index}.", "danger")
             current_app.logger.error(
                 f"[delete_row] Índice de fila inválido: {row_index}"
             )
             return redirect(url_for("catalogs.view", catalog_id=catalog_id))
-        current_rows.pop(row_index)
-        result = db["spreadsheets"].update_one(
-            {"_id": ObjectId(catalog_id)},
-            {"$set": {"rows": current_rows, "data": current_rows}},
-        )
-        current_app.logger.info(
-            f"[delete_row] Estado de filas después de eliminar: {len(current_rows)} filas. Modificados: {result.modified_count}"
-        )
-        if result.matched_count > 0 and result.modified_count > 0:
+        if delete_catalog_row(
+            collection,
+            catalog,
+            row_index,
+            expected_version=parse_expected_version(request.form),
+        ):
+            current_app.logger.info(
+                f"[delete_row] Estado de filas después de eliminar: {total_rows - 1} filas."
+            )
             flash("Fila eliminada correctamente", "success")
         else:
             flash(
                 "No se pudo eliminar la fila. Puede que ya haya sido eliminada o que no existiera.",
                 "warning",
             )
+    except CatalogVersionConflictError:
+        current_app.logger.warning(
+            f"[delete_row] Conflicto de versión en catálogo {catalog_id}, fila {row_index}"
+        )
+        flash(
+            "El catálogo ha sido modificado por otro usuario. No se ha eliminado ninguna fila.",
+            "warning",
+        )
     except Exception as e:
         current_app.logger.error(f"[delete_row] Error general: {str(e)}")
         flash(f"Error al eliminar fila: {str(e)}", "danger")
@@ -1495,7 +1655,7 @@ def delete_row(catalog_id, row_index, catalog):
 
 
 @catalogs_bp.route("/delete/<catalog_id>", methods=["GET", "POST"])
-@check_catalog_permission
+@check_catalog_permission(load_rows=False)
 def delete_catalog(catalog_id, catalog):
     """Eliminar completamente un catálogo y todos sus datos.
     
@@ -1552,6 +1712,9 @@ def delete_catalog(catalog_id, catalog):
         )
 
         if result.deleted_count > 0:
+            invalidate_catalog_cache(catalog_id)
+            # Eliminar también las filas guardadas en catalog_rows
+            delete_catalog_rows(db.spreadsheets, catalog_id)
             current_app.logger.info(
                 f"Catálogo '{catalog_name}' (ID: {catalog_id}) eliminado por {session.get('username')}"
             )
@@ -1626,14 +1789,17 @@ def create():
             # Crear el catálogo en la base de datos
             catalog = {
                 "name": catalog_name,
+                SEARCH_KEYS_FIELD: name_search_keys(catalog_name),
                 "headers": headers,
-                "rows": [],
-                "data": [],  # Sincronizado con rows; data es la fuente de verdad para imágenes
+                "data": [],  # Único array de filas del catálogo
+                "num_rows": 0,  # Contador de filas mantenido en cada escritura
                 "miniatura": "",  # Requerido por catalogs.html; vacío hasta que haya imágenes
+                THUMBNAIL_FIELD: "",  # Primera imagen de las filas (se mantiene al escribirlas)
                 "created_by": username,
                 "owner": username,  # Campo adicional para compatibilidad
                 "owner_name": nombre,  # Guardar el nombre real del usuario
                 "email": email,  # Guardar el email para referencias
+                **owner_fields(session.get("user_id")),
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow(),
             }
@@ -1645,6 +1811,7 @@ def create():
 
             result = db.spreadsheets.insert_one(catalog)
             catalog_id = str(result.inserted_id)
+            invalidate_catalog_cache(user_id=session.get("user_id"))
 
             current_app.logger.info(
                 f"Catálogo creado con ID: {catalog_id}, nombre: {catalog_name}, creado por: {nombre}"
@@ -1710,7 +1877,10 @@ def import_catalog():
             return redirect(request.url)
 
         # Verificar el formato del archivo
-        if not file.filename or not file.filename.endswith((".csv", ".xls", ".xlsx")):
+        if (
+            not file.filename
+            or os.path.splitext(file.filename)[1].lower() not in IMPORT_EXTENSIONS
+        ):
             flash("Formato de archivo no soportado. Use CSV o Excel.", "danger")
             return redirect(request.url)
 
@@ -1736,65 +1906,57 @@ def import_catalog():
                 f"Importando catálogo con usuario: {username}, email: {email}, nombre: {nombre}"
             )
 
-            # Verificar que pandas esté disponible
-            if not pandas_available:
-                flash(
-                    "Funcionalidad de importación de archivos no disponible. pandas no está instalado.",
-                    "danger",
-                )
-                return redirect(request.url)
-
-            # Procesar el archivo según su formato
-            if file.filename and file.filename.endswith(".csv"):
-                # Procesar CSV - usar el stream del archivo
-                df = pd.read_csv(file.stream, encoding="utf-8")
-            else:
-                # Procesar Excel - usar el stream del archivo
-                df = pd.read_excel(file.stream)
-
-            # Verificar que el archivo tiene datos
-            if df.empty:
-                flash("El archivo está vacío", "danger")
+            db = get_mongo_db()
+            if db is None:
+                flash("Error de conexión a la base de datos.", "danger")
                 return redirect(request.url)
 
-            # Convertir DataFrame a lista de diccionarios
-            headers = df.columns.tolist()
-            rows = df.to_dict("records")
-
-            # Crear el catálogo en la base de datos
-            catalog = {
+            # Guardar el archivo y procesarlo en segundo plano (ver
+            # app/utils/job_tasks.py): la petición no espera a la importación
+            jobs_dir = current_app.config.get("JOB_FILES_DIR")
+            os.makedirs(jobs_dir, exist_ok=True)
+            upload_path = os.path.join(
+                jobs_dir, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+            )
+            file.save(upload_path)
+            catalog_fields = {
                 "name": catalog_name,
-                "headers": headers,
-                "rows": rows,
+                SEARCH_KEYS_FIELD: name_search_keys(catalog_name),
                 "created_by": username,
                 "owner": username,  # Refuerzo: asignar siempre el username
                 "owner_name": nombre,
                 "email": email,
+                **owner_fields(session.get("user_id")),
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow(),
             }
+            try:
+                job_id = submit_job(
+                    db,
+                    "catalog_import",
+                    {
+                        "path": upload_path,
+                        "filename": file.filename,
+                        "catalog_fields": catalog_fields,
+                        "batch_size": current_app.config.get(
+                            "CATALOG_IMPORT_BATCH_SIZE", 1000
+                        ),
+                    },
+                    user_id=session.get("user_id"),
+                    username=username,
+                )
+            except Exception:
+                os.remove(upload_path)
+                raise
 
-            db = get_mongo_db()
-            if db is None:
-                flash("Error de conexión a la base de datos.", "danger")
-                return redirect(request.url)
-
-            result = db.spreadsheets.insert_one(catalog)
-            catalog_id = str(result.inserted_id)
-
-            # Refuerzo: actualizar el campo owner si por alguna razón no se guardó
-            _ = db.spreadsheets.update_one(
-                {"_id": result.inserted_id}, {"$set": {"owner": username}}
-            )
             current_app.logger.info(
-                f"[REFUERZO][IMPORT] Propietario del catálogo {catalog_id} forzado a: {username}"
+                f"Importación del catálogo '{catalog_name}' encolada como trabajo {job_id}"
             )
-
-            current_app.logger.info(
-                f"Catálogo importado con ID: {catalog_id}, nombre: {catalog_name}, creado por: {nombre}"
+            flash(
+                f'Importando el catálogo "{catalog_name}". Puede seguir el progreso en esta página.',
+                "info",
             )
-            flash(f'Catálogo "{catalog_name}" importado correctamente', "success")
-            return redirect(url_for("catalogs.view", catalog_id=catalog_id))
+            return redirect(url_for("jobs.view", job_id=job_id))
 
         except Exception as e:
             current_app.logger.error(
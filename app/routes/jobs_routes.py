@@ -0,0 +1,93 @@
+# app/routes/jobs_routes.py
+"""
+Rutas para consultar y cancelar los trabajos en segundo plano.
+
+Las operaciones largas (importar catálogos, backups, subidas a Google Drive)
+se registran como trabajos (ver app/utils/job_queue.py) y la petición
+responde enseguida con el ID. Estas rutas permiten:
+- Consultar el estado y el progreso de un trabajo (JSON o página HTML)
+- Listar los trabajos del usuario (todos para los administradores)
+- Cancelar un trabajo en cola o en ejecución
+
+Cada usuario solo ve sus trabajos; los administradores ven todos.
+"""
+
+import logging
+
+from flask import Blueprint, abort, jsonify, render_template, session
+
+from app.database import get_mongo_db
+from app.decorators import login_required
+from app.utils.job_queue import (
+    cancel_job,
+    get_job,
+    list_jobs,
+    serialize_job,
+)
+
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+def _is_admin():
+    return session.get("role") == "admin"
+
+
+def _get_visible_job(job_id):
+    """Trabajo si existe y el usuario puede verlo; si no, 404"""
+    db = get_mongo_db()
+    if db is None:
+        abort(503)
+    job = get_job(db, job_id)
+    if job is None:
+        abort(404)
+    if not _is_admin() and job.get("user_id") != str(session.get("user_id")):
+        abort(404)
+    return db, job
+
+
+@jobs_bp.route("/")
+@login_required
+def list_user_jobs():
+    """Trabajos más recientes del usuario (todos para administradores)"""
+    db = get_mongo_db()
+    if db is None:
+        return (
+            jsonify({"status": "error", "message": "Base de datos no disponible"}),
+            503,
+        )
+    jobs = list_jobs(db, user_id=None if _is_admin() else session.get("user_id"))
+    return jsonify({"status": "success", "data": [serialize_job(job) for job in jobs]})
+
+
+@jobs_bp.route("/<job_id>")
+@login_required
+def job_status(job_id):
+    """Estado y progreso de un trabajo en JSON"""
+    _, job = _get_visible_job(job_id)
+    return jsonify({"status": "success", "data": serialize_job(job)})
+
+
+@jobs_bp.route("/<job_id>/cancel", methods=["POST"])
+@login_required
+def cancel(job_id):
+    """Cancela un trabajo en cola o pide que termine uno en ejecución"""
+    db, job = _get_visible_job(job_id)
+    if not cancel_job(db, job["_id"]):
+        return (
+            jsonify({"status": "error", "message": "El trabajo ya ha terminado"}),
+            409,
+        )
+    logger.info(
+        f"Cancelación del trabajo {job_id} pedida por {session.get('username')}"
+    )
+    return jsonify({"status": "success", "data": serialize_job(get_job(db, job_id))})
+
+
+@jobs_bp.route("/<job_id>/view")
+@login_required
+def view(job_id):
+    """Página que muestra el progreso del trabajo y enlaza al resultado"""
+    _, job = _get_visible_job(job_id)
+    return render_template("jobs/status.html", job=serialize_job(job))
@@ -1,17 +1,14 @@
 # app/routes/main_routes.py
 
-import csv
 import logging
 import os
 import secrets
 import uuid
 from datetime import datetime
 
-import openpyxl
 from bson.objectid import ObjectId
 from flask import (
     Blueprint,
-    Response,
     current_app,
     flash,
     g,
@@ -26,9 +23,45 @@ from werkzeug.routing import BuildError
 from werkzeug.utils import secure_filename
 
 from app import notifications
-from app.database import get_mongo_db
+from app.database import (
+    get_mongo_db,
+    invalidate_catalog_cache,
+    invalidate_user_cache,
+)
 from app.decorators import login_required
-from app.utils.image_utils import get_images_for_template
+from app.exceptions import CatalogImportError, CatalogVersionConflictError
+from app.utils.catalog_import import (
+    IMPORT_EXTENSIONS,
+    import_catalog_rows,
+    read_import_file,
+)
+from app.utils.catalog_search import SEARCH_KEYS_FIELD, name_search_keys
+from app.utils.catalog_utils import (
+    CATALOG_METADATA_PROJECTION,
+    THUMBNAIL_FIELD,
+    append_catalog_row,
+    build_pagination,
+    count_catalogs,
+    delete_catalog_row,
+    delete_catalog_rows,
+    find_catalog_summaries,
+    get_catalog_row,
+    get_catalog_row_count,
+    get_catalog_rows,
+    load_catalog_rows,
+    owner_fields,
+    owner_query,
+    parse_expected_version,
+    parse_pagination_args,
+    replace_catalog_rows,
+    resolve_row_window,
+    update_catalog_row_fields,
+)
+from app.utils.image_utils import (
+    get_catalog_thumbnail_url,
+    get_images_for_template,
+    resolve_row_image_urls,
+)
 
 
 def get_upload_dir():
@@ -181,10 +214,6 @@ def dashboard_user():
             # Continuar normal si hay error, no bloquear el acceso
     # Acceso solo a datos propios
     username = session.get("username")
-    email = session.get("email")
-    nombre = session.get("nombre", username)
-    posibles = set([username, email, nombre])
-    posibles = {v for v in posibles if v}
     db = get_mongo_db()
     if db is None:
         flash(
@@ -198,26 +227,57 @@ def dashboard_user():
     try:
         tablas = []
         catalogos = []
-        # Unificar criterio: buscar por todos los campos posibles
-        query = {"$or": []}
-        for val in posibles:
-            query["$or"].extend(
-                [
-                    {"created_by": val},
-                    {"owner": val},
-                    {"owner_name": val},
-                    {"email": val},
-                    {"username": val},
-                    {"name": val},
-                ]
-            )
+        # Catálogos propios: igualdad sobre 'owner_id' (índice owner_id_created_at)
+        # y, en los antiguos sin 'owner_id', los campos históricos
+        query = owner_query(
+            user_id, (username, session.get("email"), session.get("nombre"))
+        ) or {"created_by": username}
+        # Solo los campos del listado, ordenados y paginados en MongoDB: primero
+        # las tablas (spreadsheets) y después los catálogos antiguos (catalogs)
+        per_page = current_app.config.get("CATALOG_LIST_PER_PAGE", 24)
+        requested = parse_pagination_args(request.args, default_per_page=per_page)
+        page, per_page = requested or (
+            max(1, request.args.get("page", 1, type=int) or 1),
+            per_page,
+        )
         try:
-            tablas = list(g.spreadsheets_collection.find(query).sort("created_at", -1))
+            total_tablas = count_catalogs(g.spreadsheets_collection, query)
+        except Exception as e:
+            print(f"[ERROR] Consulta a spreadsheets falló: {e}")
+            total_tablas = 0
+        try:
+            total_catalogos = count_catalogs(g.catalogs_collection, query)
+        except Exception as e:
+            print(f"[ERROR] Consulta a catalogs falló: {e}")
+            total_catalogos = 0
+        pagination = build_pagination(page, per_page, total_tablas + total_catalogos)
+        inicio = pagination["offset"]
+        fin = inicio + pagination["per_page"]
+        try:
+            tablas = (
+                find_catalog_summaries(
+                    g.spreadsheets_collection,
+                    query,
+                    skip=inicio,
+                    limit=min(fin, total_tablas) - inicio,
+                )
+                if inicio < total_tablas
+                else []
+            )
         except Exception as e:
             print(f"[ERROR] Consulta a spreadsheets falló: {e}")
             tablas = []
         try:
-            catalogos = list(g.catalogs_collection.find(query).sort("created_at", -1))
+            catalogos = (
+                find_catalog_summaries(
+                    g.catalogs_collection,
+                    query,
+                    skip=max(0, inicio - total_tablas),
+                    limit=fin - max(inicio, total_tablas),
+                )
+                if fin > total_tablas
+                else []
+            )
         except Exception as e:
             print(f"[ERROR] Consulta a catalogs falló: {e}")
             catalogos = []
@@ -239,15 +299,6 @@ def dashboard_user():
                 f"[DEBUG_TABLA_INDIVIDUAL] Procesando tabla: {t.get('name', 'Sin nombre')}"
             )
             t["tipo"] = "spreadsheet"
-            # Unificación: sincronizar 'rows' y 'data'
-            if "rows" in t and t["rows"] is not None:
-                t["data"] = t["rows"]
-            elif "data" in t and t["data"] is not None:
-                t["rows"] = t["data"]
-            else:
-                t["data"] = []
-                t["rows"] = []
-            t["row_count"] = len(t["rows"])
             t["_id"] = safe_str(t.get("_id"))
             t["created_at"] = safe_str(t.get("created_at"))
             t["owner"] = (
@@ -260,101 +311,10 @@ def dashboard_user():
                 or ""
             )
             t["name"] = t.get("name", "")
-            # 🖼️ Miniatura: priorizar miniatura personalizada, luego buscar automáticamente
-            current_app.logger.info(
-                f"[DEBUG_MINIATURA] Procesando tabla: {t.get('name', 'Sin nombre')}"
-            )
-
-            # 1. Verificar si tiene miniatura personalizada configurada
-            if t.get("miniatura") and t["miniatura"].strip():
-                current_app.logger.info(
-                    f"[MINIATURA_CUSTOM] Usando miniatura personalizada: {t['miniatura']}"
-                )
-                # Ya está configurada, no hacer nada más
-                continue
-
-            # 2. Si no tiene miniatura personalizada, buscar automáticamente
-            t["miniatura"] = ""
-
-            # Buscar en todas las filas hasta encontrar una imagen
-            for row in t.get("data", []):
-                if not isinstance(row, dict):
-                    continue
-
-                imagen_encontrada = None
-
-                # 1. Verificar campo "Imagen" (URLs externas como Unsplash)
-                if (
-                    row.get("Imagen")
-                    and isinstance(row["Imagen"], str)
-                    and row["Imagen"].startswith("http")
-                ):
-                    imagen_encontrada = row["Imagen"]
-
-                # 2. Si no hay imagen externa, buscar en campos de imágenes locales
-                if not imagen_encontrada:
-                    # Verificar campos de imágenes locales
-                    for campo in ["imagenes", "images", "imagen_data"]:
-                        if campo in row and row[campo]:
-                            imgs = (
-                                row[campo]
-                                if isinstance(row[campo], list)
-                                else [row[campo]]
-                            )
-                            for img in imgs:
-                                if (
-                                    img
-                                    and img != "N/A"
-                                    and isinstance(img, str)
-                                    and not img.startswith("http")
-                                ):
-                                    # Verificar si S3 está habilitado
-                                    use_s3 = (
-                                        os.environ.get("USE_S3", "false").lower()
-                                        == "true"
-                                    )
-                                    if use_s3:
-                                        from app.utils.s3_utils import get_s3_url
-
-                                        s3_url = get_s3_url(img)
-                                        if s3_url:
-                                            imagen_encontrada = s3_url
-                                        else:
-                                            imagen_encontrada = url_for(
-                                                "static", filename=f"uploads/{img}"
-                                            )
-                                    else:
-                                        imagen_encontrada = url_for(
-                                            "static", filename=f"uploads/{img}"
-                                        )
-                                    break
-                        if imagen_encontrada:
-                            break
-
-                # Si encontramos una imagen, salir del bucle
-                if imagen_encontrada:
-                    t["miniatura"] = imagen_encontrada
-                    current_app.logger.info(
-                        f"[MINIATURA] Encontrada para tabla {t.get('name', 'Sin nombre')}: {imagen_encontrada}"
-                    )
-                    break
-
-            # Si no se encontró ninguna imagen, dejar vacío (se mostrará "—")
-            if not t["miniatura"]:
-                current_app.logger.info(
-                    f"[MINIATURA] No se encontró imagen para tabla {t.get('name', 'Sin nombre')}"
-                )
+            # 🖼️ Miniatura personalizada o precalculada al escribir las filas
+            t["miniatura"] = get_catalog_thumbnail_url(t)
         for c in catalogos:
             c["tipo"] = "catalog"
-            # Unificación: sincronizar 'rows' y 'data'
-            if "rows" in c and c["rows"] is not None:
-                c["data"] = c["rows"]
-            elif "data" in c and c["data"] is not None:
-                c["rows"] = c["data"]
-            else:
-                c["data"] = []
-                c["rows"] = []
-            c["row_count"] = len(c["rows"])
             c["_id"] = safe_str(c.get("_id"))
             c["created_at"] = safe_str(c.get("created_at"))
             c["owner"] = (
@@ -367,51 +327,8 @@ def dashboard_user():
                 or ""
             )
             c["name"] = c.get("name", "")
-            # Miniatura: primera imagen de la primera fila
-            c["miniatura"] = ""
-            if c["data"] and isinstance(c["data"][0], dict):
-                row = c["data"][0]
-                imagenes = []
-                if "imagenes" in row and row["imagenes"]:
-                    imagenes = (
-                        row["imagenes"]
-                        if isinstance(row["imagenes"], list)
-                        else [row["imagenes"]]
-                    )
-                elif "images" in row and row["images"]:
-                    imagenes = (
-                        row["images"]
-                        if isinstance(row["images"], list)
-                        else [row["images"]]
-                    )
-                elif "imagen" in row and row["imagen"]:
-                    imagenes = (
-                        row["imagen"]
-                        if isinstance(row["imagen"], list)
-                        else [row["imagen"]]
-                    )
-                if imagenes:
-                    img = imagenes[0]
-                    if isinstance(img, str) and img.startswith("http"):
-                        c["miniatura"] = img
-                    else:
-                        # Verificar si S3 está habilitado
-                        use_s3 = os.environ.get("USE_S3", "false").lower() == "true"
-                        if use_s3:
-                            from app.utils.s3_utils import get_s3_url
-
-                            s3_url = get_s3_url(img)
-                            if s3_url:
-                                c["miniatura"] = s3_url
-                            else:
-                                c["miniatura"] = url_for(
-                                    "static", filename=f"uploads/{img}"
-                                )
-                        else:
-                            # Usar URL local directamente
-                            c["miniatura"] = url_for(
-                                "static", filename=f"uploads/{img}"
-                            )
+            # Miniatura personalizada o precalculada al escribir las filas
+            c["miniatura"] = get_catalog_thumbnail_url(c)
         registros = tablas + catalogos
         current_app.logger.info(
             f"[DEBUG_REGISTROS] Total registros a enviar al template: {len(registros)}"
@@ -424,7 +341,12 @@ def dashboard_user():
         if not registros:
             flash("No tienes catálogos ni tablas asociados a tu usuario.", "info")
             return render_template("dashboard_unificado.html", registros=[])
-        return render_template("dashboard_unificado.html", registros=registros)
+        return render_template(
+            "dashboard_unificado.html",
+            registros=registros,
+            pagination=pagination,
+            pagination_label="registros",
+        )
     except Exception as e:
         print(f"[ERROR][DASHBOARD_USER] {e}")
         flash("Error al cargar tus catálogos/tablas.", "error")
@@ -475,6 +397,7 @@ def editar(id):
         update = {}
         if nuevo_nombre:
             update["name"] = nuevo_nombre
+            update[SEARCH_KEYS_FIELD] = name_search_keys(nuevo_nombre)
         if nuevos_headers:
             update["headers"] = nuevos_headers
         if update:
@@ -494,7 +417,13 @@ def editar(id):
 @login_required
 def ver_tabla(table_id):
     try:
-        table = g.spreadsheets_collection.find_one({"_id": ObjectId(table_id)})
+        # Solo metadatos: las filas se cargan por ventanas tras validar permisos
+        table = g.spreadsheets_collection.find_one(
+            {"_id": ObjectId(table_id)}, CATALOG_METADATA_PROJECTION
+        )
+        if not table:
+            flash("Tabla no encontrada.", "error")
+            return redirect(url_for("main.dashboard_user"))
 
         # Asegurarse de que el propietario esté disponible
         if "owner" not in table and "owner_name" in table:
@@ -511,21 +440,6 @@ def ver_tabla(table_id):
             f"[DEBUG][VISIONADO] Campos de la tabla: {list(table.keys())}"
         )
 
-        # Asegurarse de que los datos estén disponibles
-        if "data" not in table and "rows" in table:
-            table["data"] = table["rows"]
-            current_app.logger.info(
-                f"[DEBUG][VISIONADO] Usando 'rows' como 'data', filas: {len(table['data'])}"
-            )
-        elif "data" not in table:
-            table["data"] = []
-            current_app.logger.info(
-                "[DEBUG][VISIONADO] No se encontraron datos en la tabla"
-            )
-        if not table:
-            flash("Tabla no encontrada.", "error")
-            return redirect(url_for("main.dashboard_user"))
-
         # Log de sesión y permisos
         current_app.logger.info(f"[DEBUG][VISIONADO] Sesión: {dict(session)}")
         current_app.logger.info(
@@ -555,7 +469,13 @@ def ver_tabla(table_id):
             else:
                 # Si no hay información de propietario, asignar al usuario actual
                 g.spreadsheets_collection.update_one(
-                    {"_id": ObjectId(table_id)}, {"$set": {"owner": username}}
+                    {"_id": ObjectId(table_id)},
+                    {
+                        "$set": {
+                            "owner": username,
+                            **owner_fields(session.get("user_id")),
+                        }
+                    },
                 )
                 table["owner"] = username
                 current_app.logger.info(
@@ -573,6 +493,32 @@ def ver_tabla(table_id):
             return redirect(url_for("main.tables"))
 
         # Si llegamos aquí, el usuario tiene permisos para ver la tabla
+        # Cargar solo la ventana de filas visible (paginación en servidor)
+        table["row_count"] = get_catalog_row_count(g.spreadsheets_collection, table)
+        pagination = resolve_row_window(
+            request.args,
+            table["row_count"],
+            current_app.config.get("CATALOG_VIEW_AUTO_PAGINATE_ROWS", 1000),
+            current_app.config.get("CATALOG_VIEW_PER_PAGE", 50),
+        )
+        if pagination:
+            filas = get_catalog_rows(
+                g.spreadsheets_collection,
+                table,
+                pagination["offset"],
+                pagination["per_page"],
+            )
+        else:
+            filas = get_catalog_rows(g.spreadsheets_collection, table)
+        table["data"] = filas
+        current_app.logger.info(
+            f"[DEBUG][VISIONADO] Filas cargadas: {len(filas)} de {table['row_count']}"
+        )
+
+        # Resolver en un solo lote (el cache de existencia S3 caduca por TTL y
+        # se actualiza al subir o eliminar archivos) todas las imágenes de la página
+        url_map = resolve_row_image_urls(table.get("data", []))
+
         # Procesar las imágenes en cada fila usando función unificada
         for i, row in enumerate(table.get("data", [])):
             if not isinstance(row, dict):
@@ -588,13 +534,8 @@ def ver_tabla(table_id):
                 if key.startswith("Documentación_"):
                     current_app.logger.info(f"[DEBUG][VISIONADO] Campo {key}: {value}")
 
-            # Limpiar cache de S3 al cargar la página para evitar imágenes fantasma
-            from app.utils.image_utils import clear_s3_cache
-
-            clear_s3_cache()  # Limpiar todo el cache
-
             # Usar función unificada para obtener URLs de imágenes
-            image_data = get_images_for_template(row)
+            image_data = get_images_for_template(row, url_map)
             row.update(image_data)  # Añade imagen_urls, num_imagenes, tiene_imagenes
 
             current_app.logger.info(
@@ -738,7 +679,12 @@ def ver_tabla(table_id):
                             f"[DEBUG][VISIONADO] Usando URL local para multimedia: {multimedia_value} -> {local_url}"
                         )
 
-        return render_template("ver_tabla.html", table=table)
+        return render_template(
+            "ver_tabla.html",
+            table=table,
+            pagination=pagination,
+            row_offset=pagination["offset"] if pagination else 0,
+        )
     except BuildError as e:
         logger.error(f"BuildError en ver_tabla: {str(e)}", exc_info=True)
         flash("Error interno: ruta no encontrada o mal configurada.", "danger")
@@ -785,7 +731,13 @@ def select_table(table_id):
                 else:
                     # Si no hay información de propietario, asignar al usuario actual
                     g.spreadsheets_collection.update_one(
-                        {"_id": ObjectId(table_id)}, {"$set": {"owner": username}}
+                        {"_id": ObjectId(table_id)},
+                        {
+                            "$set": {
+                                "owner": username,
+                                **owner_fields(session.get("user_id")),
+                            }
+                        },
                     )
                     table["owner"] = username
                     logger.info(
@@ -1025,6 +977,7 @@ def editar_perfil():
         mongo.db.users.update_one(
             {"_id": ObjectId(session["user_id"])}, {"$set": update_data}
         )
+        invalidate_user_cache(session["user_id"])
 
         # Mostrar mensaje específico si se cambió la contraseña
         if "password" in update_data:
@@ -1070,8 +1023,10 @@ def editar_fila(tabla_id, fila_index):
         f"[DEBUG_EDIT] Recargando datos frescos desde MongoDB para tabla {tabla_id}"
     )
 
-    # USAR EXACTAMENTE LA MISMA LÓGICA QUE VER_TABLA
-    table_info = g.spreadsheets_collection.find_one({"_id": ObjectId(tabla_id)})
+    # Cargar solo los metadatos; la fila se lee después a través de catalog_utils
+    table_info = g.spreadsheets_collection.find_one(
+        {"_id": ObjectId(tabla_id)}, CATALOG_METADATA_PROJECTION
+    )
     if not table_info:
         flash("Tabla no encontrada.", "error")
         return redirect(url_for("main.tables"))
@@ -1084,38 +1039,10 @@ def editar_fila(tabla_id, fila_index):
     elif "owner" not in table_info:
         table_info["owner"] = "Usuario desconocido"
 
-    # Asegurarse de que los datos estén disponibles (igual que ver_tabla)
-    if "data" not in table_info:
-        if "rows" in table_info:
-            table_info["data"] = table_info["rows"]
-            current_app.logger.info(
-                f"[DEBUG_EDIT] Usando 'rows' como 'data', filas: {len(table_info['data'])}"
-            )
-        else:
-            table_info["data"] = []
-            current_app.logger.info("[DEBUG_EDIT] No se encontraron datos en la tabla")
-
-    # 🚨 NO SOBRESCRIBIR DATA CON ROWS - data tiene las imágenes actualizadas
-    current_app.logger.info(
-        f"[DEBUG_EDIT] ANTES sincronización - data tiene {len(table_info.get('data', []))} filas, rows tiene {len(table_info.get('rows', []))} filas"
+    table_info["row_count"] = get_catalog_row_count(
+        g.spreadsheets_collection, table_info
     )
 
-    # Solo sincronizar si data está vacío pero rows tiene datos
-    if (
-        not table_info.get("data") or len(table_info.get("data", [])) == 0
-    ) and table_info.get("rows"):
-        current_app.logger.info("[DEBUG_EDIT] Copiando rows → data (data estaba vacío)")
-        table_info["data"] = table_info["rows"]
-    elif table_info.get("data") and (
-        not table_info.get("rows") or len(table_info.get("rows", [])) == 0
-    ):
-        current_app.logger.info("[DEBUG_EDIT] Copiando data → rows (rows estaba vacío)")
-        table_info["rows"] = table_info["data"]
-    else:
-        current_app.logger.info("[DEBUG_EDIT] PRESERVANDO data original con imágenes")
-
-    table_info["row_count"] = len(table_info.get("data", []))
-
     # Verificar permisos: solo el propietario o admin puede editar filas
     username = session.get("username")
     role = session.get("role", "user")
@@ -1138,34 +1065,17 @@ def editar_fila(tabla_id, fila_index):
         flash("No tienes permisos para editar esta fila.", "warning")
         return redirect(url_for("main.ver_tabla", table_id=tabla_id))
 
-    # Obtener la fila específica del array de datos
-    data = table_info.get("data", {})
-
-    # Verificar si data es un diccionario o una lista
-    if isinstance(data, dict):
-        # Si es un diccionario, usar la clave string
-        data_key = str(fila_index)
-        if data_key not in data:
-            current_app.logger.error(
-                f"[DEBUG] Fila no encontrada: clave {data_key} no existe en data"
-            )
-            flash("Fila no encontrada.", "error")
-            return redirect(url_for("main.ver_tabla", table_id=tabla_id))
-        fila = data[data_key]
-        data_length = len(data)
-    else:
-        # Si es una lista, usar el índice numérico
-        data_length = len(data)
-        if fila_index >= data_length:
-            current_app.logger.error(
-                f"[DEBUG] Fila no encontrada: índice {fila_index} >= longitud {data_length}"
-            )
-            flash("Fila no encontrada.", "error")
-            return redirect(url_for("main.ver_tabla", table_id=tabla_id))
-        fila = data[fila_index]
+    # Obtener la fila específica ('data' contiene las imágenes actualizadas)
+    fila = get_catalog_row(g.spreadsheets_collection, table_info, fila_index)
+    if fila is None:
+        current_app.logger.error(
+            f"[DEBUG] Fila no encontrada: índice {fila_index} >= longitud {table_info['row_count']}"
+        )
+        flash("Fila no encontrada.", "error")
+        return redirect(url_for("main.ver_tabla", table_id=tabla_id))
 
     current_app.logger.info(
-        f"[DEBUG] fila_index={fila_index}, data_length={data_length}, data_type={type(data)}"
+        f"[DEBUG] fila_index={fila_index}, data_length={table_info['row_count']}"
     )
     current_app.logger.info(f"[DEBUG] table_info.keys(): {list(table_info.keys())}")
     current_app.logger.info(
@@ -1187,14 +1097,14 @@ def editar_fila(tabla_id, fila_index):
     )
 
     # 🔥🔥🔥 USAR LA MISMA LÓGICA QUE VER_TABLA CON CACHE 🔥🔥🔥
-    # Limpiar cache de S3 al cargar la página para evitar imágenes fantasma
-    from app.utils.image_utils import clear_s3_cache
-
-    clear_s3_cache()  # Limpiar todo el cache
+    # Limpiar del cache de S3 solo las imágenes de esta fila para evitar
+    # imágenes fantasma en el formulario de edición
+    from app.utils.image_utils import clear_s3_cache, get_raw_images_for_edit
 
-    # Optimización: Limpiar cache de S3 solo si es necesario
+    for imagen in get_raw_images_for_edit(fila):
+        clear_s3_cache(imagen)
     current_app.logger.info(
-        "[DEBUG_EDIT] Cache S3 limpiado para evitar imágenes fantasma"
+        "[DEBUG_EDIT] Cache S3 limpiado para las imágenes de la fila"
     )
 
     # Usar función unificada para obtener URLs de imágenes (filtra las que no existen)
@@ -1809,15 +1719,50 @@ def editar_fila(tabla_id, fila_index):
 
         current_app.logger.info(f"Actualizando documento con datos: {mongo_update}")
 
-        # Actualizar la fila en la base de datos
-        g.spreadsheets_collection.update_one(
-            {"_id": ObjectId(tabla_id)}, {"$set": mongo_update}
-        )
+        # Actualizar solo los campos modificados de la fila
+        prefijo_fila = f"data.{fila_index}."
+        try:
+            actualizada = update_catalog_row_fields(
+                g.spreadsheets_collection,
+                table_info,
+                fila_index,
+                {
+                    key[len(prefijo_fila) :]: value
+                    for key, value in mongo_update.items()
+                    if key.startswith(prefijo_fila)
+                },
+                expected_version=parse_expected_version(request.form),
+            )
+        except CatalogVersionConflictError:
+            current_app.logger.warning(
+                f"[EDITAR_FILA] Conflicto de versión en tabla {tabla_id}, fila {fila_index}"
+            )
+            flash(
+                "La tabla ha sido modificada por otro usuario. Revisa los cambios y vuelve a editar la fila.",
+                "warning",
+            )
+            return redirect(url_for("main.ver_tabla", table_id=tabla_id))
+        if not actualizada:
+            # La fila se eliminó mientras se editaba
+            current_app.logger.warning(
+                f"[EDITAR_FILA] Fila {fila_index} no encontrada al guardar en tabla {tabla_id}"
+            )
+            flash("Fila no encontrada.", "error")
+            return redirect(url_for("main.ver_tabla", table_id=tabla_id))
 
         flash("Fila actualizada correctamente.", "success")
 
-        # Calcular la página donde está la fila editada
+        # Calcular la página donde está la fila editada (paginación en cliente
+        # de 10 filas, o la de servidor si el catálogo se pagina automáticamente)
         filas_por_pagina = 10
+        auto_paginate_rows = current_app.config.get(
+            "CATALOG_VIEW_AUTO_PAGINATE_ROWS", 0
+        )
+        if auto_paginate_rows and (
+            get_catalog_row_count(g.spreadsheets_collection, table_info)
+            > auto_paginate_rows
+        ):
+            filas_por_pagina = current_app.config.get("CATALOG_VIEW_PER_PAGE", 50)
         pagina_fila = (fila_index // filas_por_pagina) + 1
 
         current_app.logger.info(f"[REDIRECT] Fila {fila_index} → Página {pagina_fila}")
@@ -1864,8 +1809,10 @@ def agregar_fila(tabla_id):
         return redirect(url_for("auth.login"))
 
     try:
-        # Obtener la tabla
-        tabla = g.spreadsheets_collection.find_one({"_id": ObjectId(tabla_id)})
+        # Obtener la tabla (solo metadatos: para agregar no se necesitan las filas)
+        tabla = g.spreadsheets_collection.find_one(
+            {"_id": ObjectId(tabla_id)}, CATALOG_METADATA_PROJECTION
+        )
         if not tabla:
             flash("Tabla no encontrada", "error")
             return redirect(url_for("main.dashboard_user"))
@@ -2165,20 +2112,13 @@ def agregar_fila(tabla_id):
             current_app.logger.info(
                 f"[AGREGAR_FILA] Guardando nueva fila en BD: {nueva_fila}"
             )
-            result = g.spreadsheets_collection.update_one(
-                {"_id": ObjectId(tabla_id)},
-                {
-                    "$push": {"data": nueva_fila, "rows": nueva_fila},
-                    "$inc": {"num_rows": 1},
-                    "$set": {"updated_at": datetime.utcnow()},
-                },
-            )
+            agregada = append_catalog_row(g.spreadsheets_collection, tabla, nueva_fila)
 
             current_app.logger.info(
-                f"[AGREGAR_FILA] Resultado de la actualización: matched_count={result.matched_count}, modified_count={result.modified_count}"
+                f"[AGREGAR_FILA] Resultado de la actualización: agregada={agregada}"
             )
 
-            if result.modified_count > 0:
+            if agregada:
                 flash("Fila agregada correctamente", "success")
                 current_app.logger.info(
                     "[AGREGAR_FILA] Fila agregada exitosamente, redirigiendo a ver_tabla"
@@ -2272,76 +2212,41 @@ def tables():
                 filepath = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
                 import_file.save(filepath)
 
-                # Procesar archivo según su tipo
-                headers = None
-                rows = []
-
-                if ext in [".xlsx", ".xlsm", ".xltx", ".xltm"]:
-                    try:
-                        wb = openpyxl.load_workbook(filepath)
-                        hoja = wb.active
-                        headers = list(
-                            next(hoja.iter_rows(min_row=1, max_row=1, values_only=True))
-                        )
-                        for row in hoja.iter_rows(min_row=2, values_only=True):
-                            if any(row):
-                                rows.append(
-                                    {
-                                        h: (row[i] if i < len(row) else "")
-                                        for i, h in enumerate(headers)
-                                    }
-                                )
-                        wb.close()
-                    except Exception as e:
-                        flash(f"Error al leer el archivo Excel: {str(e)}", "error")
-                        return redirect(url_for("main.tables"))
-                elif ext == ".csv":
-                    try:
-                        with open(filepath, newline="", encoding="utf-8") as csvfile:
-                            reader = csv.reader(csvfile)
-                            headers = list(next(reader, None))
-                            for row in reader:
-                                if any(row):
-                                    rows.append(
-                                        {
-                                            h: (row[i] if i < len(row) else "")
-                                            for i, h in enumerate(headers)
-                                        }
-                                    )
-                    except Exception as e:
-                        flash(f"Error al leer el archivo CSV: {str(e)}", "error")
-                        return redirect(url_for("main.tables"))
-                else:
+                if ext not in IMPORT_EXTENSIONS:
                     flash(
-                        "Formato de archivo no soportado. Solo se permiten archivos .xlsx, .xlsm, .xltx, .xltm o .csv",
+                        "Formato de archivo no soportado. Solo se permiten archivos .xlsx, .xlsm, .xltx, .xltm, .xls o .csv",
                         "error",
                     )
                     return redirect(url_for("main.tables"))
 
-                if not headers or not any(headers):
-                    flash(
-                        "El archivo importado no contiene encabezados válidos.", "error"
-                    )
+                # Leer y guardar el archivo por lotes (ver app/utils/catalog_import.py)
+                try:
+                    with open(filepath, "rb") as import_stream:
+                        headers, batches = read_import_file(
+                            import_stream,
+                            filename,
+                            current_app.config.get("CATALOG_IMPORT_BATCH_SIZE", 1000),
+                        )
+                        inserted_id, _ = import_catalog_rows(
+                            g.spreadsheets_collection,
+                            {
+                                "owner": session.get("username"),
+                                "name": table_name,
+                                SEARCH_KEYS_FIELD: name_search_keys(table_name),
+                                "filename": filename,
+                                "created_at": datetime.utcnow(),
+                                "created_by": session["username"],
+                                **owner_fields(session.get("user_id")),
+                            },
+                            headers,
+                            batches,
+                        )
+                except CatalogImportError as e:
+                    flash(f"Error al leer el archivo: {str(e)}", "error")
                     return redirect(url_for("main.tables"))
 
-                # Insertar la tabla en la base de datos
-                result = g.spreadsheets_collection.insert_one(
-                    {
-                        "owner": session.get("username"),
-                        "name": table_name,
-                        "filename": filename,
-                        "headers": headers,
-                        "created_at": datetime.utcnow(),
-                        "created_by": session["username"],
-                        "data": rows,
-                        "num_rows": len(rows),
-                    }
-                )
-
                 session["selected_headers"] = headers
-                return redirect(
-                    url_for("main.ver_tabla", table_id=str(result.inserted_id))
-                )
+                return redirect(url_for("main.ver_tabla", table_id=str(inserted_id)))
 
             except Exception as e:
                 logger.error(f"Error al procesar archivo: {str(e)}", exc_info=True)
@@ -2384,14 +2289,18 @@ def tables():
                     {
                         "owner": session.get("username"),
                         "name": table_name,
+                        SEARCH_KEYS_FIELD: name_search_keys(table_name),
                         "filename": filename,
                         "headers": headers,
                         "created_at": datetime.utcnow(),
                         "created_by": session["username"],
+                        **owner_fields(session.get("user_id")),
                         "data": [],
                         "num_rows": 0,
+                        THUMBNAIL_FIELD: "",
                     }
                 )
+                invalidate_catalog_cache(user_id=session.get("user_id"))
 
                 session["selected_headers"] = headers
                 return redirect(
@@ -2541,6 +2450,7 @@ def editar_tabla(id):
             # 🔥 PRIMERO: Siempre actualizar nombre, headers y miniatura
             basic_update = {
                 "name": new_name,
+                SEARCH_KEYS_FIELD: name_search_keys(new_name),
                 "headers": new_headers,
                 "miniatura": nueva_miniatura if nueva_miniatura else "",
             }
@@ -2560,7 +2470,7 @@ def editar_tabla(id):
                         header_map[old_h] = old_h
 
                 # Actualizar los datos con los nuevos encabezados
-                data = table.get("data", [])
+                data = get_catalog_rows(g.spreadsheets_collection, table)
                 new_data = []
 
                 for row in data:
@@ -2581,7 +2491,7 @@ def editar_tabla(id):
 
                     new_data.append(new_row)
 
-                update_data["data"] = new_data
+                replace_catalog_rows(g.spreadsheets_collection, table, new_data)
 
                 # Manejar actualización de imágenes
                 nuevas_imagenes = request.files.getlist("imagenes")
@@ -2681,8 +2591,10 @@ def delete_row(tabla_id, fila_index):
         flash("Debe iniciar sesión para realizar esta acción", "warning")
         return redirect(url_for("auth.login"))
 
-    # Obtener info de la tabla
-    table_info = g.spreadsheets_collection.find_one({"_id": ObjectId(tabla_id)})
+    # Obtener info de la tabla (solo metadatos)
+    table_info = g.spreadsheets_collection.find_one(
+        {"_id": ObjectId(tabla_id)}, CATALOG_METADATA_PROJECTION
+    )
     if not table_info:
         flash("Tabla no encontrada.", "error")
         return redirect(url_for("main.tables"))
@@ -2700,52 +2612,37 @@ def delete_row(tabla_id, fila_index):
         flash("No tienes permisos para eliminar filas de esta tabla.", "warning")
         return redirect(url_for("main.ver_tabla", table_id=tabla_id))
 
-    # Sincronizar 'rows' y 'data'
-    if "rows" in table_info and table_info["rows"] is not None:
-        table_info["data"] = table_info["rows"]
-    elif "data" in table_info and table_info["data"] is not None:
-        table_info["rows"] = table_info["data"]
-    else:
-        table_info["data"] = []
-        table_info["rows"] = []
-
-    current_rows = table_info.get("data", [])
-    current_app.logger.info(f"[DELETE_ROW] Filas actuales: {len(current_rows)}")
+    total_filas = get_catalog_row_count(g.spreadsheets_collection, table_info)
+    current_app.logger.info(f"[DELETE_ROW] Filas actuales: {total_filas}")
 
     # Verificar que el índice sea válido
-    if fila_index < 0 or fila_index >= len(current_rows):
+    if fila_index < 0 or fila_index >= total_filas:
         flash(f"Índice de fila inválido: {fila_index}.", "danger")
         current_app.logger.error(
-            f"[DELETE_ROW] Índice inválido: {fila_index} >= {len(current_rows)}"
+            f"[DELETE_ROW] Índice inválido: {fila_index} >= {total_filas}"
         )
         return redirect(url_for("main.ver_tabla", table_id=tabla_id))
 
     try:
-        # Eliminar la fila
-        deleted_row = current_rows.pop(fila_index)
-        current_app.logger.info(f"[DELETE_ROW] Fila eliminada: {deleted_row}")
-
-        # Actualizar en base de datos
-        result = g.spreadsheets_collection.update_one(
-            {"_id": ObjectId(tabla_id)},
-            {
-                "$set": {
-                    "data": current_rows,
-                    "rows": current_rows,
-                    "num_rows": len(current_rows),
-                    "updated_at": datetime.utcnow(),
-                }
-            },
-        )
-
-        if result.matched_count > 0 and result.modified_count > 0:
+        # Eliminar la fila a través de la capa de datos del catálogo
+        if delete_catalog_row(
+            g.spreadsheets_collection,
+            table_info,
+            fila_index,
+            expected_version=parse_expected_version(request.form),
+        ):
             flash("Fila eliminada correctamente", "success")
             current_app.logger.info(
-                f"[DELETE_ROW] Fila eliminada exitosamente. Filas restantes: {len(current_rows)}"
+                f"[DELETE_ROW] Fila eliminada exitosamente. Filas restantes: {total_filas - 1}"
             )
         else:
             flash("No se pudo eliminar la fila.", "warning")
 
+    except CatalogVersionConflictError:
+        flash(
+            "La tabla ha sido modificada por otro usuario. No se ha eliminado ninguna fila.",
+            "warning",
+        )
     except Exception as e:
         current_app.logger.error(f"[DELETE_ROW] Error: {str(e)}")
         flash(f"Error al eliminar fila: {str(e)}", "danger")
@@ -2798,6 +2695,8 @@ def delete_table(table_id):
             os.remove(filepath)
 
     g.spreadsheets_collection.delete_one({"_id": ObjectId(table_id)})
+    invalidate_catalog_cache(table_id)
+    delete_catalog_rows(g.spreadsheets_collection, table_id)
 
     if filename and session.get("selected_table") == filename:
         session.pop("selected_table", None)
@@ -2872,6 +2771,7 @@ def get_catalog_images(catalog_id):
 
         # Buscar imágenes en las filas del catálogo
         images = []
+        load_catalog_rows(g.spreadsheets_collection, catalog)
         data = catalog.get("data", [])
 
         for row in data:
@@ -2962,10 +2862,10 @@ def serve_s3_public(filename):
     current_app.logger.info(f"[S3-PUBLIC] 🔍 Solicitud para archivo: {filename}")
 
     try:
-        # Configuración S3 simplificada
-        import boto3
         from botocore.exceptions import ClientError
 
+        from app.utils.s3_proxy import serve_s3_object
+
         # Log de configuración S3
         aws_key = current_app.config.get("AWS_ACCESS_KEY_ID")
         aws_secret = current_app.config.get("AWS_SECRET_ACCESS_KEY")
@@ -2980,38 +2880,21 @@ def serve_s3_public(filename):
             current_app.logger.error("[S3-PUBLIC] ❌ Configuración S3 incompleta")
             return "Configuración S3 incompleta", 500
 
-        # Crear cliente S3
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=aws_key,
-            aws_secret_access_key=aws_secret,
-            region_name=aws_region,
-        )
-
-        # Intentar descargar el archivo desde S3
+        # Transmitir el archivo desde S3 por bloques (Range y ETag incluidos)
         try:
-            response = s3_client.get_object(Bucket=aws_bucket, Key=filename)
-            file_content = response["Body"].read()
-            content_type = response.get("ContentType", "application/octet-stream")
-
-            current_app.logger.info(
-                f"[S3-PUBLIC] ✅ Archivo descargado: {filename} ({len(file_content)} bytes)"
-            )
-
-            # Configurar Content-Type específico para diferentes tipos de archivo
-            if filename.lower().endswith(".pdf"):
-                content_type = "application/pdf"
-            elif filename.lower().endswith((".txt", ".md")):
-                content_type = "text/plain; charset=utf-8"
-
-            return Response(
-                file_content,
-                mimetype=content_type,
-                headers={
-                    "Content-Disposition": f"inline; filename={filename}",
-                    "Cache-Control": "public, max-age=3600",
+            response = serve_s3_object(
+                filename,
+                content_types={
+                    ".pdf": "application/pdf",
+                    ".txt": "text/plain; charset=utf-8",
+                    ".md": "text/plain; charset=utf-8",
                 },
+                public=True,
+            )
+            current_app.logger.info(
+                f"[S3-PUBLIC] ✅ Respuesta {response.status_code}: {filename} ({response.headers.get('Content-Length', '?')} bytes)"
             )
+            return response
 
         except ClientError as e:
             error_code = e.response["Error"]["Code"]
@@ -3,6 +3,7 @@ Rutas de mantenimiento reorganizadas para el panel de administración.
 Este archivo consolida funciones duplicadas y mejora el manejo de errores.
 """
 
+import codecs
 import csv
 import getpass
 import gzip
@@ -22,13 +23,24 @@ from flask import (
     jsonify,
     redirect,
     request,
+    session,
     url_for,
 )
-from pymongo import errors as pymongo_errors
 
+from app import monitoring
 from app.database import get_mongo_db
 from app.decorators import admin_required
 from app.logging_unified import get_logger
+from app.utils.backup_utils import BackupManager as StreamBackupManager
+from app.utils.backup_utils import (
+    ZSTD_MAGIC,
+    CollectionRestore,
+    is_stream_backup,
+    is_stream_backup_file,
+    load_stream_backup,
+    manifest_path,
+)
+from app.utils.job_queue import submit_job
 
 # from app.auth_utils import require_google_drive_auth  # Función no disponible
 from app.utils.storage_utils import get_storage_client
@@ -52,6 +64,9 @@ def log_warning(msg):
 # Blueprint para rutas de mantenimiento
 maintenance_bp = Blueprint("maintenance", __name__, url_prefix="/admin/maintenance")
 
+# Bytes leídos del inicio de un archivo para detectar su tipo
+FILE_TYPE_SNIFF_BYTES = 4096
+
 # ============================================================================
 # CLASES DE UTILIDAD PARA PROCESAMIENTO DE ARCHIVOS
 # ============================================================================
@@ -61,15 +76,31 @@ class FileProcessor:
     """Clase para manejar el procesamiento de diferentes tipos de archivos."""
 
     @staticmethod
-    def detect_file_type(content: bytes) -> str:
-        """Detecta el tipo de archivo basado en su contenido."""
+    def detect_file_type(content: bytes, truncated: bool = False) -> str:
+        """
+        Detecta el tipo de archivo basado en su contenido.
+
+        Con ``truncated`` el contenido es solo el comienzo del archivo: se
+        admite un carácter UTF-8 cortado al final y el JSON se reconoce por
+        su primer carácter en lugar de analizarlo entero.
+        """
         try:
-            # Verificar si es gzip
+            # Verificar si es gzip o zstd
             if content.startswith(b"\x1f\x8b"):
                 return "gzip"
+            if content.startswith(ZSTD_MAGIC):
+                return "zstd"
+
+            # Backup en flujo sin comprimir (NDJSON o BSON)
+            if is_stream_backup(content):
+                return "stream"
 
             # Intentar decodificar como texto
-            text_content = content.decode("utf-8")
+            if truncated:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                text_content = decoder.decode(content, final=False)
+            else:
+                text_content = content.decode("utf-8")
 
             # Verificar si es JSON
             try:
@@ -81,7 +112,8 @@ class FileProcessor:
                     return "json"
                 return "json"  # JSON genérico
             except json.JSONDecodeError:
-                pass
+                if truncated and text_content.lstrip()[:1] in ("{", "["):
+                    return "json"
 
             # Verificar si es CSV
             lines = text_content.split("\n")
@@ -104,7 +136,10 @@ class FileProcessor:
             file_type = FileProcessor.detect_file_type(content)
 
         try:
-            if file_type == "gzip":
+            if file_type in ("zstd", "stream"):
+                # Backup en flujo (BackupManager.write_backup)
+                return load_stream_backup(io.BytesIO(content))
+            elif file_type == "gzip":
                 return FileProcessor._process_gzip(content)
             elif file_type == "json":
                 return FileProcessor._process_json(content)
@@ -278,6 +313,22 @@ class GoogleDriveManager:
             log_error(f"Error descargando archivo {filename}: {str(e)}")
             raise Exception(f"Error al descargar archivo de Google Drive: {str(e)}")
 
+    def download_file_to_path(self, file_id: str, filename: str, path: str) -> int:
+        """Descarga un archivo de Google Drive a disco sin cargarlo en memoria."""
+        try:
+            import sys
+
+            sys.path.append(
+                os.path.join(os.path.dirname(__file__), "..", "..", "tools", "db_utils")
+            )
+            from google_drive_utils_v2 import download_file_to_path  # type: ignore
+
+            return download_file_to_path(file_id, path)
+
+        except Exception as e:
+            log_error(f"Error descargando archivo {filename}: {str(e)}")
+            raise Exception(f"Error al descargar archivo de Google Drive: {str(e)}")
+
     def delete_file(self, file_id: str) -> bool:
         """Elimina un archivo de Google Drive."""
         try:
@@ -481,32 +532,79 @@ class BackupManager:
         """Restaura una colección específica."""
         if self.db is None:
             raise Exception("No se pudo conectar a la base de datos")
-        collection = self.db[collection_name]
-        inserted_count = 0
-        errors = []
-
+        restore = CollectionRestore(self.db, collection_name)
         for doc in documents:
-            try:
-                # Convertir string _id de vuelta a ObjectId si es necesario
-                if "_id" in doc and isinstance(doc["_id"], str):
-                    try:
-                        doc["_id"] = ObjectId(doc["_id"])
-                    except Exception:
-                        # Si no es un ObjectId válido, dejar como string
-                        pass
-
-                # Insertar documento
-                _ = collection.insert_one(doc)
-                inserted_count += 1
-            except pymongo_errors.DuplicateKeyError:
-                # Documento duplicado, continuar
-                continue
-            except Exception as e:
-                error_msg = f"Error insertando documento: {str(e)}"
-                errors.append(error_msg)
-                log_warning(error_msg)
-
-        return {"inserted_count": inserted_count, "errors": errors}
+            # Convertir string _id de vuelta a ObjectId si es necesario
+            if "_id" in doc and isinstance(doc["_id"], str):
+                try:
+                    doc["_id"] = ObjectId(doc["_id"])
+                except Exception:
+                    # Si no es un ObjectId válido, dejar como string
+                    pass
+            restore.add(doc)
+        result = restore.finish()
+        return {"inserted_count": result["inserted_count"], "errors": result["errors"]}
+
+
+def _restore_backup_file(path: str, staging: bool = False) -> Dict[str, Any]:
+    """
+    Restaura un archivo de backup ya guardado en disco.
+
+    Los backups en flujo se restauran leyendo los documentos por lotes (ver
+    BackupManager.restore_file en app/utils/backup_utils.py), sin cargar el
+    archivo en memoria; el resto (JSON, CSV, gzip antiguos) se carga con
+    FileProcessor.
+    """
+    if is_stream_backup_file(path):
+        return StreamBackupManager().restore_file(path, staging=staging)
+    with open(path, "rb") as f:
+        content = f.read()
+    return BackupManager().restore_backup(FileProcessor.process_file_content(content))
+
+
+def _backup_temp_path() -> str:
+    """Archivo temporal vacío para recibir un backup antes de restaurarlo"""
+    handle, path = tempfile.mkstemp(suffix=".backup")
+    os.close(handle)
+    return path
+
+
+def _submit_backup_job(job_type: str, params: Dict[str, Any]):
+    """
+    Encola un backup o una subida a Google Drive y responde con 202.
+
+    El cliente consulta 'status_url' hasta que el trabajo termina; su
+    'result' tiene los mismos campos que devolvía antes la ruta.
+    """
+    db = get_mongo_db()
+    if db is None:
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "No se pudo conectar a la base de datos",
+                }
+            ),
+            500,
+        )
+    job_id = submit_job(
+        db,
+        job_type,
+        params,
+        user_id=session.get("user_id"),
+        username=session.get("username"),
+    )
+    log_info(f"Trabajo {job_type} encolado: {job_id}")
+    return (
+        jsonify(
+            {
+                "status": "accepted",
+                "job_id": job_id,
+                "status_url": url_for("jobs.job_status", job_id=job_id),
+            }
+        ),
+        202,
+    )
 
 
 # ============================================================================
@@ -770,7 +868,9 @@ def api_system_status():
                         "user": usuario,
                         "timestamp": hora,
                     },
-                }
+                },
+                # Percentiles de latencia de los endpoints más lentos
+                "request_latency": monitoring.get_request_latency_stats(limit=10),
             },
         }
 
@@ -784,59 +884,7 @@ def api_system_status():
 @admin_required
 def create_local_backup():
     """Crea un backup de la base de datos y lo guarda localmente."""
-    try:
-        backup_manager = BackupManager()
-        backup_data = backup_manager.create_backup()
-
-        # Crear archivo local
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"backup_local_{timestamp}.json.gz"
-
-        # Guardar en directorio de backups
-        from pathlib import Path
-
-        project_root = Path(__file__).parent.parent.parent
-        backup_dir = project_root / "backups"
-        backup_dir.mkdir(exist_ok=True)
-        backup_path = backup_dir / filename
-
-        # Comprimir y escribir el backup
-        json_data = json.dumps(
-            backup_data, ensure_ascii=False, indent=2, default=json_serializer
-        )
-        compressed_data = gzip.compress(json_data.encode("utf-8"))
-
-        with open(backup_path, "wb") as f:
-            _ = f.write(compressed_data)
-
-        # Calcular estadísticas
-        file_size = backup_path.stat().st_size
-        total_collections = len(backup_data.get("collections", {}))
-        total_documents = sum(
-            len(docs) for docs in backup_data.get("collections", {}).values()
-        )
-
-        log_info(f"Backup local creado exitosamente: {filename}")
-        log_info(f"Ubicación: {backup_path}")
-        log_info(f"Tamaño: {file_size} bytes")
-        log_info(f"Colecciones: {total_collections}")
-        log_info(f"Documentos: {total_documents}")
-
-        return jsonify(
-            {
-                "status": "success",
-                "filename": filename,
-                "file_path": str(backup_path),
-                "size": file_size,
-                "total_collections": total_collections,
-                "total_documents": total_documents,
-                "message": f"Backup local creado exitosamente: {filename}",
-            }
-        )
-
-    except Exception as e:
-        log_error(f"Error creando backup local: {str(e)}")
-        return jsonify({"status": "error", "error": str(e)}), 500
+    return _submit_backup_job("database_backup", {"upload_to_drive": False})
 
 
 @maintenance_bp.route("/download-backup/<filename>", methods=["GET"])
@@ -873,115 +921,7 @@ def download_backup(filename):
 @admin_required
 def create_backup():
     """Crea un backup de la base de datos y lo sube a Google Drive."""
-    try:
-        # Importar función de Google Drive
-        import os
-        import sys
-
-        # Agregar la ruta de tools/db_utils al path
-        db_utils_path = os.path.join(
-            os.path.dirname(__file__), "..", "..", "tools", "db_utils"
-        )
-        if db_utils_path not in sys.path:
-            sys.path.insert(0, db_utils_path)
-        from google_drive_utils_v2 import upload_file_to_drive  # type: ignore
-
-        backup_manager = BackupManager()
-        backup_data = backup_manager.create_backup()
-
-        # Crear archivo temporal
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"backup_{timestamp}.json.gz"
-
-        # Guardar en directorio temporal
-        backup_dir = os.path.join(os.getcwd(), "backups")
-        os.makedirs(backup_dir, exist_ok=True)
-        backup_path = os.path.join(backup_dir, filename)
-
-        # Comprimir y escribir el backup
-        json_data = json.dumps(
-            backup_data, ensure_ascii=False, indent=2, default=json_serializer
-        )
-        compressed_data = gzip.compress(json_data.encode("utf-8"))
-
-        with open(backup_path, "wb") as f:
-            _ = f.write(compressed_data)
-
-        # Calcular estadísticas
-        file_size = os.path.getsize(backup_path)
-        total_collections = len(backup_data.get("collections", {}))
-        total_documents = sum(
-            len(docs) for docs in backup_data.get("collections", {}).values()
-        )
-
-        # **SUBIR A GOOGLE DRIVE**
-        try:
-            drive_result = upload_file_to_drive(backup_path, "Backups_CatalogoTablas")
-
-            if drive_result and drive_result.get("success"):
-                # Eliminar archivo local después de subida exitosa
-                os.remove(backup_path)
-
-                return jsonify(
-                    {
-                        "status": "success",
-                        "message": "Backup creado y subido a Google Drive exitosamente",
-                        "filename": filename,
-                        "size": file_size,
-                        "total_collections": total_collections,
-                        "total_documents": total_documents,
-                        "drive_info": {
-                            "file_id": drive_result.get("file_id"),
-                            "web_view_url": drive_result.get(
-                                "file_url"
-                            ),  # Cambiar de 'web_view_url' a 'file_url'
-                            "folder_name": drive_result.get(
-                                "folder_name", "Backups_CatalogoTablas"
-                            ),
-                        },
-                        "uploaded_to_drive": True,
-                    }
-                )
-            else:
-                # Si falla la subida a Drive, mantener archivo local
-                error_msg = (
-                    drive_result.get("error", "Error desconocido")
-                    if drive_result
-                    else "No se pudo conectar con Google Drive"
-                )
-                return jsonify(
-                    {
-                        "status": "warning",
-                        "message": f"Backup creado pero no se pudo subir a Google Drive: {error_msg}",
-                        "filename": filename,
-                        "size": file_size,
-                        "total_collections": total_collections,
-                        "total_documents": total_documents,
-                        "download_url": f"/admin/maintenance/backup/download/{filename}",
-                        "uploaded_to_drive": False,
-                        "drive_error": error_msg,
-                    }
-                )
-
-        except Exception as drive_error:
-            log_error(f"Error subiendo a Google Drive: {str(drive_error)}")
-            return jsonify(
-                {
-                    "status": "warning",
-                    "message": f"Backup creado pero no se pudo subir a Google Drive: {str(drive_error)}",
-                    "filename": filename,
-                    "size": file_size,
-                    "total_collections": total_collections,
-                    "total_documents": total_documents,
-                    "download_url": f"/admin/maintenance/backup/download/{filename}",
-                    "uploaded_to_drive": False,
-                    "drive_error": str(drive_error),
-                }
-            )
-
-    except Exception as e:
-        log_error(f"Error creando backup: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+    return _submit_backup_job("database_backup", {"upload_to_drive": True})
 
 
 @maintenance_bp.route("/restore", methods=["POST"])
@@ -996,16 +936,17 @@ def restore_backup():
         if file.filename == "":
             return jsonify({"error": "No se seleccionó archivo"}), 400
 
-        # Leer contenido del archivo
-        content = file.read()
-
-        # Procesar archivo
-        file_processor = FileProcessor()
-        backup_data = file_processor.process_file_content(content)
+        # Guardar la subida en disco por bloques, sin leerla en memoria
+        path = _backup_temp_path()
+        try:
+            file.save(path)
 
-        # Restaurar backup
-        backup_manager = BackupManager()
-        results = backup_manager.restore_backup(backup_data)
+            # Restaurar backup (con staging las colecciones se sustituyen solo
+            # si se restauran sin errores)
+            staging = request.form.get("staging", "false").lower() == "true"
+            results = _restore_backup_file(path, staging=staging)
+        finally:
+            os.remove(path)
 
         return jsonify(
             {
@@ -1047,29 +988,27 @@ def restore_from_drive(file_id):
 
         log_info(f"Iniciando restauración desde Google Drive: {file_id} ({filename})")
 
-        # Descargar archivo con logging detallado
+        # Descargar el archivo directamente a disco
         log_info(f"Descargando archivo: {file_id}")
-        content = drive_manager.download_file(file_id, filename)
-        log_info(f"Archivo descargado exitosamente: {len(content)} bytes")
-
-        # Procesar archivo con logging detallado
-        file_processor = FileProcessor()
-        log_info("Iniciando procesamiento de archivo")
-
-        # Detectar tipo de archivo
-        file_type = file_processor.detect_file_type(content)
-        log_info(f"Tipo de archivo detectado: {file_type}")
-
-        backup_data = file_processor.process_file_content(content, file_type)
-        log_info(
-            f"Archivo procesado exitosamente: {len(backup_data.get('collections', {}))} colecciones"
-        )
-
-        # Restaurar backup con logging detallado
-        backup_manager = BackupManager()
-        log_info("Iniciando restauración de backup")
-        results = backup_manager.restore_backup(backup_data)
-        log_info(f"Backup restaurado exitosamente: {results}")
+        path = _backup_temp_path()
+        try:
+            size = drive_manager.download_file_to_path(file_id, filename, path)
+            log_info(f"Archivo descargado exitosamente: {size} bytes")
+
+            # Detectar tipo de archivo a partir de su comienzo
+            with open(path, "rb") as f:
+                head = f.read(FILE_TYPE_SNIFF_BYTES)
+            file_type = FileProcessor.detect_file_type(head, truncated=True)
+            log_info(f"Tipo de archivo detectado: {file_type}")
+
+            # Restaurar backup con logging detallado
+            log_info("Iniciando restauración de backup")
+            results = _restore_backup_file(
+                path, staging=bool(request_data.get("staging"))
+            )
+            log_info(f"Backup restaurado exitosamente: {results}")
+        finally:
+            os.remove(path)
 
         return jsonify(
             {
@@ -1079,7 +1018,7 @@ def restore_from_drive(file_id):
                 "file_info": {
                     "filename": filename,
                     "file_type": file_type,
-                    "size": len(content),
+                    "size": size,
                 },
             }
         )
@@ -1352,7 +1291,7 @@ def list_local_backups():
 
         for filename in files:
             log_info(f"🔍 DEBUG: Procesando archivo: {filename}")
-            if filename.endswith((".json", ".gz", ".zip", ".csv")):
+            if filename.endswith((".json", ".gz", ".zst", ".zip", ".csv")):
                 file_path = os.path.join(backup_dir, filename)
                 file_stat = os.stat(file_path)
 
@@ -1405,49 +1344,13 @@ def upload_local_backup_to_drive(filename):
             return jsonify({"success": False, "error": "Archivo no encontrado"}), 404
 
         # Verificar que el archivo sea un backup válido
-        if not filename.endswith((".json", ".gz", ".zip", ".csv")):
+        if not filename.endswith((".json", ".gz", ".zst", ".zip", ".csv")):
             return (
                 jsonify({"success": False, "error": "Tipo de archivo no válido"}),
                 400,
             )
 
-        # Implementar subida real a Google Drive
-        try:
-            drive_manager = GoogleDriveManager()
-
-            # Leer el archivo
-            with open(file_path, "rb") as f:
-                file_content = f.read()
-
-            # Subir a Google Drive
-            file_id = drive_manager.upload_file(filename, file_content)
-
-            file_size = os.path.getsize(file_path)
-            log_info(
-                f"Backup {filename} ({file_size} bytes) subido a Google Drive correctamente con ID: {file_id}"
-            )
-
-        except Exception as drive_error:
-            log_error(f"Error en Google Drive: {str(drive_error)}")
-            return (
-                jsonify(
-                    {
-                        "success": False,
-                        "error": f"Error en Google Drive: {str(drive_error)}",
-                    }
-                ),
-                500,
-            )
-
-        return jsonify(
-            {
-                "success": True,
-                "message": f'Backup "{filename}" subido a Google Drive correctamente',
-                "filename": filename,
-                "size": file_size,
-                "size_mb": round(file_size / (1024 * 1024), 2),
-            }
-        )
+        return _submit_backup_job("drive_upload", {"filename": filename})
 
     except Exception as e:
         log_error(f"Error subiendo backup local a Google Drive: {str(e)}")
@@ -1470,14 +1373,16 @@ def delete_local_backup(filename):
             return jsonify({"success": False, "error": "Archivo no encontrado"}), 404
 
         # Verificar que el archivo sea un backup válido
-        if not filename.endswith((".json", ".gz", ".zip", ".csv")):
+        if not filename.endswith((".json", ".gz", ".zst", ".zip", ".csv")):
             return (
                 jsonify({"success": False, "error": "Tipo de archivo no válido"}),
                 400,
             )
 
-        # Eliminar el archivo
+        # Eliminar el archivo (y el manifiesto de los backups en flujo)
         os.remove(file_path)
+        if os.path.exists(manifest_path(file_path)):
+            os.remove(manifest_path(file_path))
 
         log_info(f"Backup {filename} eliminado correctamente de {file_path}")
 
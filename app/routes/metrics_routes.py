@@ -0,0 +1,70 @@
+# app/routes/metrics_routes.py
+"""
+Ruta /metrics para Prometheus.
+
+Publica en el formato de texto de Prometheus las métricas de todos los
+workers (ver app/utils/metrics.py) y la profundidad de la cola de trabajos
+en segundo plano, que se consulta en MongoDB en cada lectura.
+
+Acceso: con METRICS_TOKEN configurado se exige la cabecera
+'Authorization: Bearer <token>', que es lo que debe configurarse en
+Prometheus; sin él, solo se responde a un administrador con sesión iniciada.
+La IP de origen no sirve para autorizar: detrás del proxy (Apache en la misma
+máquina que gunicorn) todas las peticiones parecen locales.
+"""
+
+import hmac
+import logging
+
+from flask import Blueprint, Response, current_app, request, session
+
+from app.database import get_mongo_db
+from app.utils.job_queue import count_active_jobs
+from app.utils.metrics import (
+    CONTENT_TYPE,
+    aggregate_samples,
+    gauge_sample,
+    render_metrics,
+    write_worker_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def _is_authorized():
+    """Token Bearer de METRICS_TOKEN si está configurado; si no, sesión de administrador"""
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        return hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        )
+    return session.get("role") == "admin"
+
+
+def _job_samples():
+    """Trabajos en cola y en ejecución (vacío si no hay base de datos)"""
+    db = get_mongo_db()
+    if db is None:
+        return []
+    try:
+        counts = count_active_jobs(db)
+    except Exception as e:
+        logger.warning(f"No se pudo consultar la cola de trabajos para /metrics: {e}")
+        return []
+    return [
+        gauge_sample("edf_jobs", value, status=status, type=job_type)
+        for (status, job_type), value in counts.items()
+    ]
+
+
+@metrics_bp.route("/metrics")
+def metrics():
+    """Métricas de todos los workers en el formato de texto de Prometheus"""
+    if not _is_authorized():
+        return Response("Forbidden\n", status=403, mimetype="text/plain")
+    # Actualizar el archivo propio para que los demás workers lo lean al día
+    write_worker_snapshot()
+    body = render_metrics(aggregate_samples(extra=_job_samples()))
+    return Response(body, content_type=CONTENT_TYPE)
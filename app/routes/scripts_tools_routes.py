@@ -580,15 +580,25 @@ def run_data_utility(utility):
 def run_create_backup():
     """Crea backup completo"""
     try:
-        from app.utils.backup_utils import BackupManager
+        from datetime import datetime
 
-        manager = BackupManager()
-        result = manager.create_backup()
+        from app.utils.backup_utils import BackupManager, backup_extension
+        from config import BACKUP_COMPRESSION, BACKUP_FORMAT
+
+        backup_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "backups"
+        )
+        os.makedirs(backup_dir, exist_ok=True)
+        filename = (
+            f"backup_local_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+            f"{backup_extension(BACKUP_FORMAT, BACKUP_COMPRESSION)}"
+        )
+        manifest = BackupManager().write_backup(os.path.join(backup_dir, filename))
         return jsonify(
             {
                 "success": True,
                 "message": "Backup completo creado",
-                "output": f'Backup creado con {len(result.get("collections", {}))} colecciones',
+                "output": f'Backup {filename} creado con {manifest["total_collections"]} colecciones y {manifest["total_documents"]} documentos',
             }
         )
     except Exception as e:
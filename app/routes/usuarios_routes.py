@@ -22,6 +22,7 @@ from flask import (
 )
 from werkzeug.security import check_password_hash, generate_password_hash  # noqa: F401
 
+from app.database import invalidate_user_cache
 from app.decorators import admin_required
 
 usuarios_bp = Blueprint("usuarios", __name__, url_prefix="/usuarios")
@@ -61,6 +62,7 @@ def register():
             users_collection.insert_one(
                 {"email": email, "password": hashed_pw, "username": username}
             )
+            invalidate_user_cache(email)
             flash("Registro exitoso. Ya puedes iniciar sesión.", "success")
             return redirect(url_for("auth.login"))
 
@@ -110,6 +112,7 @@ def edit():
         users_collection.update_one(
             {"_id": user["_id"]}, {"$set": {"email": new_email}}
         )
+        invalidate_user_cache(user["_id"], user.get("email"), new_email)
         flash("Correo actualizado.", "success")
         return redirect(url_for("main.dashboard_user"))
 
@@ -177,6 +180,7 @@ def force_password_change():
                 }
             },
         )
+        invalidate_user_cache(user["_id"])
         session.pop("force_password_user_id", None)
         flash("Contraseña actualizada. Ya puedes iniciar sesión.", "success")
         return redirect(url_for("auth.login"))
@@ -51,6 +51,52 @@ $(function () {
     }, 5000);
   }
 
+  // Los backups y las subidas a Google Drive se ejecutan como trabajos en
+  // segundo plano: el servidor responde 202 con 'status_url' y se consulta
+  // hasta que el trabajo termina. Se resuelve con el resultado del trabajo,
+  // que tiene los mismos campos que la respuesta directa de antes.
+  function waitForJob(response) {
+    const deferred = $.Deferred();
+    if (!response || response.status !== "accepted") {
+      return deferred.resolve(response).promise();
+    }
+
+    function poll() {
+      $.ajax({
+        url: response.status_url,
+        method: "GET",
+        xhrFields: { withCredentials: true }
+      })
+        .done(function (data) {
+          const job = data.data || {};
+          if (job.status === "done") {
+            deferred.resolve(job.result);
+          } else if (job.status === "failed" || job.status === "cancelled") {
+            const message = job.error || "Trabajo cancelado";
+            deferred.reject({ status: 500, statusText: message, responseJSON: { error: message } });
+          } else {
+            setTimeout(poll, 2000);
+          }
+        })
+        .fail(function (xhr) {
+          deferred.reject(xhr);
+        });
+    }
+
+    poll();
+    return deferred.promise();
+  }
+
+  // Como $.ajax, pero success/error/complete esperan a que termine el trabajo
+  function ajaxJob(options) {
+    const { success, error, complete, ...ajaxOptions } = options;
+    return $.ajax(ajaxOptions)
+      .then(waitForJob)
+      .done(success || $.noop)
+      .fail(error || $.noop)
+      .always(complete || $.noop);
+  }
+
   // Función para mostrar alertas en el modal de backups locales
   function showModalAlert(message, type = "success") {
     console.log(`📢 showModalAlert: ${message}`);
@@ -299,7 +345,7 @@ $(function () {
       </div>
     `);
 
-    $.ajax({
+    ajaxJob({
       url: "/admin/maintenance/backup-local",
       method: "POST",
       xhrFields: { withCredentials: true },
@@ -372,7 +418,7 @@ $(function () {
       </div>
     `);
 
-    $.ajax({
+    ajaxJob({
       url: "/admin/maintenance/backup",
       method: "POST",
       xhrFields: { withCredentials: true },
@@ -488,7 +534,7 @@ $(function () {
           </div>
         `);
 
-        $.ajax({
+        ajaxJob({
           url: "/admin/maintenance/backup",
           method: "POST",
           xhrFields: { withCredentials: true },
@@ -1433,7 +1479,7 @@ $(function () {
     const errors = [];
 
     filenames.forEach(function (filename) {
-      $.ajax({
+      ajaxJob({
         url: `/admin/maintenance/local-backups/upload-to-drive/${filename}`,
         method: "POST",
         xhrFields: { withCredentials: true },
@@ -1557,7 +1603,7 @@ $(function () {
     console.log("🚀 Iniciando subida de backup individual...");
     btn.prop("disabled", true).html("<span class=\"spinner-border spinner-border-sm\"></span> Subiendo...");
 
-    $.ajax({
+    ajaxJob({
       url: `/admin/maintenance/local-backups/upload-to-drive/${filename}`,
       method: "POST",
       xhrFields: { withCredentials: true },
@@ -2,6 +2,22 @@
 Utilidades para manejo de backups y procesamiento de archivos.
 Este módulo contiene las clases y funciones refactorizadas para el manejo
 de backups, procesamiento de archivos y operaciones con Google Drive.
+
+Backups en flujo (BackupManager.write_backup): cada colección se recorre con
+un cursor y sus documentos se escriben como registros NDJSON (Extended JSON)
+o BSON directamente en el archivo comprimido, sin cargar la base de datos en
+memoria. Cada colección es un miembro gzip (o un frame zstd) independiente
+que empieza con el registro {"$collection": nombre}; el manifiesto guarda su
+posición en el archivo (offset y length comprimidos) para poder leer una
+colección sin descomprimir las anteriores. El manifiesto se escribe al final
+del propio archivo ({"$manifest": ...}) y en '<archivo>.manifest'.
+
+Restauración (BackupManager.restore_file y restore_backup): los documentos
+se leen del archivo en flujo y se insertan por lotes con
+insert_many(ordered=False); las colecciones se restauran en paralelo
+(BACKUP_RESTORE_WORKERS). Con ``staging`` cada colección se escribe en
+'<nombre>__restore' y se renombra sobre la original solo si termina sin
+errores, así que un fallo a mitad no deja la colección vacía.
 """
 
 import csv
@@ -9,15 +25,46 @@ import gzip
 import io
 import json
 import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List
-
-from bson import ObjectId
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import bson
+from bson import ObjectId, json_util
+from bson.json_util import JSONMode, JSONOptions
 from pymongo import errors as pymongo_errors
 
 from app.database import get_mongo_db
+from app.exceptions import JobCancelledError
 from app.logging_unified import get_logger
+from config import (
+    BACKUP_BATCH_SIZE,
+    BACKUP_COMPRESSION,
+    BACKUP_COMPRESSION_LEVEL,
+    BACKUP_FORMAT,
+    BACKUP_RESTORE_WORKERS,
+)
+
+try:
+    import zstandard
+
+    zstd_available = True
+except ImportError:
+    zstd_available = False
+    zstandard = None
 
 # Configurar logger
 logger = get_logger(__name__)
@@ -338,6 +385,395 @@ class FileProcessor:
         }
 
 
+# ============================================================================
+# ESCRITURA Y LECTURA DE BACKUPS EN FLUJO
+# ============================================================================
+
+BACKUP_STREAM_VERSION = "3.0"
+BACKUP_FORMATS = ("ndjson", "bson")
+BACKUP_COMPRESSIONS = ("gzip", "zstd")
+BACKUP_EXTENSIONS = {
+    ("ndjson", "gzip"): ".ndjson.gz",
+    ("ndjson", "zstd"): ".ndjson.zst",
+    ("bson", "gzip"): ".bson.gz",
+    ("bson", "zstd"): ".bson.zst",
+}
+MANIFEST_SUFFIX = ".manifest"
+COLLECTION_MARKER = "$collection"
+MANIFEST_MARKER = "$manifest"
+# Sufijo de la colección temporal de una restauración con staging
+STAGING_SUFFIX = "__restore"
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Extended JSON relajado: conserva ObjectId, fechas y binarios
+BACKUP_JSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=False)
+
+# Datos sin comprimir que se acumulan antes de pasarlos al compresor
+_WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def backup_extension(format: str, compression: str) -> str:
+    """Extensión del archivo de backup (p. ej. '.ndjson.gz')"""
+    if (format, compression) not in BACKUP_EXTENSIONS:
+        raise BackupError(f"Formato de backup no soportado: {format}/{compression}")
+    return BACKUP_EXTENSIONS[(format, compression)]
+
+
+def manifest_path(path) -> str:
+    """Ruta del manifiesto que acompaña a un backup"""
+    return f"{path}{MANIFEST_SUFFIX}"
+
+
+def _remove_partial_backup(path) -> None:
+    """Elimina el archivo de un backup a medias y su manifiesto"""
+    for leftover in (path, manifest_path(path)):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def encode_backup_record(doc: Dict[str, Any], format: str) -> bytes:
+    """Registro de un documento en el formato del backup"""
+    if format == "bson":
+        return bson.encode(doc)
+    return (
+        json_util.dumps(doc, json_options=BACKUP_JSON_OPTIONS).encode("utf-8") + b"\n"
+    )
+
+
+class BackupStreamWriter:
+    """
+    Escribe un backup como una secuencia de miembros comprimidos.
+
+    Cada miembro es un gzip (o frame zstd) completo, así que el archivo se
+    puede descomprimir de principio a fin o a partir del offset de cualquier
+    miembro.
+    """
+
+    def __init__(self, fileobj: BinaryIO, compression: str = "gzip", level: int = 6):
+        if compression not in BACKUP_COMPRESSIONS:
+            raise BackupError(f"Compresión no soportada: {compression}")
+        if compression == "zstd" and not zstd_available:
+            raise BackupError("La compresión zstd requiere el paquete 'zstandard'")
+        self.fileobj = fileobj
+        self.compression = compression
+        self.level = level
+        self._compressor = None
+        self._buffer = bytearray()
+        self._offset = 0
+        self._raw_length = 0
+
+    def _new_compressor(self):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compressobj()
+        # wbits=31: formato gzip (cabecera y CRC) por miembro
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def begin_member(self) -> None:
+        self._compressor = self._new_compressor()
+        self._offset = self.fileobj.tell()
+        self._raw_length = 0
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self._raw_length += len(data)
+        if len(self._buffer) >= _WRITE_BUFFER_SIZE:
+            self._flush_buffer()
+
+    def _flush_buffer(self) -> None:
+        if self._buffer:
+            self.fileobj.write(self._compressor.compress(bytes(self._buffer)))
+            self._buffer.clear()
+
+    def end_member(self) -> Dict[str, int]:
+        """
+        Cierra el miembro actual.
+
+        Returns:
+            dict: offset y length (comprimidos) y raw_length del miembro
+        """
+        self._flush_buffer()
+        self.fileobj.write(self._compressor.flush())
+        self._compressor = None
+        return {
+            "offset": self._offset,
+            "length": self.fileobj.tell() - self._offset,
+            "raw_length": self._raw_length,
+        }
+
+
+class _LimitedReader(io.RawIOBase):
+    """Lee como mucho 'length' bytes de un archivo desde su posición actual"""
+
+    def __init__(self, fileobj: BinaryIO, length: int):
+        self.fileobj = fileobj
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.remaining <= 0:
+            return 0
+        data = self.fileobj.read(min(len(buffer), self.remaining))
+        buffer[: len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+def _buffered(fileobj: BinaryIO) -> BinaryIO:
+    return fileobj if hasattr(fileobj, "peek") else io.BufferedReader(fileobj)
+
+
+def open_backup_stream(fileobj: BinaryIO) -> BinaryIO:
+    """Flujo descomprimido de un backup gzip o zstd (todos sus miembros)"""
+    fileobj = _buffered(fileobj)
+    magic = fileobj.peek(4)[:4]
+    if magic.startswith(ZSTD_MAGIC):
+        if not zstd_available:
+            raise BackupError(
+                "El backup usa zstd y el paquete 'zstandard' no está instalado"
+            )
+        return zstandard.ZstdDecompressor().stream_reader(
+            fileobj, read_across_frames=True
+        )
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    return fileobj
+
+
+def _detect_record_format(head: bytes) -> str:
+    # Los registros NDJSON empiezan por '{"'; en BSON los primeros bytes son
+    # la longitud del documento
+    return "ndjson" if head.lstrip()[:2] == b'{"' else "bson"
+
+
+def iter_backup_records(
+    fileobj: BinaryIO, format: Optional[str] = None
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Recorre un backup en flujo sin cargarlo en memoria.
+
+    Args:
+        fileobj: Archivo del backup abierto en modo binario
+        format (str): 'ndjson' o 'bson' (None = detectar)
+
+    Yields:
+        tuple: ("collection", nombre), ("document", documento) o
+        ("manifest", manifiesto)
+    """
+    stream = _buffered(open_backup_stream(fileobj))
+    if format is None:
+        format = _detect_record_format(stream.peek(2)[:2])
+    if format == "bson":
+        records = bson.decode_file_iter(stream)
+    else:
+        records = (
+            json_util.loads(line, json_options=BACKUP_JSON_OPTIONS)
+            for line in stream
+            if line.strip()
+        )
+    for record in records:
+        if COLLECTION_MARKER in record:
+            yield "collection", record[COLLECTION_MARKER]
+        elif MANIFEST_MARKER in record:
+            yield "manifest", record[MANIFEST_MARKER]
+        else:
+            yield "document", record
+
+
+def is_stream_backup(content: bytes) -> bool:
+    """Indica si un contenido (ya descomprimido) es un backup en flujo"""
+    markers = (COLLECTION_MARKER.encode(), MANIFEST_MARKER.encode())
+    if _detect_record_format(content[:64]) == "ndjson":
+        head = content.lstrip()[:16]
+        return any(head.startswith(b'{"' + marker) for marker in markers)
+    # BSON: longitud (int32), tipo del primer campo y su nombre
+    return any(content[5 : 6 + len(marker)] == marker + b"\x00" for marker in markers)
+
+
+def load_stream_backup(fileobj: BinaryIO) -> Dict[str, Any]:
+    """
+    Backup en flujo con la estructura {"metadata", "collections"} que usan
+    restore_backup y FileProcessor.
+    """
+    data: Dict[str, Any] = {"metadata": {}, "collections": {}}
+    current: Optional[List[Dict[str, Any]]] = None
+    for kind, value in iter_backup_records(fileobj):
+        if kind == "collection":
+            current = data["collections"].setdefault(value, [])
+        elif kind == "manifest":
+            data["metadata"] = value
+        elif current is not None:
+            current.append(value)
+    return data
+
+
+def read_backup_manifest(path) -> Optional[Dict[str, Any]]:
+    """Manifiesto de un backup ('<archivo>.manifest') o None si no existe"""
+    try:
+        with open(manifest_path(path), "r", encoding="utf-8") as f:
+            return json_util.loads(f.read(), json_options=BACKUP_JSON_OPTIONS)
+    except FileNotFoundError:
+        return None
+
+
+def iter_manifest_collection(
+    path, entry: Dict[str, Any], format: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Documentos de una colección leyendo solo su miembro del archivo (offset y
+    length del manifiesto), sin descomprimir las colecciones anteriores.
+    """
+    with open(path, "rb") as f:
+        f.seek(entry["offset"])
+        member = io.BufferedReader(_LimitedReader(f, entry["length"]))
+        for kind, value in iter_backup_records(member, format):
+            if kind == "document":
+                yield value
+
+
+def is_stream_backup_file(path) -> bool:
+    """Indica si un archivo (comprimido o no) es un backup en flujo"""
+    try:
+        with open(path, "rb") as f:
+            return is_stream_backup(open_backup_stream(f).read(64))
+    except (OSError, EOFError, BackupError):
+        return False
+
+
+class CollectionRestore:
+    """
+    Restauración de una colección por lotes con insert_many(ordered=False).
+
+    Los documentos duplicados (_id existente) se omiten sin detener el lote.
+    Con ``staging`` se escriben en '<nombre>__restore', que al terminar sin
+    errores recibe los índices y se renombra sobre la colección original; si
+    algo falla (documentos o índices) se elimina y la original queda intacta.
+    """
+
+    def __init__(
+        self,
+        db,
+        name: str,
+        overwrite: bool = False,
+        staging: bool = False,
+        batch_size: int = BACKUP_BATCH_SIZE,
+        indexes: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.db = db
+        self.name = name
+        self.staging = staging
+        self.batch_size = max(1, batch_size)
+        self.indexes = indexes
+        self.inserted_count = 0
+        self.skipped_count = 0
+        self.errors: List[str] = []
+        self._batch: List[Dict[str, Any]] = []
+
+        if staging:
+            self.target = db[f"{name}{STAGING_SUFFIX}"]
+            self.target.drop()
+        else:
+            self.target = db[name]
+            # Si overwrite es True, limpiar la colección primero
+            if overwrite:
+                try:
+                    _ = self.target.delete_many({})
+                    log_info(f"Colección {name} limpiada para sobrescritura")
+                except Exception as e:
+                    log_warning(f"No se pudo limpiar la colección {name}: {str(e)}")
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        self._batch.append(doc)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Inserta el lote pendiente"""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        try:
+            result = self.target.insert_many(batch, ordered=False)
+            self.inserted_count += len(result.inserted_ids)
+        except pymongo_errors.BulkWriteError as e:
+            details = e.details or {}
+            self.inserted_count += details.get("nInserted", 0)
+            for error in details.get("writeErrors", []):
+                if error.get("code") == 11000:
+                    # Documento duplicado, continuar
+                    self.skipped_count += 1
+                    continue
+                error_msg = (
+                    f"Error insertando documento en {self.name}: {error.get('errmsg')}"
+                )
+                self.errors.append(error_msg)
+                log_warning(error_msg)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Inserta lo pendiente y, con staging, sustituye la colección original.
+
+        Raises:
+            BackupError: Si la restauración con staging tuvo errores
+        """
+        self.flush()
+        if self.staging:
+            if self.errors:
+                self.abort()
+                raise BackupError(
+                    f"{len(self.errors)} documentos con errores; la colección {self.name} no se ha modificado"
+                )
+            failed = self._create_indexes()
+            if failed:
+                self.abort()
+                raise BackupError(
+                    f"No se pudieron crear los índices {', '.join(failed)}; la colección {self.name} no se ha modificado"
+                )
+            self.target.rename(self.name, dropTarget=True)
+            log_info(f"Colección {self.name} sustituida por la restaurada")
+        return {
+            "inserted_count": self.inserted_count,
+            "skipped_count": self.skipped_count,
+            "errors": self.errors,
+        }
+
+    def abort(self) -> None:
+        """Descarta la colección temporal de una restauración con staging"""
+        if self.staging:
+            self.target.drop()
+
+    def _create_indexes(self) -> List[str]:
+        """
+        Crea en la colección temporal los índices del manifiesto o, si no
+        hay, los de la colección original.
+
+        Returns:
+            Nombres de los índices que no se pudieron crear
+        """
+        indexes = self.indexes
+        if indexes is None:
+            indexes = [
+                {"name": index_name, **spec}
+                for index_name, spec in self.db[self.name].index_information().items()
+                if index_name != "_id_"
+            ]
+        failed = []
+        for spec in indexes:
+            keys = [tuple(key) for key in spec["key"]]
+            options = {k: v for k, v in spec.items() if k not in ("key", "v", "ns")}
+            try:
+                self.target.create_index(keys, **options)
+            except Exception as e:
+                failed.append(str(spec.get("name")))
+                error_msg = f"No se pudo crear el índice {spec.get('name')} en {self.name}: {str(e)}"
+                self.errors.append(error_msg)
+                log_error(error_msg)
+        return failed
+
+
 # ============================================================================
 # GESTOR DE BACKUPS MEJORADO
 # ============================================================================
@@ -366,15 +802,7 @@ class BackupManager:
             }
 
             # Obtener colecciones a respaldar
-            if collections:
-                collection_names = collections
-            else:
-                collection_names = [
-                    name
-                    for name in self.db.list_collection_names()
-                    if not name.startswith("system.")
-                    and name not in self.excluded_collections
-                ]
+            collection_names = self._collection_names(collections)
 
             total_documents = 0
 
@@ -415,6 +843,124 @@ class BackupManager:
             log_error(f"Error creando backup: {str(e)}")
             raise BackupError(f"Error creando backup: {str(e)}")  # noqa: B904
 
+    def _collection_names(self, collections: Optional[List[str]] = None) -> List[str]:
+        if collections:
+            return list(collections)
+        return [
+            name
+            for name in self.db.list_collection_names()
+            if not name.startswith("system.") and name not in self.excluded_collections
+        ]
+
+    def write_backup(
+        self,
+        path,
+        collections: Optional[List[str]] = None,
+        format: str = BACKUP_FORMAT,
+        compression: str = BACKUP_COMPRESSION,
+        level: int = BACKUP_COMPRESSION_LEVEL,
+        batch_size: int = BACKUP_BATCH_SIZE,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Crea un backup en flujo: recorre cada colección con un cursor y
+        escribe sus documentos directamente en el archivo comprimido.
+
+        La memoria usada no depende del tamaño de la base de datos. Si el
+        backup falla se elimina el archivo a medio escribir.
+
+        Args:
+            path: Ruta del archivo (ver backup_extension)
+            collections (list): Colecciones a respaldar (None = todas)
+            format (str): 'ndjson' (Extended JSON) o 'bson'
+            compression (str): 'gzip' o 'zstd'
+            level (int): Nivel de compresión
+            batch_size (int): Documentos por lote del cursor
+            progress: Función opcional progress(documentos_escritos, total)
+
+        Returns:
+            dict: Manifiesto del backup (también en '<path>.manifest')
+        """
+        if format not in BACKUP_FORMATS:
+            raise BackupError(f"Formato de backup no soportado: {format}")
+        if self.db is None:
+            raise BackupError("No se pudo conectar a la base de datos")
+
+        collection_names = self._collection_names(collections)
+        # Estimación para el progreso (no recorre las colecciones)
+        expected = sum(
+            self.db[name].estimated_document_count() for name in collection_names
+        )
+        manifest: Dict[str, Any] = {
+            "version": BACKUP_STREAM_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "source": "backup_manager",
+            "database_name": self.db.name,
+            "format": format,
+            "compression": compression,
+            "collections": [],
+        }
+        total_documents = 0
+        log_info(f"Iniciando backup en flujo: {path}")
+        try:
+            with open(path, "wb") as f:
+                writer = BackupStreamWriter(f, compression, level)
+                for name in collection_names:
+                    collection = self.db[name]
+                    writer.begin_member()
+                    writer.write(
+                        encode_backup_record({COLLECTION_MARKER: name}, format)
+                    )
+                    documents = 0
+                    for doc in collection.find().batch_size(batch_size):
+                        writer.write(encode_backup_record(doc, format))
+                        documents += 1
+                        if progress and documents % batch_size == 0:
+                            progress(total_documents + documents, expected)
+                    member = writer.end_member()
+                    total_documents += documents
+                    manifest["collections"].append(
+                        {
+                            "name": name,
+                            "documents": documents,
+                            **member,
+                            "indexes": [
+                                {"name": index_name, **spec}
+                                for index_name, spec in collection.index_information().items()
+                                if index_name != "_id_"
+                            ],
+                        }
+                    )
+                    if progress:
+                        progress(total_documents, expected)
+                    log_info(f"Colección {name}: {documents} documentos")
+
+                manifest["total_collections"] = len(collection_names)
+                manifest["total_documents"] = total_documents
+                manifest["data_size"] = f.tell()
+                writer.begin_member()
+                writer.write(encode_backup_record({MANIFEST_MARKER: manifest}, format))
+                writer.end_member()
+        except JobCancelledError:
+            # Cancelación pedida desde la cola de trabajos (callback progress):
+            # se propaga tal cual para que el trabajo termine como cancelado
+            log_info(f"Backup en flujo cancelado: {path}")
+            _remove_partial_backup(path)
+            raise
+        except Exception as e:
+            log_error(f"Error creando backup en flujo: {str(e)}")
+            _remove_partial_backup(path)
+            raise BackupError(f"Error creando backup: {str(e)}")  # noqa: B904
+
+        with open(manifest_path(path), "w", encoding="utf-8") as f:
+            f.write(
+                json_util.dumps(manifest, json_options=BACKUP_JSON_OPTIONS, indent=2)
+            )
+        log_info(
+            f"Backup creado: {len(collection_names)} colecciones, {total_documents} documentos"
+        )
+        return manifest
+
     def _process_document_for_backup(self, doc: Dict[str, Any]) -> Dict[str, Any]:
         """Procesa un documento para el backup, convirtiendo tipos especiales."""
         processed: Dict[str, Any] = {}
@@ -439,59 +985,191 @@ class BackupManager:
         return processed
 
     def restore_backup(
-        self, backup_data: Dict[str, Any], overwrite: bool = False
+        self,
+        backup_data: Dict[str, Any],
+        overwrite: bool = False,
+        staging: bool = False,
+        batch_size: int = BACKUP_BATCH_SIZE,
+        workers: int = BACKUP_RESTORE_WORKERS,
     ) -> Dict[str, Any]:
-        """Restaura un backup en la base de datos."""
+        """
+        Restaura un backup ya cargado ({"metadata", "collections"}).
+
+        Las colecciones se restauran en paralelo y sus documentos se insertan
+        por lotes (ver CollectionRestore).
+        """
         try:
             log_info("Iniciando restauración de backup")
 
             if not self._validate_backup_structure(backup_data):
                 raise BackupError("Estructura de backup inválida")
 
-            collections = backup_data.get("collections", {})
-            results = {
-                "restored_collections": [],
-                "errors": [],
-                "total_documents": 0,
-                "skipped_documents": 0,
-            }
+            tasks = [
+                (
+                    collection_name,
+                    partial(
+                        self._restore_collection,
+                        collection_name,
+                        (self._process_document_for_restore(doc) for doc in documents),
+                        overwrite,
+                        staging=staging,
+                        batch_size=batch_size,
+                    ),
+                )
+                for collection_name, documents in backup_data["collections"].items()
+            ]
+            return self._run_restores(tasks, workers)
+        except Exception as e:
+            log_error(f"Error en restauración: {str(e)}")
+            raise BackupError(f"Error en restauración: {str(e)}")
 
-            for collection_name, documents in collections.items():
-                try:
-                    log_info(f"Restaurando colección: {collection_name}")
-                    result = self._restore_collection(
-                        collection_name, documents, overwrite
+    def restore_file(
+        self,
+        path,
+        collections: Optional[List[str]] = None,
+        overwrite: bool = False,
+        staging: bool = False,
+        batch_size: int = BACKUP_BATCH_SIZE,
+        workers: int = BACKUP_RESTORE_WORKERS,
+    ) -> Dict[str, Any]:
+        """
+        Restaura un backup leyendo los documentos del archivo en flujo.
+
+        - Con manifiesto ('<archivo>.manifest'): cada colección se lee de su
+          miembro del archivo y se restauran en paralelo.
+        - Backup en flujo sin manifiesto: una colección tras otra en una sola
+          pasada por el archivo.
+        - Backups antiguos (JSON, CSV): se cargan con FileProcessor.
+
+        Args:
+            path: Ruta del archivo de backup
+            collections (list): Colecciones a restaurar (None = todas)
+            overwrite (bool): Vaciar cada colección antes de insertar
+            staging (bool): Restaurar en una colección temporal y renombrarla
+                sobre la original al terminar (implica sustituirla)
+            batch_size (int): Documentos por insert_many
+            workers (int): Colecciones restauradas a la vez
+
+        Returns:
+            dict: Resultado con el mismo formato que restore_backup
+        """
+        if self.db is None:
+            raise BackupError("No se pudo conectar a la base de datos")
+        options = {"staging": staging, "batch_size": batch_size}
+        log_info(f"Iniciando restauración en flujo: {path}")
+
+        manifest = read_backup_manifest(path)
+        if manifest is not None:
+            tasks = [
+                (
+                    entry["name"],
+                    partial(
+                        self._restore_collection,
+                        entry["name"],
+                        iter_manifest_collection(path, entry, manifest.get("format")),
+                        overwrite,
+                        indexes=entry.get("indexes"),
+                        **options,
+                    ),
+                )
+                for entry in manifest.get("collections", [])
+                if not collections or entry["name"] in collections
+            ]
+            return self._run_restores(tasks, workers)
+
+        if not is_stream_backup_file(path):
+            with FileProcessor() as processor:
+                with open(path, "rb") as f:
+                    backup_data = processor.process_file_content(
+                        f.read(), os.path.basename(str(path))
                     )
+            if collections:
+                backup_data["collections"] = {
+                    name: docs
+                    for name, docs in backup_data["collections"].items()
+                    if name in collections
+                }
+            return self.restore_backup(
+                backup_data, overwrite, workers=workers, **options
+            )
 
-                    results["restored_collections"].append(
-                        {
-                            "name": collection_name,
-                            "documents_inserted": result["inserted_count"],
-                            "documents_skipped": result["skipped_count"],
-                            "errors": result["errors"],
-                        }
-                    )
+        results = self._new_restore_results()
+        current: Optional[CollectionRestore] = None
+        with open(path, "rb") as f:
+            for kind, value in iter_backup_records(f):
+                if kind == "document":
+                    if current is not None:
+                        current.add(value)
+                    continue
+                if current is not None:
+                    self._finish_restore(results, current)
+                    current = None
+                if kind == "collection" and (not collections or value in collections):
+                    current = CollectionRestore(self.db, value, overwrite, **options)
+        if current is not None:
+            self._finish_restore(results, current)
+        self._log_restore_results(results)
+        return results
+
+    def _new_restore_results(self) -> Dict[str, Any]:
+        return {
+            "restored_collections": [],
+            "errors": [],
+            "total_documents": 0,
+            "skipped_documents": 0,
+        }
 
-                    results["total_documents"] += result["inserted_count"]
-                    results["skipped_documents"] += result["skipped_count"]
+    def _add_restore_result(
+        self, results: Dict[str, Any], collection_name: str, result: Dict[str, Any]
+    ) -> None:
+        results["restored_collections"].append(
+            {
+                "name": collection_name,
+                "documents_inserted": result["inserted_count"],
+                "documents_skipped": result["skipped_count"],
+                "errors": result["errors"],
+            }
+        )
+        results["total_documents"] += result["inserted_count"]
+        results["skipped_documents"] += result["skipped_count"]
+        if result["errors"]:
+            results["errors"].extend(result["errors"])
+
+    def _add_restore_error(
+        self, results: Dict[str, Any], collection_name: str, error: Exception
+    ) -> None:
+        error_msg = f"Error restaurando colección {collection_name}: {str(error)}"
+        log_error(error_msg)
+        results["errors"].append(error_msg)
+
+    def _finish_restore(self, results: Dict[str, Any], restore: CollectionRestore):
+        try:
+            self._add_restore_result(results, restore.name, restore.finish())
+        except Exception as e:
+            restore.abort()
+            self._add_restore_error(results, restore.name, e)
 
-                    if result["errors"]:
-                        results["errors"].extend(result["errors"])
+    def _log_restore_results(self, results: Dict[str, Any]) -> None:
+        log_info(
+            f"Restauración completada: {results['total_documents']} documentos insertados, {results['skipped_documents']} omitidos"
+        )
 
+    def _run_restores(
+        self,
+        tasks: List[Tuple[str, Callable[[], Dict[str, Any]]]],
+        workers: int = BACKUP_RESTORE_WORKERS,
+    ) -> Dict[str, Any]:
+        """Ejecuta la restauración de cada colección en un pool de hilos"""
+        results = self._new_restore_results()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [(name, executor.submit(task)) for name, task in tasks]
+            for collection_name, future in futures:
+                try:
+                    self._add_restore_result(results, collection_name, future.result())
                 except Exception as e:
-                    error_msg = (
-                        f"Error restaurando colección {collection_name}: {str(e)}"
-                    )
-                    log_error(error_msg)
-                    results["errors"].append(error_msg)
-
-            log_info(
-                f"Restauración completada: {results['total_documents']} documentos insertados, {results['skipped_documents']} omitidos"
-            )
-            return results
-        except Exception as e:
-            log_error(f"Error en restauración: {str(e)}")
-            raise BackupError(f"Error en restauración: {str(e)}")
+                    self._add_restore_error(results, collection_name, e)
+        self._log_restore_results(results)
+        return results
 
     def _validate_backup_structure(self, backup_data: Dict[str, Any]) -> bool:
         """Valida la estructura del backup."""
@@ -510,47 +1188,24 @@ class BackupManager:
     def _restore_collection(
         self,
         collection_name: str,
-        documents: List[Dict[str, Any]],
+        documents: Iterable[Dict[str, Any]],
         overwrite: bool = False,
+        staging: bool = False,
+        batch_size: int = BACKUP_BATCH_SIZE,
+        indexes: Optional[List[Dict[str, Any]]] = None,
     ) -> Dict[str, Any]:
-        """Restaura una colección específica."""
-        collection = self.db[collection_name]
-        inserted_count = 0
-        skipped_count = 0
-        errors = []
-
-        # Si overwrite es True, limpiar la colección primero
-        if overwrite:
-            try:
-                _ = collection.delete_many({})
-                log_info(f"Colección {collection_name} limpiada para sobrescritura")
-            except Exception as e:
-                log_warning(
-                    f"No se pudo limpiar la colección {collection_name}: {str(e)}"
-                )
-
-        for doc in documents:
-            try:
-                # Procesar documento para restauración
-                processed_doc = self._process_document_for_restore(doc)
-
-                # Insertar documento
-                _ = collection.insert_one(processed_doc)
-                inserted_count += 1
-            except pymongo_errors.DuplicateKeyError:
-                # Documento duplicado, continuar
-                skipped_count += 1
-                continue
-            except Exception as e:
-                error_msg = f"Error insertando documento en {collection_name}: {str(e)}"
-                errors.append(error_msg)
-                log_warning(error_msg)
-
-        return {
-            "inserted_count": inserted_count,
-            "skipped_count": skipped_count,
-            "errors": errors,
-        }
+        """Restaura una colección específica por lotes."""
+        log_info(f"Restaurando colección: {collection_name}")
+        restore = CollectionRestore(
+            self.db, collection_name, overwrite, staging, batch_size, indexes
+        )
+        try:
+            for doc in documents:
+                restore.add(doc)
+            return restore.finish()
+        except Exception:
+            restore.abort()
+            raise
 
     def _process_document_for_restore(self, doc: Dict[str, Any]) -> Dict[str, Any]:
         """Procesa un documento para la restauración, convirtiendo tipos especiales."""
@@ -783,11 +1438,19 @@ class GoogleDriveManager:
 
 
 def create_compressed_backup(backup_data: Dict[str, Any]) -> bytes:
-    """Crea un backup comprimido en formato JSON.gz."""
+    """
+    Crea un backup comprimido en formato JSON.gz.
+
+    El JSON se escribe directamente en el compresor, sin generar antes el
+    texto completo. Para backups de la base de datos usar
+    BackupManager.write_backup, que no necesita tenerla en memoria.
+    """
     try:
-        json_data = json.dumps(backup_data, ensure_ascii=False, indent=2)
-        compressed_data = gzip.compress(json_data.encode("utf-8"))
-        return compressed_data
+        output = io.BytesIO()
+        with gzip.GzipFile(fileobj=output, mode="wb") as gz:
+            with io.TextIOWrapper(gz, encoding="utf-8") as text:
+                json.dump(backup_data, text, ensure_ascii=False)
+        return output.getvalue()
     except Exception as e:
         raise BackupError(f"Error creando backup comprimido: {str(e)}")
 
@@ -0,0 +1,298 @@
+"""
+Exportación de catálogos a CSV, JSON, NDJSON y XLSX en flujo.
+
+Los exportadores recorren un cursor de MongoDB con ``batch_size`` y generan
+el archivo por fragmentos (EXPORT_CHUNK_SIZE), así que la memoria no depende
+del número de catálogos ni de filas:
+
+- CSV / NDJSON / JSON: generadores de texto que se devuelven tal cual en una
+  respuesta de Flask (stream_with_context) o se escriben en un archivo.
+- XLSX: openpyxl en modo ``write_only`` sobre un archivo temporal, que luego
+  se envía por bloques y se elimina (el formato es un zip y no puede
+  generarse por fragmentos).
+
+Las filas de un catálogo 'rows_collection' se leen de catalog_rows por
+orden de posición; las de un catálogo embebido, del propio documento (ya
+acotado por el límite de 16 MB de BSON). Las copias de la colección de
+catálogos (iter_catalog_documents) incluyen las filas de catalog_rows en el
+campo 'data' de cada documento, igual que un catálogo embebido.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from bson.objectid import ObjectId
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from werkzeug.utils import secure_filename
+
+from app.utils.catalog_utils import (
+    ROW_ARRAY,
+    STORAGE_ROWS_COLLECTION,
+    get_embedded_rows,
+    get_rows_collection,
+    uses_rows_collection,
+)
+from config import CATALOG_EXPORT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Formato → (tipo MIME, extensión)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", ".csv"),
+    "json": ("application/json", ".json"),
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".xlsx",
+    ),
+}
+
+# Tamaño aproximado de cada fragmento de la respuesta
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Límite de caracteres de una celda de Excel
+XLSX_MAX_CELL_LENGTH = 32767
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _text_value(value: Any) -> Any:
+    """Valor de una celda de CSV o XLSX"""
+    if value is None:
+        return ""
+    if isinstance(value, (ObjectId, datetime, date)):
+        return _json_default(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    return value
+
+
+def export_filename(name: Optional[str], export_format: str) -> str:
+    """Nombre de archivo seguro (ASCII) para la descarga"""
+    base = secure_filename(name or "")
+    return f"{base or 'catalogo'}{EXPORT_FORMATS[export_format][1]}"
+
+
+def iter_catalog_rows(
+    collection,
+    catalog: Dict[str, Any],
+    batch_size: int = CATALOG_EXPORT_BATCH_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Filas de un catálogo en orden, sin cargar en memoria las de catalog_rows.
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        batch_size (int): Documentos por lote del cursor
+
+    Yields:
+        dict: Datos de cada fila
+    """
+    if uses_rows_collection(catalog):
+        cursor = (
+            get_rows_collection(collection)
+            .find({"catalog_id": catalog["_id"]}, {"data": 1})
+            .sort("position", 1)
+            .batch_size(batch_size)
+        )
+        for doc in cursor:
+            yield doc.get("data") or {}
+        return
+    doc = collection.find_one({"_id": catalog["_id"]}, {"data": 1, "rows": 1})
+    for row in get_embedded_rows(doc):
+        yield row if isinstance(row, dict) else {}
+
+
+def iter_catalog_documents(
+    collection, query: Optional[Dict[str, Any]] = None, batch_size: int = 100
+) -> Iterator[Dict[str, Any]]:
+    """
+    Documentos de catálogo completos, por lotes del cursor.
+
+    En los catálogos 'rows_collection' las filas de catalog_rows se copian en
+    'data', para que la exportación no se quede solo con los metadatos.
+    """
+    for doc in collection.find(query or {}).batch_size(batch_size):
+        if uses_rows_collection(doc):
+            doc[ROW_ARRAY] = list(iter_catalog_rows(collection, doc))
+        doc["_id"] = str(doc["_id"])
+        yield doc
+
+
+def catalog_document_fields(
+    collection, query: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    """
+    Campos presentes en los documentos de catálogo (columnas del CSV).
+
+    Se calculan en MongoDB sin leer los documentos en la aplicación.
+    """
+    pipeline = [
+        {"$match": query or {}},
+        {"$project": {"fields": {"$objectToArray": "$$ROOT"}}},
+        {"$unwind": "$fields"},
+        {"$group": {"_id": "$fields.k"}},
+    ]
+    fields = sorted(doc["_id"] for doc in collection.aggregate(pipeline))
+    # Las filas de los catálogos 'rows_collection' se exportan en 'data'
+    # (ver iter_catalog_documents) aunque el documento no tenga ese campo
+    if ROW_ARRAY not in fields and collection.count_documents(
+        {"$and": [query or {}, {"storage": STORAGE_ROWS_COLLECTION}]}, limit=1
+    ):
+        fields = sorted(fields + [ROW_ARRAY])
+    if "_id" in fields:
+        fields.remove("_id")
+        fields.insert(0, "_id")
+    return fields
+
+
+def _drain(buffer: io.StringIO) -> str:
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
+
+
+def iter_csv(headers: List[str], rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    CSV por fragmentos: encabezados y una línea por fila.
+
+    Empieza con el BOM de UTF-8 para que Excel reconozca la codificación.
+    """
+    buffer = io.StringIO()
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow([_text_value(row.get(header)) for header in headers])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def iter_ndjson(rows: Iterable[Any]) -> Iterator[str]:
+    """NDJSON por fragmentos: un objeto JSON por línea"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+        buffer.write("\n")
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def iter_json(rows: Iterable[Any]) -> Iterator[str]:
+    """Lista JSON por fragmentos"""
+    buffer = io.StringIO()
+    buffer.write("[")
+    separator = "\n"
+    for row in rows:
+        buffer.write(separator)
+        buffer.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+        separator = ",\n"
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield _drain(buffer)
+    buffer.write("\n]\n")
+    yield _drain(buffer)
+
+
+def _xlsx_value(value: Any) -> Any:
+    value = _text_value(value)
+    if isinstance(value, str):
+        value = ILLEGAL_CHARACTERS_RE.sub("", value)[:XLSX_MAX_CELL_LENGTH]
+    return value
+
+
+def write_xlsx(
+    path: str, headers: List[str], rows: Iterable[Dict[str, Any]], title: str = ""
+) -> None:
+    """Escribe un XLSX fila a fila con openpyxl en modo write_only"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(
+        title=(re.sub(r"[\[\]:*?/\\]", "", title) or "Catalogo")[:31]
+    )
+    sheet.append(headers)
+    for row in rows:
+        sheet.append([_xlsx_value(row.get(header)) for header in headers])
+    workbook.save(path)
+
+
+def iter_file(path: str, remove: bool = True) -> Iterator[bytes]:
+    """Contenido de un archivo por bloques; lo elimina al terminar"""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove and os.path.exists(path):
+            os.remove(path)
+
+
+def iter_export(
+    export_format: str,
+    headers: List[str],
+    rows: Iterable[Dict[str, Any]],
+    title: str = "",
+) -> Iterator[Any]:
+    """
+    Archivo de exportación por fragmentos en el formato indicado.
+
+    Args:
+        export_format (str): Clave de EXPORT_FORMATS
+        headers (list): Columnas (CSV y XLSX)
+        rows: Iterable de filas (dict)
+        title (str): Nombre de la hoja (XLSX)
+
+    Yields:
+        str o bytes: Fragmentos del archivo
+    """
+    if export_format == "csv":
+        return iter_csv(headers, rows)
+    if export_format == "ndjson":
+        return iter_ndjson(rows)
+    if export_format == "json":
+        return iter_json(rows)
+    if export_format == "xlsx":
+        handle, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(handle)
+        try:
+            write_xlsx(path, headers, rows, title)
+        except Exception:
+            os.remove(path)
+            raise
+        return iter_file(path)
+    raise ValueError(f"Formato de exportación no soportado: {export_format}")
+
+
+def write_export(path: str, chunks: Iterable[Any]) -> int:
+    """
+    Escribe en un archivo los fragmentos de un exportador.
+
+    Returns:
+        int: Bytes escritos
+    """
+    written = 0
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            f.write(data)
+            written += len(data)
+    return written
@@ -0,0 +1,292 @@
+"""
+Importación de catálogos desde archivos CSV y Excel en flujo.
+
+El archivo se lee por bloques y las filas se escriben por lotes, de modo que
+la memoria no depende del tamaño del archivo:
+
+- CSV: pandas ``read_csv`` con ``chunksize`` (o el módulo csv si pandas no
+  está instalado). Todas las celdas se conservan como texto, igual que con
+  el módulo csv: sin inferir tipos no se pierden ceros a la izquierda ni
+  cambia el tipo de una columna de un bloque a otro.
+- XLSX/XLSM: openpyxl en modo ``read_only``, fila a fila. Los .xls antiguos
+  (limitados a 65.536 filas) se leen con pandas ``read_excel``.
+
+Si el archivo cabe en un lote (CATALOG_IMPORT_BATCH_SIZE filas) se crea un
+catálogo embebido como hasta ahora; si no, el catálogo se crea en formato
+'rows_collection' y cada lote se inserta con insert_many en catalog_rows, sin
+el límite de 16 MB de BSON. Si la importación falla a medias se eliminan el
+catálogo y las filas ya escritas.
+"""
+
+import csv
+import io
+import logging
+import math
+import os
+from datetime import datetime
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from openpyxl import load_workbook
+
+from app.exceptions import CatalogImportError
+from app.utils.catalog_utils import (
+    STORAGE_ROWS_COLLECTION,
+    THUMBNAIL_FIELD,
+    delete_catalog_rows,
+    find_rows_thumbnail,
+    get_rows_collection,
+)
+from config import CATALOG_IMPORT_BATCH_SIZE
+
+try:
+    import pandas as pd
+
+    pandas_available = True
+except ImportError:
+    pandas_available = False
+    pd = None
+
+logger = logging.getLogger(__name__)
+
+CSV_EXTENSIONS = (".csv",)
+XLSX_EXTENSIONS = (".xlsx", ".xlsm", ".xltx", ".xltm")
+XLS_EXTENSIONS = (".xls",)
+IMPORT_EXTENSIONS = CSV_EXTENSIONS + XLSX_EXTENSIONS + XLS_EXTENSIONS
+
+
+def _clean_cell(value: Any) -> Any:
+    """Celda lista para guardar: los vacíos de pandas (NaN, NaT) como ''"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if pandas_available and value is pd.NaT:
+        return ""
+    return value
+
+
+def _normalize_headers(raw_headers: Iterable[Any]) -> List[str]:
+    """Encabezados como texto; los vacíos se nombran por su posición"""
+    raw_headers = list(raw_headers)
+    if not any(h is not None and str(h).strip() for h in raw_headers):
+        raise CatalogImportError("El archivo no contiene encabezados válidos")
+    headers = []
+    for position, header in enumerate(raw_headers, start=1):
+        name = str(header).strip() if header is not None else ""
+        headers.append(name or f"Columna {position}")
+    return headers
+
+
+def _batched(rows: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Any]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _row_from_values(headers: List[str], values) -> Optional[Dict[str, Any]]:
+    """Fila a partir de una secuencia de valores (None si está vacía)"""
+    values = [_clean_cell(value) for value in values]
+    if not any(value != "" for value in values):
+        return None
+    return {
+        header: values[i] if i < len(values) else "" for i, header in enumerate(headers)
+    }
+
+
+def _read_csv(stream, batch_size: int) -> Tuple[List[str], Iterator[List[Any]]]:
+    if pandas_available:
+        try:
+            reader = pd.read_csv(
+                stream,
+                encoding="utf-8",
+                chunksize=batch_size,
+                skip_blank_lines=True,
+                dtype=str,
+                keep_default_na=False,
+            )
+            first = next(reader)
+        except (pd.errors.EmptyDataError, StopIteration):
+            raise CatalogImportError("El archivo está vacío")
+        headers = _normalize_headers(first.columns)
+
+        def batches():
+            for chunk in chain([first], reader):
+                rows = (
+                    _row_from_values(headers, values)
+                    for values in chunk.itertuples(index=False, name=None)
+                )
+                yield [row for row in rows if row is not None]
+
+        return headers, (batch for batch in batches() if batch)
+
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    reader = csv.reader(text)
+    raw_headers = next(reader, None)
+    if raw_headers is None:
+        raise CatalogImportError("El archivo está vacío")
+    headers = _normalize_headers(raw_headers)
+    rows = (_row_from_values(headers, values) for values in reader)
+    return headers, _batched((row for row in rows if row is not None), batch_size)
+
+
+def _read_xlsx(stream, batch_size: int) -> Tuple[List[str], Iterator[List[Any]]]:
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    sheet = workbook.active
+    values = sheet.iter_rows(values_only=True)
+    raw_headers = next(values, None)
+    if raw_headers is None:
+        workbook.close()
+        raise CatalogImportError("El archivo está vacío")
+    headers = _normalize_headers(raw_headers)
+
+    def rows():
+        try:
+            for row_values in values:
+                row = _row_from_values(headers, row_values)
+                if row is not None:
+                    yield row
+        finally:
+            workbook.close()
+
+    return headers, _batched(rows(), batch_size)
+
+
+def _read_xls(stream, batch_size: int) -> Tuple[List[str], Iterator[List[Any]]]:
+    if not pandas_available:
+        raise CatalogImportError(
+            "La importación de archivos .xls requiere pandas; use CSV o XLSX"
+        )
+    df = pd.read_excel(stream)
+    headers = _normalize_headers(df.columns)
+    rows = (
+        _row_from_values(headers, values)
+        for values in df.itertuples(index=False, name=None)
+    )
+    return headers, _batched((row for row in rows if row is not None), batch_size)
+
+
+def read_import_file(
+    stream, filename: str, batch_size: int = CATALOG_IMPORT_BATCH_SIZE
+) -> Tuple[List[str], Iterator[List[Dict[str, Any]]]]:
+    """
+    Abre un archivo CSV o Excel para importarlo por lotes.
+
+    Args:
+        stream: Archivo abierto en modo binario (p. ej. FileStorage.stream)
+        filename (str): Nombre del archivo (determina el formato)
+        batch_size (int): Filas por lote
+
+    Returns:
+        tuple: (encabezados, iterador de lotes de filas)
+
+    Raises:
+        CatalogImportError: Formato no soportado, archivo vacío o sin
+        encabezados
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in CSV_EXTENSIONS:
+        return _read_csv(stream, batch_size)
+    if ext in XLSX_EXTENSIONS:
+        return _read_xlsx(stream, batch_size)
+    if ext in XLS_EXTENSIONS:
+        return _read_xls(stream, batch_size)
+    raise CatalogImportError(
+        f"Formato de archivo no soportado: {ext or filename}. Use CSV o Excel."
+    )
+
+
+def import_catalog_rows(
+    collection,
+    catalog_fields: Dict[str, Any],
+    headers: List[str],
+    batches: Iterable[List[Dict[str, Any]]],
+    progress: Optional[Callable[[int], None]] = None,
+) -> Tuple[Any, int]:
+    """
+    Crea un catálogo con las filas de ``batches`` escribiéndolas por lotes.
+
+    Con un solo lote el catálogo se guarda embebido ('data'); con más, en
+    formato 'rows_collection' con un insert_many por lote. Si falla la
+    escritura se eliminan el catálogo y las filas insertadas.
+
+    Args:
+        collection: Colección de catálogos (spreadsheets)
+        catalog_fields (dict): Campos del documento del catálogo (nombre,
+            propietario, fechas...)
+        headers (list): Encabezados
+        batches: Iterador de lotes de filas (read_import_file)
+        progress: Función opcional que recibe el número de filas escritas
+            tras cada lote
+
+    Returns:
+        tuple: (ID del catálogo creado, número de filas)
+
+    Raises:
+        CatalogImportError: Si el archivo no tiene filas
+    """
+    batches = iter(batches)
+    first = next(batches, None)
+    if not first:
+        raise CatalogImportError("El archivo no contiene filas")
+    second = next(batches, None)
+
+    if second is None:
+        result = collection.insert_one(
+            {
+                **catalog_fields,
+                "headers": headers,
+                "data": first,
+                THUMBNAIL_FIELD: find_rows_thumbnail(first),
+                "num_rows": len(first),
+            }
+        )
+        if progress:
+            progress(len(first))
+        return result.inserted_id, len(first)
+
+    catalog_id = collection.insert_one(
+        {
+            **catalog_fields,
+            "headers": headers,
+            "storage": STORAGE_ROWS_COLLECTION,
+            THUMBNAIL_FIELD: "",
+            "num_rows": 0,
+        }
+    ).inserted_id
+    rows_collection = get_rows_collection(collection)
+    total = 0
+    thumbnail = ""
+    try:
+        for batch in chain([first, second], batches):
+            rows_collection.insert_many(
+                [
+                    {"catalog_id": catalog_id, "position": position, "data": row}
+                    for position, row in enumerate(batch, start=total)
+                ],
+                ordered=False,
+            )
+            total += len(batch)
+            thumbnail = thumbnail or find_rows_thumbnail(batch)
+            logger.info(f"Importación del catálogo {catalog_id}: {total} filas")
+            if progress:
+                progress(total)
+    except Exception:
+        delete_catalog_rows(collection, catalog_id)
+        collection.delete_one({"_id": catalog_id})
+        raise
+
+    collection.update_one(
+        {"_id": catalog_id},
+        {
+            "$set": {
+                "num_rows": total,
+                THUMBNAIL_FIELD: thumbnail,
+                "updated_at": datetime.utcnow(),
+            }
+        },
+    )
+    return catalog_id, total
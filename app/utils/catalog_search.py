@@ -0,0 +1,425 @@
+"""
+Búsqueda de catálogos y de filas.
+
+- Prefijo sobre el nombre: 'search_keys' guarda las palabras del nombre
+  normalizadas (minúsculas y sin acentos). Con su índice multiclave, cada
+  término se busca con una expresión regular anclada ('^term'), que MongoDB
+  resuelve como un rango del índice.
+- Texto completo: índices de texto 'search_text' en spreadsheets (solo
+  nombre, encabezados y descripción: un índice comodín reindexaría el array
+  de filas entero en cada escritura de una fila) y en catalog_rows (filas de
+  los catálogos 'rows_collection'). Las filas embebidas se buscan con $unwind
+  y expresiones regulares por prefijo de palabra. Los resultados se ordenan
+  por relevancia (textScore).
+- Las coincidencias se resaltan con <mark> (highlight_matches) en el nombre
+  del catálogo y en las celdas de las filas.
+
+'search_keys' se escribe al crear o renombrar un catálogo (ver
+tools/maintenance/backfill_catalog_search_keys.py para los anteriores).
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from markupsafe import Markup, escape
+from pymongo import DESCENDING, TEXT
+
+from app.utils.catalog_utils import (
+    EMBEDDED_ROWS_EXPRESSION,
+    STORAGE_ROWS_COLLECTION,
+    find_catalog_summaries,
+    get_catalog_rows,
+    get_rows_collection,
+    uses_rows_collection,
+)
+from config import SEARCH_MAX_RESULTS, SEARCH_TEXT_LANGUAGE
+
+logger = logging.getLogger(__name__)
+
+# Palabras normalizadas del nombre del catálogo (búsqueda por prefijo)
+SEARCH_KEYS_FIELD = "search_keys"
+
+# Índices de texto: campos de los metadatos en spreadsheets y todos los
+# campos (las celdas de la fila) en catalog_rows
+TEXT_INDEX_NAME = "search_text"
+CATALOG_TEXT_FIELDS = ("name", "headers", "description")
+TEXT_INDEX_KEYS = [(field, TEXT) for field in CATALOG_TEXT_FIELDS]
+ROWS_TEXT_INDEX_KEYS = [("$**", TEXT)]
+# El nombre pesa más que los encabezados y estos más que las celdas
+TEXT_INDEX_WEIGHTS = {"name": 10, "headers": 3}
+# Campo de idioma por documento: uno que las filas no usen ('language' podría
+# ser una columna de un catálogo)
+TEXT_LANGUAGE_OVERRIDE = "search_language"
+
+_WORD_RE = re.compile(r"\w+")
+
+# Variantes de cada letra en las expresiones regulares de MongoDB, que no
+# ignoran los acentos
+_ACCENT_CLASSES = {
+    "a": "aáàâä",
+    "e": "eéèêë",
+    "i": "iíìîï",
+    "o": "oóòôö",
+    "u": "uúùûü",
+    "n": "nñ",
+    "c": "cç",
+}
+
+
+def text_index_options() -> Dict[str, Any]:
+    """Opciones del índice de texto (ver db_indexes.get_index_registry)"""
+    return {
+        "weights": TEXT_INDEX_WEIGHTS,
+        "default_language": SEARCH_TEXT_LANGUAGE,
+        "language_override": TEXT_LANGUAGE_OVERRIDE,
+    }
+
+
+def _normalize_char(char: str) -> str:
+    decomposed = "".join(
+        c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c)
+    ).lower()
+    # Conservar la longitud para poder resaltar sobre el texto original
+    return decomposed if len(decomposed) == 1 else char.lower()
+
+
+def normalize_search_text(value: Any) -> str:
+    """Texto en minúsculas y sin acentos, con la misma longitud que el original"""
+    return "".join(_normalize_char(char) for char in str(value))
+
+
+def tokenize_search_text(value: Any) -> List[str]:
+    """Palabras normalizadas de un texto"""
+    return _WORD_RE.findall(normalize_search_text(value))
+
+
+def name_search_keys(name: Any) -> List[str]:
+    """
+    Valor de 'search_keys' para el nombre de un catálogo.
+
+    Args:
+        name: Nombre del catálogo
+
+    Returns:
+        list: Palabras normalizadas sin repetir, en orden
+    """
+    if not name:
+        return []
+    return list(dict.fromkeys(tokenize_search_text(name)))
+
+
+def parse_search_terms(text: str) -> List[str]:
+    """
+    Términos de una búsqueda para puntuar y resaltar en Python.
+
+    Ignora las exclusiones ('-palabra') que el índice de texto sí aplica.
+    """
+    terms = []
+    for part in (text or "").split():
+        if part.startswith("-"):
+            continue
+        terms.extend(tokenize_search_text(part))
+    return list(dict.fromkeys(terms))
+
+
+def name_prefix_query(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Filtro de catálogos cuyo nombre tiene palabras que empiezan por cada uno
+    de los términos de la búsqueda.
+
+    Los catálogos anteriores a 'search_keys' que aún no lo tienen (ver
+    tools/maintenance/backfill_catalog_search_keys.py) se filtran con una
+    expresión regular sobre el nombre, sin índice.
+
+    Args:
+        text (str): Texto buscado
+
+    Returns:
+        dict: Filtro sobre 'search_keys' o None si no hay términos
+    """
+    terms = parse_search_terms(text)
+    if not terms:
+        return None
+    keys = [{SEARCH_KEYS_FIELD: {"$regex": f"^{re.escape(term)}"}} for term in terms]
+    names = [
+        {"name": {"$regex": _mongo_term_regex([term]), "$options": "i"}}
+        for term in terms
+    ]
+    return {
+        "$or": [
+            keys[0] if len(keys) == 1 else {"$and": keys},
+            {SEARCH_KEYS_FIELD: {"$exists": False}, "$and": names},
+        ]
+    }
+
+
+def _mongo_term_regex(terms: Iterable[str]) -> Optional[str]:
+    """
+    Expresión regular de MongoDB (con la opción 'i') para palabras que
+    empiezan por alguno de los términos, sin distinguir acentos.
+    """
+    alternatives = []
+    for term in sorted(set(terms), key=len, reverse=True):
+        alternatives.append(
+            "".join(
+                (
+                    f"[{_ACCENT_CLASSES[char]}]"
+                    if char in _ACCENT_CLASSES
+                    else re.escape(char)
+                )
+                for char in term
+            )
+        )
+    if not alternatives:
+        return None
+    return r"(^|[^\w])(" + "|".join(alternatives) + ")"
+
+
+def _term_pattern(terms: Iterable[str]) -> Optional["re.Pattern"]:
+    terms = sorted(set(terms), key=len, reverse=True)
+    if not terms:
+        return None
+    # Coincidencias al comienzo de una palabra (prefijo)
+    return re.compile(r"(?<!\w)(" + "|".join(re.escape(term) for term in terms) + ")")
+
+
+def highlight_matches(value: Any, terms: List[str]) -> Markup:
+    """
+    Resalta con <mark> las palabras del texto que empiezan por algún término.
+
+    La comparación ignora mayúsculas y acentos; el resto del texto se escapa.
+
+    Args:
+        value: Texto o valor de la celda
+        terms (list): Términos normalizados (parse_search_terms)
+
+    Returns:
+        Markup: HTML seguro para la plantilla
+    """
+    text = "" if value is None else str(value)
+    pattern = _term_pattern(terms)
+    if pattern is None or not text:
+        return escape(text)
+    parts = []
+    last = 0
+    for match in pattern.finditer(normalize_search_text(text)):
+        parts.append(escape(text[last : match.start()]))
+        parts.append(Markup("<mark>%s</mark>") % text[match.start() : match.end()])
+        last = match.end()
+    parts.append(escape(text[last:]))
+    return Markup("").join(parts)
+
+
+def _score_row(row: Any, pattern: "re.Pattern") -> tuple:
+    """(términos distintos encontrados, coincidencias) en las celdas de una fila"""
+    if not isinstance(row, dict):
+        return 0, 0
+    found = set()
+    hits = 0
+    for key, value in row.items():
+        if key.startswith("_") or not isinstance(value, (str, int, float)):
+            continue
+        for match in pattern.finditer(normalize_search_text(value)):
+            found.add(match.group(1))
+            hits += 1
+    return len(found), hits
+
+
+def _row_highlights(
+    row: Dict[str, Any], headers: List[str], terms: List[str]
+) -> Dict[str, Markup]:
+    pattern = _term_pattern(terms)
+    highlights = {}
+    for header in headers or row.keys():
+        value = row.get(header)
+        if value is None or isinstance(value, (list, dict)):
+            continue
+        if pattern is not None and pattern.search(normalize_search_text(value)):
+            highlights[header] = highlight_matches(value, terms)
+    return highlights
+
+
+def search_catalog_rows(
+    collection,
+    catalog: Dict[str, Any],
+    text: str,
+    limit: int = SEARCH_MAX_RESULTS,
+) -> List[Dict[str, Any]]:
+    """
+    Filas de un catálogo que coinciden con la búsqueda, por relevancia.
+
+    En los catálogos 'rows_collection' la búsqueda usa el índice de texto de
+    catalog_rows; en los embebidos se puntúan las filas en Python (el
+    documento está acotado por el límite de 16 MB de BSON) contando las
+    palabras que empiezan por cada término.
+
+    Args:
+        collection: Colección de catálogos
+        catalog: Documento del catálogo (basta con los metadatos)
+        text (str): Texto buscado
+        limit (int): Máximo de filas
+
+    Returns:
+        list: [{"index": posición de la fila, "row": datos, "score": relevancia,
+        "highlights": {encabezado: Markup}}]
+    """
+    terms = parse_search_terms(text)
+    if not terms:
+        return []
+    headers = catalog.get("headers") or []
+    results = []
+
+    if uses_rows_collection(catalog):
+        cursor = (
+            get_rows_collection(collection)
+            .find(
+                {"catalog_id": catalog["_id"], "$text": {"$search": text}},
+                {"position": 1, "data": 1, "score": {"$meta": "textScore"}},
+            )
+            .sort([("score", {"$meta": "textScore"})])
+            .limit(limit)
+        )
+        for doc in cursor:
+            row = doc.get("data") or {}
+            results.append(
+                {
+                    "index": doc.get("position", 0),
+                    "row": row,
+                    "score": doc.get("score", 0),
+                    "highlights": _row_highlights(row, headers, terms),
+                }
+            )
+        return results
+
+    pattern = _term_pattern(terms)
+    for index, row in enumerate(get_catalog_rows(collection, catalog)):
+        found, hits = _score_row(row, pattern)
+        if found:
+            results.append(
+                {
+                    "index": index,
+                    "row": row,
+                    "score": found * 10 + hits,
+                    "highlights": _row_highlights(row, headers, terms),
+                }
+            )
+    results.sort(key=lambda result: (-result["score"], result["index"]))
+    return results[:limit]
+
+
+def search_catalogs(
+    collection,
+    text: str,
+    query: Optional[Dict[str, Any]] = None,
+    limit: int = SEARCH_MAX_RESULTS,
+) -> List[Dict[str, Any]]:
+    """
+    Catálogos cuyo nombre, encabezados o filas coinciden con la búsqueda.
+
+    Combina el índice de texto de la colección de catálogos (nombre,
+    encabezados y descripción), las filas embebidas ($unwind) y el índice de
+    texto de catalog_rows (agrupado por catálogo), y ordena por relevancia.
+
+    Args:
+        collection: Colección de catálogos
+        text (str): Texto buscado
+        query (dict): Filtro adicional (p. ej. el propietario)
+        limit (int): Máximo de catálogos
+
+    Returns:
+        list: Datos de listado (find_catalog_summaries) más 'search_score',
+        'matched_rows' (filas coincidentes, o None si solo coinciden los
+        metadatos) y 'name_highlight'
+    """
+    if not text or not text.strip():
+        return []
+    query = query or {}
+    scores: Dict[Any, float] = {}
+    matched_rows: Dict[Any, int] = {}
+
+    # 1. Nombre, encabezados y descripción
+    for doc in collection.aggregate(
+        [
+            {"$match": {**query, "$text": {"$search": text}}},
+            {"$sort": {"score": {"$meta": "textScore"}}},
+            {"$limit": limit},
+            {"$project": {"score": {"$meta": "textScore"}}},
+        ]
+    ):
+        scores[doc["_id"]] = doc["score"]
+
+    # 2. Filas embebidas: una celda de texto con una palabra que empiece por
+    # algún término. Sin textScore, cada fila coincidente suma como una
+    # coincidencia débil en el índice de texto
+    regex = _mongo_term_regex(parse_search_terms(text))
+    if regex:
+        for group in collection.aggregate(
+            [
+                {"$match": {**query, "storage": {"$ne": STORAGE_ROWS_COLLECTION}}},
+                {"$project": {"row": EMBEDDED_ROWS_EXPRESSION}},
+                {"$unwind": {"path": "$row", "includeArrayIndex": "index"}},
+                {"$match": {"row": {"$type": "object"}}},
+                {"$project": {"index": 1, "cell": {"$objectToArray": "$row"}}},
+                {"$unwind": "$cell"},
+                {"$match": {"cell.v": {"$regex": regex, "$options": "i"}}},
+                {"$group": {"_id": {"catalog": "$_id", "index": "$index"}}},
+                {"$group": {"_id": "$_id.catalog", "matches": {"$sum": 1}}},
+                {"$sort": {"matches": DESCENDING}},
+                {"$limit": limit},
+            ]
+        ):
+            score = 0.5 + 0.1 * min(group["matches"], 10)
+            scores[group["_id"]] = max(scores.get(group["_id"], 0), score)
+            matched_rows[group["_id"]] = group["matches"]
+
+    # 3. Filas de los catálogos 'rows_collection'
+    row_match: Dict[str, Any] = {"$text": {"$search": text}}
+    if query:
+        # Solo los catálogos que el filtro permite ver
+        row_match["catalog_id"] = {
+            "$in": [
+                doc["_id"]
+                for doc in collection.find(
+                    {**query, "storage": STORAGE_ROWS_COLLECTION}, {"_id": 1}
+                )
+            ]
+        }
+    if not query or row_match["catalog_id"]["$in"]:
+        for group in get_rows_collection(collection).aggregate(
+            [
+                {"$match": row_match},
+                {"$project": {"catalog_id": 1, "score": {"$meta": "textScore"}}},
+                {
+                    "$group": {
+                        "_id": "$catalog_id",
+                        "score": {"$max": "$score"},
+                        "matches": {"$sum": 1},
+                    }
+                },
+                {"$sort": {"score": DESCENDING}},
+                {"$limit": limit},
+            ]
+        ):
+            scores[group["_id"]] = max(scores.get(group["_id"], 0), group["score"])
+            matched_rows[group["_id"]] = group["matches"]
+
+    if not scores:
+        return []
+    ranked = sorted(scores, key=lambda catalog_id: -scores[catalog_id])[:limit]
+    summaries = {
+        doc["_id"]: doc
+        for doc in find_catalog_summaries(collection, {**query, "_id": {"$in": ranked}})
+    }
+    terms = parse_search_terms(text)
+    results = []
+    for catalog_id in ranked:
+        summary = summaries.get(catalog_id)
+        if summary is None:
+            continue
+        summary["search_score"] = scores[catalog_id]
+        summary["matched_rows"] = matched_rows.get(catalog_id)
+        summary["name_highlight"] = highlight_matches(summary.get("name", ""), terms)
+        results.append(summary)
+    return results
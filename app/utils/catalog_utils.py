@@ -0,0 +1,1583 @@
+"""
+Capa de acceso a datos de catálogos (colección spreadsheets).
+
+Centraliza la lectura y escritura de filas, el contador de filas almacenado
+en el documento ('num_rows') y los parámetros de paginación de las vistas.
+
+Las filas pueden estar en dos formatos, según el campo 'storage' del catálogo:
+
+- ``embedded`` (por defecto): array 'data' dentro del documento. Los
+  documentos antiguos duplicaban las filas en 'rows'; las lecturas y las
+  escrituras lo usan mientras 'data' esté vacío, y el duplicado se elimina
+  con tools/maintenance/normalize_catalog_rows.py.
+- ``rows_collection``: un documento por fila en la colección 'catalog_rows'
+  con la forma ``{catalog_id, position, data}``. Evita reescribir el array
+  completo en cada cambio y el límite de 16 MB de BSON en catálogos grandes.
+  Ver tools/maintenance/migrate_catalog_rows.py.
+
+Las escrituras de filas mantienen también 'miniatura_auto', la primera imagen
+de las filas, para que los listados no tengan que recorrerlas (ver
+tools/maintenance/backfill_catalog_thumbnails.py).
+
+El propietario de cada catálogo se guarda en 'owner_id' (el _id del usuario)
+para que los listados y contadores por usuario filtren por un único campo
+indexado en lugar de combinar created_by/owner/owner_name/email/username (ver
+tools/maintenance/backfill_catalog_owner.py). Mientras queden catálogos
+antiguos sin 'owner_id', owner_query y count_catalogs_by_owner los siguen
+atribuyendo por esos campos históricos.
+
+Los filtros y la ordenación por columna de las vistas y de la API de filas
+se ejecutan en MongoDB (query_catalog_rows): $unwind del array embebido o
+consulta a catalog_rows, seguidos de $match, $sort, $skip y $limit, de modo
+que solo se leen las filas de la página.
+
+Cada escritura de filas incrementa el campo 'version' del catálogo. Los
+formularios de edición envían la versión que leyeron y, si otra petición ha
+modificado el catálogo entretanto, se lanza CatalogVersionConflictError en
+lugar de sobrescribir sus cambios.
+"""
+
+import logging
+import math
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from app.exceptions import CatalogVersionConflictError
+
+logger = logging.getLogger(__name__)
+
+# Array canónico de filas de los catálogos embebidos. 'rows' es el duplicado
+# histórico: solo se usa en documentos aún no normalizados con 'data' vacío
+# (ver normalize_catalog_rows)
+ROW_ARRAY = "data"
+LEGACY_ROW_ARRAY = "rows"
+ROW_ARRAYS = (ROW_ARRAY, LEGACY_ROW_ARRAY)
+
+# Formatos de almacenamiento de filas (campo 'storage' del catálogo)
+STORAGE_EMBEDDED = "embedded"
+STORAGE_ROWS_COLLECTION = "rows_collection"
+
+# Colección con un documento por fila para catálogos 'rows_collection'
+ROWS_COLLECTION = "catalog_rows"
+
+# Identificador estable de cada fila embebida (permite $pull sin depender
+# de la posición)
+ROW_ID_FIELD = "_row_id"
+
+# Expresión de agregación equivalente a get_embedded_rows(): 'data' salvo que
+# falte o esté vacío en un documento antiguo que aún tenga 'rows'
+EMBEDDED_ROWS_EXPRESSION = {
+    "$cond": [
+        {"$gt": [{"$size": {"$ifNull": ["$data", []]}}, 0]},
+        "$data",
+        {"$ifNull": ["$rows", []]},
+    ]
+}
+
+# Miniatura automática del catálogo: referencia (URL externa o nombre de
+# archivo) a la primera imagen de sus filas; "" si no tiene ninguna. La
+# miniatura personalizada 'miniatura' tiene prioridad al mostrarla
+THUMBNAIL_FIELD = "miniatura_auto"
+THUMBNAIL_ROW_FIELDS = ("Imagen", "imagenes", "images", "imagen_data", "imagen")
+
+# Propietario canónico del catálogo: ObjectId del usuario que lo creó
+OWNER_ID_FIELD = "owner_id"
+# Campos históricos con el username, nombre o email del propietario, por orden
+# de preferencia al resolver 'owner_id' en los catálogos antiguos
+LEGACY_OWNER_FIELDS = ("created_by", "owner", "owner_name", "email", "username")
+
+# Colecciones con catálogos: tablas actuales y catálogos antiguos
+CATALOG_COLLECTIONS = ("spreadsheets", "catalogs")
+
+# Proyección para cargar solo los metadatos de un catálogo (sin filas)
+CATALOG_METADATA_PROJECTION = {field: 0 for field in ROW_ARRAYS}
+
+# Campos de los listados de catálogos (catalogs.html, dashboard_unificado.html):
+# ni filas ni otros datos pesados
+CATALOG_SUMMARY_FIELDS = (
+    "name",
+    "headers",
+    OWNER_ID_FIELD,
+    "created_by",
+    "owner",
+    "owner_name",
+    "email",
+    "username",
+    "created_at",
+    "updated_at",
+    "miniatura",
+    THUMBNAIL_FIELD,
+    "storage",
+)
+
+# Número de filas de un catálogo calculado en el servidor: el contador
+# 'num_rows' o, en documentos antiguos sin él, el tamaño del array embebido
+ROW_COUNT_EXPRESSION = {
+    "$cond": [
+        {"$isNumber": "$num_rows"},
+        "$num_rows",
+        {"$size": EMBEDDED_ROWS_EXPRESSION},
+    ]
+}
+
+# Ordenaciones permitidas en los listados (parámetro 'sort')
+CATALOG_SORT_FIELDS = ("created_at", "updated_at", "name", "row_count")
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+def _as_object_id(catalog_id):
+    """Convierte un ID de catálogo a ObjectId si es necesario"""
+    return catalog_id if isinstance(catalog_id, ObjectId) else ObjectId(catalog_id)
+
+
+def uses_rows_collection(catalog: Optional[Dict[str, Any]]) -> bool:
+    """Indica si las filas del catálogo están en la colección catalog_rows"""
+    return bool(catalog) and catalog.get("storage") == STORAGE_ROWS_COLLECTION
+
+
+def get_rows_collection(collection):
+    """Devuelve la colección catalog_rows de la misma base de datos"""
+    return collection.database[ROWS_COLLECTION]
+
+
+def ensure_rows_collection_indexes(db) -> None:
+    """
+    Crea el índice (catalog_id, position) de la colección catalog_rows.
+
+    No es único: al eliminar una fila las posiciones siguientes se desplazan
+    con un único update_many y no deben chocar entre sí durante la operación.
+    """
+    try:
+        db[ROWS_COLLECTION].create_index(
+            [("catalog_id", ASCENDING), ("position", ASCENDING)],
+            name="catalog_id_position",
+        )
+    except Exception as e:
+        logger.error(f"Error al crear índices de {ROWS_COLLECTION}: {str(e)}")
+
+
+def get_embedded_rows(doc: Optional[Dict[str, Any]]) -> List[Any]:
+    """
+    Devuelve el array de filas embebido de un documento sin copiarlo.
+
+    Lee el array canónico 'data' y solo recurre a 'rows' en documentos
+    antiguos sin normalizar ('data' ausente o vacío).
+    """
+    if not doc:
+        return []
+    data = doc.get(ROW_ARRAY)
+    if data:
+        return data
+    legacy = doc.get(LEGACY_ROW_ARRAY)
+    if legacy:
+        return legacy
+    return data if data is not None else []
+
+
+def normalize_catalog_rows(collection, catalog_id) -> bool:
+    """
+    Deja un único array de filas ('data') en un catálogo embebido.
+
+    Solo elimina el duplicado 'rows' cuando no se pierde ninguna fila: si
+    coincide con 'data' o es un prefijo suyo. Si es 'data' el prefijo de
+    'rows', se conserva 'rows' (el más largo) como 'data'. Si los dos arrays
+    divergen, el documento no se modifica y se registra un aviso para
+    revisarlo a mano. La actualización exige que ambos arrays sigan como se
+    leyeron, de modo que una escritura concurrente la deja sin efecto.
+
+    Returns:
+        bool: True si el documento se ha modificado
+    """
+    object_id = _as_object_id(catalog_id)
+    doc = collection.find_one(
+        {"_id": object_id, LEGACY_ROW_ARRAY: {"$exists": True}},
+        {field: 1 for field in ROW_ARRAYS},
+    )
+    if not doc:
+        return False
+    data = doc.get(ROW_ARRAY)
+    legacy = doc.get(LEGACY_ROW_ARRAY)
+    data_rows = data if isinstance(data, list) else []
+    legacy_rows = legacy if isinstance(legacy, list) else []
+
+    if legacy_rows == data_rows[: len(legacy_rows)]:
+        update = {"$unset": {LEGACY_ROW_ARRAY: ""}}
+    elif data_rows == legacy_rows[: len(data_rows)]:
+        update = {"$rename": {LEGACY_ROW_ARRAY: ROW_ARRAY}}
+    else:
+        logger.warning(
+            f"Catálogo {catalog_id}: 'data' ({len(data_rows)} filas) y 'rows' "
+            f"({len(legacy_rows)} filas) no coinciden; no se normaliza"
+        )
+        return False
+
+    result = collection.update_one(
+        {"_id": object_id, ROW_ARRAY: data, LEGACY_ROW_ARRAY: legacy}, update
+    )
+    return result.modified_count > 0
+
+
+def _embedded_row_array(collection, catalog_id) -> str:
+    """
+    Array de filas de un catálogo embebido sobre el que se escribe.
+
+    El mismo que lee get_embedded_rows: 'data', salvo en documentos antiguos
+    sin normalizar con 'data' vacío y las filas en 'rows'.
+    """
+    doc = collection.find_one(
+        {"_id": catalog_id, LEGACY_ROW_ARRAY: {"$exists": True}},
+        {field: {"$slice": 1} for field in ROW_ARRAYS},
+    )
+    if doc and not doc.get(ROW_ARRAY) and doc.get(LEGACY_ROW_ARRAY):
+        return LEGACY_ROW_ARRAY
+    return ROW_ARRAY
+
+
+def get_catalog_rows(
+    collection, catalog: Dict[str, Any], skip: int = 0, limit: Optional[int] = None
+) -> List[Any]:
+    """
+    Obtiene las filas de un catálogo, opcionalmente solo una ventana.
+
+    Con ``limit`` solo se leen las filas solicitadas: una proyección ``$slice``
+    en catálogos embebidos o skip/limit sobre catalog_rows.
+
+    Args:
+        collection: Colección de catálogos (spreadsheets)
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        skip (int): Número de filas a saltar
+        limit (int): Número máximo de filas a devolver (None = todas)
+
+    Returns:
+        list: Filas de la ventana solicitada (lista vacía si hay error)
+    """
+    catalog_id = catalog["_id"]
+    try:
+        if uses_rows_collection(catalog):
+            cursor = (
+                get_rows_collection(collection)
+                .find({"catalog_id": _as_object_id(catalog_id)}, {"data": 1})
+                .sort("position", ASCENDING)
+                .skip(skip)
+            )
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            return [doc.get("data", {}) for doc in cursor]
+
+        if limit is None:
+            projection = {field: 1 for field in ROW_ARRAYS}
+        else:
+            projection = {field: {"$slice": [skip, limit]} for field in ROW_ARRAYS}
+        projection["_id"] = 1
+        doc = collection.find_one({"_id": _as_object_id(catalog_id)}, projection)
+        rows = get_embedded_rows(doc)
+        return rows[skip:] if limit is None and skip else rows
+    except Exception as e:
+        logger.error(f"Error al obtener filas del catálogo {catalog_id}: {str(e)}")
+        return []
+
+
+def load_catalog_rows(collection, catalog: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Deja en ``catalog["data"]`` las filas de un documento de catálogo completo.
+
+    Capa de compatibilidad de lectura para las vistas que trabajan con el
+    documento entero: en catálogos 'rows_collection' consulta catalog_rows; en
+    los embebidos reutiliza el array canónico (o el 'rows' heredado) sin
+    copiarlo ni consultar nada y descarta el duplicado.
+
+    Returns:
+        dict: El mismo documento del catálogo
+    """
+    if uses_rows_collection(catalog):
+        catalog[ROW_ARRAY] = get_catalog_rows(collection, catalog)
+    else:
+        catalog[ROW_ARRAY] = get_embedded_rows(catalog)
+    catalog.pop(LEGACY_ROW_ARRAY, None)
+    return catalog
+
+
+def get_stored_row_count(catalog: Dict[str, Any]) -> int:
+    """
+    Número de filas de un documento de catálogo sin consultar la base de datos.
+
+    Usa el contador 'num_rows' si existe y, si no, el tamaño del array
+    embebido del propio documento.
+    """
+    num_rows = catalog.get("num_rows")
+    if isinstance(num_rows, int):
+        return num_rows
+    return len(get_embedded_rows(catalog))
+
+
+def find_row_thumbnail(row: Any) -> Optional[str]:
+    """
+    Devuelve la primera imagen de una fila o None si no tiene.
+
+    El campo "Imagen" solo cuenta con URLs externas; en los campos de
+    imágenes subidas vale cualquier nombre de archivo o URL salvo "N/A".
+    """
+    if not isinstance(row, dict):
+        return None
+    imagen = row.get("Imagen")
+    if isinstance(imagen, str) and imagen.startswith("http"):
+        return imagen
+    for field in THUMBNAIL_ROW_FIELDS[1:]:
+        value = row.get(field)
+        if not value:
+            continue
+        values = value if isinstance(value, list) else [value]
+        for img in values:
+            if img and isinstance(img, str) and img != "N/A":
+                return img
+    return None
+
+
+def find_rows_thumbnail(rows: Any) -> str:
+    """Primera imagen de una lista de filas ("" si ninguna tiene)"""
+    if isinstance(rows, dict):
+        rows = [rows[key] for key in sorted(rows, key=int)]
+    for row in rows or []:
+        thumbnail = find_row_thumbnail(row)
+        if thumbnail:
+            return thumbnail
+    return ""
+
+
+def refresh_catalog_thumbnail(collection, catalog_id) -> str:
+    """
+    Recalcula y guarda la miniatura automática ('miniatura_auto') de un catálogo.
+
+    Solo lee los campos de imagen de las filas (proyección en MongoDB) y, en
+    catálogos 'rows_collection', se detiene en la primera fila con imagen.
+
+    Args:
+        collection: Colección de catálogos
+        catalog_id: ID del catálogo
+
+    Returns:
+        str: Referencia de la miniatura o "" si no hay imágenes (o hay error)
+    """
+    try:
+        object_id = _as_object_id(catalog_id)
+        catalog = collection.find_one(
+            {"_id": object_id},
+            {
+                "storage": 1,
+                **{
+                    f"{array}.{field}": 1
+                    for array in ROW_ARRAYS
+                    for field in THUMBNAIL_ROW_FIELDS
+                },
+            },
+        )
+        if not catalog:
+            return ""
+        thumbnail = ""
+        if uses_rows_collection(catalog):
+            cursor = (
+                get_rows_collection(collection)
+                .find(
+                    {"catalog_id": object_id},
+                    {f"data.{field}": 1 for field in THUMBNAIL_ROW_FIELDS},
+                )
+                .sort("position", ASCENDING)
+            )
+            for doc in cursor:
+                thumbnail = find_row_thumbnail(doc.get("data"))
+                if thumbnail:
+                    break
+            cursor.close()
+        else:
+            thumbnail = find_rows_thumbnail(get_embedded_rows(catalog))
+        collection.update_one(
+            {"_id": object_id}, {"$set": {THUMBNAIL_FIELD: thumbnail or ""}}
+        )
+        return thumbnail or ""
+    except Exception as e:
+        logger.error(
+            f"Error al recalcular la miniatura del catálogo {catalog_id}: {str(e)}"
+        )
+        return ""
+
+
+def _thumbnail_after_append(collection, catalog, catalog_id, row) -> None:
+    """
+    Actualiza 'miniatura_auto' tras añadir una fila al final.
+
+    Solo puede cambiar si el catálogo aún no tenía ninguna imagen; los
+    catálogos sin el campo (anteriores a la miniatura precalculada) se
+    recalculan completos.
+    """
+    if THUMBNAIL_FIELD not in catalog:
+        refresh_catalog_thumbnail(collection, catalog_id)
+        return
+    thumbnail = find_row_thumbnail(row)
+    if thumbnail:
+        collection.update_one(
+            {"_id": catalog_id, THUMBNAIL_FIELD: ""},
+            {"$set": {THUMBNAIL_FIELD: thumbnail}},
+        )
+
+
+def find_catalog_summaries(
+    collection,
+    query: Optional[Dict[str, Any]] = None,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    skip: int = 0,
+    limit: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Obtiene los datos de listado de los catálogos sin transferir sus filas.
+
+    Proyecta solo CATALOG_SUMMARY_FIELDS más 'row_count' (ver
+    ROW_COUNT_EXPRESSION) y ordena y pagina en MongoDB.
+
+    Args:
+        collection: Colección de catálogos
+        query (dict): Filtro de catálogos
+        sort (list): [(campo, ASCENDING|DESCENDING)]; por defecto created_at
+            descendente. Admite 'row_count'
+        skip (int): Catálogos a saltar
+        limit (int): Máximo de catálogos (0 = sin límite)
+
+    Returns:
+        list: Documentos con los campos del listado y 'row_count'
+    """
+    sort = list(sort or [("created_at", DESCENDING)])
+    if all(field != "_id" for field, _ in sort):
+        # Desempate estable para que las páginas no repitan ni pierdan catálogos
+        sort.append(("_id", sort[-1][1]))
+
+    projection: Dict[str, Any] = {field: 1 for field in CATALOG_SUMMARY_FIELDS}
+    projection["row_count"] = ROW_COUNT_EXPRESSION
+    window = []
+    if skip:
+        window.append({"$skip": skip})
+    if limit:
+        window.append({"$limit": limit})
+
+    pipeline: List[Dict[str, Any]] = [{"$match": query or {}}]
+    if any(field == "row_count" for field, _ in sort):
+        # El contador se calcula en la proyección: ordenar después
+        pipeline += [{"$project": projection}, {"$sort": dict(sort)}, *window]
+    else:
+        # Ordenar y paginar antes de proyectar para aprovechar los índices
+        pipeline += [{"$sort": dict(sort)}, *window, {"$project": projection}]
+    return list(collection.aggregate(pipeline))
+
+
+def count_catalogs(collection, query: Optional[Dict[str, Any]] = None) -> int:
+    """Número de catálogos que cumplen el filtro (para la paginación)"""
+    return collection.count_documents(query or {})
+
+
+def parse_catalog_sort(
+    args, default: str = "created_at"
+) -> Tuple[str, str, List[Tuple[str, int]]]:
+    """
+    Lee los parámetros de ordenación de un listado (sort, order).
+
+    Args:
+        args: request.args (o cualquier MultiDict)
+        default (str): Campo por defecto
+
+    Returns:
+        tuple: (campo, 'asc'|'desc', especificación de orden para
+        find_catalog_summaries)
+    """
+    field = args.get("sort", default)
+    if field not in CATALOG_SORT_FIELDS:
+        field = default
+    # Por defecto: nombre ascendente, fechas y número de filas descendente
+    order = args.get("order", "asc" if field == "name" else "desc")
+    if order not in ("asc", "desc"):
+        order = "desc"
+    direction = ASCENDING if order == "asc" else DESCENDING
+    return field, order, [(field, direction)]
+
+
+def owner_fields(user_id) -> Dict[str, Any]:
+    """
+    Campo 'owner_id' para crear o reasignar un catálogo.
+
+    Args:
+        user_id: _id del usuario (ObjectId o cadena, p. ej. session["user_id"])
+
+    Returns:
+        dict: {"owner_id": ObjectId} o {} si el ID no es válido
+    """
+    if isinstance(user_id, ObjectId):
+        return {OWNER_ID_FIELD: user_id}
+    if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+        return {OWNER_ID_FIELD: ObjectId(user_id)}
+    return {}
+
+
+def user_identities(*values: Any) -> List[str]:
+    """Username, email o nombre de un usuario válidos como identidad, sin repetir"""
+    identities = (value.strip() for value in values if isinstance(value, str))
+    return list(dict.fromkeys(identity for identity in identities if identity))
+
+
+def _legacy_owner_clause(identities: List[str]) -> Dict[str, Any]:
+    """Catálogos sin 'owner_id' cuyo propietario histórico es una de las identidades"""
+    return {
+        OWNER_ID_FIELD: {"$exists": False},
+        "$or": [{field: {"$in": identities}} for field in LEGACY_OWNER_FIELDS],
+    }
+
+
+def owner_query(user_id, identities: Iterable[Any] = ()) -> Optional[Dict[str, Any]]:
+    """
+    Filtro de los catálogos de un usuario: igualdad sobre 'owner_id'.
+
+    Los catálogos antiguos que aún no tienen 'owner_id' (ver
+    tools/maintenance/backfill_catalog_owner.py) se incluyen si alguno de sus
+    campos históricos (LEGACY_OWNER_FIELDS) coincide con las identidades del
+    usuario.
+
+    Args:
+        user_id: _id del usuario (ObjectId o cadena)
+        identities: Username, email y nombre del usuario
+
+    Returns:
+        dict: Filtro de MongoDB o None si no hay ID válido ni identidades
+    """
+    clauses = []
+    owner = owner_fields(user_id)
+    if owner:
+        clauses.append(owner)
+    identities = user_identities(*identities)
+    if identities:
+        clauses.append(_legacy_owner_clause(identities))
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def count_catalogs_by_owner(db, owner_ids=None, users=None) -> Dict[ObjectId, int]:
+    """
+    Número de catálogos de cada usuario en CATALOG_COLLECTIONS.
+
+    Un $group por 'owner_id' en cada colección (servido por el índice
+    owner_id_created_at) en lugar de un count_documents por usuario. Con
+    ``users`` también se cuentan los catálogos antiguos sin 'owner_id' cuyos
+    campos históricos coinciden con el email, username o nombre de cada
+    usuario, igual que en owner_query.
+
+    Args:
+        db: Base de datos de MongoDB
+        owner_ids: _id de los usuarios a contar (None = todos)
+        users: Documentos de esos usuarios (_id, email, username, nombre)
+
+    Returns:
+        dict: {owner_id: número de catálogos}; los usuarios sin catálogos no
+        aparecen
+    """
+    if owner_ids is None:
+        match = {OWNER_ID_FIELD: {"$exists": True}}
+    else:
+        match = {OWNER_ID_FIELD: {"$in": list(owner_ids)}}
+    counts: Dict[ObjectId, int] = {}
+    for collection_name in CATALOG_COLLECTIONS:
+        for group in db[collection_name].aggregate(
+            [
+                {"$match": match},
+                {"$group": {"_id": f"${OWNER_ID_FIELD}", "count": {"$sum": 1}}},
+            ]
+        ):
+            counts[group["_id"]] = counts.get(group["_id"], 0) + group["count"]
+
+    users_by_identity = index_users_by_identity(users or [])
+    if not users_by_identity:
+        return counts
+    legacy = _legacy_owner_clause(list(users_by_identity))
+    projection = {field: 1 for field in LEGACY_OWNER_FIELDS}
+    for collection_name in CATALOG_COLLECTIONS:
+        for catalog in db[collection_name].find(legacy, projection):
+            owners = {
+                user_id
+                for field in LEGACY_OWNER_FIELDS
+                if isinstance(catalog.get(field), str)
+                for user_id in users_by_identity.get(catalog[field].strip(), [])
+            }
+            for user_id in owners:
+                counts[user_id] = counts.get(user_id, 0) + 1
+    return counts
+
+
+def index_users_by_identity(users) -> Dict[str, List[ObjectId]]:
+    """
+    Agrupa los _id de usuario por cada email, username y nombre.
+
+    Args:
+        users: Documentos de usuario (basta con _id, email, username, nombre)
+
+    Returns:
+        dict: {identidad: [_id de usuario sin repetir]}
+    """
+    users_by_identity: Dict[str, List[ObjectId]] = {}
+    for user in users:
+        for field in ("email", "username", "nombre", "name"):
+            value = user.get(field)
+            if not isinstance(value, str) or not value.strip():
+                continue
+            ids = users_by_identity.setdefault(value.strip(), [])
+            if user["_id"] not in ids:
+                ids.append(user["_id"])
+    return users_by_identity
+
+
+def resolve_catalog_owner(
+    catalog: Dict[str, Any], users_by_identity: Dict[str, List[ObjectId]]
+) -> Optional[ObjectId]:
+    """
+    Deduce el propietario de un catálogo antiguo a partir de los campos
+    históricos (LEGACY_OWNER_FIELDS).
+
+    Args:
+        catalog: Documento del catálogo
+        users_by_identity: {email|username|nombre: [_id de usuario]}
+
+    Returns:
+        ObjectId del usuario, o None si ningún campo identifica a un único
+        usuario
+    """
+    for field in LEGACY_OWNER_FIELDS:
+        value = catalog.get(field)
+        if not isinstance(value, str) or not value.strip():
+            continue
+        candidates = users_by_identity.get(value.strip(), [])
+        if len(candidates) == 1:
+            return candidates[0]
+    return None
+
+
+def get_catalog_row(
+    collection, catalog: Dict[str, Any], index: int
+) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene una única fila de un catálogo por su posición.
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        index (int): Posición de la fila (0-based)
+
+    Returns:
+        dict: La fila o None si no existe
+    """
+    if index < 0:
+        return None
+    if uses_rows_collection(catalog):
+        doc = get_rows_collection(collection).find_one(
+            {"catalog_id": _as_object_id(catalog["_id"]), "position": index},
+            {"data": 1},
+        )
+        return doc.get("data") if doc else None
+
+    rows = get_catalog_rows(collection, catalog, index, 1)
+    if isinstance(rows, dict):
+        # Formato antiguo: filas guardadas como diccionario {"0": {...}}
+        return rows.get(str(index))
+    return rows[0] if rows else None
+
+
+def new_row_id() -> str:
+    """Genera un identificador estable para una fila embebida"""
+    return str(ObjectId())
+
+
+def parse_expected_version(form) -> Optional[int]:
+    """
+    Lee la versión del catálogo enviada por un formulario de edición.
+
+    Returns:
+        int: Versión con la que se cargó el formulario o None si no se envió
+    """
+    try:
+        value = form.get("version")
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _catalog_filter(
+    catalog_id, expected_version: Optional[int] = None
+) -> Dict[str, Any]:
+    """Filtro del catálogo, opcionalmente condicionado a su versión"""
+    query: Dict[str, Any] = {"_id": catalog_id}
+    if expected_version is not None:
+        # Los catálogos anteriores al control de versiones no tienen 'version'
+        query["version"] = expected_version if expected_version else {"$in": [0, None]}
+    return query
+
+
+def _check_version_conflict(collection, catalog_id, expected_version) -> None:
+    """
+    Lanza CatalogVersionConflictError si la versión del catálogo no es
+    expected_version: tras una escritura condicionada que no coincidió con
+    ningún documento, o antes de borrar una fila de catalog_rows.
+    """
+    if expected_version is None:
+        return
+    current = collection.find_one({"_id": catalog_id}, {"version": 1})
+    if current and (current.get("version") or 0) != expected_version:
+        raise CatalogVersionConflictError(
+            f"El catálogo {catalog_id} ha cambiado (versión {current.get('version') or 0}, "
+            f"esperada {expected_version})"
+        )
+
+
+def _bump_version(collection, catalog_id, expected_version: Optional[int]) -> bool:
+    """Incrementa la versión del catálogo (catálogos 'rows_collection')"""
+    updated = collection.find_one_and_update(
+        _catalog_filter(catalog_id, expected_version),
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        projection={"_id": 1},
+    )
+    if updated is None:
+        _check_version_conflict(collection, catalog_id, expected_version)
+        return False
+    return True
+
+
+def _fetch_embedded_row(
+    collection, catalog_id, index: int
+) -> Tuple[str, Optional[Any]]:
+    """
+    Lee la fila ``index`` del array de filas del catálogo.
+
+    Returns:
+        tuple: (array que contiene las filas, la fila o None si no existe)
+    """
+    array = _embedded_row_array(collection, catalog_id)
+    doc = collection.find_one({"_id": catalog_id}, {array: {"$slice": [index, 1]}})
+    rows = doc.get(array) if doc else None
+    if isinstance(rows, list) and rows:
+        return array, rows[0]
+    return array, None
+
+
+def append_catalog_row(
+    collection, catalog: Dict[str, Any], row: Dict[str, Any]
+) -> bool:
+    """
+    Añade una fila al final de un catálogo y actualiza 'num_rows' y 'version'.
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        row (dict): Datos de la nueva fila
+
+    Returns:
+        bool: True si se añadió la fila
+    """
+    catalog_id = _as_object_id(catalog["_id"])
+    now = datetime.utcnow()
+
+    if uses_rows_collection(catalog):
+        # Reservar la posición de forma atómica incrementando el contador
+        updated = collection.find_one_and_update(
+            {"_id": catalog_id},
+            {"$inc": {"num_rows": 1, "version": 1}, "$set": {"updated_at": now}},
+            projection={"num_rows": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not updated:
+            return False
+        get_rows_collection(collection).insert_one(
+            {"catalog_id": catalog_id, "position": updated["num_rows"] - 1, "data": row}
+        )
+        _thumbnail_after_append(collection, catalog, catalog_id, row)
+        return True
+
+    row = dict(row)
+    row.setdefault(ROW_ID_FIELD, new_row_id())
+    update: Dict[str, Any] = {
+        "$push": {_embedded_row_array(collection, catalog_id): row},
+        "$set": {"updated_at": now},
+        "$inc": {"version": 1},
+    }
+    count_inc = row_count_update(catalog, 1)
+    if count_inc:
+        update["$inc"].update(count_inc)
+    result = collection.update_one({"_id": catalog_id}, update)
+    if result.matched_count > 0:
+        if not count_inc:
+            refresh_catalog_row_count(collection, catalog_id)
+        _thumbnail_after_append(collection, catalog, catalog_id, row)
+    return result.matched_count > 0
+
+
+def update_catalog_row(
+    collection,
+    catalog: Dict[str, Any],
+    index: int,
+    row: Dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> bool:
+    """
+    Sustituye la fila de la posición ``index`` con un ``$set`` posicional.
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        index (int): Posición de la fila (0-based)
+        row (dict): Nuevos datos de la fila
+        expected_version (int): Versión leída por el cliente (None = sin control)
+
+    Returns:
+        bool: True si la fila existía y se actualizó
+
+    Raises:
+        CatalogVersionConflictError: Si el catálogo cambió desde expected_version
+    """
+    catalog_id = _as_object_id(catalog["_id"])
+    if uses_rows_collection(catalog):
+        rows_collection = get_rows_collection(collection)
+        row_query = {"catalog_id": catalog_id, "position": index}
+        if not rows_collection.count_documents(row_query, limit=1):
+            return False
+        if not _bump_version(collection, catalog_id, expected_version):
+            return False
+        result = rows_collection.update_one(row_query, {"$set": {"data": row}})
+        if result.matched_count > 0:
+            refresh_catalog_thumbnail(collection, catalog_id)
+        return result.matched_count > 0
+
+    array, existing = _fetch_embedded_row(collection, catalog_id, index)
+    if existing is None:
+        return False
+    row = dict(row)
+    current_id = existing.get(ROW_ID_FIELD) if isinstance(existing, dict) else None
+    if current_id and ROW_ID_FIELD not in row:
+        row[ROW_ID_FIELD] = current_id
+
+    # La fila debe seguir existiendo al escribir: un $set sobre una posición
+    # fuera del array (p. ej. tras un borrado concurrente) la añadiría
+    # rellenando con nulos
+    query = _catalog_filter(catalog_id, expected_version)
+    query[f"{array}.{index}"] = {"$exists": True}
+    update_fields: Dict[str, Any] = {f"{array}.{index}": row}
+    update_fields["updated_at"] = datetime.utcnow()
+    result = collection.update_one(
+        query, {"$set": update_fields, "$inc": {"version": 1}}
+    )
+    if result.matched_count == 0:
+        _check_version_conflict(collection, catalog_id, expected_version)
+        return False
+    if find_row_thumbnail(existing) or find_row_thumbnail(row):
+        refresh_catalog_thumbnail(collection, catalog_id)
+    return True
+
+
+def update_catalog_row_fields(
+    collection,
+    catalog: Dict[str, Any],
+    index: int,
+    fields: Dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> bool:
+    """
+    Actualiza solo algunos campos de una fila (``$set`` de ``data.<i>.<campo>``).
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        index (int): Posición de la fila (0-based)
+        fields (dict): Campos de la fila a modificar ({columna: valor})
+        expected_version (int): Versión leída por el cliente (None = sin control)
+
+    Returns:
+        bool: True si la fila existía y se actualizó
+
+    Raises:
+        CatalogVersionConflictError: Si el catálogo cambió desde expected_version
+    """
+    if not fields:
+        return True
+    catalog_id = _as_object_id(catalog["_id"])
+    if uses_rows_collection(catalog):
+        rows_collection = get_rows_collection(collection)
+        row_query = {"catalog_id": catalog_id, "position": index}
+        if not rows_collection.count_documents(row_query, limit=1):
+            return False
+        if not _bump_version(collection, catalog_id, expected_version):
+            return False
+        result = rows_collection.update_one(
+            row_query,
+            {"$set": {f"data.{key}": value for key, value in fields.items()}},
+        )
+        if result.matched_count > 0 and _touches_thumbnail(fields):
+            refresh_catalog_thumbnail(collection, catalog_id)
+        return result.matched_count > 0
+
+    array, existing = _fetch_embedded_row(collection, catalog_id, index)
+    if not isinstance(existing, dict):
+        return False
+    query = _catalog_filter(catalog_id, expected_version)
+    query[f"{array}.{index}"] = {"$exists": True}
+    update_fields: Dict[str, Any] = {
+        f"{array}.{index}.{key}": value for key, value in fields.items()
+    }
+    update_fields["updated_at"] = datetime.utcnow()
+    result = collection.update_one(
+        query, {"$set": update_fields, "$inc": {"version": 1}}
+    )
+    if result.matched_count == 0:
+        _check_version_conflict(collection, catalog_id, expected_version)
+        return False
+    if _touches_thumbnail(fields):
+        refresh_catalog_thumbnail(collection, catalog_id)
+    return True
+
+
+def _touches_thumbnail(fields: Dict[str, Any]) -> bool:
+    """Indica si una actualización parcial modifica campos de imagen"""
+    return any(key.split(".")[0] in THUMBNAIL_ROW_FIELDS for key in fields)
+
+
+def delete_catalog_row(
+    collection,
+    catalog: Dict[str, Any],
+    index: int,
+    expected_version: Optional[int] = None,
+) -> bool:
+    """
+    Elimina la fila de la posición ``index`` y actualiza 'num_rows'.
+
+    En catálogos embebidos la fila se elimina con ``$pull`` por su '_row_id'
+    (se le asigna uno antes si es una fila antigua sin identificador), sin
+    reescribir el resto del array.
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        index (int): Posición de la fila (0-based)
+        expected_version (int): Versión leída por el cliente (None = sin control)
+
+    Returns:
+        bool: True si la fila existía y se eliminó
+
+    Raises:
+        CatalogVersionConflictError: Si el catálogo cambió desde expected_version
+    """
+    catalog_id = _as_object_id(catalog["_id"])
+    now = datetime.utcnow()
+
+    if uses_rows_collection(catalog):
+        rows_collection = get_rows_collection(collection)
+        row_query = {"catalog_id": catalog_id, "position": index}
+        _check_version_conflict(collection, catalog_id, expected_version)
+        # La versión y 'num_rows' solo cambian si este delete_one eliminó la
+        # fila: un borrado repetido o concurrente no los altera
+        result = rows_collection.delete_one(row_query)
+        if result.deleted_count != 1:
+            return False
+        rows_collection.update_many(
+            {"catalog_id": catalog_id, "position": {"$gt": index}},
+            {"$inc": {"position": -1}},
+        )
+        collection.update_one(
+            {"_id": catalog_id},
+            {"$inc": {"num_rows": -1, "version": 1}, "$set": {"updated_at": now}},
+        )
+        refresh_catalog_thumbnail(collection, catalog_id)
+        return True
+
+    array, existing = _fetch_embedded_row(collection, catalog_id, index)
+    if not isinstance(existing, dict):
+        return False
+
+    row_id = existing.get(ROW_ID_FIELD)
+    if not row_id:
+        # Fila antigua sin identificador: asignárselo solo si la posición
+        # sigue conteniendo exactamente la fila leída
+        row_id = new_row_id()
+        query = _catalog_filter(catalog_id, expected_version)
+        query[f"{array}.{index}"] = existing
+        result = collection.update_one(
+            query, {"$set": {f"{array}.{index}.{ROW_ID_FIELD}": row_id}}
+        )
+        if result.matched_count == 0:
+            _check_version_conflict(collection, catalog_id, expected_version)
+            return False
+
+    update: Dict[str, Any] = {
+        "$pull": {array: {ROW_ID_FIELD: row_id}},
+        "$set": {"updated_at": now},
+        "$inc": {"version": 1},
+    }
+    count_inc = row_count_update(catalog, -1)
+    if count_inc:
+        update["$inc"].update(count_inc)
+    # La fila debe seguir en el array: si otra petición ya la eliminó, el
+    # $pull no haría nada pero se descontaría 'num_rows' igualmente
+    query = _catalog_filter(catalog_id, expected_version)
+    query[f"{array}.{ROW_ID_FIELD}"] = row_id
+    result = collection.update_one(query, update)
+    if result.matched_count == 0:
+        _check_version_conflict(collection, catalog_id, expected_version)
+        return False
+    if not count_inc:
+        refresh_catalog_row_count(collection, catalog_id)
+    if find_row_thumbnail(existing):
+        refresh_catalog_thumbnail(collection, catalog_id)
+    return result.modified_count > 0
+
+
+def replace_catalog_rows(
+    collection,
+    catalog: Dict[str, Any],
+    rows: List[Dict[str, Any]],
+    batch_size: int = 1000,
+) -> bool:
+    """
+    Reemplaza todas las filas de un catálogo (p. ej. al cambiar encabezados).
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        rows (list): Filas nuevas
+        batch_size (int): Tamaño de lote para insert_many en catalog_rows
+
+    Returns:
+        bool: True si se guardaron las filas
+    """
+    catalog_id = _as_object_id(catalog["_id"])
+    now = datetime.utcnow()
+
+    if uses_rows_collection(catalog):
+        _write_rows_collection(collection, catalog_id, rows, batch_size)
+        collection.update_one(
+            {"_id": catalog_id},
+            {
+                "$set": {
+                    "num_rows": len(rows),
+                    THUMBNAIL_FIELD: find_rows_thumbnail(rows),
+                    "updated_at": now,
+                },
+                "$inc": {"version": 1},
+            },
+        )
+        return True
+
+    result = collection.update_one(
+        {"_id": catalog_id},
+        {
+            "$set": {
+                ROW_ARRAY: rows,
+                "num_rows": len(rows),
+                THUMBNAIL_FIELD: find_rows_thumbnail(rows),
+                "updated_at": now,
+            },
+            "$unset": {LEGACY_ROW_ARRAY: ""},
+            "$inc": {"version": 1},
+        },
+    )
+    return result.matched_count > 0
+
+
+def delete_catalog_rows(collection, catalog_id) -> int:
+    """
+    Elimina los documentos de catalog_rows de un catálogo borrado.
+
+    Returns:
+        int: Número de filas eliminadas
+    """
+    try:
+        result = get_rows_collection(collection).delete_many(
+            {"catalog_id": _as_object_id(catalog_id)}
+        )
+        return result.deleted_count
+    except Exception as e:
+        logger.error(f"Error al eliminar filas del catálogo {catalog_id}: {str(e)}")
+        return 0
+
+
+def _write_rows_collection(collection, catalog_id, rows, batch_size: int) -> None:
+    """Sustituye los documentos de catalog_rows de un catálogo por ``rows``"""
+    rows_collection = get_rows_collection(collection)
+    rows_collection.delete_many({"catalog_id": catalog_id})
+    for start in range(0, len(rows), batch_size):
+        rows_collection.insert_many(
+            [
+                {"catalog_id": catalog_id, "position": position, "data": row}
+                for position, row in enumerate(
+                    rows[start : start + batch_size], start=start
+                )
+            ],
+            ordered=False,
+        )
+
+
+def migrate_catalog_to_rows_collection(
+    collection, catalog_id, batch_size: int = 1000
+) -> Optional[int]:
+    """
+    Mueve las filas embebidas de un catálogo a la colección catalog_rows.
+
+    Las filas se insertan primero y solo después se marca el catálogo como
+    'rows_collection' y se eliminan los arrays, de modo que una migración
+    interrumpida deja el catálogo legible en su formato original.
+
+    Args:
+        collection: Colección de catálogos
+        catalog_id: ID del catálogo
+        batch_size (int): Filas por cada insert_many
+
+    Returns:
+        int: Número de filas migradas o None si hay error
+    """
+    try:
+        object_id = _as_object_id(catalog_id)
+        catalog = collection.find_one({"_id": object_id})
+        if not catalog:
+            return None
+        if uses_rows_collection(catalog):
+            return get_catalog_row_count(collection, catalog)
+
+        rows = get_embedded_rows(catalog)
+        if isinstance(rows, dict):
+            rows = [rows[key] for key in sorted(rows, key=int)]
+        _write_rows_collection(collection, object_id, rows, batch_size)
+        collection.update_one(
+            {"_id": object_id},
+            {
+                "$set": {"storage": STORAGE_ROWS_COLLECTION, "num_rows": len(rows)},
+                "$unset": {field: "" for field in ROW_ARRAYS},
+            },
+        )
+        return len(rows)
+    except Exception as e:
+        logger.error(f"Error al migrar filas del catálogo {catalog_id}: {str(e)}")
+        return None
+
+
+def migrate_catalog_to_embedded(collection, catalog_id) -> Optional[int]:
+    """
+    Devuelve las filas de catalog_rows al array embebido 'data' del catálogo.
+
+    Returns:
+        int: Número de filas restauradas o None si hay error
+    """
+    try:
+        object_id = _as_object_id(catalog_id)
+        catalog = collection.find_one({"_id": object_id}, CATALOG_METADATA_PROJECTION)
+        if not catalog:
+            return None
+        if not uses_rows_collection(catalog):
+            return get_catalog_row_count(collection, catalog)
+
+        rows = get_catalog_rows(collection, catalog)
+        collection.update_one(
+            {"_id": object_id},
+            {
+                "$set": {
+                    ROW_ARRAY: rows,
+                    "storage": STORAGE_EMBEDDED,
+                    "num_rows": len(rows),
+                }
+            },
+        )
+        delete_catalog_rows(collection, object_id)
+        return len(rows)
+    except Exception as e:
+        logger.error(f"Error al restaurar filas del catálogo {catalog_id}: {str(e)}")
+        return None
+
+
+def refresh_catalog_row_count(collection, catalog_id) -> int:
+    """
+    Recalcula en el servidor el número de filas y lo guarda en 'num_rows'.
+
+    Usa ``$size`` sobre el array embebido o count_documents sobre catalog_rows.
+
+    Args:
+        collection: Colección de catálogos
+        catalog_id: ID del catálogo
+
+    Returns:
+        int: Número de filas del catálogo (0 si hay error)
+    """
+    try:
+        object_id = _as_object_id(catalog_id)
+        catalog = collection.find_one({"_id": object_id}, {"storage": 1})
+        if uses_rows_collection(catalog):
+            num_rows = get_rows_collection(collection).count_documents(
+                {"catalog_id": object_id}
+            )
+            collection.update_one({"_id": object_id}, {"$set": {"num_rows": num_rows}})
+            return num_rows
+
+        result = list(
+            collection.aggregate(
+                [
+                    {"$match": {"_id": object_id}},
+                    {"$project": {"num_rows": {"$size": EMBEDDED_ROWS_EXPRESSION}}},
+                ]
+            )
+        )
+        num_rows = result[0]["num_rows"] if result else 0
+        collection.update_one({"_id": object_id}, {"$set": {"num_rows": num_rows}})
+        return num_rows
+    except Exception as e:
+        logger.error(
+            f"Error al recalcular num_rows del catálogo {catalog_id}: {str(e)}"
+        )
+        return 0
+
+
+def get_catalog_row_count(collection, catalog: Dict[str, Any]) -> int:
+    """
+    Devuelve el número de filas de un catálogo usando el contador almacenado.
+
+    Si el documento todavía no tiene 'num_rows' (catálogos antiguos), se
+    calcula una vez en MongoDB y se guarda para las siguientes lecturas.
+
+    Args:
+        collection: Colección de catálogos
+        catalog (dict): Documento del catálogo (puede venir sin filas)
+
+    Returns:
+        int: Número total de filas
+    """
+    num_rows = catalog.get("num_rows")
+    if isinstance(num_rows, int):
+        return num_rows
+    return refresh_catalog_row_count(collection, catalog["_id"])
+
+
+def row_count_update(catalog: Dict[str, Any], delta: int) -> Optional[Dict[str, Any]]:
+    """
+    Construye el operador $inc para mantener 'num_rows' en una escritura.
+
+    Devuelve None si el catálogo aún no tiene contador; en ese caso hay que
+    llamar a ``refresh_catalog_row_count`` después de escribir.
+    """
+    if isinstance(catalog.get("num_rows"), int):
+        return {"num_rows": delta}
+    return None
+
+
+def parse_pagination_args(
+    args, default_per_page: int = DEFAULT_PER_PAGE, max_per_page: int = MAX_PER_PAGE
+) -> Optional[Tuple[int, int]]:
+    """
+    Lee los parámetros de paginación (page, per_page) de la petición.
+
+    La paginación en servidor se solicita con 'per_page': un 'page' suelto lo
+    usa también el paginador en cliente de ver_tabla.html.
+
+    Args:
+        args: request.args (o cualquier MultiDict)
+        default_per_page (int): Tamaño de página por defecto
+        max_per_page (int): Tamaño máximo de página permitido
+
+    Returns:
+        tuple: (page, per_page) o None si la petición no pide paginación
+    """
+    if "per_page" not in args:
+        return None
+    page = args.get("page", 1, type=int) or 1
+    per_page = args.get("per_page", default_per_page, type=int) or default_per_page
+    return max(1, page), max(1, min(max_per_page, per_page))
+
+
+def build_pagination(page: int, per_page: int, total: int) -> Dict[str, Any]:
+    """
+    Calcula los datos de paginación para las plantillas.
+
+    Args:
+        page (int): Página solicitada (1-based)
+        per_page (int): Filas por página
+        total (int): Número total de filas
+
+    Returns:
+        dict: page, per_page, total, total_pages, offset, has_prev, has_next,
+        prev_page, next_page
+    """
+    total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+    page = max(1, min(page, total_pages))
+    return {
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "total_pages": total_pages,
+        "offset": (page - 1) * per_page,
+        "has_prev": page > 1,
+        "has_next": page < total_pages,
+        "prev_page": page - 1,
+        "next_page": page + 1,
+    }
+
+
+def resolve_row_window(args, total: int, auto_paginate_rows: int, per_page: int):
+    """
+    Decide la ventana de filas a cargar para una vista de catálogo.
+
+    La paginación se activa si la petición incluye per_page o si el
+    catálogo supera ``auto_paginate_rows`` filas.
+
+    Returns:
+        dict | None: Datos de paginación (ver ``build_pagination``) o None
+        si deben cargarse todas las filas
+    """
+    requested = parse_pagination_args(args, default_per_page=per_page)
+    if requested is None:
+        if not auto_paginate_rows or total <= auto_paginate_rows:
+            return None
+        requested = (max(1, args.get("page", 1, type=int) or 1), per_page)
+    return build_pagination(requested[0], requested[1], total)
+
+
+# Operadores de los filtros por columna: 'valor' busca el texto en la celda
+# (sin distinguir mayúsculas), '=valor' exige la celda completa y '>', '>=',
+# '<', '<=' comparan numéricamente
+ROW_FILTER_OPERATORS = {">=": "$gte", "<=": "$lte", ">": "$gt", "<": "$lt"}
+
+# Orden de las celdas: sin distinguir mayúsculas ni acentos y con los números
+# escritos como texto ordenados por su valor
+ROW_SORT_COLLATION = {"locale": "es", "strength": 1, "numericOrdering": True}
+
+# Posición de cada fila en el catálogo dentro de los resultados de
+# query_catalog_rows (los enlaces de editar/eliminar fila la usan)
+ROW_INDEX_FIELD = "_row_index"
+
+
+def _is_field_name(column: Any) -> bool:
+    """Las columnas con '.' o que empiezan por '$' no son rutas de campo válidas"""
+    return (
+        isinstance(column, str)
+        and bool(column)
+        and "." not in column
+        and not column.startswith("$")
+    )
+
+
+def _parse_number(value: str) -> Optional[float]:
+    try:
+        number = float(value.replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_row_query_args(
+    args, headers: List[Any]
+) -> Tuple[Dict[str, str], List[Tuple[str, int]], str]:
+    """
+    Lee los filtros y la ordenación de filas de la petición.
+
+    - ``filter[<columna>]=<valor>``: filtro por columna (ver ROW_FILTER_OPERATORS)
+    - ``q=<texto>``: texto en cualquier columna
+    - ``sort=<columna>`` o ``sort=-<columna>`` (descendente), repetible
+
+    Solo se aceptan columnas de los encabezados del catálogo que sean rutas de
+    campo válidas; el resto se ignora.
+
+    Args:
+        args: request.args (o cualquier MultiDict)
+        headers (list): Encabezados del catálogo
+
+    Returns:
+        tuple: (filtros {columna: valor}, orden [(columna, dirección)], texto)
+    """
+    columns = {header for header in headers or [] if _is_field_name(header)}
+    filters = {}
+    for key, value in args.items(multi=True):
+        if key.startswith("filter[") and key.endswith("]"):
+            column = key[len("filter[") : -1]
+            if column in columns and value.strip():
+                filters[column] = value.strip()
+    sort = []
+    for value in args.getlist("sort"):
+        column = value[1:] if value.startswith("-") else value
+        if column in columns and column not in [field for field, _ in sort]:
+            sort.append((column, DESCENDING if value.startswith("-") else ASCENDING))
+    return filters, sort, args.get("q", "").strip()
+
+
+def _row_filter_condition(path: str, value: str) -> Dict[str, Any]:
+    """Condición de $match para el filtro de una columna"""
+    for operator, mongo_operator in ROW_FILTER_OPERATORS.items():
+        if value.startswith(operator):
+            number = _parse_number(value[len(operator) :].strip())
+            if number is None:
+                break
+            # Las celdas escritas en los formularios son texto: convertirlas
+            # para comparar también las que contienen un número
+            cell = {
+                "$convert": {
+                    "input": f"${path}",
+                    "to": "double",
+                    "onError": None,
+                    "onNull": None,
+                }
+            }
+            return {
+                "$expr": {
+                    "$and": [
+                        {"$ne": [cell, None]},
+                        {mongo_operator: [cell, number]},
+                    ]
+                }
+            }
+
+    exact = value.startswith("=")
+    text = value[1:].strip() if exact else value
+    pattern = re.escape(text)
+    conditions = [
+        {path: {"$regex": f"^{pattern}$" if exact else pattern, "$options": "i"}}
+    ]
+    number = _parse_number(text)
+    if number is not None:
+        # Celdas numéricas (importaciones de Excel/CSV)
+        conditions.append({path: number})
+    return conditions[0] if len(conditions) == 1 else {"$or": conditions}
+
+
+def build_row_match(
+    prefix: str,
+    filters: Dict[str, str],
+    search: str = "",
+    headers: Optional[List[Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Etapa $match de los filtros de filas sobre el subdocumento ``prefix``.
+
+    Args:
+        prefix (str): Campo que contiene la fila ('row' tras el $unwind)
+        filters (dict): {columna: valor} (parse_row_query_args)
+        search (str): Texto a buscar en cualquier columna de ``headers``
+        headers (list): Encabezados del catálogo
+
+    Returns:
+        dict: Filtro para $match ({} si no hay filtros)
+    """
+    clauses = [
+        _row_filter_condition(f"{prefix}.{column}", value)
+        for column, value in filters.items()
+    ]
+    if search:
+        pattern = {"$regex": re.escape(search), "$options": "i"}
+        columns = [header for header in headers or [] if _is_field_name(header)]
+        if columns:
+            clauses.append(
+                {"$or": [{f"{prefix}.{column}": pattern} for column in columns]}
+            )
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def query_catalog_rows(
+    collection,
+    catalog: Dict[str, Any],
+    filters: Optional[Dict[str, str]] = None,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    search: str = "",
+    skip: int = 0,
+    limit: Optional[int] = None,
+) -> Tuple[List[Any], int]:
+    """
+    Filtra, ordena y pagina las filas de un catálogo en la base de datos.
+
+    En los catálogos embebidos el array de filas se despliega con $unwind
+    (conservando la posición con includeArrayIndex); en los 'rows_collection'
+    se consulta catalog_rows. En ambos casos $match, $sort, $skip y $limit se
+    ejecutan en MongoDB y un $facet devuelve además el total filtrado, así que
+    solo viajan las filas de la página. Sin filtros ni orden equivale a
+    get_catalog_rows.
+
+    Args:
+        collection: Colección de catálogos (spreadsheets)
+        catalog (dict): Documento del catálogo (basta con los metadatos)
+        filters (dict): {columna: valor} (parse_row_query_args)
+        sort (list): [(columna, ASCENDING|DESCENDING)]
+        search (str): Texto a buscar en cualquier columna
+        skip (int): Número de filas a saltar
+        limit (int): Número máximo de filas a devolver (None = todas)
+
+    Returns:
+        tuple: (filas de la ventana, cada una con su posición en
+        ROW_INDEX_FIELD; total de filas que cumplen los filtros)
+    """
+    catalog_id = _as_object_id(catalog["_id"])
+    match = build_row_match("row", filters or {}, search, catalog.get("headers"))
+    if not match and not sort:
+        rows = get_catalog_rows(collection, catalog, skip, limit)
+        for offset, row in enumerate(rows):
+            if isinstance(row, dict):
+                row[ROW_INDEX_FIELD] = skip + offset
+        return rows, get_catalog_row_count(collection, catalog)
+
+    if uses_rows_collection(catalog):
+        source = get_rows_collection(collection)
+        pipeline = [
+            {"$match": {"catalog_id": catalog_id}},
+            {"$project": {"_id": 0, "row": "$data", "index": "$position"}},
+        ]
+    else:
+        source = collection
+        pipeline = [
+            {"$match": {"_id": catalog_id}},
+            {"$project": {"_id": 0, "row": EMBEDDED_ROWS_EXPRESSION}},
+            {"$unwind": {"path": "$row", "includeArrayIndex": "index"}},
+        ]
+    if match:
+        pipeline.append({"$match": match})
+
+    window: List[Dict[str, Any]] = []
+    # La posición desempata para que la paginación sea estable
+    order = {f"row.{column}": direction for column, direction in sort or []}
+    order["index"] = ASCENDING
+    window.append({"$sort": order})
+    if skip:
+        window.append({"$skip": skip})
+    if limit is not None:
+        window.append({"$limit": limit})
+    pipeline.append({"$facet": {"total": [{"$count": "count"}], "rows": window}})
+
+    try:
+        options = {"collation": ROW_SORT_COLLATION} if sort else {}
+        result = next(source.aggregate(pipeline, **options), None) or {}
+    except Exception as e:
+        logger.error(f"Error al consultar filas del catálogo {catalog_id}: {str(e)}")
+        return [], 0
+    total = result["total"][0]["count"] if result.get("total") else 0
+    rows = []
+    for doc in result.get("rows", []):
+        row = doc.get("row")
+        if isinstance(row, dict):
+            row[ROW_INDEX_FIELD] = doc.get("index", 0)
+        rows.append(row)
+    return rows, total
+
+
+def row_query_link_args(
+    filters: Dict[str, str], sort: List[Tuple[str, int]], search: str = ""
+) -> Dict[str, Any]:
+    """
+    Parámetros de la petición que reproducen los filtros y el orden de filas
+    (para los enlaces de paginación; ver parse_row_query_args).
+    """
+    args: Dict[str, Any] = {
+        f"filter[{column}]": value for column, value in filters.items()
+    }
+    if sort:
+        args["sort"] = [
+            f"-{column}" if direction == DESCENDING else column
+            for column, direction in sort
+        ]
+    if search:
+        args["q"] = search
+    return args
@@ -0,0 +1,355 @@
+"""
+Registro declarativo de los índices de MongoDB de la aplicación.
+
+get_index_registry() describe, por colección, los índices que necesitan las
+consultas habituales:
+
+- spreadsheets / catalogs: filtros por propietario (owner_id y los campos
+  históricos created_by, owner, owner_name, email, username) ordenados por
+  created_at.
+- spreadsheets / catalog_rows: búsqueda por prefijo del nombre (search_keys)
+  e índices de texto (ver app/utils/catalog_search.py).
+- catalog_rows: (catalog_id, position) de los catálogos 'rows_collection'.
+- users: email único y búsqueda por username.
+- password_resets: búsqueda por token y TTL sobre expires_at.
+- audit_logs: consultas por usuario/tipo ordenadas por fecha y TTL sobre
+  timestamp (AUDIT_LOG_RETENTION_DAYS).
+- jobs: trabajos pendientes por estado, trabajos de cada usuario y TTL sobre
+  finished_at (JOB_RETENTION_DAYS).
+
+Los índices se crean al arrancar la aplicación (MONGO_ENSURE_INDEXES) o con
+tools/maintenance/ensure_indexes.py, y /admin/db-status muestra las
+diferencias entre el registro y la base de datos (índices que faltan, con
+opciones distintas o no declarados).
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+
+from app.utils.catalog_search import (
+    ROWS_TEXT_INDEX_KEYS,
+    SEARCH_KEYS_FIELD,
+    TEXT_INDEX_KEYS,
+    TEXT_INDEX_NAME,
+    text_index_options,
+)
+from app.utils.catalog_utils import OWNER_ID_FIELD, ROWS_COLLECTION
+from config import (
+    AUDIT_LOG_RETENTION_DAYS,
+    COLLECTION_AUDIT_LOGS,
+    COLLECTION_JOBS,
+    COLLECTION_USERS,
+    JOB_RETENTION_DAYS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Campos por los que se filtran los catálogos de un usuario
+CATALOG_OWNER_FIELDS = (
+    OWNER_ID_FIELD,
+    "created_by",
+    "owner",
+    "owner_name",
+    "email",
+    "username",
+)
+
+# Opciones de índice que se comparan al detectar diferencias
+COMPARED_OPTIONS = (
+    "unique",
+    "sparse",
+    "expireAfterSeconds",
+    "partialFilterExpression",
+)
+
+
+def _index(name: str, keys, **options) -> Dict[str, Any]:
+    """Declaración de un índice: nombre, claves [(campo, dirección)] y opciones"""
+    return {"name": name, "keys": list(keys), "options": options}
+
+
+def _catalog_indexes() -> List[Dict[str, Any]]:
+    indexes = [
+        _index(f"{field}_created_at", [(field, ASCENDING), ("created_at", DESCENDING)])
+        for field in CATALOG_OWNER_FIELDS
+    ]
+    indexes.append(_index("created_at", [("created_at", DESCENDING)]))
+    return indexes
+
+
+def get_index_registry() -> Dict[str, List[Dict[str, Any]]]:
+    """Devuelve los índices declarados por colección"""
+    return {
+        "spreadsheets": _catalog_indexes()
+        + [
+            _index(SEARCH_KEYS_FIELD, [(SEARCH_KEYS_FIELD, ASCENDING)]),
+            _index(TEXT_INDEX_NAME, TEXT_INDEX_KEYS, **text_index_options()),
+        ],
+        "catalogs": _catalog_indexes(),
+        ROWS_COLLECTION: [
+            # No es único: ver catalog_utils.ensure_rows_collection_indexes
+            _index(
+                "catalog_id_position",
+                [("catalog_id", ASCENDING), ("position", ASCENDING)],
+            ),
+            _index(TEXT_INDEX_NAME, ROWS_TEXT_INDEX_KEYS, **text_index_options()),
+        ],
+        COLLECTION_USERS: [
+            # Parcial: los usuarios antiguos sin email no chocan entre sí
+            _index(
+                "email_unique",
+                [("email", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"email": {"$type": "string"}},
+            ),
+            _index("username", [("username", ASCENDING)]),
+        ],
+        "password_resets": [
+            _index("token", [("token", ASCENDING)]),
+            # Los tokens se eliminan automáticamente al caducar
+            _index("expires_at_ttl", [("expires_at", ASCENDING)], expireAfterSeconds=0),
+        ],
+        COLLECTION_AUDIT_LOGS: [
+            _index(
+                "timestamp_ttl",
+                [("timestamp", DESCENDING)],
+                expireAfterSeconds=AUDIT_LOG_RETENTION_DAYS * 24 * 3600,
+            ),
+            _index(
+                "user_id_timestamp", [("user_id", ASCENDING), ("timestamp", DESCENDING)]
+            ),
+            _index(
+                "event_type_timestamp",
+                [("event_type", ASCENDING), ("timestamp", DESCENDING)],
+            ),
+        ],
+        COLLECTION_JOBS: [
+            _index(
+                "status_created_at", [("status", ASCENDING), ("created_at", ASCENDING)]
+            ),
+            _index(
+                "user_id_created_at",
+                [("user_id", ASCENDING), ("created_at", DESCENDING)],
+            ),
+            # Los trabajos terminados se eliminan pasados JOB_RETENTION_DAYS
+            _index(
+                "finished_at_ttl",
+                [("finished_at", ASCENDING)],
+                expireAfterSeconds=JOB_RETENTION_DAYS * 24 * 3600,
+            ),
+        ],
+    }
+
+
+def _key_pattern(keys) -> List[tuple]:
+    pattern: List[tuple] = []
+    for field, direction in keys:
+        if field == "_ftsx":
+            continue
+        if direction == TEXT:
+            # MongoDB guarda los campos de un índice de texto como _fts/_ftsx
+            if ("_fts", TEXT) not in pattern:
+                pattern += [("_fts", TEXT), ("_ftsx", 1)]
+        else:
+            pattern.append((field, int(direction)))
+    return pattern
+
+
+def _compare_options(declared: Dict[str, Any], existing: Dict[str, Any]) -> Dict:
+    """Opciones que difieren entre el índice declarado y el existente"""
+    differences = {}
+    for option in COMPARED_OPTIONS:
+        wanted = declared["options"].get(option)
+        current = existing.get(option)
+        if option in ("unique", "sparse"):
+            wanted, current = bool(wanted), bool(current)
+        elif option == "expireAfterSeconds" and current is not None:
+            current = int(current)
+        if wanted != current:
+            differences[option] = {"declarado": wanted, "actual": current}
+    # En los índices de texto los campos indexados solo se distinguen por sus
+    # pesos (las claves se guardan siempre como _fts/_ftsx)
+    text_fields = [field for field, direction in declared["keys"] if direction == TEXT]
+    if text_fields:
+        wanted = {field: 1 for field in text_fields}
+        wanted.update(declared["options"].get("weights") or {})
+        current = {
+            field: int(weight)
+            for field, weight in (existing.get("weights") or {}).items()
+        }
+        if wanted != current:
+            differences["weights"] = {"declarado": wanted, "actual": current}
+    return differences
+
+
+def get_index_drift(db) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """
+    Compara los índices declarados con los existentes en la base de datos.
+
+    Args:
+        db: Base de datos de MongoDB
+
+    Returns:
+        dict: {colección: {"missing": [...], "mismatched": [...],
+        "unexpected": [...], "ok": [...]}}
+    """
+    report = {}
+    for collection_name, declared_indexes in get_index_registry().items():
+        try:
+            existing = db[collection_name].index_information()
+        except OperationFailure:
+            # La colección aún no existe
+            existing = {}
+        by_keys = {
+            tuple(_key_pattern(info["key"])): name
+            for name, info in existing.items()
+            if name != "_id_"
+        }
+        entry = {"missing": [], "mismatched": [], "unexpected": [], "ok": []}
+        matched = set()
+        for declared in declared_indexes:
+            keys = tuple(_key_pattern(declared["keys"]))
+            name = (
+                declared["name"] if declared["name"] in existing else by_keys.get(keys)
+            )
+            if name is None:
+                entry["missing"].append({"name": declared["name"], "keys": list(keys)})
+                continue
+            matched.add(name)
+            info = existing[name]
+            differences = _compare_options(declared, info)
+            if tuple(_key_pattern(info["key"])) != keys:
+                differences["keys"] = {
+                    "declarado": list(keys),
+                    "actual": _key_pattern(info["key"]),
+                }
+            if differences:
+                entry["mismatched"].append(
+                    {
+                        "name": declared["name"],
+                        "existing_name": name,
+                        "differences": differences,
+                    }
+                )
+            else:
+                entry["ok"].append(declared["name"])
+        entry["unexpected"] = [
+            {"name": name, "keys": _key_pattern(info["key"])}
+            for name, info in existing.items()
+            if name != "_id_" and name not in matched
+        ]
+        report[collection_name] = entry
+    return report
+
+
+def has_index_drift(report: Dict[str, Dict[str, List]]) -> bool:
+    """True si falta algún índice o alguno tiene opciones distintas"""
+    return any(entry["missing"] or entry["mismatched"] for entry in report.values())
+
+
+def ensure_indexes(db, rebuild: bool = False, dry_run: bool = False) -> Dict:
+    """
+    Crea los índices declarados que faltan en la base de datos.
+
+    Los TTL con otro expireAfterSeconds se actualizan con collMod y los
+    índices de texto con otros campos se sustituyen (solo puede haber uno por
+    colección). El resto de índices con opciones distintas solo se
+    reconstruyen (drop + create) con ``rebuild``; los índices no declarados
+    nunca se eliminan.
+
+    Args:
+        db: Base de datos de MongoDB
+        rebuild (bool): Reconstruir los índices con claves u opciones distintas
+        dry_run (bool): Solo calcular las diferencias, sin modificar nada
+
+    Returns:
+        dict: {"created": [...], "updated": [...], "rebuilt": [...],
+        "errors": [...], "drift": informe de get_index_drift antes de aplicar}
+    """
+    drift = get_index_drift(db)
+    result = {"created": [], "updated": [], "rebuilt": [], "errors": [], "drift": drift}
+    if dry_run:
+        return result
+
+    registry = get_index_registry()
+    for collection_name, entry in drift.items():
+        collection = db[collection_name]
+        declared_by_name = {index["name"]: index for index in registry[collection_name]}
+
+        for missing in entry["missing"]:
+            declared = declared_by_name[missing["name"]]
+            try:
+                collection.create_index(
+                    declared["keys"], name=declared["name"], **declared["options"]
+                )
+                result["created"].append(f"{collection_name}.{declared['name']}")
+            except Exception as e:
+                logger.error(
+                    f"Error al crear el índice {collection_name}.{declared['name']}: {str(e)}"
+                )
+                result["errors"].append(
+                    {"index": f"{collection_name}.{declared['name']}", "error": str(e)}
+                )
+
+        for mismatched in entry["mismatched"]:
+            declared = declared_by_name[mismatched["name"]]
+            label = f"{collection_name}.{declared['name']}"
+            differences = mismatched["differences"]
+            try:
+                if set(differences) == {"expireAfterSeconds"}:
+                    db.command(
+                        "collMod",
+                        collection_name,
+                        index={
+                            "name": mismatched["existing_name"],
+                            "expireAfterSeconds": declared["options"][
+                                "expireAfterSeconds"
+                            ],
+                        },
+                    )
+                    result["updated"].append(label)
+                elif rebuild or set(differences) == {"weights"}:
+                    collection.drop_index(mismatched["existing_name"])
+                    collection.create_index(
+                        declared["keys"], name=declared["name"], **declared["options"]
+                    )
+                    result["rebuilt"].append(label)
+                else:
+                    logger.warning(
+                        f"Índice {label} con opciones distintas a las declaradas: {differences}"
+                    )
+            except Exception as e:
+                logger.error(f"Error al actualizar el índice {label}: {str(e)}")
+                result["errors"].append({"index": label, "error": str(e)})
+
+    if result["created"] or result["updated"] or result["rebuilt"]:
+        logger.info(
+            f"Índices creados: {result['created']}, actualizados: {result['updated']}, "
+            f"reconstruidos: {result['rebuilt']}"
+        )
+    return result
+
+
+def ensure_indexes_in_background(db) -> Optional[threading.Thread]:
+    """
+    Aplica el registro de índices en un hilo para no retrasar el arranque.
+
+    Crear un índice ya existente no tiene coste, así que cada worker de
+    gunicorn puede lanzarlo sin coordinarse con los demás.
+    """
+    if db is None:
+        return None
+
+    def task():
+        try:
+            ensure_indexes(db)
+        except Exception as e:
+            logger.error(f"Error al aplicar el registro de índices: {str(e)}")
+
+    thread = threading.Thread(target=task, name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
@@ -3,27 +3,18 @@ Utilidades unificadas para manejo de imágenes
 """
 
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 from flask import current_app
 
+from app.utils.s3_cache import get_s3_exists_cache, invalidate_s3_object
 
-def get_unified_image_urls(row_data: Dict[str, Any]) -> List[str]:
-    """
-    Función unificada optimizada para obtener todas las URLs de imágenes de una fila.
-
-    Busca en todos los campos posibles: images, imagenes, imagen_data, Imagen
-    Implementa fallback optimizado: Local → S3 → None
 
-    Args:
-        row_data: Diccionario con los datos de la fila
-
-    Returns:
-        Lista de URLs válidas para mostrar las imágenes
+def _collect_row_images(row_data: Dict[str, Any]) -> List[str]:
+    """
+    Recopila, sin duplicados y en orden, las imágenes de todos los campos de una
+    fila: images, imagenes, imagen_data e Imagen (URL externa).
     """
-    image_urls = []
-
-    # Recopilar todas las imágenes de todos los campos
     all_images = []
 
     # 1. Campo 'images' (principal)
@@ -53,23 +44,50 @@ def get_unified_image_urls(row_data: Dict[str, Any]) -> List[str]:
         all_images.append(imagen_url)
 
     # Eliminar duplicados manteniendo orden
-    unique_images = list(dict.fromkeys(all_images))
+    return [
+        img
+        for img in dict.fromkeys(all_images)
+        if isinstance(img, str) and img and img != "N/A"
+    ]
 
-    # Procesar cada imagen con fallback optimizado
-    for img in unique_images:
-        if not img or img == "N/A":
-            continue
 
-        if isinstance(img, str) and (
-            img.startswith("http") or img.startswith("/admin/s3/")
-        ):
+def _is_direct_url(img: str) -> bool:
+    """URL externa o del proxy S3: se usa tal cual, sin comprobar existencia"""
+    return img.startswith("http") or img.startswith("/admin/s3/")
+
+
+def get_unified_image_urls(
+    row_data: Dict[str, Any], url_map: Optional[Dict[str, Optional[str]]] = None
+) -> List[str]:
+    """
+    Función unificada optimizada para obtener todas las URLs de imágenes de una fila.
+
+    Busca en todos los campos posibles: images, imagenes, imagen_data, Imagen
+    Implementa fallback optimizado: Local → S3 → None
+
+    Args:
+        row_data: Diccionario con los datos de la fila
+        url_map: Mapa nombre → URL ya resuelto para toda la página (ver
+            resolve_row_image_urls). Los archivos que no estén en el mapa se
+            resuelven en un único lote.
+
+    Returns:
+        Lista de URLs válidas para mostrar las imágenes
+    """
+    images = _collect_row_images(row_data)
+    url_map = url_map or {}
+
+    pending = [img for img in images if not _is_direct_url(img) and img not in url_map]
+    if pending:
+        url_map = {**url_map, **resolve_image_urls(pending)}
+
+    image_urls = []
+    for img in images:
+        if _is_direct_url(img):
             # URL externa o S3 - usar directamente
             image_urls.append(img)
-        else:
-            # Archivo local - implementar fallback optimizado Local → S3 → None
-            processed_url = get_image_fallback_url(img)
-            if processed_url:  # Solo agregar si la URL es válida
-                image_urls.append(processed_url)
+        elif url_map.get(img):  # Solo agregar si la URL es válida
+            image_urls.append(url_map[img])
 
     return image_urls
 
@@ -81,15 +99,104 @@ def clear_s3_cache(filename: Optional[str] = None):
     Args:
         filename: Nombre del archivo específico a limpiar, o None para limpiar todo
     """
-    if hasattr(current_app, "s3_cache"):
-        if filename:
-            cache_key = f"s3_exists_{filename}"
-            if cache_key in current_app.s3_cache:
-                del current_app.s3_cache[cache_key]
-                current_app.logger.debug(f"Cache S3 limpiado para: {filename}")
-        else:
-            current_app.s3_cache.clear()
-            current_app.logger.debug("Cache S3 completamente limpiado")
+    invalidate_s3_object(filename)
+    if filename:
+        current_app.logger.debug(f"Cache S3 limpiado para: {filename}")
+    else:
+        current_app.logger.debug("Cache S3 completamente limpiado")
+
+
+def resolve_image_urls(filenames: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Resuelve en lote las URLs de varios archivos de imagen: Local → S3 → None
+
+    Primero se comprueba el directorio static/uploads y el cache de existencia
+    de S3 (app/utils/s3_cache.py); los archivos restantes se verifican en S3 de
+    forma concurrente con un pool de hilos acotado (S3_EXISTENCE_MAX_WORKERS)
+    en lugar de un head_object secuencial por archivo.
+
+    Args:
+        filenames: Nombres de archivo (las URLs externas se ignoran)
+
+    Returns:
+        Diccionario nombre → URL válida, o None si el archivo no existe
+    """
+    url_map: Dict[str, Optional[str]] = {}
+    pending = []
+    uploads_dir = os.path.join(current_app.root_path, "static", "uploads")
+
+    for filename in dict.fromkeys(filenames):
+        if not filename or filename == "N/A" or _is_direct_url(filename):
+            continue
+
+        # 1. Verificar si existe localmente (más rápido)
+        try:
+            if os.path.exists(os.path.join(uploads_dir, filename)):
+                url_map[filename] = f"/static/uploads/{filename}"
+                continue
+        except Exception as e:
+            current_app.logger.error(
+                f"[IMAGE] Error verificando archivo local {filename}: {e}"
+            )
+
+        pending.append(filename)
+
+    # 2. Resultados de S3 ya cacheados (TTL distinto si existe o no)
+    s3_cache = get_s3_exists_cache()
+    cached = s3_cache.get_many(pending)
+    for filename, found in cached.items():
+        url_map[filename] = f"/admin/s3/{filename}" if found else None
+    pending = [filename for filename in pending if filename not in cached]
+
+    # 3. Verificar en S3 todos los archivos restantes a la vez
+    if pending:
+        try:
+            from app.utils.s3_utils import check_s3_files_exist
+
+            exists = check_s3_files_exist(
+                pending,
+                max_workers=current_app.config.get("S3_EXISTENCE_MAX_WORKERS", 16),
+            )
+        except Exception as e:
+            current_app.logger.error(f"[IMAGE] Error verificando archivos S3: {e}")
+            exists = {}
+
+        # Un error de S3 (None) no se cachea como "no existe"
+        s3_cache.set_many(
+            {key: found for key, found in exists.items() if found is not None}
+        )
+        for filename in pending:
+            found = exists.get(filename)
+            url_map[filename] = f"/admin/s3/{filename}" if found else None
+        current_app.logger.debug(
+            f"[IMAGE] {len(pending)} archivos verificados en S3, "
+            f"{sum(1 for f in pending if url_map[f])} encontrados"
+        )
+
+    return url_map
+
+
+def resolve_row_image_urls(rows: Iterable[Any]) -> Dict[str, Optional[str]]:
+    """
+    Resuelve de una vez las URLs de todas las imágenes de un conjunto de filas.
+
+    El resultado se pasa a get_images_for_template para cada fila, de modo que
+    una página con N imágenes no hace N verificaciones secuenciales en S3.
+
+    Args:
+        rows: Filas de la página (se ignoran las que no son diccionarios)
+
+    Returns:
+        Diccionario nombre → URL válida, o None si el archivo no existe
+    """
+    filenames = [
+        img
+        for row in rows
+        if isinstance(row, dict)
+        for img in _collect_row_images(row)
+        if not _is_direct_url(img)
+    ]
+    return resolve_image_urls(filenames)
 
 
 def get_image_fallback_url(filename: str) -> Optional[str]:
@@ -104,68 +211,23 @@ def get_image_fallback_url(filename: str) -> Optional[str]:
     """
     if not filename or filename == "N/A":
         return None  # No devolver URL para archivos vacíos
-
-    # 1. Verificar si existe localmente (más rápido)
-    try:
-        local_path = os.path.join(current_app.root_path, "static", "uploads", filename)
-        if os.path.exists(local_path):
-            current_app.logger.debug(f"[IMAGE] Archivo local encontrado: {filename}")
-            return f"/static/uploads/{filename}"
-    except Exception as e:
-        current_app.logger.error(
-            f"[IMAGE] Error verificando archivo local {filename}: {e}"
-        )
-
-    # 2. Solo verificar S3 si no existe localmente (evitar verificaciones dobles)
-    # Usar verificación rápida sin reintentos para evitar lentitud
-    try:
-        from app.utils.s3_utils import check_s3_file_exists_fast
-
-        if hasattr(current_app, "s3_cache"):
-            # Usar cache si está disponible
-            cache_key = f"s3_exists_{filename}"
-            if cache_key in current_app.s3_cache:
-                if current_app.s3_cache[cache_key]:
-                    return f"/admin/s3/{filename}"
-                else:
-                    return None
-
-        # Verificación rápida de S3 (sin reintentos)
-        s3_exists = check_s3_file_exists_fast(filename)
-        if s3_exists:
-            # Cachear resultado positivo
-            if not hasattr(current_app, "s3_cache"):
-                current_app.s3_cache = {}
-            current_app.s3_cache[f"s3_exists_{filename}"] = True
-            current_app.logger.debug(f"[IMAGE] Archivo S3 encontrado: {filename}")
-            return f"/admin/s3/{filename}"
-        else:
-            # Cachear resultado negativo
-            if not hasattr(current_app, "s3_cache"):
-                current_app.s3_cache = {}
-            current_app.s3_cache[f"s3_exists_{filename}"] = False
-
-    except Exception as e:
-        current_app.logger.error(
-            f"[IMAGE] Error verificando archivo S3 {filename}: {e}"
-        )
-
-    # 3. Si no existe en ningún lado, no devolver URL
-    current_app.logger.debug(f"[IMAGE] Archivo no encontrado: {filename}")
-    return None
+    return resolve_image_urls([filename]).get(filename)
 
 
-def get_images_for_template(row_data: Dict[str, Any]) -> Dict[str, Any]:
+def get_images_for_template(
+    row_data: Dict[str, Any], url_map: Optional[Dict[str, Optional[str]]] = None
+) -> Dict[str, Any]:
     """
     Prepara los datos de imagen para usar en templates.
 
     Args:
         row_data: Datos de la fila
+        url_map: Mapa nombre → URL de resolve_row_image_urls (opcional)
 
     Returns:
         Diccionario con URLs y metadatos de imágenes
     """
-    image_urls = get_unified_image_urls(row_data)
+    image_urls = get_unified_image_urls(row_data, url_map)
 
     return {
         "imagen_urls": image_urls,
@@ -174,6 +236,41 @@ def get_images_for_template(row_data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def get_catalog_thumbnail_url(catalog: Dict[str, Any]) -> str:
+    """
+    URL de la miniatura de un catálogo para los listados.
+
+    Usa la miniatura personalizada ('miniatura') o, si no hay, la precalculada
+    al escribir las filas ('miniatura_auto'), sin recorrer las filas ni
+    consultar S3: los archivos que no están en static/uploads se sirven por el
+    proxy S3 cuando USE_S3 está activo.
+
+    Args:
+        catalog: Documento del catálogo (basta con los metadatos)
+
+    Returns:
+        URL de la miniatura o "" si el catálogo no tiene imágenes
+    """
+    from app.utils.s3_utils import convert_s3_url_to_proxy
+
+    custom = catalog.get("miniatura")
+    if isinstance(custom, str) and custom.strip():
+        return convert_s3_url_to_proxy(custom)
+
+    thumbnail = catalog.get("miniatura_auto")
+    if not thumbnail or not isinstance(thumbnail, str):
+        return ""
+    if _is_direct_url(thumbnail):
+        return convert_s3_url_to_proxy(thumbnail)
+
+    uploads_dir = os.path.join(current_app.root_path, "static", "uploads")
+    if os.environ.get("USE_S3", "false").lower() == "true" and not os.path.exists(
+        os.path.join(uploads_dir, thumbnail)
+    ):
+        return f"/admin/s3/{thumbnail}"
+    return f"/static/uploads/{thumbnail}"
+
+
 def get_raw_images_for_edit(row_data: Dict[str, Any]) -> List[str]:
     """
     Obtiene lista de nombres de archivos de imagen para formulario de edición.
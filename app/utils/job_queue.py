@@ -0,0 +1,446 @@
+"""
+Trabajos en segundo plano para operaciones largas: importación de catálogos,
+backups y subidas a Google Drive.
+
+La petición registra el trabajo (submit_job) y responde enseguida con su id;
+un pool de JOB_WORKERS procesos lo ejecuta fuera de los hilos del servidor
+web. El estado se guarda en la colección 'jobs':
+
+    {_id, type, params, status, progress: {done, total}, message, result,
+     error, user_id, username, cancel_requested, created_at, started_at,
+     finished_at, heartbeat_at}
+
+Estados: queued → running → done | failed | cancelled. El proceso que ejecuta
+un trabajo lo reclama con una actualización atómica (queued → running), así
+que reenviar los trabajos pendientes tras reiniciar un worker de gunicorn no
+los duplica. Mientras se ejecuta, el trabajo actualiza 'heartbeat_at'; los
+que dejan de hacerlo durante JOB_STALE_SECONDS se marcan como fallidos.
+
+La cancelación es cooperativa: cancel_job marca 'cancel_requested' y el
+trabajo termina con JobCancelledError en su siguiente llamada a
+JobContext.progress() o JobContext.check_cancelled().
+
+Los tipos de trabajo se declaran en JOB_HANDLERS como 'módulo:función' para
+que los procesos hijos los importen (ver app/utils/job_tasks.py). Con
+JOB_USE_PROCESSES=false los trabajos se ejecutan en hilos del propio proceso.
+"""
+
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from pymongo import DESCENDING, ReturnDocument
+
+from app.exceptions import JobCancelledError
+from config import (
+    COLLECTION_JOBS,
+    JOB_STALE_SECONDS,
+    JOB_USE_PROCESSES,
+    JOB_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+# Tipo de trabajo → función 'módulo:función' que recibe (JobContext, **params)
+JOB_HANDLERS = {
+    "catalog_import": "app.utils.job_tasks:run_catalog_import",
+    "catalog_export": "app.utils.job_tasks:run_catalog_export",
+    "database_backup": "app.utils.job_tasks:run_database_backup",
+    "drive_upload": "app.utils.job_tasks:run_drive_upload",
+}
+
+# Intervalo mínimo entre escrituras de progreso en la base de datos
+PROGRESS_INTERVAL_SECONDS = 1.0
+# Intervalo del latido de los trabajos en ejecución
+HEARTBEAT_SECONDS = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_jobs_collection(db):
+    """Colección con el estado de los trabajos"""
+    return db[COLLECTION_JOBS]
+
+
+class JobContext:
+    """Acceso de un trabajo en ejecución a su estado: progreso y cancelación"""
+
+    def __init__(self, collection, job: Dict[str, Any]):
+        self.collection = collection
+        self.job_id = job["_id"]
+        self.params = job.get("params") or {}
+        self.user_id = job.get("user_id")
+        self.username = job.get("username")
+        self._last_progress = 0.0
+
+    def progress(
+        self,
+        done: int,
+        total: Optional[int] = None,
+        message: Optional[str] = None,
+        force: bool = False,
+    ) -> None:
+        """
+        Guarda el progreso (como mucho una vez por PROGRESS_INTERVAL_SECONDS
+        salvo ``force``) y comprueba si se ha pedido la cancelación.
+
+        Raises:
+            JobCancelledError: Si se ha pedido cancelar el trabajo
+        """
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_progress = now
+        update: Dict[str, Any] = {
+            "progress.done": done,
+            "heartbeat_at": datetime.utcnow(),
+        }
+        if total is not None:
+            update["progress.total"] = total
+        if message is not None:
+            update["message"] = message
+        job = self.collection.find_one_and_update(
+            {"_id": self.job_id},
+            {"$set": update},
+            projection={"cancel_requested": 1},
+        )
+        if job and job.get("cancel_requested"):
+            raise JobCancelledError(f"Trabajo {self.job_id} cancelado")
+
+    def check_cancelled(self) -> None:
+        """
+        Raises:
+            JobCancelledError: Si se ha pedido cancelar el trabajo
+        """
+        job = self.collection.find_one({"_id": self.job_id}, {"cancel_requested": 1})
+        if job and job.get("cancel_requested"):
+            raise JobCancelledError(f"Trabajo {self.job_id} cancelado")
+
+
+def _resolve_handler(job_type: str) -> Callable[..., Any]:
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Tipo de trabajo desconocido: {job_type}")
+    module_name, function_name = JOB_HANDLERS[job_type].split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _heartbeat(collection, job_id, stop: threading.Event) -> None:
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            collection.update_one(
+                {"_id": job_id}, {"$set": {"heartbeat_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo actualizar el latido del trabajo {job_id}: {e}")
+
+
+def execute_job(job_id: str) -> Optional[str]:
+    """
+    Ejecuta un trabajo en cola en el proceso actual.
+
+    Returns:
+        str: Estado final del trabajo o None si ya lo había reclamado otro
+        proceso o estaba cancelado
+    """
+    from app.database import get_mongo_db
+
+    db = get_mongo_db()
+    if db is None:
+        raise RuntimeError("No se pudo conectar a la base de datos")
+    collection = get_jobs_collection(db)
+    now = datetime.utcnow()
+    job = collection.find_one_and_update(
+        {"_id": ObjectId(job_id), "status": JOB_QUEUED},
+        {
+            "$set": {
+                "status": JOB_RUNNING,
+                "started_at": now,
+                "heartbeat_at": now,
+                "pid": os.getpid(),
+            }
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        return None
+
+    context = JobContext(collection, job)
+    stop = threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=(collection, job["_id"], stop), daemon=True
+    ).start()
+    try:
+        result = _resolve_handler(job["type"])(context, **context.params)
+        final = {"status": JOB_DONE, "result": result}
+    except JobCancelledError:
+        final = {"status": JOB_CANCELLED}
+    except Exception as e:
+        logger.error(
+            f"Error en el trabajo {job_id} ({job['type']}): {e}", exc_info=True
+        )
+        final = {"status": JOB_FAILED, "error": str(e)}
+    finally:
+        stop.set()
+    final["finished_at"] = datetime.utcnow()
+    collection.update_one({"_id": job["_id"]}, {"$set": final})
+    logger.info(f"Trabajo {job_id} ({job['type']}) terminado: {final['status']}")
+    return final["status"]
+
+
+def _init_worker() -> None:
+    """Inicializador de los procesos del pool: su propia conexión a MongoDB"""
+    from app.database import initialize_db
+
+    initialize_db()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = max(1, JOB_WORKERS)
+            if JOB_USE_PROCESSES:
+                # 'spawn': los hijos no heredan hilos ni conexiones del servidor
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="job"
+                )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def _on_job_finished(job_id: str, future) -> None:
+    """Marca como fallido un trabajo cuyo proceso terminó de forma anómala"""
+    error = future.exception()
+    if error is None:
+        return
+    logger.error(f"El trabajo {job_id} no pudo ejecutarse: {error}")
+    if isinstance(error, BrokenProcessPool):
+        _reset_executor()
+    from app.database import get_mongo_db
+
+    db = get_mongo_db()
+    if db is not None:
+        get_jobs_collection(db).update_one(
+            {"_id": ObjectId(job_id), "status": {"$in": list(JOB_ACTIVE_STATUSES)}},
+            {
+                "$set": {
+                    "status": JOB_FAILED,
+                    "error": str(error) or type(error).__name__,
+                    "finished_at": datetime.utcnow(),
+                }
+            },
+        )
+
+
+def _dispatch(job_id: str) -> None:
+    for attempt in range(2):
+        try:
+            future = _get_executor().submit(execute_job, job_id)
+        except (BrokenProcessPool, RuntimeError):
+            # Pool roto (un proceso hijo murió) o cerrado: crear uno nuevo
+            _reset_executor()
+            if attempt:
+                raise
+            continue
+        future.add_done_callback(lambda f: _on_job_finished(job_id, f))
+        return
+
+
+def submit_job(
+    db,
+    job_type: str,
+    params: Optional[Dict[str, Any]] = None,
+    user_id=None,
+    username: Optional[str] = None,
+) -> str:
+    """
+    Registra un trabajo y lo envía al pool.
+
+    Args:
+        db: Base de datos MongoDB
+        job_type (str): Tipo de trabajo (clave de JOB_HANDLERS)
+        params (dict): Argumentos de la función del trabajo (deben poder
+            guardarse en MongoDB)
+        user_id: Usuario que lo solicita
+        username (str): Nombre del usuario
+
+    Returns:
+        str: ID del trabajo
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Tipo de trabajo desconocido: {job_type}")
+    job_id = (
+        get_jobs_collection(db)
+        .insert_one(
+            {
+                "type": job_type,
+                "params": params or {},
+                "status": JOB_QUEUED,
+                "progress": {"done": 0, "total": None},
+                "message": None,
+                "result": None,
+                "error": None,
+                "user_id": str(user_id) if user_id else None,
+                "username": username,
+                "cancel_requested": False,
+                "created_at": datetime.utcnow(),
+            }
+        )
+        .inserted_id
+    )
+    _dispatch(str(job_id))
+    logger.info(f"Trabajo {job_id} ({job_type}) encolado por {username}")
+    return str(job_id)
+
+
+def get_job(db, job_id) -> Optional[Dict[str, Any]]:
+    """Documento de un trabajo o None si no existe o el ID no es válido"""
+    if not ObjectId.is_valid(str(job_id)):
+        return None
+    return get_jobs_collection(db).find_one({"_id": ObjectId(str(job_id))})
+
+
+def list_jobs(db, user_id=None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Trabajos más recientes, opcionalmente solo los de un usuario"""
+    query = {"user_id": str(user_id)} if user_id else {}
+    return list(
+        get_jobs_collection(db)
+        .find(query, {"params": 0})
+        .sort("created_at", DESCENDING)
+        .limit(limit)
+    )
+
+
+def count_active_jobs(db) -> Dict[Tuple[str, str], int]:
+    """
+    Trabajos en cola y en ejecución por (estado, tipo), con 0 en las
+    combinaciones sin trabajos (profundidad de la cola para /metrics)
+    """
+    counts = {
+        (status, job_type): 0
+        for status in JOB_ACTIVE_STATUSES
+        for job_type in JOB_HANDLERS
+    }
+    pipeline = [
+        {"$match": {"status": {"$in": list(JOB_ACTIVE_STATUSES)}}},
+        {"$group": {"_id": {"status": "$status", "type": "$type"}, "n": {"$sum": 1}}},
+    ]
+    for doc in get_jobs_collection(db).aggregate(pipeline):
+        key = (doc["_id"].get("status"), doc["_id"].get("type"))
+        counts[key] = doc["n"]
+    return counts
+
+
+def cancel_job(db, job_id) -> bool:
+    """
+    Cancela un trabajo: los que están en cola se cancelan directamente y a
+    los que están en ejecución se les pide que terminen.
+
+    Returns:
+        bool: True si el trabajo estaba activo
+    """
+    if not ObjectId.is_valid(str(job_id)):
+        return False
+    collection = get_jobs_collection(db)
+    object_id = ObjectId(str(job_id))
+    result = collection.update_one(
+        {"_id": object_id, "status": JOB_QUEUED},
+        {
+            "$set": {
+                "status": JOB_CANCELLED,
+                "cancel_requested": True,
+                "finished_at": datetime.utcnow(),
+            }
+        },
+    )
+    if result.modified_count:
+        return True
+    result = collection.update_one(
+        {"_id": object_id, "status": JOB_RUNNING},
+        {"$set": {"cancel_requested": True}},
+    )
+    return result.modified_count > 0
+
+
+def recover_jobs(db) -> Dict[str, int]:
+    """
+    Revisa los trabajos que quedaron a medias al reiniciarse un proceso.
+
+    Los que están en ejecución sin latido desde hace JOB_STALE_SECONDS se
+    marcan como fallidos; los que siguen en cola desde entonces se reenvían
+    al pool (solo uno de los procesos que lo intenten llegará a ejecutarlos).
+
+    Returns:
+        dict: {"failed": n, "requeued": n}
+    """
+    collection = get_jobs_collection(db)
+    limit = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    failed = collection.update_many(
+        {"status": JOB_RUNNING, "heartbeat_at": {"$lt": limit}},
+        {
+            "$set": {
+                "status": JOB_FAILED,
+                "error": "Trabajo interrumpido",
+                "finished_at": datetime.utcnow(),
+            }
+        },
+    ).modified_count
+    requeued = 0
+    for job in collection.find(
+        {"status": JOB_QUEUED, "created_at": {"$lt": limit}}, {"_id": 1}
+    ):
+        _dispatch(str(job["_id"]))
+        requeued += 1
+    if failed or requeued:
+        logger.info(f"Trabajos interrumpidos: {failed}, reenviados: {requeued}")
+    return {"failed": failed, "requeued": requeued}
+
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Datos públicos de un trabajo para las respuestas JSON"""
+
+    def iso(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    progress = job.get("progress") or {}
+    return {
+        "id": str(job["_id"]),
+        "type": job.get("type"),
+        "status": job.get("status"),
+        "progress": {"done": progress.get("done", 0), "total": progress.get("total")},
+        "message": job.get("message"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "username": job.get("username"),
+        "cancel_requested": bool(job.get("cancel_requested")),
+        "created_at": iso(job.get("created_at")),
+        "started_at": iso(job.get("started_at")),
+        "finished_at": iso(job.get("finished_at")),
+    }
@@ -0,0 +1,285 @@
+"""
+Funciones de los trabajos en segundo plano (ver app/utils/job_queue.py).
+
+Cada función recibe el JobContext y los parámetros guardados con el trabajo,
+informa del progreso con ctx.progress() y devuelve un diccionario que se
+guarda como 'result' del trabajo. Se ejecutan en los procesos del pool, sin
+contexto de petición de Flask: todo lo que necesitan (usuario, rutas de
+archivos) llega en los parámetros.
+"""
+
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.audit import audit_log
+from app.database import get_mongo_db
+from app.utils.backup_utils import BackupManager, backup_extension, manifest_path
+from app.utils.catalog_export import (
+    catalog_document_fields,
+    iter_catalog_documents,
+    iter_export,
+    write_export,
+)
+from app.utils.catalog_import import import_catalog_rows, read_import_file
+from config import BACKUP_COMPRESSION, BACKUP_FORMAT
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+BACKUPS_DIR = PROJECT_ROOT / "backups"
+DRIVE_FOLDER = "Backups_CatalogoTablas"
+
+
+def _get_db():
+    db = get_mongo_db()
+    if db is None:
+        raise RuntimeError("No se pudo conectar a la base de datos")
+    return db
+
+
+def run_catalog_import(
+    ctx,
+    path: str,
+    filename: str,
+    catalog_fields: Dict[str, Any],
+    batch_size: int,
+) -> Dict[str, Any]:
+    """
+    Importa un catálogo desde el archivo subido (guardado en JOB_FILES_DIR).
+
+    El archivo se elimina al terminar, tanto si la importación va bien como
+    si falla o se cancela.
+    """
+    db = _get_db()
+    try:
+        with open(path, "rb") as stream:
+            headers, batches = read_import_file(stream, filename, batch_size)
+            ctx.progress(0, message=f"Importando {filename}", force=True)
+            catalog_id, num_rows = import_catalog_rows(
+                db.spreadsheets,
+                catalog_fields,
+                headers,
+                batches,
+                progress=lambda done: ctx.progress(done, message="Filas importadas"),
+            )
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    ctx.progress(num_rows, num_rows, f"{num_rows} filas importadas", force=True)
+    logger.info(
+        f"Catálogo importado con ID: {catalog_id}, nombre: {catalog_fields.get('name')}, filas: {num_rows}"
+    )
+    return {
+        "catalog_id": str(catalog_id),
+        "name": catalog_fields.get("name"),
+        "num_rows": num_rows,
+    }
+
+
+def _upload_to_drive(path: str) -> Dict[str, Any]:
+    from tools.db_utils.google_drive_utils import upload_to_drive
+
+    result = upload_to_drive(path, DRIVE_FOLDER)
+    if not result or not result.get("success"):
+        raise OSError(
+            result.get("error", "Error desconocido")
+            if result
+            else "No se pudo conectar con Google Drive"
+        )
+    return result
+
+
+def run_catalog_export(ctx, format: str) -> Dict[str, Any]:
+    """
+    Exporta la colección de catálogos a JSON o CSV en backups/ y la sube a
+    Google Drive; el archivo local solo se conserva si la subida falla.
+
+    Los documentos se leen por lotes del cursor y se escriben por fragmentos
+    (ver app/utils/catalog_export.py).
+    """
+    if format not in ("json", "csv"):
+        raise ValueError(f"Formato de exportación no soportado: {format}")
+    collection = _get_db().spreadsheets
+    total = collection.count_documents({})
+    BACKUPS_DIR.mkdir(exist_ok=True)
+    filename = f"catalog_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    backup_path = BACKUPS_DIR / filename
+    ctx.progress(0, total, "Exportando catálogos", force=True)
+
+    exported = 0
+
+    def documents():
+        nonlocal exported
+        for doc in iter_catalog_documents(collection):
+            yield doc
+            exported += 1
+            ctx.progress(exported, total)
+
+    headers = catalog_document_fields(collection) if format == "csv" else []
+    write_export(str(backup_path), iter_export(format, headers, documents()))
+
+    ctx.progress(exported, total, "Subiendo a Google Drive", force=True)
+    details = {"filename": filename, "username": ctx.username or "desconocido"}
+    try:
+        drive_result = _upload_to_drive(str(backup_path))
+    except Exception as e:
+        logger.error(f"Error al subir el backup {filename} a Google Drive: {e}")
+        audit_log(
+            f"backup_{format}_upload_failed",
+            user_id=ctx.user_id,
+            details={**details, "error": str(e)},
+            success=False,
+        )
+        return {
+            "filename": filename,
+            "documents": exported,
+            "uploaded_to_drive": False,
+            "drive_error": str(e),
+        }
+    os.remove(backup_path)
+    audit_log(
+        f"backup_{format}_uploaded_to_drive",
+        user_id=ctx.user_id,
+        details={**details, "drive_url": drive_result.get("file_url")},
+    )
+    return {
+        "filename": filename,
+        "documents": exported,
+        "uploaded_to_drive": True,
+        "drive_url": drive_result.get("file_url"),
+    }
+
+
+def run_database_backup(ctx, upload_to_drive: bool = False) -> Dict[str, Any]:
+    """
+    Backup completo de la base de datos en backups/, escrito en flujo con
+    BackupManager.write_backup (formato y compresión según BACKUP_FORMAT y
+    BACKUP_COMPRESSION).
+
+    Con ``upload_to_drive`` se sube a Google Drive y se eliminan el archivo
+    local y su manifiesto si la subida va bien. El resultado tiene los mismos
+    campos que devolvían /admin/maintenance/backup-local y
+    /admin/maintenance/backup.
+    """
+    ctx.progress(0, message="Escribiendo backup", force=True)
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    prefix = "backup" if upload_to_drive else "backup_local"
+    filename = (
+        f"{prefix}_{timestamp}{backup_extension(BACKUP_FORMAT, BACKUP_COMPRESSION)}"
+    )
+    BACKUPS_DIR.mkdir(exist_ok=True)
+    backup_path = BACKUPS_DIR / filename
+    manifest = BackupManager().write_backup(
+        str(backup_path),
+        progress=lambda done, total: ctx.progress(done, total, "Documentos copiados"),
+    )
+    total_collections = manifest["total_collections"]
+    total_documents = manifest["total_documents"]
+    file_size = backup_path.stat().st_size
+    logger.info(
+        f"Backup creado: {filename} ({file_size} bytes, {total_collections} colecciones, {total_documents} documentos)"
+    )
+    result: Dict[str, Any] = {
+        "filename": filename,
+        "size": file_size,
+        "total_collections": total_collections,
+        "total_documents": total_documents,
+    }
+    if not upload_to_drive:
+        result.update(
+            {
+                "status": "success",
+                "file_path": str(backup_path),
+                "message": f"Backup local creado exitosamente: {filename}",
+            }
+        )
+        return result
+
+    ctx.progress(
+        total_documents, total_documents, "Subiendo a Google Drive", force=True
+    )
+    drive_error: Optional[str] = None
+    try:
+        drive_result = _upload_file_to_drive(backup_path)
+        if not drive_result or not drive_result.get("success"):
+            drive_error = (
+                drive_result.get("error", "Error desconocido")
+                if drive_result
+                else "No se pudo conectar con Google Drive"
+            )
+    except Exception as e:
+        logger.error(f"Error subiendo a Google Drive: {e}")
+        drive_error = str(e)
+
+    if drive_error is not None:
+        # Si falla la subida a Drive, mantener archivo local
+        result.update(
+            {
+                "status": "warning",
+                "message": f"Backup creado pero no se pudo subir a Google Drive: {drive_error}",
+                "download_url": f"/admin/maintenance/download-backup/{filename}",
+                "uploaded_to_drive": False,
+                "drive_error": drive_error,
+            }
+        )
+        return result
+
+    # Eliminar archivo local (y su manifiesto) después de subida exitosa
+    os.remove(backup_path)
+    if os.path.exists(manifest_path(backup_path)):
+        os.remove(manifest_path(backup_path))
+    result.update(
+        {
+            "status": "success",
+            "message": "Backup creado y subido a Google Drive exitosamente",
+            "drive_info": {
+                "file_id": drive_result.get("file_id"),
+                "web_view_url": drive_result.get("file_url"),
+                "folder_name": drive_result.get("folder_name", DRIVE_FOLDER),
+            },
+            "uploaded_to_drive": True,
+        }
+    )
+    return result
+
+
+def _upload_file_to_drive(path: Path) -> Optional[Dict[str, Any]]:
+    """Sube un archivo a la carpeta de backups de Drive leyéndolo desde disco"""
+    db_utils_path = str(PROJECT_ROOT / "tools" / "db_utils")
+    if db_utils_path not in sys.path:
+        sys.path.insert(0, db_utils_path)
+    from google_drive_utils_v2 import upload_file_to_drive  # type: ignore
+
+    return upload_file_to_drive(str(path), DRIVE_FOLDER)
+
+
+def run_drive_upload(ctx, filename: str) -> Dict[str, Any]:
+    """Sube a Google Drive un backup local de backups/"""
+    file_path = BACKUPS_DIR / filename
+    if not file_path.exists():
+        raise FileNotFoundError(f"Archivo no encontrado: {filename}")
+    file_size = file_path.stat().st_size
+    ctx.progress(0, file_size, f"Subiendo {filename} a Google Drive", force=True)
+    drive_result = _upload_file_to_drive(file_path)
+    if not drive_result or not drive_result.get("success"):
+        error_msg = (
+            drive_result.get("error", "Error desconocido")
+            if drive_result
+            else "No se pudo conectar con Google Drive"
+        )
+        raise Exception(f"Error subiendo a Google Drive: {error_msg}")
+    file_id = drive_result.get("file_id")
+    logger.info(
+        f"Backup {filename} ({file_size} bytes) subido a Google Drive correctamente con ID: {file_id}"
+    )
+    return {
+        "success": True,
+        "message": f'Backup "{filename}" subido a Google Drive correctamente',
+        "filename": filename,
+        "size": file_size,
+        "size_mb": round(file_size / (1024 * 1024), 2),
+    }
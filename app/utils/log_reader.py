@@ -0,0 +1,460 @@
+"""
+Lectura eficiente de los archivos de log para el visor de administración.
+
+- tail_lines: últimas líneas leyendo el archivo hacia atrás desde el final,
+  por bloques de LOG_READ_BLOCK_SIZE, sin cargarlo entero.
+- find_timestamp_offset: búsqueda binaria por el prefijo de fecha de las
+  líneas ('[2024-01-31 12:00:00,123] INFO ...') para acotar un rango de
+  fechas leyendo solo unas pocas líneas.
+- search_logs: búsqueda de texto en un log y sus rotaciones (.1 ... .5) con
+  un índice en disco ('<logs>/.index'). El índice divide cada archivo en
+  bloques de líneas y guarda, por bloque, un filtro de Bloom con los
+  trigramas de sus palabras; solo se leen los bloques que pueden contener la
+  palabra clave. Cada consulta añade al índice lo escrito desde la anterior.
+
+Los índices se identifican por la primera línea del archivo, así que siguen
+siendo válidos cuando RotatingFileHandler renombra el log a '.1', '.2', ...
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import zlib
+from datetime import date, datetime, time, timedelta
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de los bloques leídos hacia atrás al hacer tail
+LOG_READ_BLOCK_SIZE = 64 * 1024
+
+# Índice de búsqueda: bytes de log por bloque y bits del filtro de Bloom
+LOG_INDEX_BLOCK_SIZE = 128 * 1024
+LOG_INDEX_BLOOM_BITS = 32 * 1024
+LOG_INDEX_DIRNAME = ".index"
+LOG_INDEX_VERSION = 1
+
+# Máximo de coincidencias devueltas por search_logs (las más recientes)
+LOG_SEARCH_LIMIT = 1000
+
+# Prefijo de fecha de una línea: '[2024-01-31 12:00:00,123]' o '2024-01-31 12:00:00'
+TIMESTAMP_RE = re.compile(rb"^\[?(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})")
+_WORD_RE = re.compile(r"\w+")
+_ROTATED_SUFFIX_RE = re.compile(r"^\.(\d+)$")
+
+
+def _decode(line: bytes) -> str:
+    return line.decode("utf-8", errors="ignore")
+
+
+def resolve_log_path(logs_dir: str, log_file: str) -> Optional[str]:
+    """Ruta de un archivo de logs_dir o None si no existe o está fuera"""
+    logs_dir = os.path.abspath(logs_dir)
+    path = os.path.abspath(os.path.join(logs_dir, log_file))
+    if os.path.dirname(path) != logs_dir or not os.path.isfile(path):
+        return None
+    return path
+
+
+def rotated_log_paths(logs_dir: str, log_file: str) -> List[str]:
+    """Log y sus rotaciones ('<log>.1', '<log>.2', ...), del más antiguo al actual"""
+    rotations = []
+    for name in os.listdir(logs_dir):
+        if not name.startswith(log_file):
+            continue
+        match = _ROTATED_SUFFIX_RE.match(name[len(log_file) :])
+        if match:
+            rotations.append((int(match.group(1)), name))
+    paths = [
+        os.path.join(logs_dir, name) for _, name in sorted(rotations, reverse=True)
+    ]
+    current = os.path.join(logs_dir, log_file)
+    if os.path.isfile(current):
+        paths.append(current)
+    return paths
+
+
+def _file_size(f: BinaryIO) -> int:
+    f.seek(0, os.SEEK_END)
+    return f.tell()
+
+
+# ============================================================================
+# TAIL Y RANGOS DE FECHAS
+# ============================================================================
+
+
+def iter_lines_reverse(
+    f: BinaryIO,
+    start: int = 0,
+    end: Optional[int] = None,
+    block_size: int = LOG_READ_BLOCK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Líneas de f[start:end] de la última a la primera (con su salto de línea).
+
+    Lee bloques de ``block_size`` desde ``end`` hacia atrás, así que el coste
+    depende de las líneas recorridas y no del tamaño del archivo.
+    """
+    if end is None:
+        end = _file_size(f)
+    position = end
+    buffer = b""
+    while position > start:
+        read_size = min(block_size, position - start)
+        position -= read_size
+        f.seek(position)
+        buffer = f.read(read_size) + buffer
+        line_end = len(buffer)
+        # El salto de línea que cierra la línea anterior (no el de la propia)
+        newline = buffer.rfind(b"\n", 0, line_end - 1)
+        while newline != -1:
+            yield buffer[newline + 1 : line_end]
+            line_end = newline + 1
+            newline = buffer.rfind(b"\n", 0, line_end - 1)
+        buffer = buffer[:line_end]
+    if buffer:
+        yield buffer
+
+
+def tail_lines(
+    path: str,
+    n: int = 20,
+    keyword: Optional[str] = None,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> List[str]:
+    """
+    Últimas ``n`` líneas del log (todas si n <= 0), en orden cronológico.
+
+    Args:
+        path (str): Ruta del log
+        n (int): Número de líneas
+        keyword (str): Solo líneas que la contengan (sin distinguir mayúsculas)
+        start (int): Offset desde el que se consideran líneas
+        end (int): Offset hasta el que se consideran líneas (None = final)
+    """
+    keyword = keyword.lower() if keyword else None
+    lines: List[str] = []
+    with open(path, "rb") as f:
+        for raw in iter_lines_reverse(f, start, end):
+            line = _decode(raw)
+            if keyword and keyword not in line.lower():
+                continue
+            lines.append(line)
+            if 0 < n <= len(lines):
+                break
+    lines.reverse()
+    return lines
+
+
+def _timestamp_key(line: bytes) -> Optional[bytes]:
+    # 'AAAA-MM-DD HH:MM:SS' se ordena igual como texto que como fecha
+    match = TIMESTAMP_RE.match(line)
+    if not match:
+        return None
+    return match.group(1) + b" " + match.group(2)
+
+
+def _next_timestamp(f: BinaryIO, position: int, size: int):
+    """Offset y fecha de la primera línea con fecha que empieza en position o después"""
+    if position == 0:
+        f.seek(0)
+    else:
+        # Completar la línea que contiene position - 1
+        f.seek(position - 1)
+        f.readline()
+    offset = f.tell()
+    while offset < size:
+        line = f.readline()
+        if not line:
+            break
+        key = _timestamp_key(line)
+        if key is not None:
+            return offset, key
+        offset += len(line)
+    return size, None
+
+
+def find_timestamp_offset(f: BinaryIO, when: datetime) -> int:
+    """
+    Offset de la primera línea con fecha >= ``when`` (búsqueda binaria).
+
+    Las líneas sin fecha (p. ej. las de una traza) se consideran parte de la
+    línea con fecha anterior. Si ninguna línea llega a ``when`` devuelve el
+    tamaño del archivo.
+    """
+    size = _file_size(f)
+    target = when.strftime("%Y-%m-%d %H:%M:%S").encode()
+    low, high = 0, size
+    while low < high:
+        middle = (low + high) // 2
+        _, key = _next_timestamp(f, middle, size)
+        if key is None or key >= target:
+            high = middle
+        else:
+            low = middle + 1
+    return _next_timestamp(f, low, size)[0]
+
+
+def date_range_offsets(
+    path: str, date_from: Optional[date] = None, date_to: Optional[date] = None
+):
+    """Offsets (inicio, fin) de las líneas entre dos fechas, ambas incluidas"""
+    with open(path, "rb") as f:
+        start = (
+            find_timestamp_offset(f, datetime.combine(date_from, time.min))
+            if date_from
+            else 0
+        )
+        end = (
+            find_timestamp_offset(
+                f, datetime.combine(date_to + timedelta(days=1), time.min)
+            )
+            if date_to
+            else _file_size(f)
+        )
+    return start, max(start, end)
+
+
+# ============================================================================
+# ÍNDICE DE BÚSQUEDA
+# ============================================================================
+
+
+def _trigrams(words: Set[str]) -> Set[str]:
+    return {word[i : i + 3] for word in words for i in range(len(word) - 2)}
+
+
+def _bloom_positions(trigram: str):
+    value = zlib.crc32(trigram.encode("utf-8"))
+    mask = LOG_INDEX_BLOOM_BITS - 1
+    return value & mask, (value >> 15) & mask
+
+
+def _index_block(data: bytes, offset: int, partial: bool) -> Dict[str, Any]:
+    text = _decode(data).lower()
+    bloom = bytearray(LOG_INDEX_BLOOM_BITS // 8)
+    for trigram in _trigrams(set(_WORD_RE.findall(text))):
+        for bit in _bloom_positions(trigram):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+    return {
+        "offset": offset,
+        "length": len(data),
+        "lines": data.count(b"\n"),
+        "partial": partial,
+        "bloom": base64.b64encode(bytes(bloom)).decode("ascii"),
+    }
+
+
+def _bloom_contains(bloom: bytes, trigrams: Set[str]) -> bool:
+    for trigram in trigrams:
+        for bit in _bloom_positions(trigram):
+            if not bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+    return True
+
+
+def _file_signature(f: BinaryIO) -> Optional[str]:
+    """Huella de la primera línea completa del archivo (None si aún no hay)"""
+    f.seek(0)
+    first_line = f.readline(4096)
+    if not first_line.endswith(b"\n"):
+        return None
+    return hashlib.sha1(first_line).hexdigest()[:20]
+
+
+def _index_dir(path: str) -> str:
+    return os.path.join(os.path.dirname(path), LOG_INDEX_DIRNAME)
+
+
+def _load_index(index_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get("version") == LOG_INDEX_VERSION else None
+
+
+def _save_index(index_path: str, index: Dict[str, Any]) -> None:
+    # Escritura atómica: varios workers pueden actualizar el mismo índice
+    directory = os.path.dirname(index_path)
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(temp_path, index_path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def prune_log_indexes(logs_dir: str) -> int:
+    """Elimina los índices de archivos que ya no existen; devuelve cuántos"""
+    index_dir = os.path.join(logs_dir, LOG_INDEX_DIRNAME)
+    if not os.path.isdir(index_dir):
+        return 0
+    signatures = set()
+    for name in os.listdir(logs_dir):
+        path = os.path.join(logs_dir, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                signatures.add(_file_signature(f))
+    removed = 0
+    for name in os.listdir(index_dir):
+        if name.endswith(".idx") and name[: -len(".idx")] not in signatures:
+            os.remove(os.path.join(index_dir, name))
+            removed += 1
+    return removed
+
+
+def update_log_index(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Índice de búsqueda del log, ampliado con lo escrito desde la última vez.
+
+    Solo se leen los bytes nuevos (y el último bloque si estaba incompleto);
+    si el archivo se ha truncado o reescrito se reconstruye. Devuelve None si
+    el archivo aún no tiene ninguna línea completa.
+    """
+    with open(path, "rb") as f:
+        signature = _file_signature(f)
+        if signature is None:
+            return None
+        size = _file_size(f)
+        index_path = os.path.join(_index_dir(path), f"{signature}.idx")
+        index = _load_index(index_path)
+        is_new = index is None or index["size"] > size
+        if is_new:
+            index = {
+                "version": LOG_INDEX_VERSION,
+                "size": 0,
+                "lines": 0,
+                "blocks": [],
+            }
+        blocks = index["blocks"]
+        if size > index["size"] and blocks and blocks[-1]["partial"]:
+            last = blocks.pop()
+            index["size"] = last["offset"]
+            index["lines"] -= last["lines"]
+        if size == index["size"]:
+            return index
+
+        offset = index["size"]
+        f.seek(offset)
+        while True:
+            data = f.read(LOG_INDEX_BLOCK_SIZE)
+            if not data:
+                break
+            partial = len(data) < LOG_INDEX_BLOCK_SIZE
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                if partial:
+                    # Línea a medio escribir: se indexará en otra consulta
+                    break
+                cut = len(data)
+            block = _index_block(data[:cut], offset, partial)
+            blocks.append(block)
+            index["lines"] += block["lines"]
+            offset += cut
+            f.seek(offset)
+        index["size"] = offset
+
+    try:
+        _save_index(index_path, index)
+        if is_new:
+            prune_log_indexes(os.path.dirname(path))
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el índice de {path}: {e}")
+    return index
+
+
+def count_lines(path: str) -> int:
+    """Líneas del log según su índice (sin releer lo ya indexado)"""
+    index = update_log_index(path)
+    if index is None:
+        with open(path, "rb") as f:
+            return 1 if f.read(1) else 0
+    with open(path, "rb") as f:
+        f.seek(index["size"])
+        rest = f.read()
+    return (
+        index["lines"]
+        + rest.count(b"\n")
+        + (1 if rest and not rest.endswith(b"\n") else 0)
+    )
+
+
+def _search_file(path: str, keyword: str, trigrams: Set[str]) -> List[str]:
+    index = update_log_index(path)
+    ranges = []
+    start = 0
+    if index is not None:
+        for block in index["blocks"]:
+            if trigrams and not _bloom_contains(
+                base64.b64decode(block["bloom"]), trigrams
+            ):
+                continue
+            ranges.append((block["offset"], block["length"]))
+        start = index["size"]
+    matches: List[str] = []
+    with open(path, "rb") as f:
+        size = _file_size(f)
+        if size > start:
+            ranges.append((start, size - start))
+        for offset, length in ranges:
+            f.seek(offset)
+            for raw in f.read(length).split(b"\n"):
+                line = _decode(raw)
+                if keyword in line.lower():
+                    matches.append(line + "\n")
+    return matches
+
+
+def search_logs(
+    logs_dir: str,
+    log_file: str,
+    keyword: str,
+    include_rotated: bool = True,
+    limit: int = LOG_SEARCH_LIMIT,
+) -> Dict[str, Any]:
+    """
+    Líneas que contienen ``keyword`` (sin distinguir mayúsculas) en el log y,
+    opcionalmente, en sus rotaciones.
+
+    Returns:
+        dict: 'logs' (coincidencias más recientes, en orden cronológico),
+        'files' (archivos consultados) y 'truncated' (si se alcanzó limit)
+    """
+    keyword = keyword.lower()
+    trigrams = _trigrams(set(_WORD_RE.findall(keyword)))
+    if include_rotated:
+        paths = rotated_log_paths(logs_dir, log_file)
+    else:
+        path = resolve_log_path(logs_dir, log_file)
+        paths = [path] if path else []
+
+    results: List[List[str]] = []
+    found = 0
+    truncated = False
+    files = []
+    # Del más reciente al más antiguo, hasta reunir 'limit' coincidencias
+    for path in reversed(paths):
+        matches = _search_file(path, keyword, trigrams)
+        files.append(os.path.basename(path))
+        if limit > 0 and found + len(matches) >= limit:
+            truncated = found + len(matches) > limit or path != paths[0]
+            matches = matches[len(matches) - (limit - found) :]
+            results.append(matches)
+            break
+        results.append(matches)
+        found += len(matches)
+
+    lines = [line for matches in reversed(results) for line in matches]
+    return {"logs": lines, "files": files, "truncated": truncated}
@@ -0,0 +1,640 @@
+"""
+Métricas de la aplicación en el formato de texto de Prometheus (/metrics).
+
+Cada proceso acumula sus propias métricas:
+
+- Duración de las peticiones HTTP por endpoint (app/monitoring.py)
+- Aciertos y fallos de las caches (app/cache_system.py y caches de S3)
+- Duración de los comandos de MongoDB y uso del pool de conexiones
+  (listeners de pymongo.monitoring, ver register_mongo_listeners)
+- Llamadas a S3 por operación, con su duración y errores (eventos de
+  botocore, ver instrument_s3_client)
+
+Los módulos aportan sus métricas con register_collector(): funciones que
+devuelven una lista de muestras (counter_sample, gauge_sample y
+histogram_sample). Con gunicorn cada worker es un proceso distinto, así que
+cada uno vuelca cada METRICS_FLUSH_INTERVAL segundos sus muestras en
+METRICS_MULTIPROC_DIR ('worker_<pid>.json') y /metrics suma las de todos:
+contadores e histogramas de todos los workers (también de los que ya han
+terminado, para que los contadores no retrocedan) y gauges solo de los que
+siguen vivos.
+"""
+
+import atexit
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import psutil  # type: ignore
+from pymongo import monitoring as pymongo_monitoring
+
+from config import (
+    METRICS_DEAD_WORKER_TTL,
+    METRICS_FLUSH_INTERVAL,
+    METRICS_MULTIPROC_DIR,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tipo de contenido del formato de exposición de texto de Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites (ms) de los buckets de los histogramas de latencia: escala
+# geométrica de 0,5 ms a ~55 s; el último bucket recoge lo que la supera
+LATENCY_BUCKETS_MS = tuple(round(0.5 * 1.25**i, 3) for i in range(53))
+
+# Límites que se publican en /metrics (uno de cada cuatro: 0,5 ms, 1,2 ms,
+# 3 ms... en progresión x2,44); los buckets son acumulativos, así que
+# publicar un subconjunto no pierde observaciones
+EXPOSED_BUCKET_INDEXES = tuple(range(0, len(LATENCY_BUCKETS_MS), 4))
+
+WORKER_FILE_PATTERN = "worker_*.json"
+
+# Descripción (# HELP) de cada métrica
+METRIC_HELP = {
+    "edf_http_request_duration_seconds": "Duración de las peticiones HTTP por endpoint",
+    "edf_http_request_errors_total": "Peticiones HTTP con error (server = 5xx, client = 4xx)",
+    "edf_cache_hits_total": "Aciertos de cache",
+    "edf_cache_misses_total": "Fallos de cache",
+    "edf_cache_hit_ratio": "Fracción de consultas a la cache que aciertan",
+    "edf_cache_entries": "Entradas almacenadas en la cache",
+    "edf_cache_evictions_total": "Entradas expulsadas de la cache",
+    "edf_cache_coalesced_waits_total": "Peticiones que esperaron al cálculo de otra para la misma clave",
+    "edf_cache_refreshes_total": "Entradas recalculadas en segundo plano",
+    "edf_mongodb_command_duration_seconds": "Duración de los comandos de MongoDB",
+    "edf_mongodb_command_failures_total": "Comandos de MongoDB que terminaron con error",
+    "edf_mongodb_pool_connections": "Conexiones abiertas en los pools de MongoDB",
+    "edf_mongodb_pool_connections_in_use": "Conexiones de MongoDB prestadas a una operación",
+    "edf_mongodb_pool_max_connections": "Tamaño máximo de los pools de MongoDB (maxPoolSize)",
+    "edf_mongodb_pool_checkout_failures_total": "Fallos al obtener una conexión del pool de MongoDB",
+    "edf_s3_request_duration_seconds": "Duración de las llamadas a S3 por operación",
+    "edf_s3_request_errors_total": "Llamadas a S3 que terminaron con error",
+    "edf_jobs": "Trabajos en segundo plano pendientes por estado y tipo",
+    "edf_metrics_workers": "Procesos cuyas métricas se incluyen",
+}
+
+
+class LatencyHistogram:
+    """
+    Histograma de latencias de tamaño fijo (LATENCY_BUCKETS_MS).
+
+    Ocupa lo mismo tras mil peticiones que tras millones; los percentiles se
+    estiman interpolando dentro del bucket (error relativo < 25%).
+    """
+
+    __slots__ = ("counts", "count", "errors", "client_errors", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.client_errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, duration_ms, status_code=None, is_error=False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        if is_error:
+            self.errors += 1
+        elif status_code is not None and 400 <= status_code < 500:
+            self.client_errors += 1
+
+    def merge(self, other):
+        for i, value in enumerate(other.counts):
+            self.counts[i] += value
+        self.count += other.count
+        self.errors += other.errors
+        self.client_errors += other.client_errors
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, q):
+        """Latencia (ms) por debajo de la que queda la fracción q de peticiones"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, value in enumerate(self.counts):
+            if value and seen + value >= rank:
+                lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0.0
+                upper = (
+                    LATENCY_BUCKETS_MS[i]
+                    if i < len(LATENCY_BUCKETS_MS)
+                    else self.max_ms
+                )
+                estimate = lower + (upper - lower) * (rank - seen) / value
+                return round(min(estimate, self.max_ms), 2)
+            seen += value
+        return round(self.max_ms, 2)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "client_errors": self.client_errors,
+            "error_rate": (
+                round(self.errors / self.count * 100, 2) if self.count else 0.0
+            ),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+# ============================================================================
+# MUESTRAS Y COLECTORES
+# ============================================================================
+
+_collectors: List[Callable[[], List[Dict[str, Any]]]] = []
+
+
+def counter_sample(name: str, value: float, **labels) -> Dict[str, Any]:
+    return {"name": name, "type": "counter", "labels": labels, "value": value}
+
+
+def gauge_sample(name: str, value: float, **labels) -> Dict[str, Any]:
+    return {"name": name, "type": "gauge", "labels": labels, "value": value}
+
+
+def histogram_sample(
+    name: str, histogram: LatencyHistogram, **labels
+) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "type": "histogram",
+        "labels": labels,
+        "counts": list(histogram.counts),
+        "count": histogram.count,
+        "sum_ms": histogram.total_ms,
+    }
+
+
+def register_collector(collector: Callable[[], List[Dict[str, Any]]]) -> None:
+    """Añade una función que devuelve muestras del proceso actual"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def collect_samples() -> List[Dict[str, Any]]:
+    """Muestras de todos los colectores del proceso actual"""
+    samples = []
+    for collector in list(_collectors):
+        try:
+            samples.extend(collector())
+        except Exception as e:
+            logger.error(f"Error en el colector de métricas {collector.__name__}: {e}")
+    return samples
+
+
+# ============================================================================
+# MONGODB (pymongo.monitoring)
+# ============================================================================
+
+_mongo_lock = threading.Lock()
+_mongo_commands: Dict[str, LatencyHistogram] = {}
+# Estado de cada pool (uno por servidor): conexiones abiertas, en uso y máximo
+_mongo_pools: Dict[Any, Dict[str, int]] = {}
+_mongo_checkout_failures: Dict[str, int] = {}
+_mongo_listeners_registered = False
+
+
+class MongoCommandListener(pymongo_monitoring.CommandListener):
+    """Anota la duración de cada comando en el histograma de su nombre"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, False)
+
+    def failed(self, event):
+        self._record(event, True)
+
+    @staticmethod
+    def _record(event, is_error):
+        with _mongo_lock:
+            histogram = _mongo_commands.get(event.command_name)
+            if histogram is None:
+                histogram = _mongo_commands[event.command_name] = LatencyHistogram()
+            histogram.record(event.duration_micros / 1000, is_error=is_error)
+
+
+class MongoPoolListener(pymongo_monitoring.ConnectionPoolListener):
+    """Lleva la cuenta de las conexiones de cada pool de MongoDB"""
+
+    @staticmethod
+    def _update(address, **changes):
+        with _mongo_lock:
+            pool = _mongo_pools.setdefault(address, {"open": 0, "in_use": 0, "max": 0})
+            for field, delta in changes.items():
+                pool[field] = max(pool[field] + delta, 0)
+
+    def pool_created(self, event):
+        with _mongo_lock:
+            _mongo_pools[event.address] = {
+                "open": 0,
+                "in_use": 0,
+                "max": event.options.get("maxPoolSize") or 0,
+            }
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with _mongo_lock:
+            _mongo_pools.pop(event.address, None)
+
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        reason = str(getattr(event, "reason", "") or "unknown")
+        with _mongo_lock:
+            _mongo_checkout_failures[reason] = (
+                _mongo_checkout_failures.get(reason, 0) + 1
+            )
+
+    def connection_checked_out(self, event):
+        self._update(event.address, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+
+def register_mongo_listeners() -> None:
+    """
+    Registra los listeners de MongoDB para todos los MongoClient que se
+    creen a partir de ahora (los ya creados no se ven afectados).
+    """
+    global _mongo_listeners_registered
+    with _mongo_lock:
+        if _mongo_listeners_registered:
+            return
+        _mongo_listeners_registered = True
+    pymongo_monitoring.register(MongoCommandListener())
+    pymongo_monitoring.register(MongoPoolListener())
+
+
+def _collect_mongo_metrics() -> List[Dict[str, Any]]:
+    samples = []
+    with _mongo_lock:
+        for command, histogram in _mongo_commands.items():
+            samples.append(
+                histogram_sample(
+                    "edf_mongodb_command_duration_seconds", histogram, command=command
+                )
+            )
+            samples.append(
+                counter_sample(
+                    "edf_mongodb_command_failures_total",
+                    histogram.errors,
+                    command=command,
+                )
+            )
+        for address, pool in _mongo_pools.items():
+            server = f"{address[0]}:{address[1]}" if address else "unknown"
+            samples.append(
+                gauge_sample(
+                    "edf_mongodb_pool_connections", pool["open"], server=server
+                )
+            )
+            samples.append(
+                gauge_sample(
+                    "edf_mongodb_pool_connections_in_use", pool["in_use"], server=server
+                )
+            )
+            samples.append(
+                gauge_sample(
+                    "edf_mongodb_pool_max_connections", pool["max"], server=server
+                )
+            )
+        for reason, value in _mongo_checkout_failures.items():
+            samples.append(
+                counter_sample(
+                    "edf_mongodb_pool_checkout_failures_total", value, reason=reason
+                )
+            )
+    return samples
+
+
+# ============================================================================
+# S3 (eventos de botocore)
+# ============================================================================
+
+_s3_lock = threading.Lock()
+_s3_operations: Dict[str, LatencyHistogram] = {}
+_S3_STARTED_AT = "edf_metrics_started_at"
+
+
+def _s3_start_call(model, context, **kwargs):
+    context[_S3_STARTED_AT] = time.perf_counter()
+
+
+def _s3_record(model, context, is_error):
+    started_at = context.pop(_S3_STARTED_AT, None)
+    if started_at is None:
+        return
+    with _s3_lock:
+        histogram = _s3_operations.get(model.name)
+        if histogram is None:
+            histogram = _s3_operations[model.name] = LatencyHistogram()
+        histogram.record((time.perf_counter() - started_at) * 1000, is_error=is_error)
+
+
+def _s3_after_call(http_response, model, context, **kwargs):
+    # Un 304 (If-None-Match) o un 404 de una comprobación de existencia son
+    # respuestas esperadas para la aplicación; solo 5xx cuenta como error
+    _s3_record(model, context, http_response.status_code >= 500)
+
+
+def _s3_after_call_error(model, context, **kwargs):
+    # Error de red o de conexión: no llegó respuesta
+    _s3_record(model, context, True)
+
+
+def instrument_s3_client(client):
+    """
+    Mide las llamadas de un cliente S3 de boto3 (duración y errores por
+    operación). Devuelve el mismo cliente.
+    """
+    if client is None:
+        return client
+    events = client.meta.events
+    events.register(
+        "before-parameter-build.s3", _s3_start_call, unique_id="edf-metrics-before"
+    )
+    events.register("after-call.s3", _s3_after_call, unique_id="edf-metrics-after")
+    events.register(
+        "after-call-error.s3", _s3_after_call_error, unique_id="edf-metrics-error"
+    )
+    return client
+
+
+def _collect_s3_metrics() -> List[Dict[str, Any]]:
+    samples = []
+    with _s3_lock:
+        for operation, histogram in _s3_operations.items():
+            samples.append(
+                histogram_sample(
+                    "edf_s3_request_duration_seconds", histogram, operation=operation
+                )
+            )
+            samples.append(
+                counter_sample(
+                    "edf_s3_request_errors_total", histogram.errors, operation=operation
+                )
+            )
+    return samples
+
+
+register_collector(_collect_mongo_metrics)
+register_collector(_collect_s3_metrics)
+
+
+# ============================================================================
+# INSTANTÁNEAS POR PROCESO
+# ============================================================================
+
+_flusher_pid: Optional[int] = None
+_flusher_lock = threading.Lock()
+
+
+def _worker_file(pid: int) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f"worker_{pid}.json")
+
+
+def write_worker_snapshot() -> None:
+    """Vuelca las muestras del proceso actual en METRICS_MULTIPROC_DIR"""
+    pid = os.getpid()
+    path = _worker_file(pid)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"pid": pid, "updated_at": time.time(), "samples": collect_samples()},
+                f,
+            )
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.error(f"No se pudieron guardar las métricas del proceso {pid}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _flush_loop(pid: int) -> None:
+    while _flusher_pid == pid:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        write_worker_snapshot()
+
+
+def ensure_metrics_flusher() -> None:
+    """
+    Arranca en el proceso actual el hilo que vuelca sus métricas.
+
+    Se llama en cada petición: tras un fork (workers de gunicorn con
+    preload) el proceso hijo no hereda el hilo del padre y arranca el suyo.
+    """
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+        threading.Thread(
+            target=_flush_loop, args=(pid,), name="metrics-flush", daemon=True
+        ).start()
+        atexit.register(write_worker_snapshot)
+
+
+# ============================================================================
+# AGREGACIÓN Y FORMATO DE EXPOSICIÓN
+# ============================================================================
+
+
+def _sample_key(sample: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return (
+        sample["name"],
+        tuple(sorted((k, str(v)) for k, v in sample["labels"].items())),
+    )
+
+
+def _merge_sample(merged: Dict[Any, Dict[str, Any]], sample: Dict[str, Any]) -> None:
+    key = _sample_key(sample)
+    current = merged.get(key)
+    if current is None:
+        merged[key] = {
+            **sample,
+            "labels": dict(sample["labels"]),
+            **({"counts": list(sample["counts"])} if "counts" in sample else {}),
+        }
+    elif sample["type"] == "histogram":
+        for i, value in enumerate(sample["counts"]):
+            current["counts"][i] += value
+        current["count"] += sample["count"]
+        current["sum_ms"] += sample["sum_ms"]
+    else:
+        current["value"] += sample["value"]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        return psutil.pid_exists(pid)
+    except Exception:
+        return False
+
+
+def aggregate_samples(extra: Iterable[Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+    """
+    Suma las muestras de todos los procesos (ver docstring del módulo).
+
+    El proceso actual se incluye con sus métricas al momento, sin esperar a
+    su próximo volcado. Los archivos de procesos terminados hace más de
+    METRICS_DEAD_WORKER_TTL segundos se eliminan.
+
+    Args:
+        extra: Muestras calculadas al servir /metrics (p. ej. la cola de
+            trabajos), que no se suman por proceso
+
+    Returns:
+        list: Muestras sumadas, más edf_cache_hit_ratio y edf_metrics_workers
+    """
+    own_pid = os.getpid()
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for sample in collect_samples():
+        _merge_sample(merged, sample)
+    workers = 1
+
+    now = time.time()
+    for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, WORKER_FILE_PATTERN)):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudieron leer las métricas de {path}: {e}")
+            continue
+        pid = snapshot.get("pid")
+        if pid == own_pid:
+            continue
+        alive = _pid_alive(pid)
+        if not alive and now - snapshot.get("updated_at", 0) > METRICS_DEAD_WORKER_TTL:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        workers += alive
+        for sample in snapshot.get("samples", []):
+            if sample["type"] == "gauge" and not alive:
+                continue
+            _merge_sample(merged, sample)
+
+    for sample in extra:
+        _merge_sample(merged, sample)
+
+    samples = list(merged.values())
+    samples.extend(_cache_hit_ratios(merged))
+    samples.append(gauge_sample("edf_metrics_workers", workers))
+    return samples
+
+
+def _cache_hit_ratios(merged: Dict[Any, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    ratios = []
+    for (name, labels), sample in merged.items():
+        if name != "edf_cache_hits_total":
+            continue
+        misses = merged.get(("edf_cache_misses_total", labels))
+        total = sample["value"] + (misses["value"] if misses else 0)
+        ratios.append(
+            gauge_sample(
+                "edf_cache_hit_ratio",
+                sample["value"] / total if total else 0.0,
+                **dict(labels),
+            )
+        )
+    return ratios
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any], extra: str = "") -> str:
+    parts = [f'{key}="{_escape_label(value)}"' for key, value in sorted(labels.items())]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+    return repr(value)
+
+
+def _histogram_lines(name: str, sample: Dict[str, Any]) -> List[str]:
+    lines = []
+    counts = sample["counts"]
+    cumulative = 0
+    previous = 0
+    for index in EXPOSED_BUCKET_INDEXES:
+        cumulative += sum(counts[previous : index + 1])
+        previous = index + 1
+        bound = _format_value(round(LATENCY_BUCKETS_MS[index] / 1000, 6))
+        labels = _format_labels(sample["labels"], f'le="{bound}"')
+        lines.append(f"{name}_bucket{labels} {cumulative}")
+    labels = _format_labels(sample["labels"], 'le="+Inf"')
+    lines.append(f"{name}_bucket{labels} {sample['count']}")
+    labels = _format_labels(sample["labels"])
+    lines.append(f"{name}_sum{labels} {_format_value(sample['sum_ms'] / 1000)}")
+    lines.append(f"{name}_count{labels} {sample['count']}")
+    return lines
+
+
+def render_metrics(samples: Iterable[Dict[str, Any]]) -> str:
+    """Muestras en el formato de exposición de texto de Prometheus"""
+    families: Dict[str, List[Dict[str, Any]]] = {}
+    for sample in samples:
+        families.setdefault(sample["name"], []).append(sample)
+
+    lines = []
+    for name in sorted(families):
+        family = sorted(families[name], key=_sample_key)
+        lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} {family[0]['type']}")
+        for sample in family:
+            if sample["type"] == "histogram":
+                lines.extend(_histogram_lines(name, sample))
+            else:
+                lines.append(
+                    f"{name}{_format_labels(sample['labels'])} {_format_value(sample['value'])}"
+                )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,334 @@
+"""
+Cache de existencia de objetos en S3.
+
+Sustituye al antiguo diccionario ``current_app.s3_cache``, que no tenía
+límite de tamaño ni caducidad y era distinto en cada worker de gunicorn.
+
+- Tamaño acotado con expulsión LRU (S3_EXISTS_CACHE_MAX_ENTRIES).
+- TTL distinto para resultados positivos y negativos, de modo que un archivo
+  recién subido no queda oculto por un "no existe" antiguo.
+- Backend en memoria (por proceso) o SQLite en disco compartido por todos los
+  workers (S3_EXISTS_CACHE_BACKEND = "memory" | "sqlite").
+- s3_utils lo actualiza al subir o eliminar objetos.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from app.utils.metrics import counter_sample, gauge_sample, register_collector
+
+logger = logging.getLogger(__name__)
+
+BACKEND_MEMORY = "memory"
+BACKEND_SQLITE = "sqlite"
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_POSITIVE_TTL = 3600
+DEFAULT_NEGATIVE_TTL = 60
+
+
+class _MemoryBackend:
+    """Almacén LRU en memoria del proceso"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str], now: float) -> Dict[str, bool]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[0]
+        return found
+
+    def set_many(self, entries: Dict[str, Tuple[bool, float]]) -> None:
+        with self._lock:
+            for key, entry in entries.items():
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _SQLiteBackend:
+    """
+    Almacén LRU en un fichero SQLite compartido entre procesos.
+
+    Cada hilo (y cada proceso tras un fork) abre su propia conexión.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS s3_exists ("
+                "key TEXT PRIMARY KEY, found INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS s3_exists_accessed "
+                "ON s3_exists (accessed_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, keys: Iterable[str], now: float) -> Dict[str, bool]:
+        keys = list(keys)
+        found: Dict[str, bool] = {}
+        if not keys:
+            return found
+        conn = self._connect()
+        with conn:
+            # SQLite limita el número de parámetros por consulta
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, found FROM s3_exists "
+                    f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now),
+                ).fetchall()
+                found.update({key: bool(value) for key, value in rows})
+            if found:
+                conn.executemany(
+                    "UPDATE s3_exists SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+        return found
+
+    def set_many(self, entries: Dict[str, Tuple[bool, float]]) -> None:
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO s3_exists (key, found, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (key, int(found), expires_at, now)
+                    for key, (found, expires_at) in entries.items()
+                ],
+            )
+            conn.execute("DELETE FROM s3_exists WHERE expires_at <= ?", (now,))
+            overflow = (
+                conn.execute("SELECT COUNT(*) FROM s3_exists").fetchone()[0]
+                - self.max_entries
+            )
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM s3_exists WHERE key IN ("
+                    "SELECT key FROM s3_exists ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+
+    def delete(self, key: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM s3_exists WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM s3_exists")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM s3_exists").fetchone()[0]
+
+
+class S3ExistenceCache:
+    """
+    Cache de existencia de objetos S3 con LRU y TTL positivo/negativo.
+
+    Args:
+        max_entries (int): Máximo de claves almacenadas
+        positive_ttl (int): Segundos que se recuerda que un objeto existe
+        negative_ttl (int): Segundos que se recuerda que un objeto no existe
+        sqlite_path (str): Fichero SQLite compartido (None = solo memoria)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        positive_ttl: int = DEFAULT_POSITIVE_TTL,
+        negative_ttl: int = DEFAULT_NEGATIVE_TTL,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        if sqlite_path:
+            self.backend = _SQLiteBackend(sqlite_path, max_entries)
+        else:
+            self.backend = _MemoryBackend(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bool]:
+        """Devuelve True/False si la clave está en cache o None si no lo está"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bool]:
+        """Devuelve {clave: existe} solo para las claves presentes y vigentes"""
+        keys = list(dict.fromkeys(keys))
+        try:
+            found = self.backend.get_many(keys, time.time())
+        except Exception as e:
+            logger.error(f"Error leyendo cache de existencia S3: {str(e)}")
+            found = {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, exists: bool) -> None:
+        """Guarda el resultado de existencia de una clave"""
+        self.set_many({key: exists})
+
+    def set_many(self, results: Dict[str, bool]) -> None:
+        """Guarda varios resultados de existencia a la vez"""
+        if not results:
+            return
+        now = time.time()
+        entries = {
+            key: (
+                bool(exists),
+                now + (self.positive_ttl if exists else self.negative_ttl),
+            )
+            for key, exists in results.items()
+        }
+        try:
+            self.backend.set_many(entries)
+        except Exception as e:
+            logger.error(f"Error guardando cache de existencia S3: {str(e)}")
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Elimina una clave del cache, o todo el cache si key es None"""
+        try:
+            if key is None:
+                self.backend.clear()
+            else:
+                self.backend.delete(key)
+        except Exception as e:
+            logger.error(f"Error invalidando cache de existencia S3: {str(e)}")
+
+    def stats(self) -> Dict[str, object]:
+        """Estadísticas básicas del cache (tamaño, aciertos y fallos)"""
+        total = self.hits + self.misses
+        return {
+            "backend": (
+                BACKEND_SQLITE
+                if isinstance(self.backend, _SQLiteBackend)
+                else BACKEND_MEMORY
+            ),
+            "entries": len(self.backend),
+            "max_entries": self.backend.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 2) if total else 0,
+        }
+
+
+_cache: Optional[S3ExistenceCache] = None
+_cache_lock = threading.Lock()
+
+
+def _setting(name: str, default):
+    """Lee un ajuste de la configuración de Flask o, fuera de contexto, del entorno"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return os.environ.get(name, default)
+
+
+def get_s3_exists_cache() -> S3ExistenceCache:
+    """Devuelve el cache de existencia S3 del proceso (se crea en el primer uso)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                settings = {
+                    "max_entries": int(
+                        _setting("S3_EXISTS_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+                    ),
+                    "positive_ttl": int(
+                        _setting("S3_EXISTS_CACHE_POSITIVE_TTL", DEFAULT_POSITIVE_TTL)
+                    ),
+                    "negative_ttl": int(
+                        _setting("S3_EXISTS_CACHE_NEGATIVE_TTL", DEFAULT_NEGATIVE_TTL)
+                    ),
+                }
+                sqlite_path = None
+                if (
+                    _setting("S3_EXISTS_CACHE_BACKEND", BACKEND_MEMORY)
+                    == BACKEND_SQLITE
+                ):
+                    sqlite_path = _setting("S3_EXISTS_CACHE_PATH", None)
+                try:
+                    _cache = S3ExistenceCache(sqlite_path=sqlite_path, **settings)
+                except Exception as e:
+                    logger.error(
+                        f"No se pudo abrir el cache S3 compartido, se usa memoria: {str(e)}"
+                    )
+                    _cache = S3ExistenceCache(**settings)
+    return _cache
+
+
+def _collect_cache_metrics():
+    """Muestras de /metrics del cache de existencia (si ya se ha creado)"""
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return [
+        counter_sample("edf_cache_hits_total", stats["hits"], cache="s3_exists"),
+        counter_sample("edf_cache_misses_total", stats["misses"], cache="s3_exists"),
+        gauge_sample("edf_cache_entries", stats["entries"], cache="s3_exists"),
+    ]
+
+
+register_collector(_collect_cache_metrics)
+
+
+def mark_s3_object(key: str, exists: bool) -> None:
+    """Registra en el cache que un objeto se ha subido (True) o eliminado (False)"""
+    if key:
+        get_s3_exists_cache().set(key, exists)
+
+
+def invalidate_s3_object(key: Optional[str] = None) -> None:
+    """Olvida el estado de un objeto, o de todos si key es None"""
+    get_s3_exists_cache().invalidate(key)
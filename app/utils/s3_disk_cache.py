@@ -0,0 +1,340 @@
+"""
+Cache en disco (read-through) de los objetos servidos por el proxy S3.
+
+Está desactivada salvo que se configure S3_DISK_CACHE_DIR. Cada objeto se
+guarda en ese directorio con un fichero de datos por clave+ETag y un fichero
+JSON de metadatos. Las siguientes peticiones se sirven con send_file
+(sendfile/wsgi.file_wrapper, sin copiar el contenido en Python) sin
+consultar S3:
+
+- Durante S3_DISK_CACHE_TTL segundos la copia se da por válida; después se
+  revalida con un head_object condicional (If-None-Match) y, si el ETag no ha
+  cambiado, se sigue usando sin volver a descargarla.
+- El tamaño total se limita a S3_DISK_CACHE_MAX_BYTES expulsando los ficheros
+  usados hace más tiempo (LRU por fecha de modificación, que se actualiza en
+  cada acierto). Los objetos mayores que S3_DISK_CACHE_MAX_OBJECT_BYTES no se
+  guardan.
+- s3_utils invalida la entrada al subir o eliminar un objeto.
+
+El directorio puede compartirse entre los workers de gunicorn; las escrituras
+usan ficheros temporales y os.replace para ser atómicas.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from flask import current_app, has_app_context
+
+from app.utils.metrics import counter_sample, register_collector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_OBJECT_BYTES = 50 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+
+
+class _CacheWriter:
+    """Escribe un objeto en un fichero temporal mientras se transmite al cliente"""
+
+    def __init__(self, cache: "S3DiskCache", key: str, meta: Dict[str, Any]):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.size = 0
+        self.failed = False
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.directory, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        if self.failed:
+            return
+        try:
+            self.file.write(chunk)
+            self.size += len(chunk)
+        except OSError as e:
+            logger.error(f"Error escribiendo cache S3 en disco {self.key}: {str(e)}")
+            self.failed = True
+
+    @property
+    def complete(self) -> bool:
+        """True cuando se han escrito todos los bytes del objeto"""
+        return self.size >= self.meta["size"]
+
+    def commit(self) -> None:
+        """Publica el fichero si se recibió el objeto completo"""
+        self.file.close()
+        if self.failed or self.size != self.meta["size"]:
+            self.abort()
+            return
+        self.meta["size"] = self.size
+        self.cache._store(self.key, self.temp_path, self.meta)
+
+    def abort(self) -> None:
+        """Descarta el fichero temporal (cliente desconectado o error)"""
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+class S3DiskCache:
+    """
+    Cache LRU en disco de objetos S3 con presupuesto de bytes.
+
+    Args:
+        directory (str): Directorio de la cache
+        max_bytes (int): Tamaño total máximo
+        ttl (int): Segundos durante los que una copia se sirve sin revalidar
+        max_object_bytes (int): Tamaño máximo de un objeto cacheable
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: int = DEFAULT_TTL,
+        max_object_bytes: int = DEFAULT_MAX_OBJECT_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_object_bytes = max_object_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "bytes_served": 0,
+            "bytes_written": 0,
+            "evictions": 0,
+        }
+
+    # -- rutas ---------------------------------------------------------------
+
+    def _base(self, key: str) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest()
+        )
+
+    def _data_path(self, key: str, etag: str) -> str:
+        etag_hash = hashlib.sha1(etag.encode("utf-8")).hexdigest()[:16]
+        return f"{self._base(key)}-{etag_hash}.bin"
+
+    def _meta_path(self, key: str) -> str:
+        return f"{self._base(key)}.json"
+
+    # -- lectura -------------------------------------------------------------
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve los metadatos de la copia en disco de ``key`` (con 'path' y
+        'fresh') o None si no hay copia.
+        """
+        try:
+            with open(self._meta_path(key), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = self._data_path(key, meta.get("etag", ""))
+        if not os.path.exists(path):
+            return None
+        meta["path"] = path
+        meta["fresh"] = time.time() - meta.get("validated_at", 0) < self.ttl
+        return meta
+
+    def record_hit(self, meta: Dict[str, Any]) -> None:
+        """Cuenta un acierto y marca el fichero como usado recientemente (LRU)"""
+        self.metrics["hits"] += 1
+        self.metrics["bytes_served"] += meta.get("size", 0)
+        try:
+            os.utime(meta["path"])
+        except OSError:
+            pass
+
+    def record_miss(self) -> None:
+        self.metrics["misses"] += 1
+
+    def mark_validated(self, key: str, meta: Dict[str, Any]) -> None:
+        """Renueva el TTL de una copia tras comprobar que su ETag sigue vigente"""
+        self.metrics["revalidations"] += 1
+        meta = {k: v for k, v in meta.items() if k not in ("path", "fresh")}
+        meta["validated_at"] = time.time()
+        self._write_meta(key, meta)
+
+    # -- escritura -----------------------------------------------------------
+
+    def open_writer(self, key: str, meta: Dict[str, Any]) -> Optional[_CacheWriter]:
+        """
+        Prepara la escritura de un objeto que se va a transmitir.
+
+        Returns:
+            _CacheWriter o None si el objeto no es cacheable
+        """
+        size = meta.get("size")
+        if not meta.get("etag") or size is None or size > self.max_object_bytes:
+            return None
+        try:
+            return _CacheWriter(self, key, dict(meta))
+        except OSError as e:
+            logger.error(f"No se pudo crear fichero de cache S3 {key}: {str(e)}")
+            return None
+
+    def _write_meta(self, key: str, meta: Dict[str, Any]) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._meta_path(key))
+
+    def _store(self, key: str, temp_path: str, meta: Dict[str, Any]) -> None:
+        previous = self.lookup(key)
+        try:
+            os.replace(temp_path, self._data_path(key, meta["etag"]))
+            meta["key"] = key
+            meta["validated_at"] = time.time()
+            self._write_meta(key, meta)
+        except OSError as e:
+            logger.error(f"Error guardando cache S3 en disco {key}: {str(e)}")
+            return
+        if previous and previous["path"] != self._data_path(key, meta["etag"]):
+            self._remove(previous["path"])
+        self.metrics["bytes_written"] += meta["size"]
+        with self._lock:
+            if self._size is not None:
+                self._size += meta["size"]
+            needs_eviction = self._size is None or self._size > self.max_bytes
+        if needs_eviction:
+            self.evict()
+
+    def invalidate(self, key: str) -> None:
+        """Elimina la copia en disco de ``key`` (si existe)"""
+        meta = self.lookup(key)
+        if meta:
+            self._remove(meta["path"])
+        self._remove(self._meta_path(key))
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """
+        Recalcula el tamaño de la cache y, si supera el presupuesto, borra los
+        ficheros usados hace más tiempo hasta quedar por debajo del 90%.
+        También elimina los temporales abandonados por workers que terminaron
+        a mitad de una descarga.
+        """
+        with self._lock:
+            files = []
+            stale_before = time.time() - 3600
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".part"):
+                    if entry.stat().st_mtime < stale_before:
+                        self._remove(entry.path)
+                elif entry.name.endswith(".bin"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            if total > self.max_bytes:
+                target = int(self.max_bytes * 0.9)
+                for _, size, path in sorted(files):
+                    if total <= target:
+                        break
+                    self._remove(path)
+                    self._remove(path.rsplit("-", 1)[0] + ".json")
+                    total -= size
+                    self.metrics["evictions"] += 1
+            self._size = total
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de la cache (aciertos, fallos y bytes) del proceso actual"""
+        if self._size is None:
+            self.evict()
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": (
+                round(self.metrics["hits"] / lookups * 100, 2) if lookups else 0
+            ),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "directory": self.directory,
+        }
+
+
+_cache: Optional[S3DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def _setting(name: str, default):
+    """Lee un ajuste de la configuración de Flask o, fuera de contexto, del entorno"""
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return os.environ.get(name, default)
+
+
+def get_s3_disk_cache() -> Optional[S3DiskCache]:
+    """Devuelve la cache en disco del proceso o None si está desactivada"""
+    global _cache
+    if _cache is None:
+        directory = _setting("S3_DISK_CACHE_DIR", None)
+        if not directory:
+            return None
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = S3DiskCache(
+                        directory,
+                        max_bytes=int(
+                            _setting("S3_DISK_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+                        ),
+                        ttl=int(_setting("S3_DISK_CACHE_TTL", DEFAULT_TTL)),
+                        max_object_bytes=int(
+                            _setting(
+                                "S3_DISK_CACHE_MAX_OBJECT_BYTES",
+                                DEFAULT_MAX_OBJECT_BYTES,
+                            )
+                        ),
+                    )
+                except OSError as e:
+                    logger.error(f"No se pudo crear la cache S3 en disco: {str(e)}")
+                    return None
+    return _cache
+
+
+def _collect_cache_metrics():
+    """
+    Muestras de /metrics de la cache en disco (si está activada). El tamaño
+    no se publica: el directorio es común a todos los workers y se sumaría
+    una vez por cada uno.
+    """
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return [
+        counter_sample("edf_cache_hits_total", stats["hits"], cache="s3_disk"),
+        counter_sample("edf_cache_misses_total", stats["misses"], cache="s3_disk"),
+        counter_sample("edf_cache_evictions_total", stats["evictions"], cache="s3_disk"),
+    ]
+
+
+register_collector(_collect_cache_metrics)
+
+
+def invalidate_cached_object(key: str) -> None:
+    """Elimina de la cache en disco un objeto subido o eliminado"""
+    cache = get_s3_disk_cache()
+    if cache is not None and key:
+        cache.invalidate(key)
@@ -0,0 +1,273 @@
+"""
+Proxy de objetos S3 compartido por /admin/s3/<archivo> y /s3/<archivo>.
+
+- Reutiliza un único cliente boto3 por proceso con un pool de conexiones
+  (S3_PROXY_MAX_POOL_CONNECTIONS) en lugar de crear uno por petición.
+- Transmite el cuerpo en bloques (S3_PROXY_CHUNK_SIZE) sin cargar el objeto
+  completo en memoria.
+- Reenvía las cabeceras Range (respuesta 206, necesaria para avanzar en los
+  vídeos) e If-None-Match / If-Modified-Since (respuesta 304).
+- Devuelve ETag, Last-Modified y Cache-Control con max-age
+  (S3_PROXY_CACHE_MAX_AGE) para que el navegador pueda revalidar.
+- Si S3_DISK_CACHE_DIR está configurado, guarda los objetos en la cache en
+  disco (app/utils/s3_disk_cache.py) y sirve las copias con send_file.
+"""
+
+import logging
+import threading
+from typing import Dict, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from flask import Response, current_app, request, send_file
+from werkzeug.http import http_date, parse_date
+
+from app.utils.metrics import instrument_s3_client
+from app.utils.s3_disk_cache import get_s3_disk_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_proxy_s3_client():
+    """
+    Devuelve el cliente S3 del proceso, creándolo en el primer uso.
+
+    Los clientes de boto3 son thread-safe, así que todas las peticiones
+    comparten el mismo pool de conexiones HTTP.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config
+                _client = instrument_s3_client(
+                    boto3.client(
+                        "s3",
+                        aws_access_key_id=config.get("AWS_ACCESS_KEY_ID"),
+                        aws_secret_access_key=config.get("AWS_SECRET_ACCESS_KEY"),
+                        region_name=config.get("AWS_REGION") or "eu-central-1",
+                        config=Config(
+                            max_pool_connections=config.get(
+                                "S3_PROXY_MAX_POOL_CONNECTIONS", 32
+                            ),
+                            retries={"max_attempts": 3, "mode": "standard"},
+                        ),
+                    )
+                )
+    return _client
+
+
+def _error_status(error: ClientError) -> int:
+    """Código HTTP de un ClientError de S3"""
+    return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 500)
+
+
+def _iter_body(body, chunk_size: int, writer=None):
+    """
+    Itera el StreamingBody de S3 por bloques y lo cierra al terminar.
+
+    Si se indica ``writer`` (cache en disco), cada bloque se escribe también en
+    disco y la copia se publica en cuanto se ha recibido el objeto completo; si
+    el cliente se desconecta antes, se descarta.
+    """
+    try:
+        for chunk in body.iter_chunks(chunk_size):
+            if writer is not None:
+                writer.write(chunk)
+                if writer.complete:
+                    writer.commit()
+                    writer = None
+            yield chunk
+    finally:
+        body.close()
+        if writer is not None:
+            writer.abort()
+
+
+def _content_type(
+    key: str, s3_content_type: Optional[str], content_types: Optional[Dict[str, str]]
+) -> str:
+    """Content-Type de la respuesta, aplicando los forzados por extensión"""
+    for extension, forced_type in (content_types or {}).items():
+        if key.lower().endswith(extension):
+            return forced_type
+    return s3_content_type or "application/octet-stream"
+
+
+def _revalidate(disk_cache, key: str, cached: Dict) -> Optional[Dict]:
+    """
+    Comprueba con un head_object condicional si la copia en disco sigue vigente.
+
+    Returns:
+        Los metadatos de la copia si el ETag no ha cambiado (o S3 no responde),
+        None si el objeto cambió o ya no existe
+    """
+    try:
+        get_proxy_s3_client().head_object(
+            Bucket=current_app.config.get("S3_BUCKET_NAME"),
+            Key=key,
+            IfNoneMatch=cached["etag"],
+        )
+    except ClientError as e:
+        status = _error_status(e)
+        if status == 304:
+            disk_cache.mark_validated(key, cached)
+            return cached
+        if status == 404:
+            disk_cache.invalidate(key)
+            return None
+        logger.warning(f"No se pudo revalidar {key} en S3, se usa la copia local")
+        return cached
+    except Exception as e:
+        logger.warning(f"No se pudo revalidar {key} en S3: {str(e)}")
+        return cached
+    disk_cache.invalidate(key)
+    return None
+
+
+def _send_cached(
+    key: str,
+    cached: Dict,
+    content_types: Optional[Dict[str, str]],
+    extra_headers: Optional[Dict[str, str]],
+    cache_control: str,
+) -> Response:
+    """Sirve la copia en disco con send_file (Range, ETag y 304 incluidos)"""
+    response = send_file(
+        cached["path"],
+        mimetype=_content_type(key, cached.get("content_type"), content_types),
+        download_name=key.split("/")[-1],
+        conditional=True,
+        etag=cached["etag"].strip('"'),
+        last_modified=(
+            parse_date(cached["last_modified"]) if cached.get("last_modified") else None
+        ),
+    )
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers.update(extra_headers or {})
+    return response
+
+
+def _response_headers(s3_response: Dict, filename: str, cache_control: str) -> Dict:
+    """Cabeceras HTTP comunes a partir de la respuesta de S3"""
+    headers = {
+        "Content-Disposition": f'inline; filename="{filename}"',
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+    }
+    if s3_response.get("ETag"):
+        headers["ETag"] = s3_response["ETag"]
+    if s3_response.get("LastModified"):
+        headers["Last-Modified"] = http_date(s3_response["LastModified"])
+    if s3_response.get("ContentLength") is not None:
+        headers["Content-Length"] = str(s3_response["ContentLength"])
+    if s3_response.get("ContentRange"):
+        headers["Content-Range"] = s3_response["ContentRange"]
+    return headers
+
+
+def serve_s3_object(
+    key: str,
+    content_types: Optional[Dict[str, str]] = None,
+    extra_headers: Optional[Dict[str, str]] = None,
+    public: bool = False,
+) -> Response:
+    """
+    Sirve un objeto de S3 en streaming respetando Range y peticiones condicionales.
+
+    Args:
+        key (str): Clave del objeto en el bucket S3_BUCKET_NAME
+        content_types (dict): Content-Type forzado por extensión ({".pdf": ...})
+        extra_headers (dict): Cabeceras adicionales de la respuesta
+        public (bool): Cache-Control public (True) o private (False)
+
+    Returns:
+        Response: 200/206 con el contenido, 304 si el cliente ya lo tiene
+        o 416 si el rango pedido no es válido
+
+    Raises:
+        ClientError: Otros errores de S3 (p. ej. NoSuchKey), para que cada ruta
+            los trate como hasta ahora
+    """
+    config = current_app.config
+    max_age = config.get("S3_PROXY_CACHE_MAX_AGE", 3600)
+    cache_control = f"{'public' if public else 'private'}, max-age={max_age}"
+
+    # Copia en disco: se sirve sin consultar S3 mientras esté vigente
+    disk_cache = get_s3_disk_cache()
+    if disk_cache is not None:
+        cached = disk_cache.lookup(key)
+        if cached and not cached["fresh"]:
+            cached = _revalidate(disk_cache, key, cached)
+        if cached:
+            disk_cache.record_hit(cached)
+            return _send_cached(
+                key, cached, content_types, extra_headers, cache_control
+            )
+        disk_cache.record_miss()
+
+    params = {"Bucket": config.get("S3_BUCKET_NAME"), "Key": key}
+    if request.headers.get("Range"):
+        params["Range"] = request.headers["Range"]
+    if request.headers.get("If-None-Match"):
+        params["IfNoneMatch"] = request.headers["If-None-Match"]
+    elif request.if_modified_since:
+        params["IfModifiedSince"] = request.if_modified_since
+
+    s3_client = get_proxy_s3_client()
+    try:
+        if request.method == "HEAD":
+            params.pop("Range", None)
+            s3_response = s3_client.head_object(**params)
+            body = None
+        else:
+            s3_response = s3_client.get_object(**params)
+            body = s3_response["Body"]
+    except ClientError as e:
+        status = _error_status(e)
+        if status == 304:
+            headers = {"Cache-Control": cache_control}
+            if request.headers.get("If-None-Match"):
+                headers["ETag"] = request.headers["If-None-Match"]
+            return Response(status=304, headers=headers)
+        if status == 416:
+            return Response(status=416, headers={"Accept-Ranges": "bytes"})
+        raise
+
+    content_type = _content_type(key, s3_response.get("ContentType"), content_types)
+
+    headers = _response_headers(s3_response, key.split("/")[-1], cache_control)
+    headers.update(extra_headers or {})
+    status = 206 if s3_response.get("ContentRange") else 200
+
+    if body is None:
+        return Response(status=status, content_type=content_type, headers=headers)
+
+    # Objeto completo: guardarlo en disco mientras se transmite
+    writer = None
+    if disk_cache is not None and status == 200:
+        writer = disk_cache.open_writer(
+            key,
+            {
+                "etag": s3_response.get("ETag"),
+                "size": s3_response.get("ContentLength"),
+                "content_type": s3_response.get("ContentType"),
+                "last_modified": headers.get("Last-Modified"),
+            },
+        )
+
+    chunk_size = config.get("S3_PROXY_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    return Response(
+        _iter_body(body, chunk_size, writer),
+        status=status,
+        content_type=content_type,
+        headers=headers,
+        direct_passthrough=True,
+    )
@@ -7,11 +7,16 @@
 
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 from botocore.exceptions import ClientError
 from flask import current_app
 
+from app.utils.s3_cache import mark_s3_object
+from app.utils.metrics import instrument_s3_client
+from app.utils.s3_disk_cache import invalidate_cached_object
+
 logger = logging.getLogger(__name__)
 
 
@@ -36,7 +41,7 @@ def get_s3_client():
             aws_secret_access_key=aws_secret_key,
             region_name=aws_region,
         )
-        return s3_client
+        return instrument_s3_client(s3_client)
     except Exception as e:
         logger.error(f"Error al crear el cliente S3: {str(e)}")
         return None
@@ -74,6 +79,8 @@ def upload_file_to_s3_direct(file_obj, object_name, bucket_name=None):
 
         # Subir el archivo directamente a S3
         s3_client.upload_fileobj(file_obj, bucket_name, object_name)
+        mark_s3_object(object_name, True)
+        invalidate_cached_object(object_name)
 
         # Generar la URL del archivo usando el proxy S3 para evitar CORS
         url = f"/admin/s3/{object_name}"
@@ -123,6 +130,8 @@ def upload_file_to_s3(file_path, object_name=None, bucket_name=None):
     try:
         # Subir el archivo a S3
         s3_client.upload_file(file_path, bucket_name, object_name)
+        mark_s3_object(object_name, True)
+        invalidate_cached_object(object_name)
 
         # Generar la URL del archivo usando el proxy S3 para evitar CORS
         url = f"/admin/s3/{object_name}"
@@ -168,6 +177,8 @@ def delete_file_from_s3(object_name, bucket_name=None):
     try:
         # Eliminar el archivo de S3
         s3_client.delete_object(Bucket=bucket_name, Key=object_name)
+        mark_s3_object(object_name, False)
+        invalidate_cached_object(object_name)
         logger.info(f"Archivo eliminado de S3: {object_name}")
         return {
             "success": True,
@@ -314,3 +325,54 @@ def check_s3_file_exists_fast(object_name, bucket_name=None):
     except Exception as e:
         logger.error(f"Error inesperado verificando archivo en S3: {str(e)}")
         return False
+
+
+def check_s3_files_exist(object_names, bucket_name=None, max_workers=16):
+    """
+    Verificación concurrente de existencia de varios archivos en S3.
+
+    Reutiliza un único cliente (los clientes de boto3 son thread-safe) y lanza
+    los head_object en un pool de hilos acotado, de modo que N archivos cuestan
+    aproximadamente N / max_workers round-trips en lugar de N.
+
+    Args:
+        object_names (iterable): Nombres de los objetos en S3
+        bucket_name (str): Nombre del bucket de S3
+        max_workers (int): Máximo de peticiones simultáneas
+
+    Returns:
+        dict: {nombre: True/False} para cada objeto solicitado, o None si no se
+        pudo comprobar (error de S3 o de configuración)
+    """
+    keys = list(dict.fromkeys(name for name in object_names if name))
+    if not keys:
+        return {}
+
+    if bucket_name is None:
+        bucket_name = os.environ.get("S3_BUCKET_NAME")
+        if not bucket_name:
+            logger.error(
+                "No se especificó un bucket y no se encontró S3_BUCKET_NAME en las variables de entorno"
+            )
+            return {key: None for key in keys}
+
+    s3_client = get_s3_client()
+    if not s3_client:
+        return {key: None for key in keys}
+
+    def _exists(key):
+        try:
+            s3_client.head_object(Bucket=bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            logger.error(f"Error verificando archivo en S3 {key}: {str(e)}")
+            return None
+        except Exception as e:
+            logger.error(f"Error inesperado verificando archivo en S3 {key}: {str(e)}")
+            return None
+
+    workers = max(1, min(max_workers, len(keys)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(keys, executor.map(_exists, keys)))
@@ -13,6 +13,8 @@ from botocore.exceptions import ClientError
 from flask import current_app
 from werkzeug.utils import secure_filename
 
+from app.utils.metrics import instrument_s3_client
+
 # Importaciones para Google Drive
 try:
     import sys
@@ -29,11 +31,13 @@ UPLOAD_FOLDER = os.path.join(os.getcwd(), "imagenes_subidas")
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 
 # Inicializar S3 Client
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION"),
+s3_client = instrument_s3_client(
+    boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_REGION"),
+    )
 )
 
 
@@ -6,6 +6,7 @@
 # Autor: EDF Developer - 2025-05-28
 
 import os
+import tempfile
 from datetime import timedelta
 
 from dotenv import load_dotenv
@@ -49,6 +50,32 @@ class BaseConfig:
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
     AWS_REGION = os.getenv("AWS_REGION")
     S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
+    # Peticiones head_object simultáneas al comprobar las imágenes de una página
+    S3_EXISTENCE_MAX_WORKERS = int(os.getenv("S3_EXISTENCE_MAX_WORKERS", 16))
+    # Cache de existencia de objetos S3 (ver app/utils/s3_cache.py)
+    S3_EXISTS_CACHE_BACKEND = os.getenv("S3_EXISTS_CACHE_BACKEND", "memory")
+    S3_EXISTS_CACHE_PATH = os.getenv(
+        "S3_EXISTS_CACHE_PATH", "/tmp/edf_s3_exists_cache.sqlite3"
+    )
+    S3_EXISTS_CACHE_MAX_ENTRIES = int(os.getenv("S3_EXISTS_CACHE_MAX_ENTRIES", 10000))
+    S3_EXISTS_CACHE_POSITIVE_TTL = int(os.getenv("S3_EXISTS_CACHE_POSITIVE_TTL", 3600))
+    S3_EXISTS_CACHE_NEGATIVE_TTL = int(os.getenv("S3_EXISTS_CACHE_NEGATIVE_TTL", 60))
+    # Proxy S3 en streaming (ver app/utils/s3_proxy.py)
+    S3_PROXY_MAX_POOL_CONNECTIONS = int(os.getenv("S3_PROXY_MAX_POOL_CONNECTIONS", 32))
+    S3_PROXY_CHUNK_SIZE = int(os.getenv("S3_PROXY_CHUNK_SIZE", 64 * 1024))
+    S3_PROXY_CACHE_MAX_AGE = int(os.getenv("S3_PROXY_CACHE_MAX_AGE", 3600))
+    # Cache en disco de objetos servidos por el proxy. Desactivada por
+    # defecto: se activa indicando un directorio propio de la aplicación (no
+    # un /tmp compartido), p. ej. <instancia>/s3_object_cache, con espacio
+    # para S3_DISK_CACHE_MAX_BYTES
+    S3_DISK_CACHE_DIR = os.getenv("S3_DISK_CACHE_DIR", "")
+    S3_DISK_CACHE_MAX_BYTES = int(
+        os.getenv("S3_DISK_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+    )
+    S3_DISK_CACHE_MAX_OBJECT_BYTES = int(
+        os.getenv("S3_DISK_CACHE_MAX_OBJECT_BYTES", 50 * 1024 * 1024)
+    )
+    S3_DISK_CACHE_TTL = int(os.getenv("S3_DISK_CACHE_TTL", 24 * 3600))
 
     # Email
     MAIL_SERVER = os.getenv("MAIL_SERVER")
@@ -105,6 +132,15 @@ class BaseConfig:
     COLLECTION_RESET_TOKENS = "reset_tokens"
     COLLECTION_AUDIT_LOGS = "audit_logs"
     COLLECTION_CATALOGOS = "catalogos"
+    COLLECTION_JOBS = "jobs"
+
+    # Índices de MongoDB (ver app/utils/db_indexes.py)
+    MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() in [
+        "true",
+        "1",
+    ]
+    # Días que se conservan los logs de auditoría (índice TTL de audit_logs)
+    AUDIT_LOG_RETENTION_DAYS = int(os.getenv("AUDIT_LOG_RETENTION_DAYS", 365))
 
     # Ajuste de parámetros de reintentos para ser más eficientes
     MAX_RETRIES = 2  # Reducido de 3 a 2 reintentos
@@ -113,6 +149,79 @@ class BaseConfig:
     LOG_ROTATION_SIZE = 2  # Tamaño en MB para rotación de logs
     LOG_BACKUP_COUNT = 3  # Número de copias de logs a mantener
 
+    # Paginación de filas en la vista de catálogos
+    CATALOG_VIEW_PER_PAGE = int(os.getenv("CATALOG_VIEW_PER_PAGE", 50))
+    # Paginar automáticamente catálogos con más filas que este umbral (0 = nunca)
+    CATALOG_VIEW_AUTO_PAGINATE_ROWS = int(
+        os.getenv("CATALOG_VIEW_AUTO_PAGINATE_ROWS", 1000)
+    )
+    # Catálogos por página en los listados (catálogos y dashboard de usuario)
+    CATALOG_LIST_PER_PAGE = int(os.getenv("CATALOG_LIST_PER_PAGE", 24))
+    # Usuarios por página en la gestión de usuarios del administrador
+    USER_LIST_PER_PAGE = int(os.getenv("USER_LIST_PER_PAGE", 50))
+
+    # Importación de catálogos: filas leídas y escritas por lote. Los archivos
+    # que caben en un lote se guardan embebidos; los mayores, en catalog_rows
+    CATALOG_IMPORT_BATCH_SIZE = int(os.getenv("CATALOG_IMPORT_BATCH_SIZE", 1000))
+    # Filas por lote del cursor al exportar (ver app/utils/catalog_export.py)
+    CATALOG_EXPORT_BATCH_SIZE = int(os.getenv("CATALOG_EXPORT_BATCH_SIZE", 500))
+
+    # Backups de la base de datos en flujo (ver app/utils/backup_utils.py)
+    BACKUP_FORMAT = os.getenv("BACKUP_FORMAT", "ndjson")  # ndjson o bson
+    BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "gzip")  # gzip o zstd
+    BACKUP_COMPRESSION_LEVEL = int(os.getenv("BACKUP_COMPRESSION_LEVEL", 6))
+    BACKUP_BATCH_SIZE = int(os.getenv("BACKUP_BATCH_SIZE", 1000))
+    # Colecciones que se restauran a la vez
+    BACKUP_RESTORE_WORKERS = int(os.getenv("BACKUP_RESTORE_WORKERS", 4))
+
+    # Trabajos en segundo plano (ver app/utils/job_queue.py)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+    # false = ejecutar los trabajos en hilos (p. ej. la aplicación de escritorio)
+    JOB_USE_PROCESSES = os.getenv("JOB_USE_PROCESSES", "true").lower() in [
+        "true",
+        "1",
+    ]
+    # Un trabajo en ejecución sin latido durante este tiempo se da por interrumpido
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 300))
+    # Días que se conservan los trabajos terminados
+    JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", 30))
+    # Archivos subidos que esperan a ser procesados por un trabajo
+    JOB_FILES_DIR = os.getenv(
+        "JOB_FILES_DIR", os.path.join(tempfile.gettempdir(), "edf_catalogotablas_jobs")
+    )
+
+    # Caché en memoria (ver app/cache_system.py): entradas y TTL por defecto
+    # de cada espacio de nombres y particiones con lock propio de cada uno
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 256))
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 1800))
+    CACHE_LOCK_STRIPES = int(os.getenv("CACHE_LOCK_STRIPES", 8))
+    # Decorador cached: hilos que recalculan entradas en segundo plano,
+    # espera máxima al cálculo de otra petición y factor de la expiración
+    # anticipada (0 = desactivada)
+    CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", 2))
+    CACHE_SINGLE_FLIGHT_TIMEOUT = float(os.getenv("CACHE_SINGLE_FLIGHT_TIMEOUT", 30))
+    CACHE_EARLY_EXPIRY_BETA = float(os.getenv("CACHE_EARLY_EXPIRY_BETA", 1.0))
+
+    # Métricas de Prometheus (ver app/utils/metrics.py y /metrics)
+    # Con token, /metrics exige 'Authorization: Bearer <token>' (necesario
+    # para Prometheus); sin él, solo responde a un administrador con sesión.
+    # No se confía en la IP de origen: detrás de Apache en la misma máquina
+    # todas las peticiones llegan desde 127.0.0.1
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    # Directorio compartido por los workers de gunicorn para sumar sus métricas
+    METRICS_MULTIPROC_DIR = os.getenv(
+        "METRICS_MULTIPROC_DIR",
+        os.path.join(tempfile.gettempdir(), "edf_catalogotablas_metrics"),
+    )
+    # Segundos entre volcados de las métricas de cada worker
+    METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", 10))
+    # Segundos que se conservan las métricas de un worker que ya ha terminado
+    METRICS_DEAD_WORKER_TTL = int(os.getenv("METRICS_DEAD_WORKER_TTL", 86400))
+
+    # Búsqueda de catálogos y filas (ver app/utils/catalog_search.py)
+    SEARCH_TEXT_LANGUAGE = os.getenv("SEARCH_TEXT_LANGUAGE", "spanish")
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 200))
+
     # Sesión optimizada
     SESSION_TYPE = "filesystem"  # Usar sesiones de archivos para mayor estabilidad
     SESSION_PERMANENT = False  # Mantener False para evitar problemas de persistencia
@@ -161,3 +270,29 @@ COLLECTION_USERS = BaseConfig.COLLECTION_USERS
 COLLECTION_CATALOGOS = BaseConfig.COLLECTION_CATALOGOS
 COLLECTION_RESET_TOKENS = BaseConfig.COLLECTION_RESET_TOKENS
 COLLECTION_AUDIT_LOGS = BaseConfig.COLLECTION_AUDIT_LOGS
+COLLECTION_JOBS = BaseConfig.COLLECTION_JOBS
+AUDIT_LOG_RETENTION_DAYS = BaseConfig.AUDIT_LOG_RETENTION_DAYS
+CATALOG_IMPORT_BATCH_SIZE = BaseConfig.CATALOG_IMPORT_BATCH_SIZE
+CATALOG_EXPORT_BATCH_SIZE = BaseConfig.CATALOG_EXPORT_BATCH_SIZE
+BACKUP_FORMAT = BaseConfig.BACKUP_FORMAT
+BACKUP_COMPRESSION = BaseConfig.BACKUP_COMPRESSION
+BACKUP_COMPRESSION_LEVEL = BaseConfig.BACKUP_COMPRESSION_LEVEL
+BACKUP_BATCH_SIZE = BaseConfig.BACKUP_BATCH_SIZE
+BACKUP_RESTORE_WORKERS = BaseConfig.BACKUP_RESTORE_WORKERS
+JOB_WORKERS = BaseConfig.JOB_WORKERS
+JOB_USE_PROCESSES = BaseConfig.JOB_USE_PROCESSES
+JOB_STALE_SECONDS = BaseConfig.JOB_STALE_SECONDS
+JOB_RETENTION_DAYS = BaseConfig.JOB_RETENTION_DAYS
+JOB_FILES_DIR = BaseConfig.JOB_FILES_DIR
+CACHE_MAX_ENTRIES = BaseConfig.CACHE_MAX_ENTRIES
+CACHE_DEFAULT_TTL = BaseConfig.CACHE_DEFAULT_TTL
+CACHE_LOCK_STRIPES = BaseConfig.CACHE_LOCK_STRIPES
+CACHE_REFRESH_WORKERS = BaseConfig.CACHE_REFRESH_WORKERS
+CACHE_SINGLE_FLIGHT_TIMEOUT = BaseConfig.CACHE_SINGLE_FLIGHT_TIMEOUT
+CACHE_EARLY_EXPIRY_BETA = BaseConfig.CACHE_EARLY_EXPIRY_BETA
+METRICS_TOKEN = BaseConfig.METRICS_TOKEN
+METRICS_MULTIPROC_DIR = BaseConfig.METRICS_MULTIPROC_DIR
+METRICS_FLUSH_INTERVAL = BaseConfig.METRICS_FLUSH_INTERVAL
+METRICS_DEAD_WORKER_TTL = BaseConfig.METRICS_DEAD_WORKER_TTL
+SEARCH_TEXT_LANGUAGE = BaseConfig.SEARCH_TEXT_LANGUAGE
+SEARCH_MAX_RESULTS = BaseConfig.SEARCH_MAX_RESULTS
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pruebas del backup en flujo y de su restauración (con y sin staging)."""
+
+import os
+from datetime import datetime
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+from app.exceptions import JobCancelledError
+from app.utils import backup_utils
+from app.utils.backup_utils import (
+    STAGING_SUFFIX,
+    BackupManager,
+    backup_extension,
+    manifest_path,
+)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(backup_utils, "get_mongo_db", lambda: database)
+    return database
+
+
+def _fill(db):
+    db.users.insert_many(
+        [{"_id": ObjectId(), "email": f"user{i}@example.com", "n": i} for i in range(5)]
+    )
+    db.users.create_index("email", unique=True, name="email_1")
+    db.spreadsheets.insert_one(
+        {"name": "Catálogo", "created_at": datetime(2024, 1, 2, 3, 4, 5)}
+    )
+
+
+def _snapshot(db, name):
+    return sorted(db[name].find(), key=lambda doc: str(doc["_id"]))
+
+
+def _backup(tmp_path, fmt="ndjson"):
+    path = str(tmp_path / f"backup{backup_extension(fmt, 'gzip')}")
+    manifest = BackupManager().write_backup(
+        path, format=fmt, compression="gzip", batch_size=2
+    )
+    return path, manifest
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "bson"])
+def test_backup_round_trip(db, tmp_path, fmt):
+    _fill(db)
+    expected = {name: _snapshot(db, name) for name in ("users", "spreadsheets")}
+    path, manifest = _backup(tmp_path, fmt)
+
+    assert manifest["total_documents"] == 6
+    assert os.path.exists(manifest_path(path))
+
+    db.users.drop()
+    db.spreadsheets.drop()
+    results = BackupManager().restore_file(path, batch_size=2)
+
+    assert results["errors"] == []
+    assert results["total_documents"] == 6
+    for name, docs in expected.items():
+        assert _snapshot(db, name) == docs
+
+
+def test_restore_without_manifest(db, tmp_path):
+    _fill(db)
+    path, _ = _backup(tmp_path)
+    os.remove(manifest_path(path))
+    db.users.drop()
+
+    results = BackupManager().restore_file(path, collections=["users"])
+
+    assert results["total_documents"] == 5
+    assert db.users.count_documents({}) == 5
+
+
+def test_restore_skips_existing_documents(db, tmp_path):
+    _fill(db)
+    path, _ = _backup(tmp_path)
+    db.users.delete_one({"n": 0})
+
+    results = BackupManager().restore_file(path, collections=["users"])
+
+    assert results["total_documents"] == 1
+    assert results["skipped_documents"] == 4
+
+
+def test_staging_restore_replaces_collection(db, tmp_path):
+    _fill(db)
+    path, _ = _backup(tmp_path)
+    db.users.insert_one({"email": "nuevo@example.com"})
+
+    results = BackupManager().restore_file(path, collections=["users"], staging=True)
+
+    assert results["errors"] == []
+    assert db.users.count_documents({}) == 5
+    assert db.users.count_documents({"email": "nuevo@example.com"}) == 0
+    assert "email_1" in db.users.index_information()
+    assert f"users{STAGING_SUFFIX}" not in db.list_collection_names()
+
+
+def test_staging_restore_keeps_original_when_index_fails(db, tmp_path):
+    db.users.insert_many([{"email": "repetido@example.com"} for _ in range(2)])
+    path, _ = _backup(tmp_path)
+    # Sin manifiesto se recrean los índices de la colección original
+    os.remove(manifest_path(path))
+    db.users.delete_many({})
+    db.users.insert_one({"email": "original@example.com"})
+    db.users.create_index("email", unique=True, name="email_1")
+
+    results = BackupManager().restore_file(path, collections=["users"], staging=True)
+
+    assert results["errors"]
+    assert [doc["email"] for doc in db.users.find()] == ["original@example.com"]
+    assert f"users{STAGING_SUFFIX}" not in db.list_collection_names()
+
+
+def test_cancelled_backup_removes_partial_file(db, tmp_path):
+    _fill(db)
+    path = str(tmp_path / "backup.ndjson.gz")
+
+    def progress(done, total):
+        raise JobCancelledError("cancelado")
+
+    with pytest.raises(JobCancelledError):
+        BackupManager().write_backup(path, batch_size=1, progress=progress)
+
+    assert not os.path.exists(path)
+    assert not os.path.exists(manifest_path(path))
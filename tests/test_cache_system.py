@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pruebas de la caché en memoria: LRU/TTL, etiquetas y decorador cached."""
+
+import threading
+import time
+
+import pytest
+
+from app import cache_system
+from app.cache_system import (
+    cached,
+    clear_cache,
+    configure_namespace,
+    delete_cache,
+    get_cache,
+    get_cache_stats,
+    invalidate_tags,
+    set_cache,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_system.time, "time", fake)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_lru_eviction():
+    configure_namespace("test_lru", max_entries=3)
+    for key in ("a", "b", "c"):
+        set_cache(f"test_lru:{key}", key)
+    # Leer 'a' la convierte en la más reciente: la expulsada es 'b'
+    assert get_cache("test_lru:a") == "a"
+
+    set_cache("test_lru:d", "d")
+
+    assert get_cache("test_lru:b") is None
+    assert [get_cache(f"test_lru:{key}") for key in ("a", "c", "d")] == [
+        "a",
+        "c",
+        "d",
+    ]
+    assert get_cache_stats()["namespaces"]["test_lru"]["evictions"] == 1
+
+
+def test_ttl_expiration(clock):
+    set_cache("test_ttl:corta", 1, ttl=10)
+    set_cache("test_ttl:larga", 2, ttl=100)
+
+    clock.now += 11
+
+    assert get_cache("test_ttl:corta") is None
+    assert get_cache("test_ttl:larga") == 2
+
+
+def test_namespace_default_ttl(clock):
+    configure_namespace("test_ns_ttl", ttl=5)
+    set_cache("test_ns_ttl:clave", "valor")
+
+    clock.now += 6
+
+    assert get_cache("test_ns_ttl:clave") is None
+
+
+def test_delete_and_clear_namespace():
+    set_cache("test_a:x", 1)
+    set_cache("test_b:x", 2)
+
+    assert delete_cache("test_a:x")
+    assert not delete_cache("test_a:x")
+    clear_cache("test_b")
+
+    assert get_cache("test_b:x") is None
+
+
+def test_invalidate_tags():
+    set_cache("test_tags:perfil", "p", tags=["user:1"])
+    set_cache("test_tags:catalogo", "c", tags=["user:1", "catalog:7"])
+    set_cache("test_tags:otro", "o", tags=["user:2"])
+
+    assert invalidate_tags("user:1") == 2
+
+    assert get_cache("test_tags:perfil") is None
+    assert get_cache("test_tags:catalogo") is None
+    assert get_cache("test_tags:otro") == "o"
+    assert invalidate_tags("catalog:7") == 0
+
+
+def test_cached_reuses_result_and_skips_none():
+    calls = []
+
+    @cached(ttl=60, key_prefix="test_cached")
+    def load(value):
+        calls.append(value)
+        return None if value == "nada" else value.upper()
+
+    assert load("a") == "A"
+    assert load("a") == "A"
+    assert load("nada") is None
+    assert load("nada") is None
+
+    assert calls == ["a", "nada", "nada"]
+
+
+def test_cached_tags_invalidation():
+    calls = []
+
+    @cached(ttl=60, key_prefix="test_cached_tags", tags=lambda r, uid: [f"user:{uid}"])
+    def load(uid):
+        calls.append(uid)
+        return {"uid": uid}
+
+    load(1)
+    load(2)
+    invalidate_tags("user:1")
+    load(1)
+    load(2)
+
+    assert calls == [1, 2, 1]
+
+
+def test_cached_discards_result_invalidated_while_computing():
+    calls = []
+
+    @cached(ttl=60, key_prefix="test_cached_race", tags=lambda r: ["catalog:1"])
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            # Una escritura concurrente invalida mientras se calcula
+            invalidate_tags("catalog:1")
+        return len(calls)
+
+    assert load() == 1
+    assert load() == 2
+    assert load() == 2
+
+
+def test_single_flight():
+    release = threading.Event()
+    calls = []
+    results = []
+
+    @cached(ttl=60, key_prefix="test_flight")
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "valor"
+
+    waits_before = get_cache_stats()["coalesced_waits"]
+    threads = [
+        threading.Thread(target=lambda: results.append(slow())) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    assert _wait_until(lambda: get_cache_stats()["coalesced_waits"] - waits_before == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["valor"] * 5
+
+
+def test_stale_while_revalidate(clock):
+    calls = []
+
+    @cached(ttl=10, key_prefix="test_stale", stale_ttl=60, early_expiry=False)
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    assert load() == 1
+    clock.now += 11
+
+    # Se sirve el valor caducado y se recalcula en segundo plano
+    assert load() == 1
+    assert _wait_until(lambda: get_cache(load.cache_key()) == 2)
+    assert load() == 2
+
+    # Pasado stale_ttl ya no se sirve el valor antiguo
+    clock.now += 100
+    assert load() == 3
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pruebas de la importación de catálogos por lotes."""
+
+import io
+
+import mongomock
+import pytest
+
+from app.exceptions import CatalogImportError
+from app.utils.catalog_import import import_catalog_rows, read_import_file
+from app.utils.catalog_utils import (
+    STORAGE_ROWS_COLLECTION,
+    get_catalog_rows,
+    get_rows_collection,
+)
+
+CSV_CONTENT = "Nombre,Código\na,001\nb,002\nc,003\nd,004\ne,005\n"
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.spreadsheets
+
+
+def _csv(content=CSV_CONTENT):
+    return io.BytesIO(content.encode("utf-8"))
+
+
+def test_read_csv_in_batches():
+    headers, batches = read_import_file(_csv(), "datos.csv", batch_size=2)
+
+    assert headers == ["Nombre", "Código"]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_read_csv_keeps_cells_as_text():
+    _, batches = read_import_file(_csv(), "datos.csv", batch_size=10)
+
+    assert next(batches)[0]["Código"] == "001"
+
+
+def test_read_unsupported_format():
+    with pytest.raises(CatalogImportError):
+        read_import_file(_csv(), "datos.pdf")
+
+
+def test_import_single_batch_is_embedded(collection):
+    headers, batches = read_import_file(_csv(), "datos.csv", batch_size=10)
+
+    catalog_id, num_rows = import_catalog_rows(
+        collection, {"name": "Pequeño"}, headers, batches
+    )
+
+    catalog = collection.find_one({"_id": catalog_id})
+    assert num_rows == 5
+    assert catalog.get("storage") != STORAGE_ROWS_COLLECTION
+    assert [row["Nombre"] for row in catalog["data"]] == ["a", "b", "c", "d", "e"]
+
+
+def test_import_several_batches_uses_rows_collection(collection):
+    headers, batches = read_import_file(_csv(), "datos.csv", batch_size=2)
+    progress = []
+
+    catalog_id, num_rows = import_catalog_rows(
+        collection, {"name": "Grande"}, headers, batches, progress=progress.append
+    )
+
+    catalog = collection.find_one({"_id": catalog_id})
+    assert num_rows == 5
+    assert progress == [2, 4, 5]
+    assert catalog["storage"] == STORAGE_ROWS_COLLECTION
+    assert catalog["num_rows"] == 5
+    assert "data" not in catalog
+    rows = get_catalog_rows(collection, catalog)
+    assert [row["Nombre"] for row in rows] == ["a", "b", "c", "d", "e"]
+
+
+def test_import_failure_removes_catalog_and_rows(collection):
+    def batches():
+        yield [{"Nombre": "a"}, {"Nombre": "b"}]
+        yield [{"Nombre": "c"}]
+        raise CatalogImportError("Archivo dañado")
+
+    with pytest.raises(CatalogImportError):
+        import_catalog_rows(collection, {"name": "Roto"}, ["Nombre"], batches())
+
+    assert collection.count_documents({}) == 0
+    assert get_rows_collection(collection).count_documents({}) == 0
+
+
+def test_import_empty_file(collection):
+    with pytest.raises(CatalogImportError):
+        import_catalog_rows(collection, {"name": "Vacío"}, ["Nombre"], iter([]))
+    assert collection.count_documents({}) == 0
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pruebas de la capa de acceso a filas de catálogo (embebidas y catalog_rows)."""
+
+import mongomock
+import pytest
+
+from app.exceptions import CatalogVersionConflictError
+from app.utils.catalog_utils import (
+    LEGACY_ROW_ARRAY,
+    ROW_ARRAY,
+    STORAGE_EMBEDDED,
+    STORAGE_ROWS_COLLECTION,
+    append_catalog_row,
+    delete_catalog_row,
+    get_catalog_rows,
+    get_rows_collection,
+    load_catalog_rows,
+    migrate_catalog_to_rows_collection,
+    update_catalog_row,
+    update_catalog_row_fields,
+)
+
+STORAGES = (STORAGE_EMBEDDED, STORAGE_ROWS_COLLECTION)
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.spreadsheets
+
+
+def _create_catalog(collection, storage, rows):
+    """Crea un catálogo con ``rows`` en el modo de almacenamiento indicado"""
+    catalog_id = collection.insert_one(
+        {
+            "name": "Pruebas",
+            "headers": ["Nombre", "Precio"],
+            ROW_ARRAY: [dict(row) for row in rows],
+            "num_rows": len(rows),
+            "version": 0,
+        }
+    ).inserted_id
+    if storage == STORAGE_ROWS_COLLECTION:
+        migrate_catalog_to_rows_collection(collection, catalog_id)
+    return collection.find_one({"_id": catalog_id})
+
+
+def _names(collection, catalog):
+    return [row.get("Nombre") for row in get_catalog_rows(collection, catalog)]
+
+
+def _counters(collection, catalog):
+    doc = collection.find_one({"_id": catalog["_id"]})
+    return doc.get("num_rows"), doc.get("version")
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_append_row(collection, storage):
+    catalog = _create_catalog(collection, storage, [{"Nombre": "a"}])
+
+    assert append_catalog_row(collection, catalog, {"Nombre": "b"})
+
+    assert _names(collection, catalog) == ["a", "b"]
+    assert _counters(collection, catalog) == (2, 1)
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_update_row_and_fields(collection, storage):
+    catalog = _create_catalog(
+        collection, storage, [{"Nombre": "a", "Precio": 1}, {"Nombre": "b"}]
+    )
+
+    assert update_catalog_row(collection, catalog, 1, {"Nombre": "B"})
+    assert update_catalog_row_fields(collection, catalog, 0, {"Precio": 2})
+
+    rows = get_catalog_rows(collection, catalog)
+    assert [row.get("Nombre") for row in rows] == ["a", "B"]
+    assert rows[0]["Precio"] == 2
+    assert _counters(collection, catalog) == (2, 2)
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_update_missing_row(collection, storage):
+    catalog = _create_catalog(collection, storage, [{"Nombre": "a"}])
+
+    assert not update_catalog_row(collection, catalog, 5, {"Nombre": "x"})
+    assert not update_catalog_row_fields(collection, catalog, 5, {"Nombre": "x"})
+
+    # Un $set fuera del array no debe rellenarlo con nulos
+    assert _names(collection, catalog) == ["a"]
+    assert _counters(collection, catalog) == (1, 0)
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_delete_row(collection, storage):
+    catalog = _create_catalog(
+        collection, storage, [{"Nombre": "a"}, {"Nombre": "b"}, {"Nombre": "c"}]
+    )
+
+    assert delete_catalog_row(collection, catalog, 1)
+
+    assert _names(collection, catalog) == ["a", "c"]
+    assert _counters(collection, catalog) == (2, 1)
+    if storage == STORAGE_ROWS_COLLECTION:
+        positions = [
+            doc["position"]
+            for doc in get_rows_collection(collection).find(
+                {"catalog_id": catalog["_id"]}
+            )
+        ]
+        assert sorted(positions) == [0, 1]
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_repeated_delete_is_noop(collection, storage):
+    catalog = _create_catalog(collection, storage, [{"Nombre": "a"}])
+
+    assert delete_catalog_row(collection, catalog, 0)
+    assert not delete_catalog_row(collection, catalog, 0)
+
+    assert _names(collection, catalog) == []
+    assert _counters(collection, catalog) == (0, 1)
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_version_conflict(collection, storage):
+    catalog = _create_catalog(collection, storage, [{"Nombre": "a"}, {"Nombre": "b"}])
+    assert append_catalog_row(collection, catalog, {"Nombre": "c"})
+
+    with pytest.raises(CatalogVersionConflictError):
+        update_catalog_row(collection, catalog, 0, {"Nombre": "x"}, expected_version=0)
+    with pytest.raises(CatalogVersionConflictError):
+        update_catalog_row_fields(
+            collection, catalog, 0, {"Nombre": "x"}, expected_version=0
+        )
+    with pytest.raises(CatalogVersionConflictError):
+        delete_catalog_row(collection, catalog, 0, expected_version=0)
+
+    assert _names(collection, catalog) == ["a", "b", "c"]
+    assert _counters(collection, catalog) == (3, 1)
+    assert delete_catalog_row(collection, catalog, 0, expected_version=1)
+
+
+def test_legacy_rows_array(collection):
+    catalog_id = collection.insert_one(
+        {"name": "Antiguo", LEGACY_ROW_ARRAY: [{"Nombre": "a"}], "num_rows": 1}
+    ).inserted_id
+    catalog = collection.find_one({"_id": catalog_id})
+
+    assert append_catalog_row(collection, catalog, {"Nombre": "b"})
+    assert update_catalog_row_fields(collection, catalog, 0, {"Nombre": "A"})
+
+    loaded = load_catalog_rows(collection, collection.find_one({"_id": catalog_id}))
+    assert [row["Nombre"] for row in loaded[ROW_ARRAY]] == ["A", "b"]
+    assert LEGACY_ROW_ARRAY not in loaded
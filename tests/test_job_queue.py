@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pruebas de la cola de trabajos en segundo plano y de su cancelación."""
+
+import mongomock
+import pytest
+
+import app.database
+from app.utils import job_queue
+from app.utils.job_queue import (
+    JOB_CANCELLED,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_HANDLERS,
+    cancel_job,
+    execute_job,
+    get_job,
+    submit_job,
+)
+
+
+def run_counter(ctx, steps):
+    """Trabajo de prueba: informa del progreso en cada paso"""
+    for step in range(steps):
+        ctx.progress(step, steps, force=True)
+    return {"steps": steps}
+
+
+def run_cancelled_midway(ctx, steps):
+    """Trabajo de prueba que pide su propia cancelación en el primer paso"""
+    for step in range(steps):
+        if step == 1:
+            cancel_job(ctx.collection.database, ctx.job_id)
+        ctx.progress(step, steps, force=True)
+    return {"steps": steps}
+
+
+def run_failing(ctx):
+    raise ValueError("fallo de prueba")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(app.database, "get_mongo_db", lambda: database)
+    # Los trabajos se ejecutan en la prueba con execute_job, no en el pool
+    monkeypatch.setattr(job_queue, "_dispatch", lambda job_id: None)
+    for name in ("run_counter", "run_cancelled_midway", "run_failing"):
+        monkeypatch.setitem(JOB_HANDLERS, name, f"{__name__}:{name}")
+    return database
+
+
+def test_job_runs_to_completion(db):
+    job_id = submit_job(db, "run_counter", {"steps": 3}, username="admin")
+
+    assert execute_job(job_id) == JOB_DONE
+
+    job = get_job(db, job_id)
+    assert job["result"] == {"steps": 3}
+    assert job["progress"] == {"done": 2, "total": 3}
+    assert job["finished_at"] is not None
+
+
+def test_cancel_queued_job(db):
+    job_id = submit_job(db, "run_counter", {"steps": 3})
+
+    assert cancel_job(db, job_id)
+    # Un trabajo cancelado en cola ya no se reclama ni se ejecuta
+    assert execute_job(job_id) is None
+    assert get_job(db, job_id)["status"] == JOB_CANCELLED
+
+
+def test_cancel_running_job(db):
+    job_id = submit_job(db, "run_cancelled_midway", {"steps": 5})
+
+    assert execute_job(job_id) == JOB_CANCELLED
+
+    job = get_job(db, job_id)
+    assert job["result"] is None
+    # El trabajo se detiene en la llamada a progress() posterior a la petición
+    assert job["progress"]["done"] == 1
+
+
+def test_cancel_finished_job(db):
+    job_id = submit_job(db, "run_counter", {"steps": 1})
+    execute_job(job_id)
+
+    assert not cancel_job(db, job_id)
+    assert not cancel_job(db, "no-es-un-id")
+    assert get_job(db, job_id)["status"] == JOB_DONE
+
+
+def test_failed_job(db):
+    job_id = submit_job(db, "run_failing")
+
+    assert execute_job(job_id) == JOB_FAILED
+    assert get_job(db, job_id)["error"] == "fallo de prueba"
+
+
+def test_unknown_job_type(db):
+    with pytest.raises(ValueError):
+        submit_job(db, "desconocido")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pruebas de la autorización del endpoint /metrics."""
+
+import pytest
+from flask import Flask
+
+from app.routes import metrics_routes
+from app.utils import metrics
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics_routes, "get_mongo_db", lambda: None)
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY="test", TESTING=True, METRICS_TOKEN=None)
+    app.register_blueprint(metrics_routes.metrics_bp)
+    return app
+
+
+def _client(app, role=None):
+    client = app.test_client()
+    if role:
+        with client.session_transaction() as session:
+            session["role"] = role
+    return client
+
+
+def test_anonymous_request_is_forbidden(app):
+    response = _client(app).get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"})
+
+    assert response.status_code == 403
+
+
+def test_admin_session(app):
+    assert _client(app, "user").get("/metrics").status_code == 403
+
+    response = _client(app, "admin").get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+
+
+def test_bearer_token(app):
+    app.config["METRICS_TOKEN"] = "secreto"
+    client = _client(app)
+
+    assert client.get("/metrics").status_code == 403
+    assert (
+        client.get("/metrics", headers={"Authorization": "Bearer otro"}).status_code
+        == 403
+    )
+    response = client.get("/metrics", headers={"Authorization": "Bearer secreto"})
+    assert response.status_code == 200
+
+
+def test_token_replaces_admin_session(app):
+    app.config["METRICS_TOKEN"] = "secreto"
+
+    assert _client(app, "admin").get("/metrics").status_code == 403
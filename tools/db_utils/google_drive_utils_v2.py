@@ -19,7 +19,7 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 
 # Configurar logging
 logging.basicConfig(level=logging.DEBUG)
@@ -327,6 +327,35 @@ def download_file(file_id: str) -> bytes:
         raise Exception(f"Error al descargar archivo: {e}")
 
 
+def download_file_to_path(file_id: str, path: str) -> int:
+    """
+    Descarga un archivo de Google Drive directamente a disco, por bloques.
+
+    A diferencia de download_file, el contenido no se carga en memoria.
+
+    Args:
+        file_id: ID del archivo en Google Drive
+        path: Ruta local donde guardar el archivo
+
+    Returns:
+        int: Tamaño del archivo descargado en bytes
+    """
+    try:
+        service = get_drive_service()
+
+        request = service.files().get_media(fileId=file_id)
+        with open(path, "wb") as f:
+            downloader = MediaIoBaseDownload(f, request)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+            return f.tell()
+
+    except Exception as e:
+        print(f"❌ Error descargando archivo {file_id}: {e}")
+        raise Exception(f"Error al descargar archivo: {e}")
+
+
 def delete_file(file_id: str) -> bool:
     """
     Elimina un archivo de Google Drive.
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Script para asignar 'owner_id' a los catálogos existentes.
+
+Los listados y contadores por usuario (main.dashboard_user,
+admin.lista_usuarios, admin.ver_catalogos_usuario) filtran por 'owner_id', el
+_id del usuario propietario. Los catálogos creados antes solo guardan el
+username, nombre o email en created_by/owner/owner_name/email/username; este
+script los resuelve contra la colección users y guarda el ObjectId.
+
+Los catálogos cuyos campos no identifican a un único usuario se muestran y
+se dejan sin modificar para revisarlos a mano.
+
+Uso:
+    python3 tools/maintenance/backfill_catalog_owner.py
+    python3 tools/maintenance/backfill_catalog_owner.py --dry-run
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Añadir el directorio raíz al path
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.utils.catalog_utils import (  # noqa: E402
+    LEGACY_OWNER_FIELDS,
+    OWNER_ID_FIELD,
+    index_users_by_identity,
+    resolve_catalog_owner,
+)
+from config import COLLECTION_USERS  # noqa: E402
+
+# Cargar variables de entorno
+load_dotenv()
+
+COLLECTIONS = ("spreadsheets", "catalogs")
+
+
+def backfill_owner(dry_run=False):
+    """Asigna 'owner_id' a los catálogos que aún no lo tienen"""
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        print("❌ Error: MONGO_URI no encontrado en las variables de entorno")
+        return False
+
+    try:
+        client = MongoClient(mongo_uri)
+        db = client.get_database()
+
+        users_by_identity = index_users_by_identity(
+            db[COLLECTION_USERS].find(
+                {}, {"email": 1, "username": 1, "nombre": 1, "name": 1}
+            )
+        )
+        print(f"👥 {len(users_by_identity)} identidades de usuario cargadas")
+
+        total = 0
+        sin_resolver = 0
+        projection = {field: 1 for field in ("name", *LEGACY_OWNER_FIELDS)}
+        for collection_name in COLLECTIONS:
+            collection = db[collection_name]
+            documentos = list(
+                collection.find({OWNER_ID_FIELD: {"$exists": False}}, projection)
+            )
+            print(f"\n📊 {collection_name}: {len(documentos)} documentos por procesar")
+
+            for doc in documentos:
+                nombre = doc.get("name", "Sin nombre")
+                owner_id = resolve_catalog_owner(doc, users_by_identity)
+                if owner_id is None:
+                    sin_resolver += 1
+                    identidades = {
+                        field: doc[field]
+                        for field in LEGACY_OWNER_FIELDS
+                        if doc.get(field)
+                    }
+                    print(
+                        f"   ⚠️  {nombre} (ID: {doc['_id']}) - propietario no resuelto: {identidades}"
+                    )
+                    continue
+
+                if dry_run:
+                    print(f"   🔍 {nombre} (ID: {doc['_id']}) → {owner_id}")
+                    continue
+
+                collection.update_one(
+                    {"_id": doc["_id"], OWNER_ID_FIELD: {"$exists": False}},
+                    {"$set": {OWNER_ID_FIELD: owner_id}},
+                )
+                total += 1
+                print(f"   ✅ {nombre} (ID: {doc['_id']}) → {owner_id}")
+
+        if not dry_run:
+            print(f"\n📈 Documentos actualizados: {total}")
+        if sin_resolver:
+            print(f"⚠️  Documentos sin propietario resuelto: {sin_resolver}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error conectando a MongoDB: {e}")
+        return False
+    finally:
+        if "client" in locals():
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Asigna owner_id a los catálogos existentes"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Mostrar qué catálogos se actualizarían sin modificar",
+    )
+    args = parser.parse_args()
+
+    print("🚀 Iniciando asignación de propietarios de catálogos...")
+    print("=" * 60)
+
+    success = backfill_owner(dry_run=args.dry_run)
+
+    print("=" * 60)
+    if success:
+        print("✅ Script ejecutado exitosamente")
+        sys.exit(0)
+    else:
+        print("❌ Script terminó con errores")
+        sys.exit(1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Script para calcular 'search_keys' en los catálogos existentes.
+
+La búsqueda por nombre de catalogs.list_catalogs filtra por 'search_keys',
+las palabras del nombre normalizadas (minúsculas y sin acentos), con un
+índice que permite buscar por prefijo (ver app/utils/catalog_search.py).
+
+La aplicación guarda el campo al crear o renombrar un catálogo, así que este
+script solo es necesario una vez para los catálogos anteriores, o con --all
+para recalcularlo en todos. Los índices de texto se crean con
+tools/maintenance/ensure_indexes.py.
+
+Uso:
+    python3 tools/maintenance/backfill_catalog_search_keys.py
+    python3 tools/maintenance/backfill_catalog_search_keys.py --dry-run
+    python3 tools/maintenance/backfill_catalog_search_keys.py --all
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+# Añadir el directorio raíz al path
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.utils.catalog_search import (  # noqa: E402
+    SEARCH_KEYS_FIELD,
+    name_search_keys,
+)
+
+# Cargar variables de entorno
+load_dotenv()
+
+BATCH_SIZE = 500
+
+
+def backfill_search_keys(dry_run=False, recompute_all=False):
+    """Calcula 'search_keys' en los catálogos que aún no lo tienen"""
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        print("❌ Error: MONGO_URI no encontrado en las variables de entorno")
+        return False
+
+    try:
+        client = MongoClient(mongo_uri)
+        collection = client.get_database()["spreadsheets"]
+
+        query = {} if recompute_all else {SEARCH_KEYS_FIELD: {"$exists": False}}
+        print(
+            f"\n📊 spreadsheets: {collection.count_documents(query)} documentos por procesar"
+        )
+
+        total = 0
+        operations = []
+        for doc in collection.find(query, {"name": 1}):
+            keys = name_search_keys(doc.get("name"))
+            if dry_run:
+                print(
+                    f"   🔍 {doc.get('name', 'Sin nombre')} (ID: {doc['_id']}) → {keys}"
+                )
+                continue
+            operations.append(
+                UpdateOne({"_id": doc["_id"]}, {"$set": {SEARCH_KEYS_FIELD: keys}})
+            )
+            if len(operations) >= BATCH_SIZE:
+                total += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            total += collection.bulk_write(operations, ordered=False).modified_count
+
+        if not dry_run:
+            print(f"\n📈 Documentos actualizados: {total}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error conectando a MongoDB: {e}")
+        return False
+    finally:
+        if "client" in locals():
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Calcula las palabras de búsqueda del nombre de los catálogos"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Mostrar qué catálogos se procesarían sin modificar",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Recalcular también los catálogos que ya tienen el campo",
+    )
+    args = parser.parse_args()
+
+    print("🚀 Iniciando cálculo de palabras de búsqueda de catálogos...")
+    print("=" * 60)
+
+    success = backfill_search_keys(dry_run=args.dry_run, recompute_all=args.all)
+
+    print("=" * 60)
+    if success:
+        print("✅ Script ejecutado exitosamente")
+        sys.exit(0)
+    else:
+        print("❌ Script terminó con errores")
+        sys.exit(1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Script para precalcular la miniatura automática de los catálogos.
+
+Guarda en 'miniatura_auto' la primera imagen de las filas de cada catálogo
+para que los listados (catalogs.list_catalogs y main.dashboard_user) no
+tengan que recorrer las filas ni consultar S3 al mostrarse.
+
+La aplicación mantiene el campo en cada escritura de filas, así que este
+script solo es necesario una vez para los catálogos anteriores, o con
+--all para recalcularlo en todos.
+
+Uso:
+    python3 tools/maintenance/backfill_catalog_thumbnails.py
+    python3 tools/maintenance/backfill_catalog_thumbnails.py --dry-run
+    python3 tools/maintenance/backfill_catalog_thumbnails.py --all
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Añadir el directorio raíz al path
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.utils.catalog_utils import (  # noqa: E402
+    THUMBNAIL_FIELD,
+    refresh_catalog_thumbnail,
+)
+
+# Cargar variables de entorno
+load_dotenv()
+
+COLLECTIONS = ("spreadsheets", "catalogs")
+
+
+def backfill_thumbnails(dry_run=False, recompute_all=False):
+    """Calcula 'miniatura_auto' en los catálogos que aún no lo tienen"""
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        print("❌ Error: MONGO_URI no encontrado en las variables de entorno")
+        return False
+
+    try:
+        client = MongoClient(mongo_uri)
+        db = client.get_database()
+
+        total = 0
+        con_imagen = 0
+        for collection_name in COLLECTIONS:
+            collection = db[collection_name]
+            query = {} if recompute_all else {THUMBNAIL_FIELD: {"$exists": False}}
+            documentos = list(collection.find(query, {"name": 1}))
+            print(f"\n📊 {collection_name}: {len(documentos)} documentos por procesar")
+
+            for doc in documentos:
+                nombre = doc.get("name", "Sin nombre")
+                if dry_run:
+                    print(f"   🔍 {nombre} (ID: {doc['_id']})")
+                    continue
+
+                miniatura = refresh_catalog_thumbnail(collection, doc["_id"])
+                total += 1
+                if miniatura:
+                    con_imagen += 1
+                    print(f"   ✅ {nombre} (ID: {doc['_id']}) - {miniatura}")
+                else:
+                    print(f"   ➖ {nombre} (ID: {doc['_id']}) - sin imágenes")
+
+        if not dry_run:
+            print(f"\n📈 Documentos procesados: {total} ({con_imagen} con miniatura)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error conectando a MongoDB: {e}")
+        return False
+    finally:
+        if "client" in locals():
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Precalcula la miniatura automática de los catálogos"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Mostrar qué catálogos se procesarían sin modificar",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Recalcular también los catálogos que ya tienen miniatura",
+    )
+    args = parser.parse_args()
+
+    print("🚀 Iniciando cálculo de miniaturas de catálogos...")
+    print("=" * 60)
+
+    success = backfill_thumbnails(dry_run=args.dry_run, recompute_all=args.all)
+
+    print("=" * 60)
+    if success:
+        print("✅ Script ejecutado exitosamente")
+        sys.exit(0)
+    else:
+        print("❌ Script terminó con errores")
+        sys.exit(1)
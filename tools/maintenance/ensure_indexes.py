@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Script para aplicar el registro de índices de MongoDB (app/utils/db_indexes.py).
+
+Muestra las diferencias entre los índices declarados y los existentes y crea
+los que faltan. La aplicación hace lo mismo al arrancar
+(MONGO_ENSURE_INDEXES); este script permite revisarlo o aplicarlo a mano,
+por ejemplo antes de un despliegue.
+
+Uso:
+    python3 tools/maintenance/ensure_indexes.py
+    python3 tools/maintenance/ensure_indexes.py --dry-run
+    python3 tools/maintenance/ensure_indexes.py --rebuild
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Añadir el directorio raíz al path
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.utils.db_indexes import ensure_indexes  # noqa: E402
+
+# Cargar variables de entorno
+load_dotenv()
+
+
+def print_drift(drift):
+    """Muestra las diferencias de índices por colección"""
+    for collection_name, entry in drift.items():
+        print(f"\n📊 {collection_name}")
+        for name in entry["ok"]:
+            print(f"   ✅ {name}")
+        for missing in entry["missing"]:
+            print(f"   ❌ Falta: {missing['name']} {missing['keys']}")
+        for mismatched in entry["mismatched"]:
+            print(
+                f"   ⚠️  Distinto: {mismatched['name']} "
+                f"(existe como {mismatched['existing_name']}): {mismatched['differences']}"
+            )
+        for unexpected in entry["unexpected"]:
+            print(f"   ℹ️  No declarado: {unexpected['name']} {unexpected['keys']}")
+
+
+def apply_indexes(dry_run=False, rebuild=False):
+    """Compara y aplica el registro de índices"""
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        print("❌ Error: MONGO_URI no encontrado en las variables de entorno")
+        return False
+
+    try:
+        client = MongoClient(mongo_uri)
+        db = client.get_database()
+
+        result = ensure_indexes(db, rebuild=rebuild, dry_run=dry_run)
+        print_drift(result["drift"])
+
+        if not dry_run:
+            print(f"\n📈 Índices creados: {len(result['created'])}")
+            for name in result["created"]:
+                print(f"   ➕ {name}")
+            for name in result["updated"]:
+                print(f"   🔄 TTL actualizado: {name}")
+            for name in result["rebuilt"]:
+                print(f"   🔁 Reconstruido: {name}")
+            for error in result["errors"]:
+                print(f"   ❌ {error['index']}: {error['error']}")
+        return not result["errors"]
+
+    except Exception as e:
+        print(f"❌ Error conectando a MongoDB: {e}")
+        return False
+    finally:
+        if "client" in locals():
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Aplica el registro de índices de MongoDB"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Mostrar las diferencias sin crear índices",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Reconstruir los índices con claves u opciones distintas a las declaradas",
+    )
+    args = parser.parse_args()
+
+    print("🚀 Comprobando índices de MongoDB...")
+    print("=" * 60)
+
+    success = apply_indexes(dry_run=args.dry_run, rebuild=args.rebuild)
+
+    print("=" * 60)
+    if success:
+        print("✅ Script ejecutado exitosamente")
+        sys.exit(0)
+    else:
+        print("❌ Script terminó con errores")
+        sys.exit(1)
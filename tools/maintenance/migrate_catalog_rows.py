@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Script para migrar las filas de los catálogos entre los arrays embebidos
+('data' en spreadsheets) y la colección 'catalog_rows' (un documento
+por fila).
+
+Uso:
+    python3 tools/maintenance/migrate_catalog_rows.py --min-rows 1000
+    python3 tools/maintenance/migrate_catalog_rows.py --catalog-id <id>
+    python3 tools/maintenance/migrate_catalog_rows.py --catalog-id <id> --revert
+    python3 tools/maintenance/migrate_catalog_rows.py --dry-run
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Añadir el directorio raíz al path
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.utils.catalog_utils import (  # noqa: E402
+    EMBEDDED_ROWS_EXPRESSION,
+    STORAGE_ROWS_COLLECTION,
+    ensure_rows_collection_indexes,
+    migrate_catalog_to_embedded,
+    migrate_catalog_to_rows_collection,
+)
+from bson.objectid import ObjectId  # noqa: E402
+
+# Cargar variables de entorno
+load_dotenv()
+
+
+def migrate_catalog_rows(
+    catalog_id=None, min_rows=0, batch_size=1000, revert=False, dry_run=False
+):
+    """Migra los catálogos seleccionados al formato indicado"""
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        print("❌ Error: MONGO_URI no encontrado en las variables de entorno")
+        return False
+
+    try:
+        client = MongoClient(mongo_uri)
+        db = client.get_database()
+        collection = db["spreadsheets"]
+
+        if not revert and not dry_run:
+            ensure_rows_collection_indexes(db)
+
+        # Seleccionar catálogos según el formato de origen
+        if revert:
+            query = {"storage": STORAGE_ROWS_COLLECTION}
+        else:
+            query = {"storage": {"$ne": STORAGE_ROWS_COLLECTION}}
+        if catalog_id:
+            query["_id"] = ObjectId(catalog_id)
+
+        # Contar filas en el servidor sin descargar los arrays
+        pipeline = [
+            {"$match": query},
+            {
+                "$project": {
+                    "name": 1,
+                    "num_rows": {"$size": EMBEDDED_ROWS_EXPRESSION},
+                    "stored_rows": "$num_rows",
+                }
+            },
+        ]
+        catalogos = list(collection.aggregate(pipeline))
+        print(f"📊 Catálogos candidatos: {len(catalogos)}")
+
+        migrados = 0
+        errores = 0
+        for catalogo in catalogos:
+            nombre = catalogo.get("name", "Sin nombre")
+            filas = catalogo["stored_rows"] if revert else catalogo["num_rows"]
+            if not revert and filas < min_rows:
+                continue
+
+            print(f"\n🔧 {nombre} (ID: {catalogo['_id']}) - {filas} filas")
+            if dry_run:
+                print("   🔍 Simulación: no se modifica nada")
+                continue
+
+            if revert:
+                resultado = migrate_catalog_to_embedded(collection, catalogo["_id"])
+            else:
+                resultado = migrate_catalog_to_rows_collection(
+                    collection, catalogo["_id"], batch_size=batch_size
+                )
+
+            if resultado is None:
+                errores += 1
+                print("   ❌ Error en la migración (ver logs)")
+            else:
+                migrados += 1
+                print(f"   ✅ {resultado} filas migradas")
+
+        print(f"\n📈 Catálogos migrados: {migrados}, errores: {errores}")
+        return errores == 0
+
+    except Exception as e:
+        print(f"❌ Error conectando a MongoDB: {e}")
+        return False
+    finally:
+        if "client" in locals():
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migra filas de catálogos a la colección catalog_rows"
+    )
+    parser.add_argument("--catalog-id", help="Migrar solo este catálogo")
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=0,
+        help="Migrar solo catálogos con al menos este número de filas",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Filas por cada insert_many"
+    )
+    parser.add_argument(
+        "--revert",
+        action="store_true",
+        help="Devolver las filas de catalog_rows a los arrays embebidos",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Mostrar qué se migraría sin modificar"
+    )
+    args = parser.parse_args()
+
+    print("🚀 Iniciando migración de filas de catálogos...")
+    print("=" * 60)
+
+    success = migrate_catalog_rows(
+        catalog_id=args.catalog_id,
+        min_rows=args.min_rows,
+        batch_size=args.batch_size,
+        revert=args.revert,
+        dry_run=args.dry_run,
+    )
+
+    print("=" * 60)
+    if success:
+        print("✅ Script ejecutado exitosamente")
+        sys.exit(0)
+    else:
+        print("❌ Script terminó con errores")
+        sys.exit(1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Script para eliminar el array duplicado 'rows' de los catálogos.
+
+Deja 'data' como único array de filas sin perder ninguna: si 'rows' coincide
+con 'data' o es un prefijo suyo se elimina; si es 'data' el prefijo de 'rows'
+(o está vacío), 'rows' pasa a ser 'data'. Los documentos en los que ambos
+arrays divergen no se modifican y se listan para revisarlos a mano.
+También recalcula 'num_rows' en los documentos normalizados.
+
+Uso:
+    python3 tools/maintenance/normalize_catalog_rows.py
+    python3 tools/maintenance/normalize_catalog_rows.py --dry-run
+"""
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Añadir el directorio raíz al path
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.utils.catalog_utils import (  # noqa: E402
+    LEGACY_ROW_ARRAY,
+    normalize_catalog_rows,
+    refresh_catalog_row_count,
+)
+
+# Cargar variables de entorno
+load_dotenv()
+
+COLLECTIONS = ("spreadsheets", "catalogs")
+
+
+def normalize_rows(dry_run=False):
+    """Normaliza los catálogos que aún conservan el array 'rows'"""
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        print("❌ Error: MONGO_URI no encontrado en las variables de entorno")
+        return False
+
+    try:
+        client = MongoClient(mongo_uri)
+        db = client.get_database()
+
+        total = 0
+        divergentes = 0
+        for collection_name in COLLECTIONS:
+            collection = db[collection_name]
+            query = {LEGACY_ROW_ARRAY: {"$exists": True}}
+            documentos = list(collection.find(query, {"name": 1}))
+            print(
+                f"\n📊 {collection_name}: {len(documentos)} documentos con '{LEGACY_ROW_ARRAY}'"
+            )
+
+            for doc in documentos:
+                nombre = doc.get("name", "Sin nombre")
+                if dry_run:
+                    print(f"   🔍 {nombre} (ID: {doc['_id']})")
+                    continue
+
+                if normalize_catalog_rows(collection, doc["_id"]):
+                    num_rows = refresh_catalog_row_count(collection, doc["_id"])
+                    total += 1
+                    print(f"   ✅ {nombre} (ID: {doc['_id']}) - {num_rows} filas")
+                else:
+                    divergentes += 1
+                    print(
+                        f"   ⚠️ {nombre} (ID: {doc['_id']}) - 'data' y "
+                        f"'{LEGACY_ROW_ARRAY}' no coinciden, revisar a mano"
+                    )
+
+        if not dry_run:
+            print(f"\n📈 Documentos normalizados: {total}")
+            if divergentes:
+                print(
+                    f"⚠️ Documentos sin normalizar (arrays divergentes): {divergentes}"
+                )
+        return True
+
+    except Exception as e:
+        print(f"❌ Error conectando a MongoDB: {e}")
+        return False
+    finally:
+        if "client" in locals():
+            client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Elimina el array duplicado 'rows' de los catálogos"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Mostrar qué se normalizaría sin modificar",
+    )
+    args = parser.parse_args()
+
+    print("🚀 Iniciando normalización de filas de catálogos...")
+    print("=" * 60)
+
+    success = normalize_rows(dry_run=args.dry_run)
+
+    print("=" * 60)
+    if success:
+        print("✅ Script ejecutado exitosamente")
+        sys.exit(0)
+    else:
+        print("❌ Script terminó con errores")
+        sys.exit(1)
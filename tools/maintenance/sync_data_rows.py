@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Script para sincronizar los campos 'data' y 'rows' en todas las tablas
+
+Obsoleto: 'data' es el único array de filas; usar normalize_catalog_rows.py
 """
 
 import os